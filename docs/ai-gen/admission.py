@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Priority admission control and load shedding for tool calls
+
+Every tool belongs to a priority class:
+
+    live_call     made while a caller is on the line: schedule_callback,
+                  find_available_slots, get_customer_history
+    interactive   a person is waiting on the answer (the default)
+    bulk          exports, analytics and batch calls: get_call_logs,
+                  export_call_logs, get_call_analytics, forecast_staffing,
+                  the plural batch tools
+
+At most `capacity` calls run at once. Each class has its own concurrency
+budget, and slots are kept in reserve for the classes above it: a bulk call
+only starts while fewer than `capacity - reserved(live_call) -
+reserved(interactive)` calls are running, so however much bulk traffic
+arrives, live calls find a free slot. A freed slot goes to the oldest
+waiter of the highest class that may take it.
+
+Waiting is bounded by each class's `max_wait`. A call whose estimated wait
+(queue ahead of it x mean run time / budget) already exceeds that, or that
+finds its class's queue full, is refused at once; one still queued at its
+deadline is refused then. Either way the tool fails fast with
+OverloadedError ("Server busy ... retry after 0.4s") instead of adding to
+everyone's latency, and the error is counted in the tool's metrics.
+
+Configuration:
+    CALL_CENTER_MAX_CONCURRENCY     capacity (default: 16; 0 disables admission control)
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import NamedTuple, Optional
+
+
+LIVE_CALL = "live_call"
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+
+class PriorityClass(NamedTuple):
+    """Budget of one class; `concurrency`, `reserved` and `max_queue` as fractions of capacity"""
+
+    name: str
+    concurrency: float
+    reserved: float
+    max_wait: float
+    max_queue: float
+
+
+# Highest priority first
+DEFAULT_CLASSES = (
+    PriorityClass(LIVE_CALL, concurrency=1.0, reserved=0.25, max_wait=2.0, max_queue=16.0),
+    PriorityClass(INTERACTIVE, concurrency=0.75, reserved=0.125, max_wait=1.0, max_queue=8.0),
+    PriorityClass(BULK, concurrency=0.25, reserved=0.0, max_wait=0.25, max_queue=1.0),
+)
+
+
+class OverloadedError(RuntimeError):
+    """A call was shed; `retry_after` is the suggested wait in seconds"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Budget:
+    __slots__ = ("name", "rank", "concurrency", "threshold", "max_wait", "max_queue", "running", "queue",
+                 "service_time", "admitted", "queued", "shed", "expired")
+
+    def __init__(self, spec: PriorityClass, rank: int, capacity: int, reserved_above: float):
+        self.name = spec.name
+        self.rank = rank
+        self.concurrency = max(1, round(spec.concurrency * capacity))
+        # Start only while fewer than this many calls run in total
+        self.threshold = max(1, capacity - round(reserved_above * capacity))
+        self.max_wait = spec.max_wait
+        self.max_queue = max(1, round(spec.max_queue * capacity))
+        self.running = 0
+        # (deadline, future), oldest first
+        self.queue: deque = deque()
+        # Exponentially weighted mean run time, seconds
+        self.service_time = 0.0
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+        self.expired = 0
+
+
+class AdmissionController:
+    """Admits tool calls by priority class within a shared concurrency capacity"""
+
+    def __init__(self, capacity: int = 16, classes=DEFAULT_CLASSES, clock=time.monotonic):
+        self.capacity = capacity
+        self._clock = clock
+        self._budgets: dict = {}
+        reserved = 0.0
+        for rank, spec in enumerate(classes):
+            self._budgets[spec.name] = _Budget(spec, rank, capacity, reserved)
+            reserved += spec.reserved
+        self._order = list(self._budgets.values())
+        self.running = 0
+
+    def classes(self) -> list[str]:
+        return [budget.name for budget in self._order]
+
+    async def acquire(self, priority: str, name: str = "") -> tuple:
+        """Wait for a slot; returns a token for release(), or raises OverloadedError"""
+        budget = self._budgets[priority]
+        if self._may_start(budget) and not any(b.queue for b in self._order[:budget.rank + 1]):
+            return self._start(budget)
+
+        ahead = sum(len(b.queue) for b in self._order[:budget.rank + 1])
+        estimate = (ahead + 1) * budget.service_time / budget.concurrency
+        retry_after = round(max(estimate, budget.service_time, 0.1), 1)
+        if len(budget.queue) >= budget.max_queue or estimate > budget.max_wait:
+            budget.shed += 1
+            raise OverloadedError(f"Server busy: {name or priority} ({priority}) was not admitted; "
+                                  f"retry after {retry_after:.1f}s", retry_after)
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (self._clock() + budget.max_wait, future)
+        budget.queue.append(entry)
+        budget.queued += 1
+        try:
+            return await asyncio.wait_for(future, budget.max_wait)
+        except asyncio.TimeoutError:
+            budget.expired += 1
+            raise OverloadedError(f"Server busy: {name or priority} ({priority}) waited {budget.max_wait:g}s "
+                                  f"without a slot; retry after {retry_after:.1f}s", retry_after) from None
+        except BaseException:
+            if future.done() and not future.cancelled():
+                # Granted just as the caller gave up
+                self.release(future.result())
+            raise
+        finally:
+            if not future.done() or future.cancelled():
+                try:
+                    budget.queue.remove(entry)
+                except ValueError:
+                    pass
+
+    def release(self, token: tuple):
+        """Return the slot taken by acquire() and hand it to the next eligible waiter"""
+        budget, started = token
+        budget.running -= 1
+        self.running -= 1
+        elapsed = self._clock() - started
+        budget.service_time = elapsed if budget.service_time == 0.0 else 0.9 * budget.service_time + 0.1 * elapsed
+        self._wake()
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "running": self.running,
+            "classes": {b.name: {"concurrency": b.concurrency, "running": b.running, "waiting": len(b.queue),
+                                 "admitted": b.admitted, "queued": b.queued, "shed": b.shed, "expired": b.expired,
+                                 "mean_ms": round(b.service_time * 1000, 2)}
+                        for b in self._order},
+        }
+
+    def _may_start(self, budget: _Budget) -> bool:
+        return budget.running < budget.concurrency and self.running < budget.threshold
+
+    def _start(self, budget: _Budget) -> tuple:
+        budget.running += 1
+        budget.admitted += 1
+        self.running += 1
+        return budget, self._clock()
+
+    def _wake(self):
+        now = self._clock()
+        for budget in self._order:
+            queue = budget.queue
+            while queue and self._may_start(budget):
+                deadline, future = queue.popleft()
+                if future.done() or deadline <= now:
+                    # Timed out or cancelled; acquire() reports it
+                    continue
+                future.set_result(self._start(budget))
+            if queue and self.running >= budget.threshold:
+                # Lower classes have a lower threshold: nothing more can start
+                return
+
+
+def admission_from_env() -> Optional[AdmissionController]:
+    """Controller sized by CALL_CENTER_MAX_CONCURRENCY, or None when it is 0"""
+    capacity = int(os.environ.get("CALL_CENTER_MAX_CONCURRENCY", "16"))
+    return AdmissionController(capacity) if capacity > 0 else None
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Live agent presence registry behind the `call-center://agents` resource
+
+Each business (user_id) has its own registry, so sessions only read and hear
+about their own agents. Status changes are applied to the registry's state
+(agent ID -> status and since when) at once, so reads are never stale, while
+notifications are coalesced and published once per tick: everything that
+changed during the tick becomes one versioned delta, with an agent that
+flapped several times appearing once in its final state. Each subscriber
+gets the delta by reference and sends it from its own task, so a slow MCP
+session never delays the others; if it falls behind, its queued deltas are
+merged before the next send instead of piling up. Deltas larger than
+`inline_limit` are announced by version only and read from
+`call-center://agents?since=<version>`, rendered once per version for all
+subscribers. Deltas group agents by (status, since), so a batch update costs
+a few bytes per agent on the wire instead of a full record.
+
+A burst of 10k status changes therefore costs each subscriber one
+notification per tick rather than 10k notifications or full-list re-reads.
+
+With CALL_CENTER_STATE_DIR set, statuses are also logged to the warm state
+(see warm_state), and a restarted server seeds the registry from it instead
+of querying call_center_agent_status.
+"""
+
+import asyncio
+import json
+import sys
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
+
+
+AGENTS_URI = "call-center://agents"
+
+# send(version, since, groups) pushes one delta; groups is None when it is too large to inline
+SendDelta = Callable[[int, int, Optional[list]], Awaitable[None]]
+
+
+def _by_agent(changes: list):
+    return ((change["agent_id"], change) for change in changes)
+
+
+def group_changes(changes: list) -> list[dict]:
+    """Wire form of a delta: [{"status", "since", "agent_ids": [...]}, ...]"""
+    groups: dict = {}
+    for change in changes:
+        key = change["status"], change["since"]
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {"status": key[0], "since": key[1], "agent_ids": []}
+        group["agent_ids"].append(change["agent_id"])
+    return list(groups.values())
+
+
+class Subscriber:
+    """One subscription's queue of published deltas and the task that sends them"""
+
+    def __init__(self, send: SendDelta, version: int, inline_limit: int):
+        self.send = send
+        self.version = version
+        self.inline_limit = inline_limit
+        self.sent = 0
+        self._queued: list = []
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def offer(self, version: int, changes: list, groups: list):
+        self._queued.append((version, changes, groups))
+        self._wake.set()
+
+    def start(self, on_error: Callable[["Subscriber"], None]):
+        self._task = asyncio.create_task(self._run(on_error))
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _run(self, on_error):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            queued, self._queued = self._queued, []
+            if not queued:
+                continue
+            if len(queued) == 1:
+                version, changes, groups = queued[0]
+            else:
+                # Fell behind: one merged delta, latest state per agent
+                merged: dict = {}
+                for _, batch, _ in queued:
+                    merged.update(_by_agent(batch))
+                version, changes = queued[-1][0], list(merged.values())
+                groups = group_changes(changes) if len(changes) <= self.inline_limit else None
+            try:
+                await self.send(version, self.version, groups if len(changes) <= self.inline_limit else None)
+            except Exception as e:
+                print(f"Dropping presence subscriber: {e!r}", file=sys.stderr)
+                on_error(self)
+                return
+            self.version = version
+            self.sent += 1
+
+
+class PresenceRegistry:
+    """Agent ID -> current status, published to subscribers as coalesced deltas"""
+
+    def __init__(self, tick: float = 0.1, history: int = 1000, inline_limit: int = 1000, clock=time.time,
+                 journal=None):
+        self.tick = tick
+        # warm_state.StateTable that status changes are logged to, if any
+        self.journal = journal
+        self.inline_limit = inline_limit
+        self._clock = clock
+        self.version = 0
+        self.agents: dict = {}
+        self._pending: dict = {}
+        self._history: deque = deque(maxlen=history)
+        self._rendered: dict = {}
+        self.subscribers: dict = {}
+        self._ticker: Optional[asyncio.Task] = None
+
+    def update(self, agent_id: str, status: str, at: Optional[float] = None) -> dict:
+        """Record a status change; reads see it at once, subscribers at the next tick"""
+        change = {
+            "agent_id": agent_id,
+            "status": status,
+            "since": datetime.fromtimestamp(self._clock() if at is None else at, timezone.utc).isoformat(),
+        }
+        self._pending[agent_id] = change
+        self.agents[agent_id] = change
+        self._rendered.clear()
+        if self.journal is not None:
+            self.journal.put(agent_id, change)
+        return change
+
+    def publish(self) -> int:
+        """Turn pending changes into the next version and fan it out; returns the number of changes"""
+        if not self._pending:
+            return 0
+        changes = list(self._pending.values())
+        self._pending = {}
+        self.version += 1
+        self._history.append((self.version, changes))
+        self._rendered.clear()
+        groups = group_changes(changes) if len(changes) <= self.inline_limit else None
+        for subscriber in self.subscribers.values():
+            subscriber.offer(self.version, changes, groups)
+        return len(changes)
+
+    async def run(self):
+        """Publish once per tick until cancelled"""
+        while True:
+            await asyncio.sleep(self.tick)
+            self.publish()
+
+    def start(self):
+        if self._ticker is None:
+            self._ticker = asyncio.create_task(self.run())
+
+    def subscribe(self, key, send: SendDelta) -> Subscriber:
+        """Push every later delta to `send`; re-subscribing with the same key replaces the old one"""
+        self.unsubscribe(key)
+        subscriber = Subscriber(send, self.version, self.inline_limit)
+        self.subscribers[key] = subscriber
+
+        def drop(failed: Subscriber):
+            if self.subscribers.get(key) is failed:
+                del self.subscribers[key]
+
+        subscriber.start(drop)
+        return subscriber
+
+    def unsubscribe(self, key):
+        subscriber = self.subscribers.pop(key, None)
+        if subscriber is not None:
+            subscriber.stop()
+
+    def snapshot(self) -> dict:
+        return {"version": self.version, "agents": sorted(self.agents.values(), key=lambda a: a["agent_id"])}
+
+    def changes_since(self, version: int) -> Optional[dict]:
+        """Agents changed after `version` in their latest state, grouped by status and time
+
+        Changes not yet published are included (and returned again after `version`
+        until they are). Returns None when `version` is older than the retained history.
+        """
+        merged: dict = {}
+        if version < self.version:
+            if not self._history or self._history[0][0] > version + 1:
+                return None
+            for published, changes in self._history:
+                if published > version:
+                    merged.update(_by_agent(changes))
+        merged.update(self._pending)
+        return {"version": self.version, "since": version, "changes": group_changes(list(merged.values()))}
+
+    def render(self, since: Optional[int] = None) -> str:
+        """JSON for the resource: the full list, or the delta after `since` (cached per version)"""
+        text = self._rendered.get(since)
+        if text is None:
+            body = None if since is None else self.changes_since(since)
+            if body is None:
+                body = self.snapshot()
+                if since is not None:
+                    body["reset"] = True
+            text = self._rendered[since] = json.dumps(body, separators=(",", ":"))
+        return text
+
+    async def load(self, store, user_id: Optional[str] = None):
+        """Seed a business's statuses from call_center_agent_status without notifying anyone
+
+        Rows without a business belong to `user_id` None, as in the table's unique key.
+        """
+        rows = await store.query(
+            "SELECT agent_id, status, updated_at FROM call_center_agent_status "
+            "WHERE COALESCE(CAST(user_id AS TEXT), '') = ?", (user_id or "",))
+        for row in rows:
+            since = row["updated_at"]
+            self.agents[row["agent_id"]] = {"agent_id": row["agent_id"], "status": row["status"], "since": since}
+        self._rendered.clear()
+
+    def restore(self, table):
+        """Seed current statuses from a warm state table without notifying anyone"""
+        self.agents.update(table.items())
+        self._rendered.clear()
+
+
+_registries: dict = {}
+
+
+async def get_presence_registry(user_id: Optional[str] = None) -> PresenceRegistry:
+    """Return the process-wide registry for business `user_id`, seeded from the store and ticking"""
+    registry = _registries.get(user_id)
+    if registry is None:
+        from warm_state import get_warm_state
+
+        registry = PresenceRegistry()
+        state = get_warm_state()
+        name = f"agent_status/{user_id or '*'}"
+        journal = state.filled(name) if state is not None else None
+        if journal is not None:
+            registry.restore(journal)
+        else:
+            try:
+                from call_log_store import get_call_log_store
+
+                await registry.load(await get_call_log_store(), user_id)
+            except Exception as e:
+                print(f"Agent presence for {user_id or 'unscoped calls'} starts empty: {e!r}", file=sys.stderr)
+            else:
+                if state is not None:
+                    journal = state.fill(name, registry.agents.items())
+        registry.journal = journal
+        registry = _registries.setdefault(user_id, registry)
+        registry.start()
+    return registry
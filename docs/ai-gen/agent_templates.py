@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Retell agent templates from `src/agent-template`, rendered per business
+
+Python port of RetellTemplateService's prompt and config builders
+(src/lib/services/retell-template-service.ts): a template file holds an agent
+config plus its `retellLlmData`, and a deployment fills in the business's
+prompt, begin message, webhook URLs and post-call analysis examples.
+
+Rendering is memoized on (template, business_type, metadata hash), where the
+template part includes a hash of the file's contents, so redeploying many
+tenants only re-renders the ones whose metadata or template changed. Each
+rendered config also carries a content hash that the deployment queue compares
+with what it last sent to Retell.
+"""
+
+import hashlib
+import json
+import os
+from typing import Optional
+
+from customer_history import TTLCache
+
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "src", "agent-template")
+DEFAULT_TEMPLATE = "dental-inbound-receptionist-v01"
+
+# Fields Retell assigns; never sent on create or update
+LLM_READ_ONLY = ("llm_id", "last_modification_timestamp", "version", "is_published")
+AGENT_READ_ONLY = ("agent_id", "retellLlmData", "conversationFlow", "llmURL", "last_modification_timestamp", "version")
+
+
+def content_hash(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, separators=(",", ":")).encode()).hexdigest()[:16]
+
+
+def site_url() -> str:
+    return os.environ.get("NEXT_PUBLIC_SITE_URL") or os.environ.get("NEXT_PUBLIC_BASE_URL") or "http://localhost:19080"
+
+
+def _kind(business_type: str) -> str:
+    if business_type == "dental":
+        return ", a dental practice"
+    return f", a {business_type} business" if business_type else ""
+
+
+def render_prompt(metadata: dict, business_type: str) -> str:
+    """The agent's general prompt, as generateComprehensivePrompt builds it"""
+    name = metadata.get("business_name") or "Business"
+    dental = business_type == "dental"
+    scripts = metadata.get("call_scripts") or {}
+    parts = [
+        f"You are a professional AI receptionist for {name}{_kind(business_type)}"
+        ". AI receptionist connected to my application and my integrated calendar.\n\n"
+        "Your main role is to handle customer appointment scheduling by creating, updating, and canceling "
+        "bookings directly in my calendar.\n\n"
+        "CAPABILITIES & RULES:\n\n"
+        "Calendar Integration:\n"
+        "- Access my configured calendar from the application\n"
+        "- Always check availability before confirming a booking\n"
+        "- Create, reschedule, or cancel appointments based on customer requests\n\n"
+        "Customer Interaction:\n"
+        "- Always greet the customer politely and ask for their first name, last name, phone number, "
+        "and email address\n"
+        "- If they want to create an appointment, ask for:\n"
+        "  • Date and time preference\n"
+        "  • Service type (e.g., consultation, cleaning, follow-up, etc.)\n"
+        "  • Staff preference (if any)\n"
+        "- If they want to update an existing appointment, confirm their current booking details before "
+        "making changes\n"
+        "- If they want to cancel an appointment, confirm their booking ID or details and then proceed\n\n"
+    ]
+    if metadata.get("basic_info_prompt"):
+        parts.append(metadata["basic_info_prompt"] + "\n\n")
+
+    services = metadata.get("services") or []
+    if services:
+        parts.append("SERVICES WE OFFER:\n")
+        for service in services:
+            line = f"- {service.get('service_name')}"
+            if service.get("service_description"):
+                line += f": {service['service_description']}"
+            if (service.get("price") or 0) > 0:
+                line += f" (Starting at ${service['price']})"
+            parts.append(line + "\n")
+        parts.append("\n")
+
+    staff = metadata.get("staff") or []
+    if staff:
+        parts.append("OUR TEAM:\n")
+        for member in staff:
+            line = f"- {member.get('first_name')} {member.get('last_name')}"
+            if member.get("job_title"):
+                line += f" ({member['job_title']})"
+            if member.get("specialization"):
+                line += f" - Specializes in: {member['specialization']}"
+            parts.append(line + "\n")
+        parts.append("\n")
+
+    locations = metadata.get("locations") or []
+    if locations:
+        parts.append("OUR LOCATION:\n" if len(locations) == 1 else "OUR LOCATIONS:\n")
+        for location in locations:
+            line = f"- {location.get('location_name') or 'Main Office'}"
+            if location.get("address"):
+                line += f": {location['address']}"
+            if location.get("phone_number"):
+                line += f" (Phone: {location['phone_number']})"
+            parts.append(line + "\n")
+        parts.append("\n")
+
+    insurance = metadata.get("insurance_providers") or []
+    if dental and insurance:
+        parts.append("INSURANCE ACCEPTED:\n")
+        for provider in insurance:
+            line = f"- {provider.get('provider_name')}"
+            if provider.get("plan_type"):
+                line += f" ({provider['plan_type']})"
+            parts.append(line + "\n")
+        parts.append("\n")
+
+    if metadata.get("custom_instructions"):
+        parts.append("SPECIAL INSTRUCTIONS:\n" + metadata["custom_instructions"] + "\n\n")
+
+    parts.append(
+        f"## Identify\nYou are a friendly AI assistant for {name}{_kind(business_type)}"
+        ". Your primary role is to handle incoming calls with warmth, efficiency, and professionalism.\n\n"
+        "## Style Guardrails\n"
+        "Be concise: Keep responses brief and to the point while being helpful\n"
+        "Be conversational: Use natural, friendly language that puts callers at ease\n"
+        "Be professional: Maintain a courteous and competent demeanor at all times\n"
+        "Be empathetic: Show understanding for customer needs and concerns\n"
+        + ("Be sensitive: Show extra care when patients mention pain or discomfort\n" if dental else "")
+        + "\n## Response Guideline\n"
+        'Return dates in their spoken forms: "Monday, January 15th" instead of "2024-01-15"\n'
+        "Ask up to one question at a time: Focus on gathering one piece of information per interaction\n"
+        "Confirm important details: Always repeat back appointment times, dates, and contact information\n"
+        "Offer alternatives: If the requested time is unavailable, suggest nearby options\n"
+        "Stay in character: Always respond as the business's receptionist, never break character\n"
+        "Handle transfers gracefully: If you need to transfer, explain why and set expectations\n\n"
+    )
+
+    main_script = scripts.get("main_script") or ""
+    if "## Task" not in main_script and "## Task" not in (metadata.get("call_scripts_prompt") or ""):
+        greeting = scripts.get("greeting_script") or \
+            f"Hello! Thank you for calling {name}. How may I assist you today?"
+        parts.append(
+            "## Task\n"
+            f"1. **Greet the caller warmly**\n   - Use: \"{greeting}\"\n"
+            "   - Ask for their name and how you can help\n\n"
+            "2. **Identify the caller and their needs**\n"
+            "   - Collect caller's first name, last name, phone number, and email address\n"
+            "   - Determine the purpose of their call (appointment, inquiry, etc.)\n"
+            + ("   - For new patients, ask about insurance information\n" if dental else "")
+            + "\n3. **Handle appointment requests**\n"
+            "   - Ask for preferred date and time\n"
+            "   - Confirm service type needed\n"
+            "   - Check staff preferences if applicable\n"
+            "   - Verify availability and book the appointment\n\n"
+            "4. **Provide information and assistance**\n"
+            "   - Answer questions about services, hours, and location\n"
+            "   - Provide pricing information if available\n"
+            "   - Explain policies and procedures as needed\n\n"
+            "5. **Handle escalations when needed**\n"
+            + (f"   - Use: \"{scripts['escalation_script']}\"\n" if scripts.get("escalation_script")
+               else "   - If you cannot answer a question, offer to find someone who can\n")
+            + "   - Transfer to appropriate staff member when necessary\n\n"
+            "6. **Close the call professionally**\n"
+            + (f"   - Use: \"{scripts['closing_script']}\"\n   - Confirm all details and next steps\n"
+               "   - Thank the caller for choosing the business\n\n" if scripts.get("closing_script")
+               else "   - Summarize what was accomplished\n   - Confirm all details and next steps\n"
+               f"   - Thank the caller for choosing {name}\n\n")
+        )
+    if main_script and "## Task" not in main_script:
+        parts.append("## Additional Instructions\n" + main_script + "\n\n")
+    if metadata.get("call_scripts_prompt"):
+        parts.append("## Call Handling Guidelines\n" + metadata["call_scripts_prompt"] + "\n\n")
+
+    parts.append(
+        "INBOUND CALL GUIDELINES:\n"
+        "- You are receiving calls from customers/patients contacting the business\n"
+        "- Greet callers warmly and professionally\n"
+        "- Listen carefully to understand their needs\n"
+        "- Provide helpful information and assistance\n"
+        "- Schedule appointments if requested\n"
+        "- Never make outbound calls - you only receive them\n\n"
+    )
+    if dental:
+        parts.append(
+            "DENTAL PRACTICE GUIDELINES:\n"
+            "- Always ask for patient insurance information\n"
+            "- For dental emergencies, prioritize immediate scheduling\n"
+            "- Collect patient date of birth for verification\n"
+            "- Ask about the reason for visit to schedule appropriate appointment time\n"
+            "- Confirm if they are an existing or new patient\n"
+            "- Be empathetic with patients experiencing pain\n\n"
+        )
+    return "".join(parts)
+
+
+def build_llm_config(template: dict, metadata: dict, business_type: str, base_url: str) -> dict:
+    """Body for create-retell-llm / update-retell-llm"""
+    config = {k: v for k, v in template["retellLlmData"].items() if k not in LLM_READ_ONLY}
+    config["general_prompt"] = render_prompt(metadata, business_type)
+    config["begin_message"] = (
+        f"Hello! Thank you for calling {metadata.get('business_name') or 'Business'}. How can I help you today?"
+    )
+    config["general_tools"] = [
+        {**tool, "url": f"{base_url}/api/retell/functions"} if tool.get("type") == "custom" and tool.get("url")
+        else tool
+        for tool in config.get("general_tools") or []
+    ]
+    config["inbound_dynamic_variables_webhook_url"] = f"{base_url}/api/retell/webhook"
+    return config
+
+
+def build_agent_config(template: dict, metadata: dict, agent_name: str, base_url: str) -> dict:
+    """Body for create-agent / update-agent, without the response engine's llm_id"""
+    config = {k: v for k, v in template.items() if k not in AGENT_READ_ONLY}
+    config["agent_name"] = agent_name or f"{metadata.get('business_name') or 'Business'} AI Receptionist"
+    config["webhook_url"] = f"{base_url}/api/retell/webhook"
+    services = [s.get("service_name") for s in metadata.get("services") or []][:5]
+    staff = [f"{s.get('first_name')} {s.get('last_name')}" for s in metadata.get("staff") or []][:3]
+    fields = []
+    for field in config.get("post_call_analysis_data") or []:
+        if field.get("name") == "service_type" and services:
+            field = {**field, "examples": services}
+        elif field.get("name") == "preferred_staff" and staff:
+            field = {**field, "examples": staff}
+        fields.append(field)
+    config["post_call_analysis_data"] = fields
+    return config
+
+
+class PromptCache:
+    """Memoized template rendering keyed by (template, business_type, metadata hash)"""
+
+    def __init__(self, template_dir: str = TEMPLATE_DIR, maxsize: int = 4096):
+        self.template_dir = template_dir
+        self.renders = 0
+        self._templates: dict = {}
+        self._rendered = TTLCache(maxsize, float("inf"))
+
+    def template_name(self, business_type: str, requested: Optional[str] = None) -> str:
+        """`requested`, else `<business_type>-inbound-receptionist-v01` if it exists, else the default"""
+        if requested:
+            return requested
+        candidate = f"{business_type}-inbound-receptionist-v01"
+        if os.path.exists(os.path.join(self.template_dir, candidate + ".json")):
+            return candidate
+        return DEFAULT_TEMPLATE
+
+    def template(self, name: str) -> tuple[dict, str]:
+        """Parsed template and its content hash, reloaded when the file changes"""
+        if os.path.basename(name) != name:
+            raise ValueError(f"Invalid template name: {name}")
+        path = os.path.join(self.template_dir, name + ".json")
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            raise ValueError(f"Template file not found: {name}.json") from None
+        cached = self._templates.get(name)
+        if cached is None or cached[0] != mtime:
+            with open(path, "rb") as f:
+                raw = f.read()
+            cached = self._templates[name] = (mtime, json.loads(raw), hashlib.sha256(raw).hexdigest()[:16])
+        return cached[1], cached[2]
+
+    def render(self, template_name: str, business_type: str, agent_name: str, metadata: dict) -> dict:
+        """Rendered {"llm", "agent", "llm_hash", "agent_hash"} for one deployment
+
+        The returned configs are shared between callers and must not be mutated.
+        """
+        template, template_hash = self.template(template_name)
+        base_url = site_url()
+        key = (template_name, template_hash, business_type,
+               content_hash({"agent_name": agent_name, "metadata": metadata, "site_url": base_url}))
+        rendered = self._rendered.get(key)
+        if rendered is None:
+            self.renders += 1
+            llm = build_llm_config(template, metadata, business_type, base_url)
+            agent = build_agent_config(template, metadata, agent_name, base_url)
+            rendered = {"llm": llm, "agent": agent, "llm_hash": content_hash(llm), "agent_hash": content_hash(agent)}
+            self._rendered.set(key, rendered)
+        return rendered
+
+    @property
+    def hits(self) -> int:
+        return self._rendered.hits
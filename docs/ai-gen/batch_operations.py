@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Batch write and lookup operations behind the Call Center MCP tools
+
+The single-entity tools (create_ticket, update_agent_status,
+get_customer_history) are batches of one. Each batch is written in a single
+transaction (execute_many, one statement per item), and results come back
+item by item in request order, so catching up after an outage takes one
+JSON-RPC round trip instead of one per entity.
+
+Tickets and agent statuses also pass through the business's assignment
+engine (ticket_queue.py): new tickets go to a free agent with the right
+skill, and an agent becoming available picks up queued tickets.
+"""
+
+import asyncio
+from datetime import datetime, timezone
+from typing import Optional
+
+from ticket_queue import get_ticket_service
+
+
+MAX_BATCH = 1000
+
+TICKET_PROPERTIES = {
+    "title": {
+        "type": "string",
+        "description": "Ticket title"
+    },
+    "description": {
+        "type": "string",
+        "description": "Ticket description"
+    },
+    "priority": {
+        "type": "string",
+        "enum": ["low", "medium", "high", "urgent"],
+        "description": "Ticket priority"
+    },
+    "skill": {
+        "type": "string",
+        "description": "Skill an agent needs for this ticket, e.g. billing (default: any agent)"
+    }
+}
+
+AGENT_STATUS_PROPERTIES = {
+    "agent_id": {
+        "type": "string",
+        "description": "Agent ID"
+    },
+    "status": {
+        "type": "string",
+        "enum": ["available", "busy", "break", "offline"],
+        "description": "New agent status"
+    },
+    "skills": {
+        "type": "array",
+        "items": {"type": "string"},
+        "description": "Replace the agent's skills (ticket routing)"
+    },
+    "max_tickets": {
+        "type": "integer",
+        "minimum": 0,
+        "description": "Open tickets the agent can hold at once (default: 5)"
+    }
+}
+
+
+def batch_schema(key: str, properties: dict, required: list, description: str) -> dict:
+    """inputSchema for a batch tool taking a list of single-tool argument objects"""
+    return {
+        "type": "object",
+        "properties": {
+            key: {
+                "type": "array",
+                "description": description,
+                "items": {"type": "object", "properties": properties, "required": required},
+                "minItems": 1,
+                "maxItems": MAX_BATCH
+            }
+        },
+        "required": [key]
+    }
+
+
+async def create_tickets(store, items: list[dict], user_id: Optional[str] = None) -> list[dict]:
+    """Insert tickets in one transaction, assigned or queued; returns the stored tickets in order"""
+    return await get_ticket_service(store).create(items, user_id)
+
+
+async def update_agent_statuses(store, items: list[dict], user_id: Optional[str] = None) -> list[dict]:
+    """Upsert agent statuses in one transaction; later items win for repeated agents
+
+    Each result lists the queued tickets that status change assigned.
+    """
+    now = datetime.now(timezone.utc)
+    await store.execute_many(
+        "INSERT INTO call_center_agent_status (agent_id, user_id, status, skills, max_tickets, updated_at) "
+        "VALUES (?, ?, ?, ?, COALESCE(?, 5), ?) "
+        # Agent ids are per business; a missing business counts as one
+        "ON CONFLICT ((COALESCE(CAST(user_id AS TEXT), '')), agent_id) "
+        "DO UPDATE SET status = excluded.status, updated_at = excluded.updated_at, "
+        "skills = COALESCE(?, call_center_agent_status.skills), "
+        "max_tickets = COALESCE(?, call_center_agent_status.max_tickets)",
+        [
+            (item["agent_id"], user_id, item["status"], _skills(item), item.get("max_tickets"), now,
+             _skills(item), item.get("max_tickets"))
+            for item in items
+        ],
+    )
+    assignments = await get_ticket_service(store).update_agents(items, user_id)
+    return [
+        {"success": True, "agent_id": item["agent_id"], "new_status": item["status"], "timestamp": now.isoformat(),
+         "assigned_tickets": [ticket_id for ticket_id, _ in made]}
+        for item, made in zip(items, assignments)
+    ]
+
+
+def _skills(item: dict) -> Optional[str]:
+    return ",".join(item["skills"]) if item.get("skills") is not None else None
+
+
+async def get_customer_histories(service, user_id: str, customer_ids: list[str]) -> list[dict]:
+    """Look up many callers at once; unknown customers get an error entry in place"""
+
+    async def one(customer_id):
+        try:
+            return await service.lookup(user_id, customer_id)
+        except ValueError as e:
+            return {"customer_id": customer_id, "error": str(e)}
+
+    # Repeated numbers share one lookup
+    unique = list(dict.fromkeys(customer_ids))
+    results = dict(zip(unique, await asyncio.gather(*(one(c) for c in unique))))
+    return [results[c] for c in customer_ids]
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark live-call latency while bulk exports ramp to saturation
+
+Registers two tools on a ToolRegistry sharing a pool of --pool database
+connections and one event loop, like the servers do:
+
+    lookup    live_call: one query and a little encoding
+    export    bulk: --chunks queries, each followed by ~1 ms of encoding
+
+--live callers look customers up in a closed loop (with --think seconds
+between calls) while the number of concurrent export clients steps through
+--levels. Export clients that are shed wait the suggested retry_after and
+try again. Each level runs once without admission control and once with an
+AdmissionController of --capacity slots, and reports live p50/p99 against
+--target-ms, completed exports per second and the share of export calls
+that were shed.
+
+Usage:
+    python bench_admission.py
+    python bench_admission.py --levels 0,8,32,128,512 --seconds 5
+"""
+
+import argparse
+import asyncio
+import time
+
+from admission import BULK, LIVE_CALL, AdmissionController, OverloadedError
+from tool_registry import ToolRegistry
+
+
+def _percentile(samples: list, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)] * 1000 if ordered else 0.0
+
+
+def _encode(seconds: float):
+    # Stands in for row encoding: holds the event loop
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def build_registry(admission, pool: asyncio.Semaphore, query_time: float, chunks: int) -> ToolRegistry:
+    tools = ToolRegistry(admission=admission)
+
+    async def query():
+        async with pool:
+            await asyncio.sleep(query_time)
+
+    @tools.tool("lookup", "Customer history", priority=LIVE_CALL)
+    async def lookup(arguments):
+        await query()
+        _encode(0.0002)
+        return "history"
+
+    @tools.tool("export", "Call log export", priority=BULK)
+    async def export(arguments):
+        for _ in range(chunks):
+            await query()
+            _encode(0.001)
+        return "rows"
+
+    return tools
+
+
+async def run_level(tools: ToolRegistry, bulk_clients: int, live_clients: int, seconds: float, think: float):
+    stop = time.perf_counter() + seconds
+    live_ms, counts = [], {"live_shed": 0, "exports": 0, "shed": 0}
+
+    async def live():
+        while time.perf_counter() < stop:
+            started = time.perf_counter()
+            try:
+                await tools.dispatch("lookup", {})
+                live_ms.append(time.perf_counter() - started)
+            except OverloadedError:
+                counts["live_shed"] += 1
+            await asyncio.sleep(think)
+
+    async def bulk():
+        while time.perf_counter() < stop:
+            try:
+                await tools.dispatch("export", {})
+                counts["exports"] += 1
+            except OverloadedError as e:
+                counts["shed"] += 1
+                await asyncio.sleep(e.retry_after)
+
+    await asyncio.gather(*(live() for _ in range(live_clients)), *(bulk() for _ in range(bulk_clients)))
+    return live_ms, counts
+
+
+async def run(args):
+    levels = [int(level) for level in args.levels.split(",")]
+    print(f"{args.live} live callers, {args.pool} connections, capacity {args.capacity}, "
+          f"{args.seconds:g}s per level, target p99 {args.target_ms:g} ms")
+    print(f"{'exports':>8}  {'admission':<10}{'live p50':>10}{'live p99':>10}{'':>6}"
+          f"{'live shed':>10}{'exports/s':>11}{'shed %':>8}")
+    for level in levels:
+        for label, admission in (("off", None), ("on", AdmissionController(args.capacity))):
+            tools = build_registry(admission, asyncio.Semaphore(args.pool), args.query_ms / 1000, args.chunks)
+            live_ms, counts = await run_level(tools, level, args.live, args.seconds, args.think)
+            p99 = _percentile(live_ms, 0.99)
+            attempts = counts["exports"] + counts["shed"]
+            print(f"{level:>8}  {label:<10}{_percentile(live_ms, 0.5):>10.1f}{p99:>10.1f}"
+                  f"{'ok' if p99 <= args.target_ms else 'MISS':>6}{counts['live_shed']:>10}"
+                  f"{counts['exports'] / args.seconds:>11.1f}"
+                  f"{100 * counts['shed'] / attempts if attempts else 0:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark priority admission control under bulk load")
+    parser.add_argument("--levels", default="0,4,16,64,256", help="Concurrent export clients per step")
+    parser.add_argument("--live", type=int, default=8, help="Concurrent live-call clients")
+    parser.add_argument("--think", type=float, default=0.02, help="Seconds between a live client's calls")
+    parser.add_argument("--seconds", type=float, default=3.0, help="Duration of each step")
+    parser.add_argument("--capacity", type=int, default=16, help="Admission capacity (CALL_CENTER_MAX_CONCURRENCY)")
+    parser.add_argument("--pool", type=int, default=16, help="Database connections")
+    parser.add_argument("--query-ms", type=float, default=2.0, help="Database time per query")
+    parser.add_argument("--chunks", type=int, default=20, help="Queries per export")
+    parser.add_argument("--target-ms", type=float, default=50.0, help="Live-call p99 target")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
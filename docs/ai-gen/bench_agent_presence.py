@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Benchmark agent presence fan-out to resource subscribers
+
+In-process mode drives a PresenceRegistry directly; socket mode starts
+example_mcp_server.py with `--listen`, subscribes every session to
+call-center://agents and changes statuses through update_agent_statuses.
+Both report how long subscribers take to see a single change and a burst of
+changes, and how many notifications each subscriber received for the burst.
+
+Usage:
+    python bench_agent_presence.py
+    python bench_agent_presence.py --mode socket --subscribers 1000 --burst 10000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from agent_presence import AGENTS_URI, PresenceRegistry
+from batch_operations import MAX_BATCH
+from bench_mcp_socket import Client, free_port, wait_for_port
+from generate_call_log_fixtures import write_sqlite
+
+
+def _percentile(samples_ns: list, q: float) -> float:
+    ordered = sorted(samples_ns)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)] / 1_000_000
+
+
+def _report(label: str, samples_ns: list, notifications: list):
+    print(f"{label:<18}p50 {_percentile(samples_ns, 0.5):7.2f} ms  p99 {_percentile(samples_ns, 0.99):7.2f} ms  "
+          f"max {max(samples_ns) / 1e6:7.2f} ms  notifications/subscriber {sum(notifications) / len(notifications):.1f}")
+
+
+async def run_inprocess(subscribers: int, burst: int, singles: int, tick: float):
+    registry = PresenceRegistry(tick=tick)
+    registry.start()
+    received = [0] * subscribers
+    deltas: dict = {}
+    arrivals = [0] * subscribers
+    counts = [0] * subscribers
+    done = asyncio.Event()
+    target = [0]
+    remaining = [subscribers]
+
+    def make_send(i):
+        async def send(version, since, changes):
+            if changes is None:
+                # What a client reads from ?since=, rendered once per version
+                if (since, version) not in deltas:
+                    deltas[since, version] = registry.changes_since(since)["changes"]
+                changes = deltas[since, version]
+            counts[i] += 1
+            received[i] += sum(len(group["agent_ids"]) for group in changes)
+            if received[i] >= target[0] and not arrivals[i]:
+                arrivals[i] = time.perf_counter_ns()
+                remaining[0] -= 1
+                if not remaining[0]:
+                    done.set()
+        return send
+
+    for i in range(subscribers):
+        registry.subscribe(i, make_send(i))
+
+    async def wave(agent_ids: list) -> list:
+        received[:] = [0] * subscribers
+        arrivals[:] = [0] * subscribers
+        counts[:] = [0] * subscribers
+        target[0], remaining[0] = len(agent_ids), subscribers
+        done.clear()
+        started = time.perf_counter_ns()
+        # One timestamp per wave, as update_agent_statuses records a batch
+        at = time.time()
+        for agent_id in agent_ids:
+            registry.update(agent_id, "busy", at)
+        await done.wait()
+        return [arrival - started for arrival in arrivals]
+
+    single = []
+    for n in range(singles):
+        single += await wave([f"agent-{n}"])
+    _report("single change", single, [1] * subscribers)
+    latencies = await wave([f"agent-{n}" for n in range(burst)])
+    _report(f"burst of {burst}", latencies, counts)
+
+
+async def run_socket(subscribers: int, burst: int, singles: int, host: str, port: int):
+    clients = []
+    for _ in range(subscribers):
+        client = await Client.connect(host, port)
+        await client.initialize()
+        await client.request("resources/subscribe", {"uri": AGENTS_URI})
+        clients.append(client)
+    control = await Client.connect(host, port)
+    await control.initialize()
+
+    async def listen(client: Client, expected: set, started: int) -> tuple:
+        notifications = 0
+        reads: dict = {}
+        while expected:
+            message = json.loads(await client.reader.readline())
+            if message.get("id") in reads:
+                for group in json.loads(message["result"]["contents"][0]["text"])["changes"]:
+                    expected.difference_update(group["agent_ids"])
+                continue
+            if message.get("method") != "notifications/resources/updated":
+                continue
+            notifications += 1
+            params = message["params"]
+            if "changes" in params:
+                for group in params["changes"]:
+                    expected.difference_update(group["agent_ids"])
+            else:
+                # Too large to inline: read the delta without blocking on the response
+                client.next_id += 1
+                reads[client.next_id] = params["version"]
+                client.writer.write(json.dumps({
+                    "jsonrpc": "2.0", "id": client.next_id, "method": "resources/read",
+                    "params": {"uri": f"{AGENTS_URI}?since={params['since']}"},
+                }).encode() + b"\n")
+        return time.perf_counter_ns() - started, notifications
+
+    async def wave(agent_ids: list) -> tuple:
+        started = time.perf_counter_ns()
+        listeners = [asyncio.create_task(listen(c, set(agent_ids), started)) for c in clients]
+        for i in range(0, len(agent_ids), MAX_BATCH):
+            await control.request("tools/call", {"name": "update_agent_statuses", "arguments": {"updates": [
+                {"agent_id": agent_id, "status": "busy"} for agent_id in agent_ids[i:i + MAX_BATCH]
+            ]}})
+        results = await asyncio.gather(*listeners)
+        return [latency for latency, _ in results], [n for _, n in results]
+
+    single = []
+    for n in range(singles):
+        single += (await wave([f"agent-{n}"]))[0]
+    _report("single change", single, [1] * subscribers)
+    latencies, counts = await wave([f"agent-{n}" for n in range(burst)])
+    _report(f"burst of {burst}", latencies, counts)
+    for client in clients + [control]:
+        await client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark agent presence fan-out")
+    parser.add_argument("--mode", choices=["inprocess", "socket"], default="inprocess")
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--burst", type=int, default=10_000, help="Agents changing status at once")
+    parser.add_argument("--singles", type=int, default=5, help="Single-change waves")
+    parser.add_argument("--tick", type=float, default=0.1, help="Publish interval (in-process mode)")
+    args = parser.parse_args()
+
+    if args.mode == "inprocess":
+        asyncio.run(run_inprocess(args.subscribers, args.burst, args.singles, args.tick))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "presence.db")
+        write_sqlite(db, 100, 42, transcripts=False)
+        host, port = "127.0.0.1", free_port()
+        server_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "example_mcp_server.py")
+        process = subprocess.Popen(
+            [sys.executable, server_path, "--listen", f"{host}:{port}",
+             "--max-sessions", str(args.subscribers + 16)],
+            env={**os.environ, "CALL_CENTER_DB_URL": f"sqlite:///{db}"},
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_for_port(host, port)
+            asyncio.run(run_socket(args.subscribers, args.burst, args.singles, host, port))
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark batch tools against one tools/call per entity
+
+Starts the servers over the socket transport against a temporary fixture
+database and writes the same N entities either one call at a time or in
+batches, reporting entities/sec for each.
+
+Usage:
+    python bench_batch_tools.py
+    python bench_batch_tools.py --items 5000 --batch-size 500
+"""
+
+import argparse
+import asyncio
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional
+
+from bench_mcp_socket import Client, free_port, wait_for_port
+from generate_call_log_fixtures import generate_rows, write_sqlite
+
+
+CASES = [
+    # server, single tool, batch tool, batch key, item factory
+    ("working_mcp_server.py", "create_ticket", "create_tickets", "tickets",
+     lambda i, phones: {"title": f"Outage follow-up {i}", "description": "Caller dropped during outage", "priority": "high"}),
+    ("example_mcp_server.py", "update_agent_status", "update_agent_statuses", "updates",
+     lambda i, phones: {"agent_id": f"agent_{i % 200}", "status": ("available", "busy", "break")[i % 3]}),
+    ("example_mcp_server.py", "get_customer_history", "get_customer_histories", "customer_ids",
+     lambda i, phones: phones[i % len(phones)]),
+]
+
+
+async def run_phase(port: int, tool: str, key: Optional[str], entities: list, batch_size: int) -> float:
+    """Entities/sec writing `entities` one per call (key=None) or in batches under `key`"""
+    client = await Client.connect("127.0.0.1", port)
+    await client.initialize()
+    started = time.perf_counter()
+    if key is None:
+        for entity in entities:
+            arguments = entity if isinstance(entity, dict) else {"customer_id": entity}
+            await client.request("tools/call", {"name": tool, "arguments": arguments})
+    else:
+        for i in range(0, len(entities), batch_size):
+            await client.request("tools/call", {"name": tool, "arguments": {key: entities[i:i + batch_size]}})
+    rate = len(entities) / (time.perf_counter() - started)
+    await client.close()
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batch vs. single-entity tool calls")
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "batch.db")
+        write_sqlite(db, 50_000, 42, transcripts=False, staff=10)
+        env = dict(os.environ, CALL_CENTER_DB_URL=f"sqlite:///{db}",
+                   CALL_CENTER_USER_ID=next(generate_rows(1))[0][3])
+        here = os.path.dirname(os.path.abspath(__file__))
+        with sqlite3.connect(db) as conn:
+            phones = [row[0] for row in conn.execute(
+                "SELECT DISTINCT from_number FROM customer_call_logs WHERE user_id = ?",
+                (env["CALL_CENTER_USER_ID"],))]
+
+        print(f"{'tool':<24}{'single/s':>12}{'batch/s':>12}{'speedup':>10}")
+        for server, single, batch, key, make in CASES:
+            entities = [make(i, phones) for i in range(args.items)]
+            rates = []
+            # A fresh server per phase, so neither phase starts with the other's warm caches
+            for tool, batch_key in ((single, None), (batch, key)):
+                port = free_port()
+                process = subprocess.Popen(
+                    [sys.executable, os.path.join(here, server), "--listen", f"127.0.0.1:{port}"],
+                    env=env, stderr=subprocess.DEVNULL,
+                )
+                try:
+                    wait_for_port("127.0.0.1", port)
+                    rates.append(asyncio.run(run_phase(port, tool, batch_key, entities, args.batch_size)))
+                finally:
+                    process.terminate()
+                    process.wait()
+            print(f"{batch:<24}{rates[0]:>12.0f}{rates[1]:>12.0f}{rates[1] / rates[0]:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
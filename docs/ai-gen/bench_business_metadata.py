@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark business metadata reads: rebuilt every time vs. section cache vs. conditional
+
+Builds SQLite fixtures with --staff staff members, then reads the
+`call-center://business/{id}` document --reads times each way:
+
+    rebuild       every section queried and assembled (no cache)
+    cached        sections served from the cache, counters polled every read
+    etag          ?if_none_match=<etag> from a reader that already has it
+    known         ?known=... after one section (hours) changed
+
+Reports p50/p99 latency and the bytes each read puts on the wire.
+
+Usage:
+    python bench_business_metadata.py
+    python bench_business_metadata.py --staff 200 --reads 2000
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from business_metadata import BusinessMetadataService
+from call_log_store import SQLiteCallLogStore
+from generate_call_log_fixtures import generate_rows, write_sqlite
+from serializers import get_serializer
+
+
+def _percentile(samples: list, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)] * 1000
+
+
+async def measure(label: str, read, reads: int):
+    samples, size = [], 0
+    for _ in range(reads):
+        started = time.perf_counter()
+        size = len(get_serializer().dumps(await read()).encode())
+        samples.append(time.perf_counter() - started)
+    print(f"{label:<10}{_percentile(samples, 0.5):>10.3f}{_percentile(samples, 0.99):>10.3f}{size:>10,}")
+
+
+async def run(db: str, reads: int):
+    tenant = next(generate_rows(1))[0][3]
+    store = SQLiteCallLogStore(db)
+    service = BusinessMetadataService(store, poll_interval=0)
+    uncached = BusinessMetadataService(store, poll_interval=0, ttl=0)
+    try:
+        first = await service.read(tenant)
+        known = ",".join(f"{name}:{section['hash']}" for name, section in first["sections"].items())
+        print(f"{'read':<10}{'p50 ms':>10}{'p99 ms':>10}{'bytes':>10}")
+        await measure("rebuild", lambda: uncached.read(tenant), reads)
+        await measure("cached", lambda: service.read(tenant), reads)
+        await measure("etag", lambda: service.read(tenant, f"if_none_match={first['etag']}"), reads)
+        await store.execute("UPDATE office_hours SET end_time = '18:00:00' WHERE user_id = ?", (tenant,))
+        await measure("known", lambda: service.read(tenant, f"known={known}"), reads)
+    finally:
+        await store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark business metadata resource reads")
+    parser.add_argument("--staff", type=int, default=50)
+    parser.add_argument("--reads", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "metadata.db")
+        write_sqlite(db, 1000, 42, transcripts=False, staff=args.staff)
+        asyncio.run(run(db, args.reads))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Benchmark call enrichment throughput: in-process vs. a pool of 1..N worker processes
+
+Builds SQLite fixtures with --calls transcripts once, then for each worker
+count enriches a fresh copy of the database from an empty checkpoint and
+reports transcripts/s for the whole job (both passes and the bulk writes)
+and the speedup over one worker. Workers beyond the machine's cores
+(os.cpu_count()) only add overhead.
+
+Usage:
+    python bench_call_enrichment.py
+    python bench_call_enrichment.py --calls 200000 --max-workers 8 --chunk-size 2000
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+from call_enrichment import enrich_calls
+from call_log_store import SQLiteCallLogStore
+from generate_call_log_fixtures import write_sqlite
+
+
+async def enrich(db: str, checkpoint: str, workers: int, chunk_size: int) -> dict:
+    store = SQLiteCallLogStore(db)
+    try:
+        return await enrich_calls(store, checkpoint, workers=workers, chunk_size=chunk_size)
+    finally:
+        await store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark transcript enrichment scaling")
+    parser.add_argument("--calls", type=int, default=50_000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "source.db")
+        write_sqlite(source, args.calls, 42, transcripts=True)
+        print(f"{args.calls:,} transcripts, {os.cpu_count()} CPUs")
+        print(f"{'workers':<10}{'seconds':>10}{'calls/s':>12}{'speedup':>10}")
+        single = None
+        for workers in range(0, args.max_workers + 1):
+            db = os.path.join(tmp, f"run{workers}.db")
+            shutil.copy(source, db)
+            started = time.perf_counter()
+            stats = asyncio.run(enrich(db, os.path.join(tmp, f"run{workers}.json"), workers, args.chunk_size))
+            elapsed = time.perf_counter() - started
+            assert stats["enriched"] == args.calls
+            single = single or (elapsed if workers == 1 else None)
+            speedup = f"{single / elapsed:>9.2f}x" if single else f"{'-':>10}"
+            print(f"{workers or 'inline':<10}{elapsed:>10.2f}{args.calls / elapsed:>12,.0f}{speedup}")
+            os.remove(db)
+
+
+if __name__ == "__main__":
+    main()
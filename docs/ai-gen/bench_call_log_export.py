@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark the streaming call log export
+
+Exports a fixture's customer_call_logs in every available format, each in
+its own process, and reports rows/s, output size and the process's peak RSS
+(the export itself, rollups included). --baseline adds the old shape of the
+job for comparison: every row fetched into one list of dicts, then written
+as JSON, which needs memory in proportion to the table.
+
+Usage:
+    python bench_call_log_export.py
+    python bench_call_log_export.py --rows 10000000 --db /tmp/calls-10m.db
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from call_log_export import SUFFIXES, export_call_logs
+from call_log_store import SQLiteCallLogStore
+from generate_call_log_fixtures import write_sqlite
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+async def _materialized(db: str, path: str) -> dict:
+    store = SQLiteCallLogStore(db)
+    try:
+        rows = await store.query("SELECT * FROM customer_call_logs")
+    finally:
+        await store.close()
+    with gzip.open(path, "wt", compresslevel=6) as file:
+        for row in rows:
+            file.write(json.dumps(row) + "\n")
+    return {"rows": len(rows), "bytes": os.path.getsize(path)}
+
+
+def child(db: str, format: str, path: str):
+    """Runs in its own process so peak RSS is this export's alone"""
+    started = time.perf_counter()
+    if format == "baseline":
+        summary = asyncio.run(_materialized(db, path))
+    else:
+        async def run():
+            store = SQLiteCallLogStore(db)
+            try:
+                return await export_call_logs(store, path, format)
+            finally:
+                await store.close()
+        summary = asyncio.run(run())
+    print(json.dumps({"rows": summary["rows"], "bytes": summary["bytes"], "seconds": time.perf_counter() - started,
+                      "peak_rss_mb": _peak_rss_mb()}))
+
+
+def run(db: str, formats: list):
+    print(f"{'format':<10}{'rows':>12}{'rows/s':>10}{'MB out':>9}{'peak RSS MB':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for format in formats:
+            path = os.path.join(tmp, "calls" + SUFFIXES.get(format, ".ndjson.gz"))
+            output = subprocess.run([sys.executable, __file__, "--child", format, "--db", db, "--out", path],
+                                    check=True, capture_output=True, text=True).stdout
+            result = json.loads(output.splitlines()[-1])
+            print(f"{format:<10}{result['rows']:>12,}{result['rows'] / result['seconds']:>10,.0f}"
+                  f"{result['bytes'] / 1e6:>9.1f}{result['peak_rss_mb']:>13.0f}")
+            for name in os.listdir(tmp):
+                os.remove(os.path.join(tmp, name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the streaming call log export")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Call log rows in a generated fixture")
+    parser.add_argument("--db", help="Fixture database; generated with --rows when missing")
+    parser.add_argument("--formats", default="parquet,arrow,ndjson", help="Comma-separated formats to run")
+    parser.add_argument("--baseline", action="store_true", help="Also run the load-everything-then-write baseline")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.db, args.child, args.out)
+        return
+    formats = args.formats.split(",") + (["baseline"] if args.baseline else [])
+    if args.db:
+        if not os.path.exists(args.db):
+            write_sqlite(args.db, args.rows, 42, transcripts=False)
+        run(args.db, formats)
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "export.db")
+        write_sqlite(db, args.rows, 42, transcripts=False)
+        run(db, formats)
+
+
+if __name__ == "__main__":
+    main()
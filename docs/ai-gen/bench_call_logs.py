@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark get_call_logs reads: keyset-streamed chunks vs. materializing the full list
+
+Each mode runs in a fresh subprocess so peak RSS is measured independently.
+
+Usage:
+    python bench_call_logs.py --rows 200000 --limit 50000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from call_log_store import SQLiteCallLogStore
+from generate_call_log_fixtures import write_sqlite
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+async def run_streamed(db: str, limit: int, chunk_size: int) -> tuple[int, int]:
+    store = SQLiteCallLogStore(db)
+    rows = payload = 0
+    async for chunk, _ in store.iter_chunks(limit, chunk_size=chunk_size):
+        payload += len(json.dumps(chunk, separators=(",", ":")))
+        rows += len(chunk)
+    await store.close()
+    return rows, payload
+
+
+async def run_materialized(db: str, limit: int, chunk_size: int) -> tuple[int, int]:
+    store = SQLiteCallLogStore(db)
+    logs = []
+    async for chunk, _ in store.iter_chunks(limit, chunk_size=chunk_size):
+        logs.extend(chunk)
+    text = json.dumps(logs, indent=2)
+    await store.close()
+    return len(logs), len(text)
+
+
+def run_mode(mode: str, db: str, limit: int, chunk_size: int):
+    runner = run_streamed if mode == "streamed" else run_materialized
+    started = time.perf_counter()
+    rows, payload = asyncio.run(runner(db, limit, chunk_size))
+    elapsed = time.perf_counter() - started
+    print(json.dumps({
+        "mode": mode,
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(rows / elapsed),
+        "payload_bytes": payload,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark call log streaming")
+    parser.add_argument("--rows", type=int, default=100_000, help="Fixture rows to generate")
+    parser.add_argument("--limit", type=int, default=50_000, help="Rows requested from get_call_logs")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--db", help="Existing fixture database (skips generation)")
+    parser.add_argument("--mode", choices=["streamed", "materialized"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.db, args.limit, args.chunk_size)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = args.db
+        if not db:
+            db = os.path.join(tmp, "bench_calls.db")
+            write_sqlite(db, args.rows, seed=42, transcripts=False)
+
+        print(f"{'mode':<14}{'rows':>10}{'rows/s':>12}{'payload MB':>12}{'peak RSS MB':>13}")
+        for mode in ("streamed", "materialized"):
+            out = subprocess.run(
+                [sys.executable, __file__, "--mode", mode, "--db", db,
+                 "--limit", str(args.limit), "--chunk-size", str(args.chunk_size)],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(out)
+            print(f"{mode:<14}{result['rows']:>10}{result['rows_per_sec']:>12}"
+                  f"{result['payload_bytes'] / 1e6:>12.1f}{result['peak_rss_mb']:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
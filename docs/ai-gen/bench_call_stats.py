@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Replay benchmark for the call stats engine
+
+Replays one simulated day of call start/end events per volume and samples
+snapshot() latency throughout the day. p99 read latency should stay flat as
+daily volume grows, because reads never touch per-call data.
+
+Usage:
+    python bench_call_stats.py
+    python bench_call_stats.py --volumes 1000,100000,10000000
+"""
+
+import argparse
+import random
+import time
+
+from call_stats import CallStatsEngine
+
+
+def replay_day(calls_per_day: int, reads: int, concurrency: int = 20, seed: int = 7) -> dict:
+    rng = random.Random(seed)
+    engine = CallStatsEngine()
+    day_start = 1_705_363_200.0  # 2024-01-16T00:00:00Z
+    step = 86_400 / calls_per_day
+    read_every = max(calls_per_day // reads, 1)
+    latencies = []
+
+    replay_started = time.perf_counter()
+    for i in range(calls_per_day):
+        ts = day_start + i * step
+        engine.record_start(f"call_{i}", ts, agent_id=f"agent_{i % 50}")
+        if i >= concurrency:
+            engine.record_end(
+                f"call_{i - concurrency}", ts,
+                wait_seconds=rng.expovariate(1 / 30),
+                satisfaction=rng.choice((3.0, 4.0, 4.0, 5.0, 5.0)),
+            )
+        if i % read_every == 0:
+            read_started = time.perf_counter_ns()
+            engine.snapshot(ts)
+            latencies.append(time.perf_counter_ns() - read_started)
+    replay_seconds = time.perf_counter() - replay_started
+
+    # Reads against the end-of-day state with a warm cache isolate the
+    # algorithmic read cost from cache misses caused by the interleaved writes
+    settled = []
+    for _ in range(reads):
+        read_started = time.perf_counter_ns()
+        engine.snapshot(ts)
+        settled.append(time.perf_counter_ns() - read_started)
+
+    return {
+        "calls_per_day": calls_per_day,
+        "events_per_sec": round(2 * calls_per_day / replay_seconds),
+        "reads": len(latencies),
+        "p50_us": _percentile(latencies, 0.5),
+        "p99_us": _percentile(latencies, 0.99),
+        "settled_p99_us": _percentile(settled, 0.99),
+    }
+
+
+def _percentile(samples_ns: list, q: float) -> float:
+    ordered = sorted(samples_ns)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)] / 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark call stats reads vs. daily volume")
+    parser.add_argument("--volumes", default="1000,10000,100000,1000000",
+                        help="Comma-separated calls/day to replay (10000000 takes a few minutes)")
+    parser.add_argument("--reads", type=int, default=2000, help="Snapshots sampled per day")
+    args = parser.parse_args()
+
+    print(f"{'calls/day':>12}{'events/s':>12}{'reads':>8}{'p50 us':>10}{'p99 us':>10}{'settled p99 us':>16}")
+    for volume in (int(v) for v in args.volumes.split(",")):
+        r = replay_day(volume, args.reads)
+        print(f"{r['calls_per_day']:>12}{r['events_per_sec']:>12}{r['reads']:>8}"
+              f"{r['p50_us']:>10.1f}{r['p99_us']:>10.1f}{r['settled_p99_us']:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
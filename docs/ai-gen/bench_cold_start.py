@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Benchmark stdio server cold start: spawn to first `initialize` response
+
+For each server, spawns it directly and through warm_launcher.py (against a
+pool this script starts) --runs times each, and reports the time from spawn
+to the `initialize` response. It also measures what the repo's own modules
+add to import time on top of the `mcp` stack (python -X importtime, self
+time of every module the server imports beyond `mcp`), which is what a
+stray top-level import of numpy or httpx would blow up.
+
+Exits 1 when a warm p50 exceeds --target-ms or a server's own imports exceed
+--import-budget-ms, so it can gate CI.
+
+Usage:
+    python bench_cold_start.py
+    python bench_cold_start.py --servers working_mcp_server.py --runs 20 --target-ms 100
+"""
+
+import argparse
+import compileall
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+INITIALIZE = json.dumps({
+    "jsonrpc": "2.0", "id": 1, "method": "initialize",
+    "params": {"protocolVersion": "2024-11-05", "capabilities": {},
+               "clientInfo": {"name": "bench", "version": "1.0"}},
+}) + "\n"
+# Everything a server needs from `mcp`, imported first so it is excluded
+MCP_PRELUDE = ("import mcp.server, mcp.server.stdio, mcp.server.lowlevel.helper_types, mcp.types, pydantic, "
+               "mcp_socket_transport")
+
+
+def _percentile(samples_ns: list, q: float) -> float:
+    ordered = sorted(samples_ns)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)] / 1_000_000
+
+
+def time_to_initialize(command: list[str], env: dict) -> int:
+    started = time.perf_counter_ns()
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                               cwd=HERE, env=env)
+    try:
+        process.stdin.write(INITIALIZE.encode())
+        process.stdin.flush()
+        line = process.stdout.readline()
+        elapsed = time.perf_counter_ns() - started
+        if b'"result"' not in line:
+            raise RuntimeError(f"No initialize result from {' '.join(command)}: {line[:200]!r}")
+        return elapsed
+    finally:
+        process.stdin.close()
+        process.kill()
+        process.wait()
+
+
+def own_import_ms(module: str) -> tuple[float, list]:
+    """Self import time of the modules `module` adds beyond MCP_PRELUDE, and the slowest of them"""
+    def imported(code: str) -> dict:
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=HERE,
+                                capture_output=True, text=True, check=True)
+        times = {}
+        for line in result.stderr.splitlines():
+            if line.startswith("import time:") and "|" in line:
+                self_us, _, name = line[len("import time:"):].split("|")
+                if self_us.strip().isdigit():
+                    times[name.strip()] = int(self_us)
+        return times
+
+    before = imported(MCP_PRELUDE)
+    added = {name: us for name, us in imported(f"{MCP_PRELUDE}; import {module}").items() if name not in before}
+    slowest = sorted(added.items(), key=lambda item: -item[1])[:3]
+    return sum(added.values()) / 1000, slowest
+
+
+def start_pool(server: str, socket_path: str, spares: int) -> subprocess.Popen:
+    pool = subprocess.Popen([sys.executable, "warm_launcher.py", "--serve", server, "--socket", socket_path,
+                             "--spares", str(spares)], cwd=HERE, stderr=subprocess.PIPE, text=True)
+    # The pool reports once it is listening; workers are forked right after
+    line = pool.stderr.readline()
+    if "Warm pool" not in line:
+        pool.kill()
+        raise RuntimeError(f"Pool did not start: {line}{pool.stderr.read()}")
+    time.sleep(0.5)
+    return pool
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark stdio server cold start")
+    parser.add_argument("--servers", default="working_mcp_server.py,example_mcp_server.py")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--spares", type=int, default=2, help="Idle workers in the warm pool")
+    parser.add_argument("--target-ms", type=float, default=100.0, help="Warm p50 time-to-initialize budget")
+    parser.add_argument("--import-budget-ms", type=float, default=40.0,
+                        help="Import time the repo's own modules may add on top of mcp")
+    args = parser.parse_args()
+
+    # Time an installed server, not the first run after an edit
+    compileall.compile_dir(HERE, quiet=1)
+    failures = []
+    print(f"{'server':<24}{'own imports':>13}{'cold p50':>11}{'cold p90':>11}{'warm p50':>11}{'warm p90':>11}")
+    for server in args.servers.split(","):
+        imports_ms, slowest = own_import_ms(os.path.splitext(server)[0])
+        cold = [time_to_initialize([sys.executable, server], dict(os.environ)) for _ in range(args.runs)]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            socket_path = os.path.join(tmp, "pool.sock")
+            pool = start_pool(server, socket_path, args.spares)
+            env = {**os.environ, "CALL_CENTER_WARM_SOCKET": socket_path}
+            try:
+                warm = []
+                for _ in range(args.runs):
+                    warm.append(time_to_initialize([sys.executable, "warm_launcher.py", server], env))
+                    # A session arriving faster than the pool refills would wait for a fork
+                    time.sleep(0.05)
+            finally:
+                pool.terminate()
+                pool.wait()
+
+        print(f"{server:<24}{imports_ms:>10.1f} ms{_percentile(cold, 0.5):>8.0f} ms{_percentile(cold, 0.9):>8.0f} ms"
+              f"{_percentile(warm, 0.5):>8.0f} ms{_percentile(warm, 0.9):>8.0f} ms")
+        print(f"{'':<24}slowest own imports: " + ", ".join(f"{name} {us / 1000:.1f} ms" for name, us in slowest))
+        if _percentile(warm, 0.5) > args.target_ms:
+            failures.append(f"{server}: warm p50 {_percentile(warm, 0.5):.0f} ms > {args.target_ms:g} ms")
+        if imports_ms > args.import_budget_ms:
+            failures.append(f"{server}: own imports {imports_ms:.1f} ms > {args.import_budget_ms:g} ms")
+
+    for failure in failures:
+        print(f"OVER BUDGET {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
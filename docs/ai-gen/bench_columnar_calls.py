@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark the columnar call log store against a list of row dicts
+
+Loads a fixture's customer_call_logs both ways and reports bytes per record
+(tracemalloc) and the latency of the analytics queries: group-bys per agent,
+hour and disconnection reason, a filtered group-by, call_stats windows and a
+get_call_logs page.
+
+Usage:
+    python bench_columnar_calls.py
+    python bench_columnar_calls.py --rows 1000000 --repeat 20
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime
+
+from call_log_store import SQLiteCallLogStore
+from columnar_calls import ColumnarCallLogs
+from generate_call_log_fixtures import write_sqlite
+
+
+def _percentile(samples_ns: list, q: float) -> float:
+    ordered = sorted(samples_ns)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)] / 1_000_000
+
+
+def _measure(build):
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def rows_group_by(rows, key, direction=None):
+    groups = defaultdict(lambda: [0, 0])
+    for row in rows:
+        if direction is not None and row["direction"] != direction:
+            continue
+        label = datetime.fromisoformat(row["start_timestamp"]).hour if key == "hour" else row[key]
+        group = groups[label]
+        group[0] += 1
+        group[1] += row["duration_ms"] or 0
+    return groups
+
+
+def rows_window(rows, since, until):
+    durations = [
+        row["duration_ms"] for row in rows
+        if row["end_timestamp"] and since <= datetime.fromisoformat(row["end_timestamp"]).timestamp() < until
+    ]
+    return len(durations), sum(durations) / len(durations) if durations else None
+
+
+def rows_page(rows, limit):
+    return sorted(rows, key=lambda row: (row["start_timestamp"], row["id"]), reverse=True)[:limit]
+
+
+async def run(db: str, rows_limit: int, repeat: int):
+    store = SQLiteCallLogStore(db)
+    tracemalloc.start()
+    rows = [row async for chunk, _ in store.iter_chunks(rows_limit, chunk_size=5000) for row in chunk]
+    rows_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    await store.close()
+
+    started = time.perf_counter()
+    calls, columnar_bytes = _measure(lambda: _columnar(rows))
+    build_s = time.perf_counter() - started
+    print(f"rows: {len(rows)}")
+    print(f"row dicts:  {rows_bytes / len(rows):8.0f} bytes/record")
+    print(f"columnar:   {columnar_bytes / len(rows):8.0f} bytes/record "
+          f"(nbytes {calls.nbytes() / len(rows):.0f}, build {build_s:.2f}s)")
+
+    newest = datetime.fromisoformat(rows[0]["end_timestamp"]).timestamp()
+    queries = (
+        ("group by agent", lambda: calls.group_by("agent_id"), lambda: rows_group_by(rows, "agent_id")),
+        ("group by hour", lambda: calls.group_by("hour"), lambda: rows_group_by(rows, "hour")),
+        ("group by reason", lambda: calls.group_by("disconnection_reason"),
+         lambda: rows_group_by(rows, "disconnection_reason")),
+        ("inbound by reason", lambda: calls.group_by("disconnection_reason", calls.filter(direction="inbound")),
+         lambda: rows_group_by(rows, "disconnection_reason", "inbound")),
+        ("call_stats", lambda: calls.call_stats(now=newest),
+         lambda: [rows_window(rows, newest - span, newest + 1) for span in (86_400, 3_600, 300)]),
+        ("page of 100", lambda: calls.page(100), lambda: rows_page(rows, 100)),
+    )
+    calls.page(1)  # the sort order is built once and reused until new rows arrive
+    print(f"\n{'query':<20}{'columnar p50':>14}{'rows p50':>12}{'speedup':>10}")
+    for label, columnar, baseline in queries:
+        samples = {}
+        for name, fn in (("columnar", columnar), ("rows", baseline)):
+            samples[name] = []
+            for _ in range(repeat):
+                started = time.perf_counter_ns()
+                fn()
+                samples[name].append(time.perf_counter_ns() - started)
+        fast, slow = _percentile(samples["columnar"], 0.5), _percentile(samples["rows"], 0.5)
+        print(f"{label:<20}{fast:>11.2f} ms{slow:>9.2f} ms{slow / fast:>9.0f}x")
+
+
+def _columnar(rows):
+    calls = ColumnarCallLogs()
+    for i in range(0, len(rows), 5000):
+        calls.append_rows(rows[i:i + 5000])
+    return calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark columnar call logs against row dicts")
+    parser.add_argument("--rows", type=int, default=200_000, help="Call log rows in the fixture")
+    parser.add_argument("--repeat", type=int, default=10, help="Runs per query")
+    parser.add_argument("--db", help="Existing fixture database (default: generate a temporary one)")
+    args = parser.parse_args()
+
+    if args.db:
+        asyncio.run(run(args.db, args.rows, args.repeat))
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "columnar.db")
+        write_sqlite(db, args.rows, 42, transcripts=False)
+        asyncio.run(run(db, args.rows, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
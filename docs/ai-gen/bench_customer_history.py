@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark customer history lookups by phone number
+
+Generates a fixture database, then looks callers up with a mix of phone
+formats and reports cold (database) and cached latency, plus the cost of a
+lookup right after a new call log invalidates the caller's entry.
+
+Usage:
+    python bench_customer_history.py
+    python bench_customer_history.py --rows 1000000 --lookups 5000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from call_log_store import SQLiteCallLogStore
+from customer_history import CustomerHistoryService
+from generate_call_log_fixtures import generate_rows, write_sqlite
+
+
+def _percentile(samples_ns: list, q: float) -> float:
+    ordered = sorted(samples_ns)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)] / 1_000_000
+
+
+async def timed(samples: list, coro):
+    started = time.perf_counter_ns()
+    result = await coro
+    samples.append(time.perf_counter_ns() - started)
+    return result
+
+
+async def run(db: str, tenant: str, lookups: int):
+    store = SQLiteCallLogStore(db)
+    service = CustomerHistoryService(store)
+    started = time.perf_counter()
+    await service.index.load(store, tenant)
+    print(f"index build:     {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    numbers = [row["from_number"] for row in await store.query(
+        "SELECT DISTINCT from_number FROM customer_call_logs WHERE user_id = ?", (tenant,))]
+    rng = random.Random(5)
+    formats = (
+        lambda n: n,
+        lambda n: f"({n[-10:-7]}) {n[-7:-4]}-{n[-4:]}",
+        lambda n: n.replace("+", "").replace("-", ""),
+    )
+    sample = [rng.choice(formats)(rng.choice(numbers)) for _ in range(lookups)]
+
+    cold, warm, invalidated = [], [], []
+    for number in sample:
+        await timed(cold, service.lookup(tenant, number))
+        service.cache.invalidate(tenant, service.index.add(tenant, number))
+    for number in sample:
+        await service.lookup(tenant, number)
+    for number in sample:
+        await timed(warm, service.lookup(tenant, number))
+    for number in sample:
+        service.record_call_log(tenant, number)
+        await timed(invalidated, service.lookup(tenant, number))
+    await store.close()
+
+    for label, samples in (("database", cold), ("cached", warm), ("after new call", invalidated)):
+        print(f"{label + ':':<17}p50 {_percentile(samples, 0.5):.3f} ms, p99 {_percentile(samples, 0.99):.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark customer history lookups")
+    parser.add_argument("--rows", type=int, default=200_000, help="Call log rows in the fixture")
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--db", help="Existing fixture database (default: generate a temporary one)")
+    args = parser.parse_args()
+
+    tenant = next(generate_rows(1))[0][3]
+    if args.db:
+        asyncio.run(run(args.db, tenant, args.lookups))
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "history.db")
+        write_sqlite(db, args.rows, 42, transcripts=False, staff=10)
+        asyncio.run(run(db, tenant, args.lookups))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark deploying and redeploying many tenants through the deployment queue
+
+Starts fake_retell_server.py in-process with a per-request latency, deploys
+one agent per tenant, then redeploys every tenant with a fraction of them
+changed. Reports wall time, prompt renders and Retell API calls for each
+round, plus how long submitting took (what deploy_agent callers wait for).
+
+Usage:
+    python bench_deployment_queue.py
+    python bench_deployment_queue.py --tenants 500 --changed 0.05 --latency 0.2 --concurrency 8
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from agent_templates import PromptCache
+from deployment_queue import DeploymentQueue, DeploymentService
+from fake_retell_server import FakeRetellServer
+from retell_client import RetellClient
+
+
+def tenant_metadata(i: int, revision: int = 0) -> dict:
+    return {
+        "business_name": f"Clinic {i}",
+        "services": [{"service_name": f"Service {i}-{n}", "price": 50 + n} for n in range(8)],
+        "staff": [{"first_name": f"Staff{n}", "last_name": f"T{i}", "job_title": "Dentist"} for n in range(5)],
+        "locations": [{"location_name": "Main", "address": f"{i} Main St"}],
+        "custom_instructions": f"Revision {revision}",
+    }
+
+
+async def deploy_round(service: DeploymentService, tenants: int, revisions: dict, label: str):
+    renders, calls = service.prompts.renders, service.api_calls
+    started = time.perf_counter()
+    jobs = []
+    for i in range(tenants):
+        job, _ = await service.submit(f"tenant-{i}", {
+            "agent_name": "Front Desk", "business_type": "dental", "metadata": tenant_metadata(i, revisions.get(i, 0)),
+        })
+        jobs.append(job["deployment_id"])
+    submitted = time.perf_counter() - started
+    statuses = []
+    for deployment_id in jobs:
+        job = await service.status(deployment_id)
+        while job["status"] not in ("succeeded", "failed"):
+            job = await service.status(deployment_id, wait=5)
+        statuses.append(job["status"])
+    elapsed = time.perf_counter() - started
+    print(f"{label:<22}{elapsed:8.2f} s  submit {submitted * 1000 / tenants:6.2f} ms/job  "
+          f"renders {service.prompts.renders - renders:5d}  API calls {service.api_calls - calls:5d}  "
+          f"failed {statuses.count('failed')}")
+
+
+async def run(args, tmp: str):
+    fake = FakeRetellServer(args.latency, args.error_rate)
+    retell = RetellClient("bench", await fake.start(), max_connections=args.concurrency)
+    service = DeploymentService(DeploymentQueue(os.path.join(tmp, "jobs.db")), retell, PromptCache(),
+                                concurrency=args.concurrency, retry_delay=0.05, poll_interval=0.2)
+    service.start()
+
+    await deploy_round(service, args.tenants, {}, "initial deploy")
+    changed = {i: 1 for i in range(0, args.tenants, max(int(1 / args.changed), 1))} if args.changed else {}
+    await deploy_round(service, args.tenants, changed, f"redeploy, {len(changed)} changed")
+    await deploy_round(service, args.tenants, changed, "redeploy, none changed")
+
+    prompts = PromptCache()
+    started = time.perf_counter()
+    for i in range(args.tenants):
+        prompts.render("dental-inbound-receptionist-v01", "dental", "Front Desk", tenant_metadata(i))
+    print(f"\nuncached render: {(time.perf_counter() - started) * 1e6 / args.tenants:.0f} µs per tenant; "
+          f"fake Retell requests: {sum(fake.requests.values())} ({dict(fake.requests)})")
+
+    await service.stop()
+    await retell.close()
+    await fake.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the deployment queue")
+    parser.add_argument("--tenants", type=int, default=500)
+    parser.add_argument("--changed", type=float, default=0.05, help="Fraction of tenants changed on redeploy")
+    parser.add_argument("--concurrency", type=int, default=8, help="Deployment workers")
+    parser.add_argument("--latency", type=float, default=0.1, help="Fake Retell latency per request (s)")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="Fraction of fake Retell requests failing")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run(args, tmp))
+
+
+if __name__ == "__main__":
+    main()
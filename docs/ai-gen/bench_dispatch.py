@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of the call_tool dispatch path
+
+Compares ToolRegistry.dispatch (dict lookup + precompiled validator), the bare
+registry lookup, and the old unvalidated `if name == ... elif` chain for 5 and
+500 registered tools. Calls target the last registered tool, which is the worst
+case for the chain.
+
+Then measures what ServerMetrics adds, both around the bare registry dispatch
+and around the MCP server's full tools/call handler (request model in, result
+model out), as the median ratio of many short paired runs with and without
+metrics.
+
+Usage:
+    python bench_dispatch.py
+    python bench_dispatch.py --calls 200000 --sizes 5,50,500
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from mcp import server, types
+
+from server_metrics import ServerMetrics
+from tool_registry import ToolRegistry
+
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string"},
+        "priority": {"type": "string", "enum": ["low", "medium", "high", "urgent"], "default": "medium"},
+        "limit": {"type": "integer", "minimum": 1, "maximum": 1000, "default": 10},
+    },
+    "required": ["title"],
+}
+ARGUMENTS = {"title": "Login issue", "priority": "high"}
+
+
+def build_registry(size: int) -> ToolRegistry:
+    registry = ToolRegistry()
+    for i in range(size):
+        async def handler(arguments, i=i):
+            return i
+        registry.register(f"tool_{i}", f"Benchmark tool {i}", SCHEMA, handler)
+    return registry
+
+
+def build_chain(size: int):
+    """Generate the equivalent if/elif dispatcher with no validation"""
+    lines = ["async def call_tool(name, arguments):"]
+    for i in range(size):
+        keyword = "if" if i == 0 else "elif"
+        lines.append(f"    {keyword} name == 'tool_{i}':")
+        lines.append(f"        return {i}")
+    lines.append("    raise ValueError(f'Unknown tool: {name}')")
+    namespace = {}
+    exec("\n".join(lines), namespace)
+    return namespace["call_tool"]
+
+
+async def measure(dispatch, name: str, calls: int) -> float:
+    started = time.perf_counter()
+    for _ in range(calls):
+        await dispatch(name, ARGUMENTS)
+    return calls / (time.perf_counter() - started)
+
+
+async def run(sizes: list[int], calls: int):
+    print(f"{'tools':>6}{'registry calls/s':>20}{'lookup only calls/s':>22}{'if/elif calls/s':>20}")
+    for size in sizes:
+        registry = build_registry(size)
+        chain = build_chain(size)
+        target = f"tool_{size - 1}"
+
+        async def lookup_only(name, arguments):
+            return await registry.get(name).handler(arguments)
+
+        registry_rate = await measure(registry.dispatch, target, calls)
+        lookup_rate = await measure(lookup_only, target, calls)
+        chain_rate = await measure(chain, target, calls)
+        print(f"{size:>6}{registry_rate:>20,.0f}{lookup_rate:>22,.0f}{chain_rate:>20,.0f}")
+
+
+def build_app(registry: ToolRegistry):
+    """The tools/call request handler, registered the way the servers do it"""
+    app = server.Server("bench")
+    tool_list = [types.Tool(**definition) for definition in registry.definitions()]
+
+    @app.list_tools()
+    async def list_tools():
+        return tool_list
+
+    @app.call_tool(validate_input=False)
+    async def call_tool(name, arguments):
+        return await registry.dispatch(name, arguments)
+    return app.request_handlers[types.CallToolRequest]
+
+
+async def measure_overhead(rounds: int):
+    async def handler(arguments):
+        return [types.TextContent(type="text", text='{"ticket_id": "TKT-1", "status": "open"}')]
+
+    plain, metered = ToolRegistry(), ToolRegistry(ServerMetrics())
+    for registry in (plain, metered):
+        registry.register("create_ticket", "Benchmark tool", SCHEMA, handler)
+    request = types.CallToolRequest(method="tools/call", params=types.CallToolRequestParams(
+        name="create_ticket", arguments=ARGUMENTS))
+
+    def via_app(registry):
+        app = build_app(registry)
+
+        async def dispatch(name, arguments):
+            return await app(request)
+        return dispatch
+
+    cases = {
+        "registry.dispatch": (plain.dispatch, metered.dispatch, 5000),
+        "tools/call handler": (via_app(plain), via_app(metered), 1000),
+    }
+    print(f"\n{'path':<20}{'plain µs/call':>15}{'metrics µs/call':>17}{'overhead':>10}")
+    for label, (without, with_metrics, n) in cases.items():
+        # Many short alternating rounds, compared pairwise: drift and noisy
+        # neighbours hit both sides of a pair alike, and the median drops outliers
+        ratios, plain_times = [], []
+        for i in range(rounds):
+            elapsed = {}
+            for dispatch in ((without, with_metrics) if i % 2 else (with_metrics, without)):
+                elapsed[dispatch] = n / await measure(dispatch, "create_ticket", n)
+            plain_times.append(elapsed[without] / n)
+            ratios.append(elapsed[with_metrics] / elapsed[without])
+        ratio = statistics.median(ratios)
+        per_call = statistics.median(plain_times) * 1e6
+        print(f"{label:<20}{per_call:>15.2f}{per_call * ratio:>17.2f}{(ratio - 1) * 100:>9.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark call_tool dispatch")
+    parser.add_argument("--calls", type=int, default=100_000)
+    parser.add_argument("--sizes", default="5,500")
+    parser.add_argument("--rounds", type=int, default=200, help="Paired rounds for the metrics overhead")
+    args = parser.parse_args()
+    asyncio.run(run([int(s) for s in args.sizes.split(",")], args.calls))
+    asyncio.run(measure_overhead(args.rounds))
+
+
+if __name__ == "__main__":
+    main()
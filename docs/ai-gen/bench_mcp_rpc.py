@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+"""
+Replayable JSON-RPC load and regression benchmark for the MCP servers
+
+`record` sits between an MCP client and a server over stdio and saves the
+client's messages as a session file (one JSON-RPC message per line):
+
+    python bench_mcp_rpc.py record --out session.jsonl -- python working_mcp_server.py
+
+`run` replays session files against a server: each of --concurrency
+clients starts its own stdio server (or connects to one --transport socket
+server), sends the session's initialize, replays the rest --warmup times
+unmeasured, then --iterations times with up to --pipeline requests in
+flight. Request IDs are rewritten,
+so recordings from any client work. It reports throughput and latency
+percentiles per method (per tool for tools/call), plus the servers' CPU
+time and peak RSS (from /proc, or psutil where installed).
+
+    python bench_mcp_rpc.py run --server working_mcp_server.py --session bench_rpc_session.jsonl
+    python bench_mcp_rpc.py run --server example_mcp_server.py --transport socket --concurrency 50
+
+Each figure is the median over --runs repeats of the whole run, which keeps
+one noisy run from failing the gate. --save-baseline writes the results as
+JSON; --baseline compares against such a file and exits with status 1 if
+throughput, latency, startup, CPU per request or RSS got worse by more than
+--tolerance (latency changes under 0.5 ms are ignored).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shlex
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Optional
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SESSION = os.path.join(HERE, "bench_rpc_session.jsonl")
+# Latency changes smaller than this are noise, whatever the ratio
+MIN_LATENCY_DELTA_MS = 0.5
+
+
+def server_command(server: str) -> list[str]:
+    """Command for a server given as a script name or a full command line"""
+    args = shlex.split(server, posix=os.name != "nt")
+    if args and args[0].endswith(".py"):
+        script = args[0] if os.path.isabs(args[0]) or os.path.exists(args[0]) else os.path.join(HERE, args[0])
+        args = [sys.executable, script] + args[1:]
+    return args
+
+
+def load_session(path: str) -> list[dict]:
+    """Client messages of a recorded session, initialize first"""
+    with open(path, encoding="utf-8") as f:
+        messages = [json.loads(line) for line in f if line.strip()]
+    messages = [m for m in messages if "method" in m]
+    if not messages or messages[0]["method"] != "initialize":
+        raise ValueError(f"{path}: a session must start with an initialize request")
+    return messages
+
+
+def label(message: dict) -> str:
+    params = message.get("params") or {}
+    if message["method"] == "tools/call":
+        return f"tools/call {params.get('name')}"
+    if message["method"] == "resources/read":
+        return f"resources/read {str(params.get('uri', '')).partition('?')[0]}"
+    return message["method"]
+
+
+def _percentile(samples: list, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)] * 1000 if ordered else 0.0
+
+
+def process_usage(pid: int) -> Optional[dict]:
+    """CPU seconds (user + system) and peak RSS in MiB of a running process"""
+    try:
+        import psutil  # optional, for non-Linux platforms
+
+        process = psutil.Process(pid)
+        times = process.cpu_times()
+        info = process.memory_info()
+        return {"cpu_s": times.user + times.system, "peak_rss_mb": getattr(info, "peak_wset", info.rss) / 2 ** 20}
+    except ImportError:
+        pass
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rpartition(")")[2].split()
+        with open(f"/proc/{pid}/status") as f:
+            peak = next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+    except (OSError, StopIteration):
+        return None
+    ticks = os.sysconf("SC_CLK_TCK")
+    return {"cpu_s": (int(fields[11]) + int(fields[12])) / ticks, "peak_rss_mb": peak / 1024}
+
+
+class Connection:
+    """Newline-delimited JSON-RPC client that matches responses to requests by id"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, process=None):
+        self.reader = reader
+        self.writer = writer
+        self.process = process
+        self.next_id = 0
+        self.pending: dict = {}
+        self._reader_task = asyncio.create_task(self._read())
+
+    @classmethod
+    async def start(cls, command: list[str], env: dict) -> "Connection":
+        process = await asyncio.create_subprocess_exec(
+            *command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            cwd=HERE, env=env, limit=64 * 1024 * 1024)
+        return cls(process.stdout, process.stdin, process)
+
+    @classmethod
+    async def connect(cls, host: str, port: int) -> "Connection":
+        reader, writer = await asyncio.open_connection(host, port, limit=64 * 1024 * 1024)
+        return cls(reader, writer)
+
+    async def _read(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                future = self.pending.pop(message.get("id"), None) if "method" not in message else None
+                if future is not None and not future.done():
+                    future.set_result(message)
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Server closed the connection"))
+
+    async def request(self, message: dict) -> dict:
+        self.next_id += 1
+        future = self.pending[self.next_id] = asyncio.get_running_loop().create_future()
+        self.writer.write(json.dumps({**message, "jsonrpc": "2.0", "id": self.next_id}).encode() + b"\n")
+        await self.writer.drain()
+        return await future
+
+    async def notify(self, message: dict):
+        self.writer.write(json.dumps({**message, "jsonrpc": "2.0"}).encode() + b"\n")
+        await self.writer.drain()
+
+    async def close(self) -> Optional[dict]:
+        """Close the connection; returns the stdio server's usage, taken just before it exits"""
+        usage = process_usage(self.process.pid) if self.process else None
+        self.writer.close()
+        if self.process:
+            try:
+                await asyncio.wait_for(self.process.wait(), 5)
+            except asyncio.TimeoutError:
+                self.process.kill()
+                await self.process.wait()
+        self._reader_task.cancel()
+        return usage
+
+
+def is_error(response: dict) -> bool:
+    return "error" in response or bool((response.get("result") or {}).get("isError"))
+
+
+async def timed(connection: Connection, message: dict, samples: dict, errors: dict):
+    started = time.perf_counter()
+    response = await connection.request(message)
+    name = label(message)
+    samples.setdefault(name, []).append(time.perf_counter() - started)
+    if is_error(response):
+        errors[name] = errors.get(name, 0) + 1
+
+
+async def initialize(connection: Connection, session: list[dict], errors: dict) -> float:
+    started = time.perf_counter()
+    response = await connection.request(session[0])
+    if is_error(response):
+        errors["initialize"] = errors.get("initialize", 0) + 1
+    await connection.notify({"method": "notifications/initialized"})
+    return time.perf_counter() - started
+
+
+async def replay(connection: Connection, session: list[dict], iterations: int, pipeline: int,
+                 samples: dict, errors: dict):
+    """Replay the session's messages after initialize with up to `pipeline` requests in flight"""
+    slots = asyncio.Semaphore(pipeline)
+    in_flight = set()
+
+    async def run_one(message: dict):
+        try:
+            await timed(connection, message, samples, errors)
+        finally:
+            slots.release()
+
+    for _ in range(iterations):
+        for message in session[1:]:
+            if "id" not in message:
+                if message["method"] != "notifications/initialized":
+                    await connection.notify(message)
+                continue
+            await slots.acquire()
+            task = asyncio.create_task(run_one(message))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+    if in_flight:
+        await asyncio.gather(*in_flight)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(host: str, port: int, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"Server did not start listening on {host}:{port}")
+
+
+async def run_load(command: list[str], sessions: list[list[dict]], concurrency: int, iterations: int,
+                   pipeline: int, transport: str = "stdio", warmup: int = 1, env: Optional[dict] = None) -> dict:
+    """Replay `sessions` (round-robin over clients) and return the results document
+
+    Every client initializes and replays `warmup` unmeasured iterations (first
+    calls load caches); the clock and the servers' CPU counters start once all
+    of them have. Initialize latency is reported on its own as startup.
+    """
+    env = dict(os.environ if env is None else env)
+    samples: dict = {}
+    errors: dict = {}
+    startups = []
+    usages = []
+    cpu = []
+    warm = 0
+    all_warm = asyncio.Event()
+    server = None
+    if transport == "socket":
+        port = free_port()
+        server = subprocess.Popen(command + ["--listen", f"127.0.0.1:{port}", "--max-sessions",
+                                             str(concurrency + 16)], stderr=subprocess.DEVNULL, cwd=HERE, env=env)
+        wait_for_port("127.0.0.1", port)
+
+    async def client(index: int):
+        if server is not None:
+            connection = await Connection.connect("127.0.0.1", port)
+        else:
+            connection = await Connection.start(command, env)
+        nonlocal warm
+        session = sessions[index % len(sessions)]
+        before = None
+        try:
+            startups.append(await initialize(connection, session, errors))
+            await replay(connection, session, warmup, pipeline, {}, errors)
+            warm += 1
+            if warm == concurrency:
+                all_warm.set()
+            await all_warm.wait()
+            before = process_usage(connection.process.pid) if connection.process else None
+            await replay(connection, session, iterations, pipeline, samples, errors)
+        finally:
+            usage = await connection.close()
+            if usage:
+                usages.append(usage)
+                if before:
+                    cpu.append(usage["cpu_s"] - before["cpu_s"])
+
+    try:
+        clients = asyncio.gather(*(client(i) for i in range(concurrency)))
+        await asyncio.wait([asyncio.ensure_future(all_warm.wait()), clients], return_when=asyncio.FIRST_COMPLETED)
+        started = time.perf_counter()
+        if server is not None:
+            before = process_usage(server.pid)
+        await clients
+        elapsed = time.perf_counter() - started
+        if server is not None:
+            usage = process_usage(server.pid)
+            if usage:
+                usages.append(usage)
+                if before:
+                    cpu.append(usage["cpu_s"] - before["cpu_s"])
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    requests = sum(len(values) for values in samples.values())
+    everything = [value for values in samples.values() for value in values]
+    cpu_s = sum(cpu) if cpu else None
+    return {
+        "transport": transport,
+        "concurrency": concurrency,
+        "pipeline": pipeline,
+        "requests": requests,
+        "errors": sum(errors.values()),
+        "seconds": elapsed,
+        "requests_per_sec": requests / elapsed,
+        "p50_ms": _percentile(everything, 0.5),
+        "p99_ms": _percentile(everything, 0.99),
+        "startup_ms": _percentile(startups, 0.5),
+        "cpu_ms_per_request": cpu_s * 1000 / requests if cpu_s is not None and requests else None,
+        "peak_rss_mb": max(usage["peak_rss_mb"] for usage in usages) if usages else None,
+        "methods": {
+            name: {"count": len(values), "errors": errors.get(name, 0), "p50_ms": _percentile(values, 0.5),
+                   "p90_ms": _percentile(values, 0.9), "p99_ms": _percentile(values, 0.99),
+                   "max_ms": max(values) * 1000}
+            for name, values in sorted(samples.items())
+        },
+    }
+
+
+def combine(runs: list[dict]) -> dict:
+    """One results document from repeated runs: the median of every measurement"""
+    median = lambda values: sorted(values)[len(values) // 2] if None not in values else None
+    results = dict(runs[0])
+    for key in ("seconds", "requests_per_sec", "p50_ms", "p99_ms", "startup_ms", "cpu_ms_per_request",
+                "peak_rss_mb"):
+        results[key] = median([run[key] for run in runs])
+    results["requests"] = sum(run["requests"] for run in runs)
+    results["errors"] = sum(run["errors"] for run in runs)
+    results["runs"] = len(runs)
+    results["methods"] = {}
+    for name in runs[0]["methods"]:
+        stats = [run["methods"][name] for run in runs if name in run["methods"]]
+        results["methods"][name] = {
+            "count": sum(s["count"] for s in stats),
+            "errors": sum(s["errors"] for s in stats),
+            **{key: median([s[key] for s in stats]) for key in ("p50_ms", "p90_ms", "p99_ms")},
+            "max_ms": max(s["max_ms"] for s in stats),
+        }
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Regressions of `results` against `baseline`, as readable lines (empty if none)"""
+    checks = [("requests/s", results["requests_per_sec"], baseline.get("requests_per_sec"), False)]
+    checks += [(name, results[key], baseline.get(key), True)
+               for name, key in (("p50 ms", "p50_ms"), ("p99 ms", "p99_ms"),
+                                 ("startup ms", "startup_ms"), ("CPU ms/request", "cpu_ms_per_request"),
+                                 ("peak RSS MiB", "peak_rss_mb"))]
+    for method, stats in results["methods"].items():
+        before = baseline.get("methods", {}).get(method)
+        if before:
+            checks.append((f"{method} p50 ms", stats["p50_ms"], before["p50_ms"], True))
+    regressions = []
+    for name, now, before, higher_is_worse in checks:
+        if now is None or not before:
+            continue
+        change = now / before - 1
+        worse = change > tolerance if higher_is_worse else change < -tolerance
+        if worse and name.endswith("ms") and abs(now - before) < MIN_LATENCY_DELTA_MS:
+            continue
+        if worse:
+            regressions.append(f"{name}: {before:,.2f} -> {now:,.2f} ({change:+.0%})")
+    return regressions
+
+
+def print_results(results: dict):
+    print(f"\n{'method':<44}{'count':>8}{'errors':>8}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for name, stats in results["methods"].items():
+        print(f"{name[:43]:<44}{stats['count']:>8}{stats['errors']:>8}{stats['p50_ms']:>9.2f}"
+              f"{stats['p90_ms']:>9.2f}{stats['p99_ms']:>9.2f}{stats['max_ms']:>9.1f}")
+    cpu = results["cpu_ms_per_request"]
+    rss = results["peak_rss_mb"]
+    runs = results.get("runs", 1)
+    print(f"\n{results['requests']:,} requests ({results['errors']} errors) over {runs} run(s), "
+          f"median of runs: {results['seconds']:.2f} s, "
+          f"{results['requests_per_sec']:,.0f} requests/s, p50 {results['p50_ms']:.2f} ms, "
+          f"p99 {results['p99_ms']:.2f} ms")
+    print(f"startup (initialize) p50 {results['startup_ms']:.0f} ms, "
+          f"server CPU {'n/a' if cpu is None else f'{cpu:.3f} ms/request'}, "
+          f"peak RSS {'n/a' if rss is None else f'{rss:.1f} MiB'} per server")
+
+
+def record(out: str, command: list[str]) -> int:
+    """Proxy stdio between this process's client and the server, saving client messages"""
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, cwd=HERE)
+
+    def pump_out():
+        for line in process.stdout:
+            sys.stdout.buffer.write(line)
+            sys.stdout.buffer.flush()
+
+    threading.Thread(target=pump_out, daemon=True).start()
+    saved = 0
+    with open(out, "w", encoding="utf-8") as f:
+        for line in sys.stdin.buffer:
+            process.stdin.write(line)
+            process.stdin.flush()
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            # Responses to server-initiated requests depend on that run; keep the client's own traffic
+            if isinstance(message, dict) and "method" in message:
+                f.write(json.dumps(message) + "\n")
+                saved += 1
+    process.stdin.close()
+    code = process.wait()
+    print(f"Recorded {saved} messages to {out}", file=sys.stderr)
+    return code
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded JSON-RPC sessions against an MCP server")
+    commands = parser.add_subparsers(dest="command", required=True)
+    recorder = commands.add_parser("record", help="Proxy a client's stdio session and save its messages")
+    recorder.add_argument("--out", required=True)
+    recorder.add_argument("server", nargs=argparse.REMAINDER, help="-- then the server command")
+    runner = commands.add_parser("run", help="Replay sessions and report throughput and latency")
+    runner.add_argument("--server", default="working_mcp_server.py",
+                        help="Server script or command line (scripts run with this Python)")
+    runner.add_argument("--session", action="append", help=f"Session file, repeatable (default: {DEFAULT_SESSION})")
+    runner.add_argument("--transport", choices=("stdio", "socket"), default="stdio",
+                        help="stdio: one server process per client; socket: one --listen server for all")
+    runner.add_argument("--concurrency", type=int, default=4, help="Concurrent client sessions")
+    runner.add_argument("--pipeline", type=int, default=8, help="Requests in flight per session")
+    runner.add_argument("--iterations", type=int, default=20, help="Replays of each session after initialize")
+    runner.add_argument("--warmup", type=int, default=2, help="Unmeasured iterations per session first")
+    runner.add_argument("--runs", type=int, default=3,
+                        help="Repeat the whole run; each figure is the median across runs")
+    runner.add_argument("--baseline", help="Results JSON to compare against; regressions exit with status 1")
+    runner.add_argument("--save-baseline", help="Write the results JSON here")
+    runner.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative change (default: 0.2)")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        server = args.server[1:] if args.server[:1] == ["--"] else args.server
+        if not server:
+            parser.error("record needs a server command after --")
+        sys.exit(record(args.out, server_command(shlex.join(server))))
+
+    command = server_command(args.server)
+    sessions = [load_session(path) for path in args.session or [DEFAULT_SESSION]]
+    results = combine([
+        asyncio.run(run_load(command, sessions, args.concurrency, args.iterations, args.pipeline,
+                             args.transport, args.warmup))
+        for _ in range(args.runs)
+    ])
+    results["server"] = args.server
+    print_results(results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\nREGRESSIONS (tolerance {args.tolerance:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    if results["errors"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
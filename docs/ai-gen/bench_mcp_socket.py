@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Load generator for the MCP socket transport
+
+Starts a server with `--listen` (or targets a running one), then drives many
+concurrent sessions: initialize, tools/list and a few tools/call requests per
+session. Reports sessions/sec, request latency percentiles and server memory
+per idle session.
+
+Usage:
+    python bench_mcp_socket.py
+    python bench_mcp_socket.py --server simple_mcp_server.py --sessions 2000 --concurrency 200
+    python bench_mcp_socket.py --connect 127.0.0.1:8765 --idle-sessions 0
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+
+INITIALIZE = {
+    "protocolVersion": "2024-11-05",
+    "capabilities": {},
+    "clientInfo": {"name": "bench-mcp-socket", "version": "1.0.0"},
+}
+
+
+class Client:
+    """Minimal newline-delimited JSON-RPC client"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.next_id = 0
+
+    @classmethod
+    async def connect(cls, host: str, port: int) -> "Client":
+        reader, writer = await asyncio.open_connection(host, port, limit=64 * 1024 * 1024)
+        return cls(reader, writer)
+
+    async def request(self, method: str, params: dict) -> dict:
+        self.next_id += 1
+        request_id = self.next_id
+        self.writer.write(json.dumps({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}).encode() + b"\n")
+        await self.writer.drain()
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                raise ConnectionError("Server closed the connection")
+            message = json.loads(line)
+            if message.get("id") == request_id or ("error" in message and message.get("id") is None):
+                if "error" in message:
+                    raise RuntimeError(message["error"]["message"])
+                return message["result"]
+
+    async def notify(self, method: str):
+        self.writer.write(json.dumps({"jsonrpc": "2.0", "method": method}).encode() + b"\n")
+        await self.writer.drain()
+
+    async def initialize(self):
+        await self.request("initialize", INITIALIZE)
+        await self.notify("notifications/initialized")
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+
+async def run_session(host, port, tool, calls, latencies: list):
+    client = await Client.connect(host, port)
+    try:
+        for method, params in [("initialize", INITIALIZE), ("tools/list", {})] + \
+                [("tools/call", {"name": tool, "arguments": {}})] * calls:
+            started = time.perf_counter()
+            await client.request(method, params)
+            latencies.append(time.perf_counter() - started)
+            if method == "initialize":
+                await client.notify("notifications/initialized")
+    finally:
+        await client.close()
+
+
+async def load_phase(host, port, sessions, concurrency, tool, calls) -> dict:
+    latencies: list = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            try:
+                await run_session(host, port, tool, calls, latencies)
+            except (ConnectionError, RuntimeError, OSError):
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(sessions)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    pick = lambda q: latencies[min(int(len(latencies) * q), len(latencies) - 1)] * 1000 if latencies else 0.0
+    return {
+        "sessions": sessions,
+        "errors": errors,
+        "sessions_per_sec": sessions / elapsed,
+        "requests_per_sec": len(latencies) / elapsed,
+        "p50_ms": pick(0.5),
+        "p99_ms": pick(0.99),
+    }
+
+
+def rss_kb(pid: int) -> int:
+    try:
+        import psutil  # optional, for non-Linux platforms
+
+        return psutil.Process(pid).memory_info().rss // 1024
+    except ImportError:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    return 0
+
+
+async def memory_phase(host, port, pid, idle_sessions) -> float:
+    baseline = rss_kb(pid)
+    clients = []
+    for _ in range(idle_sessions):
+        client = await Client.connect(host, port)
+        await client.initialize()
+        clients.append(client)
+    await asyncio.sleep(0.5)
+    loaded = rss_kb(pid)
+    for client in clients:
+        await client.close()
+    return (loaded - baseline) / idle_sessions if idle_sessions else 0.0
+
+
+def wait_for_port(host: str, port: int, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"Server did not start listening on {host}:{port}")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the MCP socket transport")
+    parser.add_argument("--server", default="working_mcp_server.py", help="Server script to start")
+    parser.add_argument("--connect", help="HOST:PORT of an already running server")
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--tool", default="get_call_stats")
+    parser.add_argument("--calls", type=int, default=3, help="tools/call requests per session")
+    parser.add_argument("--idle-sessions", type=int, default=200, help="Sessions held open for the memory phase")
+    args = parser.parse_args()
+
+    process = None
+    if args.connect:
+        host, _, port = args.connect.rpartition(":")
+        port = int(port)
+    else:
+        host, port = "127.0.0.1", free_port()
+        server_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), args.server)
+        process = subprocess.Popen(
+            [sys.executable, server_path, "--listen", f"{host}:{port}",
+             "--max-sessions", str(max(args.concurrency, args.idle_sessions) + 16)],
+            stderr=subprocess.DEVNULL,
+        )
+        wait_for_port(host, port)
+
+    try:
+        result = asyncio.run(load_phase(host, port, args.sessions, args.concurrency, args.tool, args.calls))
+        print(f"sessions:        {result['sessions']} ({result['errors']} errors)")
+        print(f"sessions/sec:    {result['sessions_per_sec']:.0f}")
+        print(f"requests/sec:    {result['requests_per_sec']:.0f}")
+        print(f"latency p50/p99: {result['p50_ms']:.2f} / {result['p99_ms']:.2f} ms")
+        if process and args.idle_sessions:
+            per_session = asyncio.run(memory_phase(host, port, process.pid, args.idle_sessions))
+            print(f"memory/session:  {per_session:.1f} KiB ({args.idle_sessions} idle sessions)")
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark get_retell_agents under a burst of identical requests
+
+Starts fake_retell_server.py in-process with --latency per request and
+fires --concurrency identical agent-list reads at once, --bursts times,
+each way:
+
+    unpooled      a new HTTP client (and connection) per read
+    pooled        the shared keep-alive client, every read goes upstream
+    coalesced     shared client + single-flight, nothing cached (ttl 0)
+    cached        shared client + single-flight + stale-while-revalidate, warm
+
+Reports upstream requests per burst and p50/p99 read latency.
+
+Usage:
+    python bench_retell_agents.py
+    python bench_retell_agents.py --concurrency 500 --latency 0.05 --bursts 10
+"""
+
+import argparse
+import asyncio
+import time
+
+from fake_retell_server import FakeRetellServer
+from generate_call_log_fixtures import AGENTS
+from retell_agents import AgentDirectory, agent_summary
+from retell_client import RetellClient
+
+
+def _percentile(samples: list, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)] * 1000
+
+
+async def measure(label: str, fake: FakeRetellServer, read, concurrency: int, bursts: int):
+    async def timed():
+        started = time.perf_counter()
+        await read()
+        return time.perf_counter() - started
+
+    before = fake.requests["GET /list-agents"]
+    samples = []
+    for _ in range(bursts):
+        samples += await asyncio.gather(*(timed() for _ in range(concurrency)))
+    upstream = (fake.requests["GET /list-agents"] - before) / bursts
+    print(f"{label:<12}{upstream:>12,.0f}{_percentile(samples, 0.5):>10.1f}{_percentile(samples, 0.99):>10.1f}")
+
+
+async def run(concurrency: int, latency: float, bursts: int, connections: int):
+    fake = FakeRetellServer(latency)
+    for agent_id, name in AGENTS:
+        fake.agents[agent_id] = {"agent_id": agent_id, "agent_name": name, "version": 1}
+    url = await fake.start()
+    shared = RetellClient("test", url, max_connections=connections)
+    coalesced = AgentDirectory(shared, ttl=0, stale_ttl=0)
+    cached = AgentDirectory(shared, ttl=3600, stale_ttl=300)
+
+    async def unpooled():
+        client = RetellClient("test", url, max_connections=1)
+        try:
+            return [agent_summary(agent) for agent in await client.list_agents()]
+        finally:
+            await client.close()
+
+    async def pooled():
+        return [agent_summary(agent) for agent in await shared.list_agents()]
+
+    try:
+        await cached.agents()
+        print(f"{concurrency} concurrent reads x {bursts} bursts, {latency * 1000:.0f} ms upstream latency, "
+              f"{connections} pooled connections")
+        print(f"{'client':<12}{'upstream/burst':>12}{'p50 ms':>10}{'p99 ms':>10}")
+        await measure("unpooled", fake, unpooled, concurrency, bursts)
+        await measure("pooled", fake, pooled, concurrency, bursts)
+        await measure("coalesced", fake, coalesced.agents, concurrency, bursts)
+        await measure("cached", fake, cached.agents, concurrency, bursts)
+    finally:
+        await cached.cache.close()
+        await shared.close()
+        await fake.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark coalesced Retell agent listings")
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds the fake Retell API takes per request")
+    parser.add_argument("--bursts", type=int, default=3)
+    parser.add_argument("--connections", type=int, default=16, help="Keep-alive pool size")
+    args = parser.parse_args()
+    asyncio.run(run(args.concurrency, args.latency, args.bursts, args.connections))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark tool response encoding: indent=2 json.dumps vs. the serializers
+
+For a 10-row and a 100k-row call log result (read from a generated SQLite
+fixture), reports per configuration the encode time (median of --runs), the
+bytes of text content, and the bytes of the whole tools/call result as it
+goes over the wire (CallToolResult serialized by pydantic, as the MCP
+server does, including structuredContent).
+
+    legacy          banner + json.dumps(rows, indent=2) in one text block
+    json-compact    serializers.Serializer("compact", "json")
+    json-pretty     serializers.Serializer("pretty", "json")
+    orjson-*        the same with orjson, when it is installed
+
+Small results carry the rows in structuredContent too, which roughly
+doubles their wire size (the text-only column leaves it out); large ones go
+through encode_rows() and carry only their summary.
+
+Usage:
+    python bench_serializers.py
+    python bench_serializers.py --rows 100000 --runs 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from mcp import types
+
+from call_log_store import SQLiteCallLogStore
+from generate_call_log_fixtures import write_sqlite
+from serializers import Serializer
+
+
+def _percentile(samples_ns: list, q: float) -> float:
+    ordered = sorted(samples_ns)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)] / 1_000_000
+
+
+async def read_rows(db: str, limit: int) -> list[dict]:
+    store = SQLiteCallLogStore(db)
+    rows = []
+    async for chunk, _ in store.iter_chunks(limit):
+        rows.extend(chunk)
+    await store.close()
+    return rows
+
+
+def legacy_result(rows: list[dict]) -> tuple[list[types.TextContent], None]:
+    text = f"📞 Recent Call Logs (Last {len(rows)}):\n\n" + json.dumps(rows, indent=2)
+    return [types.TextContent(type="text", text=text)], None
+
+
+def serializer_result(serializer: Serializer, rows: list[dict], streamed: bool):
+    header = f"📞 Recent Call Logs (Last {len(rows)}):"
+    if streamed:
+        return serializer.rows_result(serializer.encode_rows(rows), {"returned": len(rows), "next_cursor": None},
+                                      header=header)
+    return serializer.result(rows, header=header)
+
+
+def wire_size(content: list[types.TextContent], structured) -> int:
+    wire = types.CallToolResult(content=content, structuredContent=structured)
+    return len(wire.model_dump_json(by_alias=True, exclude_none=True))
+
+
+def configurations() -> list[tuple[str, object]]:
+    configs = [("legacy", None)]
+    # "auto" resolves to orjson only when it is installed
+    backends = ["json", "orjson"] if Serializer("compact", "auto").backend == "orjson" else ["json"]
+    for backend in backends:
+        for format in ("compact", "pretty"):
+            configs.append((f"{backend}-{format}", Serializer(format, backend)))
+    return configs
+
+
+def measure(rows: list[dict], runs: int, streamed: bool):
+    shape = "encode_rows, summary as structured content" if streamed else "rows as structured content"
+    print(f"\n{len(rows):,} rows ({shape})")
+    print(f"{'config':<16}{'encode p50':>13}{'text bytes':>14}{'wire bytes':>14}{'vs legacy':>11}"
+          f"{'text-only wire':>16}")
+    legacy_wire = None
+    for name, serializer in configurations():
+        samples = []
+        for _ in range(runs):
+            started = time.perf_counter_ns()
+            if serializer is None:
+                content, structured = legacy_result(rows)
+            else:
+                content, structured = serializer_result(serializer, rows, streamed)
+            samples.append(time.perf_counter_ns() - started)
+        text_bytes = sum(len(block.text.encode()) for block in content)
+        wire_bytes = wire_size(content, structured)
+        legacy_wire = legacy_wire or wire_bytes
+        print(f"{name:<16}{_percentile(samples, 0.5):>10.2f} ms{text_bytes:>14,}{wire_bytes:>14,}"
+              f"{wire_bytes / legacy_wire:>10.0%}{wire_size(content, None):>16,}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tool response serializers")
+    parser.add_argument("--rows", type=int, default=100_000, help="Rows in the large result")
+    parser.add_argument("--small-rows", type=int, default=10, help="Rows in the small result")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--db", help="Existing fixture database (skips generation)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = args.db
+        if not db:
+            db = os.path.join(tmp, "bench_calls.db")
+            write_sqlite(db, args.rows, seed=42, transcripts=False)
+        rows = asyncio.run(read_rows(db, args.rows))
+
+    measure(rows[:args.small_rows], max(args.runs, 50), streamed=False)
+    measure(rows, args.runs, streamed=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the slot-search index
+
+Builds an index for a large practice from generated scheduling rows (no
+database needed) and measures next-free-slot searches from random times and
+booking latency. Searches should stay in the microsecond range because they
+work on per-day bitsets rather than appointment rows.
+
+Usage:
+    python bench_slot_index.py
+    python bench_slot_index.py --staff 500 --days 90 --queries 5000
+"""
+
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from generate_call_log_fixtures import generate_scheduling_rows
+from slot_index import SLOT_MINUTES, SlotIndex
+
+
+def _percentile(samples_ns: list, q: float) -> float:
+    ordered = sorted(samples_ns)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)] / 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark slot searches and bookings")
+    parser.add_argument("--staff", type=int, default=500)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--queries", type=int, default=5000, help="Searches per service length")
+    parser.add_argument("--utilization", type=float, default=0.6, help="Share of open hours already booked")
+    args = parser.parse_args()
+
+    start_date = date(2024, 1, 15)
+    rows = generate_scheduling_rows("bench", args.staff, start_date, args.days, utilization=args.utilization)
+    print(f"{args.staff} staff, {args.days} days, {len(rows['appointments'])} appointments")
+
+    started = time.perf_counter()
+    index = SlotIndex.build(
+        start_date, args.days, rows["staff_members"], rows["office_hours"], rows["business_holidays"],
+        rows["staff_availability"], rows["appointments"], rows["appointment_types"],
+    )
+    print(f"build:           {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    rng = random.Random(3)
+    horizon_minutes = args.days * 24 * 60
+    origin = datetime.combine(start_date, datetime.min.time())
+    for minutes in (30, 60):
+        slots, _ = index.slots_for(minutes=minutes)
+        latencies = []
+        for _ in range(args.queries):
+            after = origin + timedelta(minutes=rng.randrange(horizon_minutes))
+            query_started = time.perf_counter_ns()
+            index.next_free_slots(slots, after, count=5)
+            latencies.append(time.perf_counter_ns() - query_started)
+        print(f"search {minutes:>2} min:   p50 {_percentile(latencies, 0.5):.1f} us, "
+              f"p99 {_percentile(latencies, 0.99):.1f} us")
+
+    slots, _ = index.slots_for(minutes=30)
+    latencies = []
+    booked = 0
+    for _ in range(args.queries):
+        after = origin + timedelta(minutes=rng.randrange(horizon_minutes) // SLOT_MINUTES * SLOT_MINUTES)
+        book_started = time.perf_counter_ns()
+        found = index.next_free_slots(slots, after, count=1)
+        if found and index.book(found[0].staff_id, found[0].start, slots):
+            booked += 1
+        latencies.append(time.perf_counter_ns() - book_started)
+    print(f"search+book:     p50 {_percentile(latencies, 0.5):.1f} us, "
+          f"p99 {_percentile(latencies, 0.99):.1f} us ({booked} booked)")
+
+
+if __name__ == "__main__":
+    main()
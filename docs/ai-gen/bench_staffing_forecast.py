@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark the vectorized Erlang C staffing forecast
+
+Builds a synthetic weekly profile (672 15-minute intervals, busy weekday
+mornings and afternoons, quiet nights, --peak calls in the busiest interval)
+and forecasts --scenarios service level scenarios (targets x answer times x
+volume growth), reporting wall time per full forecast. For comparison it
+also times a per-interval, per-scenario Python loop (Erlang B recursion, then
+a linear search for the agents) on a few scenarios and scales that up.
+
+Usage:
+    python bench_staffing_forecast.py
+    python bench_staffing_forecast.py --peak 2000 --scenarios 400
+"""
+
+import argparse
+import itertools
+import math
+import time
+
+import numpy as np
+
+from staffing_forecast import WEEK_INTERVALS, Scenario, forecast
+
+
+def _percentile(samples: list, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)] * 1000
+
+
+def weekly_profile(peak: float, seed: int = 7) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    hours = (np.arange(WEEK_INTERVALS) % 96) / 4
+    days = np.arange(WEEK_INTERVALS) // 96
+    shape = np.exp(-((hours - 10.5) ** 2) / 6) + 0.8 * np.exp(-((hours - 15) ** 2) / 5) + 0.03
+    shape *= np.where(days < 5, 1.0, np.where(days == 5, 0.45, 0.15))
+    arrivals = peak * shape / shape.max() * rng.uniform(0.9, 1.1, WEEK_INTERVALS)
+    handle = rng.uniform(150, 330, WEEK_INTERVALS)
+    return arrivals, handle
+
+
+def make_scenarios(count: int) -> list:
+    grid = itertools.product((0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 0.98), (10, 15, 20, 30, 60), (1.0, 1.1, 1.25))
+    return [Scenario(level, seconds, growth) for level, seconds, growth in itertools.islice(itertools.cycle(grid), count)]
+
+
+def looped(arrivals, handle, scenarios, patience=120.0):
+    """One Python loop per interval and scenario, the way the forecast was first sketched"""
+    agents = []
+    for scenario in scenarios:
+        row = []
+        for calls, seconds in zip(arrivals, handle):
+            traffic = calls * scenario.growth * seconds / 900
+            n, blocking = 0, 1.0
+            while True:
+                n += 1
+                blocking = traffic * blocking / (n + traffic * blocking)
+                if n <= traffic:
+                    continue
+                wait = n * blocking / (n - traffic * (1 - blocking))
+                if 1 - wait * math.exp(-(n - traffic) * scenario.answer_seconds / seconds) >= scenario.service_level:
+                    break
+            row.append(n if traffic > 0 else 0)
+        agents.append(row)
+    return np.array(agents)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Erlang C staffing forecast")
+    parser.add_argument("--peak", type=float, default=400, help="Calls in the busiest 15 minutes")
+    parser.add_argument("--scenarios", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--loop-scenarios", type=int, default=3, help="Scenarios timed with the Python loop")
+    args = parser.parse_args()
+
+    arrivals, handle = weekly_profile(args.peak)
+    scenarios = make_scenarios(args.scenarios)
+    traffic = arrivals * handle / 900
+    print(f"{WEEK_INTERVALS} intervals x {len(scenarios)} scenarios, peak {traffic.max():.0f} Erlangs")
+
+    forecast(arrivals, handle, scenarios)
+    samples = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        result = forecast(arrivals, handle, scenarios)
+        samples.append(time.perf_counter() - started)
+    print(f"vectorized:      p50 {_percentile(samples, 0.5):.1f} ms, max {max(samples) * 1000:.1f} ms, "
+          f"peak agents {result['agents'].max()}")
+
+    sample = scenarios[:args.loop_scenarios]
+    started = time.perf_counter()
+    agents = looped(arrivals, handle, sample)
+    elapsed = time.perf_counter() - started
+    assert (agents == result["agents"][:len(sample)]).all(), "loop and vectorized forecasts disagree"
+    print(f"python loop:     {elapsed / len(sample) * 1000:.1f} ms per scenario, "
+          f"~{elapsed / len(sample) * len(scenarios) * 1000:.0f} ms for all {len(scenarios)} (same agents)")
+
+
+if __name__ == "__main__":
+    main()
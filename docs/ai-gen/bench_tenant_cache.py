@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Benchmark tenant-aware caching and routing under a skewed (Zipf) tenant load
+
+Requests pick a tenant with Zipf(--skew) popularity, then one of that
+tenant's --keys cached items (customer histories, say) with Zipf
+popularity inside the tenant; the busiest tenant instead reads uniformly
+over --hot-keys items, more than the whole cache holds. A miss costs
+--miss-us of CPU to rebuild the item, standing in for the database queries
+and assembly.
+
+1. One process, same memory: a single shared LRU vs. TenantCache. Reports
+   the hit rate overall and for the long tail (every tenant but the 5
+   busiest), which is what the hot tenant flushes out of a shared cache.
+2. --workers processes, each with 1/N of the memory: sessions routed
+   round-robin vs. by consistent hash of the tenant. Reports hit rate and
+   requests/s across all workers.
+
+Usage:
+    python bench_tenant_cache.py
+    python bench_tenant_cache.py --tenants 500 --requests 1000000 --workers 4 --skew 1.2
+"""
+
+import argparse
+import multiprocessing
+import random
+import time
+from collections import OrderedDict
+
+from tenant_cache import ConsistentHashRing, TenantCache
+
+
+ITEM_BYTES = 2048
+
+
+class SharedLRU:
+    """One LRU for every tenant, the layout TenantCache replaces"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, tenant, key):
+        value = self._data.get((tenant, key))
+        if value is not None:
+            self._data.move_to_end((tenant, key))
+        return value
+
+    def set(self, tenant, key, value, size):
+        self._data[tenant, key] = value
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            self._data.popitem(last=False)
+            self.bytes -= ITEM_BYTES
+
+
+def zipf_choices(rng: random.Random, n: int, skew: float, k: int) -> list[int]:
+    weights = [1 / (rank + 1) ** skew for rank in range(n)]
+    return rng.choices(range(n), weights=weights, k=k)
+
+
+def workload(tenants: int, keys: int, hot_keys: int, requests: int, skew: float,
+             seed: int = 7) -> list[tuple[int, int]]:
+    """(tenant, key) pairs; tenant 0, the busiest, spreads over `hot_keys` keys"""
+    rng = random.Random(seed)
+    pairs = list(zip(zipf_choices(rng, tenants, skew, requests), zipf_choices(rng, keys, 1.0, requests)))
+    return [(tenant, rng.randrange(hot_keys) if tenant == 0 else key) for tenant, key in pairs]
+
+
+def build(miss_ns: int) -> bytes:
+    deadline = time.perf_counter_ns() + miss_ns
+    while time.perf_counter_ns() < deadline:
+        pass
+    return b"x"
+
+
+def run(cache, requests: list, miss_ns: int) -> dict:
+    hits = tail_hits = tail = 0
+    started = time.perf_counter()
+    for tenant, key in requests:
+        found = cache.get(tenant, key) is not None
+        if not found:
+            cache.set(tenant, key, build(miss_ns), ITEM_BYTES)
+        hits += found
+        if tenant >= 5:
+            tail += 1
+            tail_hits += found
+    return {"requests": len(requests), "hits": hits, "tail": tail, "tail_hits": tail_hits,
+            "seconds": time.perf_counter() - started}
+
+
+def _worker(job: tuple) -> dict:
+    kind, max_bytes, tenant_bytes, requests, miss_ns = job
+    cache = SharedLRU(max_bytes) if kind == "shared" else TenantCache(max_bytes, tenant_bytes)
+    return run(cache, requests, miss_ns)
+
+
+def report(label: str, results: list[dict], wall: float):
+    requests = sum(r["requests"] for r in results)
+    hits = sum(r["hits"] for r in results)
+    tail = sum(r["tail"] for r in results)
+    tail_hits = sum(r["tail_hits"] for r in results)
+    print(f"{label:<28}{hits / requests:>9.1%}{tail_hits / max(tail, 1):>12.1%}{requests / wall:>14,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tenant-partitioned caches under Zipf tenant load")
+    parser.add_argument("--tenants", type=int, default=500)
+    parser.add_argument("--keys", type=int, default=1000, help="Cacheable items per tenant")
+    parser.add_argument("--hot-keys", type=int, default=200_000,
+                        help="Items of the busiest tenant, read uniformly (a large business, or a backfill)")
+    parser.add_argument("--requests", type=int, default=1_000_000)
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of tenant popularity")
+    parser.add_argument("--cache-mb", type=float, default=64, help="Cache memory in total (split across workers)")
+    parser.add_argument("--tenant-mb", type=float, default=4, help="TenantCache quota per tenant")
+    parser.add_argument("--miss-us", type=float, default=100, help="CPU cost of rebuilding a missed item")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    max_bytes = int(args.cache_mb * 1024 * 1024)
+    tenant_bytes = int(args.tenant_mb * 1024 * 1024)
+    miss_ns = int(args.miss_us * 1000)
+    requests = workload(args.tenants, args.keys, args.hot_keys, args.requests, args.skew)
+    busiest = sum(tenant < 5 for tenant, _ in requests) / len(requests)
+    print(f"{args.requests:,} requests over {args.tenants} tenants (Zipf {args.skew}); "
+          f"the 5 busiest send {busiest:.0%}")
+    print(f"\n{'':<28}{'hit rate':>9}{'tail hits':>12}{'requests/s':>14}")
+
+    for kind in ("shared", "tenant"):
+        started = time.perf_counter()
+        result = _worker((kind, max_bytes, tenant_bytes, requests, miss_ns))
+        report(f"1 process, {'shared LRU' if kind == 'shared' else 'TenantCache'}", [result],
+               time.perf_counter() - started)
+
+    ring = ConsistentHashRing(range(args.workers))
+    owner = {tenant: ring.node_for(str(tenant)) for tenant in range(args.tenants)}
+    routes = {
+        "round-robin": lambda index, tenant: index % args.workers,
+        "consistent hash": lambda index, tenant: owner[tenant],
+    }
+    with multiprocessing.get_context("fork").Pool(args.workers) as pool:
+        for label, route in routes.items():
+            shards = [[] for _ in range(args.workers)]
+            for index, (tenant, key) in enumerate(requests):
+                shards[route(index, tenant)].append((tenant, key))
+            jobs = [("tenant", max_bytes // args.workers, tenant_bytes, shard, miss_ns) for shard in shards]
+            started = time.perf_counter()
+            results = pool.map(_worker, jobs)
+            report(f"{args.workers} workers, {label}", results, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Benchmark ticket assignment: heap-based AssignmentEngine vs. linear scans
+
+Loads --agents agents (1-3 of --skills skills each, capacity 5) and
+--tickets open tickets (random priority, most needing a skill), so most
+tickets wait in the queue. Then measures, per engine:
+
+    submit      creating a ticket while every agent is full (queued)
+    resolve     closing an assigned ticket; its agent takes the next one
+    status      an agent going on break and coming back (drains its share)
+
+The linear baseline scans every agent for the least loaded match and every
+waiting ticket for the most urgent one, the way a SQL "ORDER BY ... LIMIT 1"
+without the right index would; it runs --baseline-ops operations only.
+
+Usage:
+    python bench_ticket_assignment.py
+    python bench_ticket_assignment.py --tickets 100000 --agents 2000 --ops 50000
+"""
+
+import argparse
+import random
+import time
+
+from ticket_queue import PRIORITIES, PRIORITY_RANK, AssignmentEngine, uuid7
+
+
+class LinearEngine:
+    """Same decisions as AssignmentEngine, made by scanning lists"""
+
+    def __init__(self):
+        self.agents: dict = {}
+        self.tickets: dict = {}
+        self._arrivals = 0
+
+    def set_agent(self, agent_id, status, skills=None, max_tickets=5):
+        agent = self.agents.setdefault(agent_id, {"skills": set(), "tickets": set(), "max": 5, "status": status})
+        agent["status"] = status
+        if skills is not None:
+            agent["skills"] = set(skills) | {"general"}
+        agent["max"] = max_tickets if max_tickets is not None else agent["max"]
+        return self._fill(agent_id)
+
+    def submit(self, ticket_id, priority="medium", skill=None):
+        self._arrivals += 1
+        ticket = self.tickets[ticket_id] = {"priority": PRIORITY_RANK[priority], "skill": skill or "general",
+                                            "arrival": self._arrivals, "agent": None}
+        candidates = [(len(a["tickets"]), agent_id) for agent_id, a in self.agents.items()
+                      if a["status"] == "available" and len(a["tickets"]) < a["max"] and ticket["skill"] in a["skills"]]
+        if candidates:
+            agent_id = min(candidates)[1]
+            ticket["agent"] = agent_id
+            self.agents[agent_id]["tickets"].add(ticket_id)
+            return agent_id
+        return None
+
+    def resolve(self, ticket_id):
+        ticket = self.tickets.pop(ticket_id)
+        if ticket["agent"] is None:
+            return []
+        self.agents[ticket["agent"]]["tickets"].discard(ticket_id)
+        return self._fill(ticket["agent"])
+
+    def _fill(self, agent_id):
+        agent = self.agents[agent_id]
+        made = []
+        while agent["status"] == "available" and len(agent["tickets"]) < agent["max"]:
+            waiting = [(t["priority"], t["arrival"], ticket_id) for ticket_id, t in self.tickets.items()
+                       if t["agent"] is None and t["skill"] in agent["skills"]]
+            if not waiting:
+                break
+            ticket_id = min(waiting)[2]
+            self.tickets[ticket_id]["agent"] = agent_id
+            agent["tickets"].add(ticket_id)
+            made.append((ticket_id, agent_id))
+        return made
+
+
+def _percentile(samples_ns: list, q: float) -> float:
+    ordered = sorted(samples_ns)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)] / 1000
+
+
+def populate(engine, args, rng: random.Random) -> list[str]:
+    """Load agents and open tickets; returns the IDs of tickets given an agent"""
+    skills = [f"skill{i}" for i in range(args.skills)]
+    for i in range(args.agents):
+        engine.set_agent(f"agent{i}", "available", rng.sample(skills, rng.randint(1, 3)), 5)
+    assigned = []
+    for _ in range(args.tickets):
+        ticket_id = str(uuid7())
+        if engine.submit(ticket_id, rng.choice(PRIORITIES), rng.choice(skills) if rng.random() < 0.7 else None):
+            assigned.append(ticket_id)
+    return assigned
+
+
+def measure(engine, assigned: list[str], ops: int, args, rng: random.Random) -> dict:
+    skills = [f"skill{i}" for i in range(args.skills)]
+    results = {}
+
+    samples = []
+    for _ in range(ops):
+        started = time.perf_counter_ns()
+        engine.submit(str(uuid7()), rng.choice(PRIORITIES), rng.choice(skills) if rng.random() < 0.7 else None)
+        samples.append(time.perf_counter_ns() - started)
+    results["submit"] = samples
+
+    samples, assignments = [], 0
+    for _ in range(ops):
+        # Resolve a random assigned ticket; the assignments it makes replace it
+        index = rng.randrange(len(assigned))
+        ticket_id = assigned[index]
+        assigned[index] = assigned[-1]
+        assigned.pop()
+        started = time.perf_counter_ns()
+        made = engine.resolve(ticket_id)
+        samples.append(time.perf_counter_ns() - started)
+        assignments += len(made)
+        assigned.extend(t for t, _ in made)
+    results["resolve"] = samples
+    results["assignments"] = assignments
+
+    samples = []
+    for _ in range(ops // 2):
+        agent_id = f"agent{rng.randrange(args.agents)}"
+        started = time.perf_counter_ns()
+        engine.set_agent(agent_id, "break")
+        engine.set_agent(agent_id, "available")
+        samples.append(time.perf_counter_ns() - started)
+    results["status"] = samples
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark skill-based ticket assignment")
+    parser.add_argument("--tickets", type=int, default=100_000, help="Open tickets loaded before measuring")
+    parser.add_argument("--agents", type=int, default=2000)
+    parser.add_argument("--skills", type=int, default=20)
+    parser.add_argument("--ops", type=int, default=50_000, help="Operations of each kind measured")
+    parser.add_argument("--baseline-ops", type=int, default=200, help="Operations for the linear baseline")
+    args = parser.parse_args()
+
+    print(f"{args.tickets:,} open tickets, {args.agents:,} agents, {args.skills} skills")
+    print(f"{'engine':<10}{'load s':>8}{'op':>9}{'ops/s':>12}{'p50 us':>10}{'p99 us':>10}{'assignments/s':>15}")
+    for name, engine, ops in (("heaps", AssignmentEngine(), args.ops), ("linear", LinearEngine(), args.baseline_ops)):
+        rng = random.Random(11)
+        started = time.perf_counter()
+        assigned = populate(engine, args, rng)
+        load = f"{time.perf_counter() - started:.1f}"
+        results = measure(engine, assigned, ops, args, rng)
+        for op in ("submit", "resolve", "status"):
+            samples = results[op]
+            seconds = sum(samples) / 1e9
+            per_second = f"{results['assignments'] / seconds:,.0f}" if op == "resolve" else ""
+            print(f"{name:<10}{load:>8}{op:>9}{len(samples) / seconds:>12,.0f}{_percentile(samples, 0.5):>10.1f}"
+                  f"{_percentile(samples, 0.99):>10.1f}{per_second:>15}")
+            name = load = ""
+
+
+if __name__ == "__main__":
+    main()
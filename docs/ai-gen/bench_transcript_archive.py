@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark transcript indexing throughput and search latency
+
+Generates synthetic transcripts (the fixture's dialogue lines plus words
+drawn from a Zipf-distributed vocabulary), indexes them into a fresh
+archive, then reopens it from disk and times keyword, multi-term, phrase and
+tenant-filtered queries.
+
+Usage:
+    python bench_transcript_archive.py
+    python bench_transcript_archive.py --calls 2000000 --words 60
+"""
+
+import argparse
+import itertools
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from generate_call_log_fixtures import TRANSCRIPT_LINES
+from transcript_archive import TranscriptArchive
+
+
+SYLLABLES = ("ka", "lo", "mi", "ne", "su", "ta", "ri", "po", "de", "va", "zu", "chi")
+
+
+def _percentile(samples_ns: list, q: float) -> float:
+    ordered = sorted(samples_ns)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)] / 1_000_000
+
+
+def vocabulary_words(size: int) -> list[str]:
+    return ["".join(p) for n in (2, 3, 4) for p in itertools.product(SYLLABLES, repeat=n)][:size]
+
+
+def generate(calls: int, words: int, vocab: list, tenants: int, seed: int):
+    rng = np.random.default_rng(seed)
+    weights = 1 / np.arange(1, len(vocab) + 1)
+    picks = rng.choice(len(vocab), size=(calls, words), p=weights / weights.sum())
+    lines = rng.integers(0, len(TRANSCRIPT_LINES), size=(calls, 2))
+    for i in range(calls):
+        yield (
+            f"call_{i:010d}",
+            f"tenant-{i % tenants}",
+            1_704_067_200_000 + i * 30_000,
+            f"{TRANSCRIPT_LINES[lines[i, 0]]}\nUser: {' '.join(vocab[w] for w in picks[i])}.\n"
+            f"{TRANSCRIPT_LINES[lines[i, 1]]}",
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the transcript archive")
+    parser.add_argument("--calls", type=int, default=1_000_000)
+    parser.add_argument("--words", type=int, default=40, help="Random words per transcript")
+    parser.add_argument("--vocabulary", type=int, default=20_000)
+    parser.add_argument("--tenants", type=int, default=20)
+    parser.add_argument("--flush-docs", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"Generating {args.calls} transcripts...")
+    vocab = vocabulary_words(args.vocabulary)
+    docs = list(generate(args.calls, args.words, vocab, args.tenants, 7))
+    text_bytes = sum(len(doc[3].encode()) for doc in docs)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = TranscriptArchive(tmp, flush_docs=args.flush_docs)
+        started = time.perf_counter()
+        for doc in docs:
+            archive.add(*doc)
+        archive.flush()
+        elapsed = time.perf_counter() - started
+        print(f"indexed:   {args.calls / elapsed:,.0f} calls/s, {text_bytes / elapsed / 1e6:.1f} MB/s "
+              f"({elapsed:.1f}s, {len(archive.segments)} segments, {archive.nbytes() / 1e6:.0f} MB on disk "
+              f"for {text_bytes / 1e6:.0f} MB of text)")
+        archive.close()
+        del docs
+
+        tracemalloc.start()
+        archive = TranscriptArchive(tmp)
+        heap = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"reopened:  {heap / 1e6:.2f} MB of heap (segments are memory-mapped)")
+
+        rng = np.random.default_rng(11)
+        common, mid, rare = vocab[:20], vocab[200:1000], vocab[5000:]
+        pick = lambda words: words[int(rng.integers(len(words)))]
+        cases = {
+            "rare keyword": lambda: pick(rare),
+            "common keyword": lambda: pick(common),
+            "two keywords": lambda: f"{pick(mid)} {pick(mid)}",
+            "keyword + common": lambda: f"{pick(rare)} {pick(common)}",
+            "phrase": lambda: '"reschedule my appointment"',
+            "phrase + keyword": lambda: f'"billing question" {pick(mid)}',
+        }
+        print(f"\n{'query':<20}{'p50':>10}{'p99':>10}{'avg candidates':>16}")
+        for label, make in cases.items():
+            for user_id in (None, "tenant-3"):
+                samples, candidates = [], 0
+                for _ in range(args.queries):
+                    query = make()
+                    started = time.perf_counter_ns()
+                    candidates += archive.search(query, 20, user_id)["candidates"]
+                    samples.append(time.perf_counter_ns() - started)
+                name = label + (" (tenant)" if user_id else "")
+                print(f"{name:<20}{_percentile(samples, 0.5):>7.2f} ms{_percentile(samples, 0.99):>7.2f} ms"
+                      f"{candidates / args.queries:>16,.0f}")
+        archive.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark warm restarts from the state snapshot and write-ahead log
+
+For each state size, writes that many ticket-like entries (log append rate),
+snapshots them (snapshot write time), then appends --tail more changes to
+the log, as a server would between snapshots. A fresh process then times
+the restart: opening the state (mapping the snapshot and replaying the
+tail), the first read, and decoding every entry, against the cold path of
+loading the same rows from the database (an SQLite table here, so the
+cold figure is a lower bound for Postgres over a network).
+
+Usage:
+    python bench_warm_state.py
+    python bench_warm_state.py --sizes 10000,100000,1000000 --tail 50000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from call_log_store import SQLiteCallLogStore
+from warm_state import SNAPSHOT_FILE, WarmState
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+def _ticket(rng: random.Random, i: int) -> dict:
+    return {"priority": rng.choice(("urgent", "high", "medium", "low")), "skill": rng.choice((None, "billing")),
+            "assigned_to": rng.choice((None, f"agent-{rng.randrange(500)}")),
+            "created_at": f"2024-03-{1 + i % 28:02d}T{i % 24:02d}:{i % 60:02d}:00+00:00"}
+
+
+def build(directory: str, db: str, size: int, tail: int) -> dict:
+    rng = random.Random(size)
+    state = WarmState(directory, snapshot_every=size + tail + 1)
+    table = state.table("tickets/bench")
+    started = time.perf_counter()
+    for i in range(size):
+        table.put(f"ticket-{i:09d}", _ticket(rng, i))
+    appended = time.perf_counter() - started
+    started = time.perf_counter()
+    state.snapshot()
+    snapshotted = time.perf_counter() - started
+    for _ in range(tail):
+        i = rng.randrange(size)
+        table.put(f"ticket-{i:09d}", _ticket(rng, i))
+    state.close(snapshot=False)
+
+    with sqlite3.connect(db) as conn:
+        conn.execute("CREATE TABLE support_tickets (id TEXT PRIMARY KEY, priority TEXT, skill TEXT, "
+                     "assigned_to TEXT, created_at TEXT)")
+        conn.executemany("INSERT INTO support_tickets VALUES (?, ?, ?, ?, ?)", (
+            (key, ticket["priority"], ticket["skill"], ticket["assigned_to"], ticket["created_at"])
+            for key, ticket in ((f"ticket-{i:09d}", _ticket(rng, i)) for i in range(size))))
+    return {"append_per_s": size / appended, "snapshot_ms": snapshotted * 1000,
+            "snapshot_mb": os.path.getsize(os.path.join(directory, SNAPSHOT_FILE)) / 1e6}
+
+
+def child(mode: str, path: str, size: int):
+    """Runs in its own process so the restart starts from nothing in memory"""
+    if mode == "warm":
+        started = time.perf_counter()
+        state = WarmState(path)
+        opened = time.perf_counter() - started
+        table = state.table("tickets/bench")
+        started = time.perf_counter()
+        assert table.get(f"ticket-{size // 2:09d}") is not None
+        first = time.perf_counter() - started
+        started = time.perf_counter()
+        tickets = dict(table.items())
+        decoded = time.perf_counter() - started
+        result = {"open_ms": opened * 1000, "replayed": state.replayed, "first_ms": first * 1000,
+                  "all_ms": (opened + first + decoded) * 1000}
+    else:
+        async def load():
+            store = SQLiteCallLogStore(path)
+            try:
+                return await store.query("SELECT id, priority, skill, assigned_to, created_at FROM support_tickets "
+                                         "ORDER BY created_at, id")
+            finally:
+                await store.close()
+
+        started = time.perf_counter()
+        tickets = {row["id"]: row for row in asyncio.run(load())}
+        result = {"all_ms": (time.perf_counter() - started) * 1000}
+    assert len(tickets) == size
+    print(json.dumps({**result, "peak_rss_mb": _peak_rss_mb()}))
+
+
+def _run_child(mode: str, path: str, size: int) -> dict:
+    output = subprocess.run([sys.executable, __file__, "--child", mode, "--path", path, "--sizes", str(size)],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark warm restarts against state size")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma-separated entry counts")
+    parser.add_argument("--tail", type=int, default=10_000, help="Log records written after the snapshot")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.path, int(args.sizes))
+        return
+    print(f"{'entries':>10}{'appends/s':>11}{'snap ms':>9}{'snap MB':>9}{'open ms':>9}{'1st read ms':>13}"
+          f"{'all ms':>8}{'RSS MB':>8}{'cold ms':>9}")
+    for size in (int(size) for size in args.sizes.split(",")):
+        with tempfile.TemporaryDirectory() as tmp:
+            directory, db = os.path.join(tmp, "state"), os.path.join(tmp, "tickets.db")
+            built = build(directory, db, size, args.tail)
+            warm = _run_child("warm", directory, size)
+            cold = _run_child("cold", db, size)
+        print(f"{size:>10,}{built['append_per_s']:>11,.0f}{built['snapshot_ms']:>9.0f}{built['snapshot_mb']:>9.1f}"
+              f"{warm['open_ms']:>9.0f}{warm['first_ms']:>13.2f}{warm['all_ms']:>8.0f}{warm['peak_rss_mb']:>8.0f}"
+              f"{cold['all_ms']:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark the Retell webhook ingest worker
+
+Spools call_started / call_ended / call_analyzed events for synthetic calls,
+then drains the spool into a fixture database and reports events/sec and peak
+RSS. Memory should stay flat as the event count grows, since the worker holds
+at most one batch.
+
+Usage:
+    python bench_webhook_ingest.py
+    python bench_webhook_ingest.py --calls 100000 --batch-size 5000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+from call_log_store import SQLiteCallLogStore
+from generate_call_log_fixtures import AGENTS, write_sqlite
+from webhook_ingest import IngestWorker, SpoolWriter
+
+
+def spool_events(spool_dir: str, calls: int, seed: int = 9) -> int:
+    rng = random.Random(seed)
+    writer = SpoolWriter(spool_dir, max_events=5000, max_seconds=60)
+    start_ms = 1_705_363_200_000
+    events = 0
+    for i in range(calls):
+        agent_id, agent_name = AGENTS[i % len(AGENTS)]
+        start = start_ms + i * 2000
+        duration = rng.randint(15_000, 900_000)
+        call = {"call_id": f"live_{i:09d}", "agent_id": agent_id, "call_type": "phone_call",
+                "from_number": f"+1-555-{rng.randint(100, 999)}-{rng.randint(0, 9999):04d}",
+                "to_number": "+18003368251", "direction": "inbound", "start_timestamp": start}
+        writer.write({"event": "call_started", "call": call})
+        writer.write({"event": "call_ended", "call": {
+            **call, "end_timestamp": start + duration, "duration_ms": duration,
+            "disconnection_reason": "user_hangup"}})
+        writer.write({"event": "call_analyzed", "call": {
+            **call, "agent_name": agent_name, "end_timestamp": start + duration, "duration_ms": duration,
+            "transcript": "Agent: Thank you for calling.", "call_analysis": {"user_sentiment": "Positive"},
+            "call_cost": {"combined_cost": round(duration / 60000 * 7.5, 2)}}})
+        events += 3
+    writer.close()
+    return events
+
+
+def peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+async def drain(db: str, spool_dir: str, batch_size: int) -> IngestWorker:
+    store = SQLiteCallLogStore(db)
+    worker = IngestWorker(store, spool_dir, batch_size=batch_size)
+    await worker.run_once()
+    await store.close()
+    return worker
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark webhook event ingest")
+    parser.add_argument("--calls", type=int, default=30_000, help="Calls to spool (3 events each)")
+    parser.add_argument("--batch-size", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "ingest.db")
+        spool_dir = os.path.join(tmp, "spool")
+        write_sqlite(db, 1000, 42, transcripts=False, staff=0)
+        started = time.perf_counter()
+        events = spool_events(spool_dir, args.calls)
+        print(f"spooled:   {events} events in {time.perf_counter() - started:.2f}s")
+
+        rss_before = peak_rss_mb()
+        started = time.perf_counter()
+        worker = asyncio.run(drain(db, spool_dir, args.batch_size))
+        elapsed = time.perf_counter() - started
+        print(f"ingested:  {worker.events} events ({worker.rejected} rejected) in {elapsed:.2f}s")
+        print(f"events/s:  {worker.events / elapsed:.0f}")
+        print(f"peak RSS:  {peak_rss_mb():.1f} MiB (before drain {rss_before:.1f} MiB)")
+
+
+if __name__ == "__main__":
+    main()
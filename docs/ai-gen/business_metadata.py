@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Business metadata snapshots for voice agents (`call-center://business/{id}`)
+
+Python counterpart of the dashboard's metadata aggregator
+(src/lib/metadata/aggregator.ts): practice name and contact details, team,
+services, opening hours and accepted insurance for one business owner
+(`{id}` is the owner's user_id, the tenant key every tool uses).
+
+The snapshot is split into sections, each cached on its own with a content
+hash (BLAKE2b of its canonical JSON); the snapshot's etag hashes the section
+hashes. Source tables bump a per-business counter in
+`business_metadata_versions` from triggers (SQLite fixtures and
+docs/sql/create-call-center-ops-tables.sql), and a read rebuilds only the
+sections fed by a table whose counter moved, checking at most once per
+`poll_interval`. If the counters cannot be read, sections fall back to their
+TTL and the query is retried after a backoff (`retry_interval`, doubling up
+to MAX_RETRY_INTERVAL). Readers pass back what they already hold:
+
+    ?if_none_match=<etag>        {"etag", "not_modified": true} if unchanged
+    ?known=hours:<hash>,...      unchanged sections come back without data
+    ?sections=profile,hours      only these sections
+"""
+
+import hashlib
+import json
+import sys
+import time
+from typing import Optional
+from urllib.parse import parse_qs
+
+from tenant_cache import TenantCache
+
+
+BUSINESS_URI_PREFIX = "call-center://business/"
+BUSINESS_URI_TEMPLATE = BUSINESS_URI_PREFIX + "{id}"
+SECTIONS = ("profile", "team", "services", "hours", "insurance")
+# Source table -> sections built from it
+TABLE_SECTIONS = {
+    "business_profiles": ("profile", "hours", "insurance"),
+    "staff_members": ("team",),
+    "business_services": ("services",),
+    "appointment_types": ("services",),
+    "office_hours": ("hours",),
+}
+MAX_RETRY_INTERVAL = 300.0
+DAY_NAMES = ("Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday")
+DEFAULT_HOURS = [f"{day}: Closed" if day in ("Sunday", "Saturday") else f"{day}: 9:00 AM to 5:00 PM"
+                 for day in DAY_NAMES]
+
+
+def content_hash(value) -> str:
+    """Short, stable hash of a JSON-compatible value"""
+    text = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str, ensure_ascii=False)
+    return hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+
+
+def snapshot_etag(hashes: dict) -> str:
+    return content_hash(sorted(hashes.items()))
+
+
+def _format_time(value) -> str:
+    try:
+        hours, minutes = (int(part) for part in str(value).split(":")[:2])
+    except ValueError:
+        return str(value)
+    return f"{hours % 12 or 12}:{minutes:02d} {'PM' if hours >= 12 else 'AM'}"
+
+
+def _json_field(value):
+    """JSON columns arrive parsed from Postgres and as text from SQLite"""
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return None
+    return value
+
+
+def format_hours(office_hours: list[dict], business_hours=None) -> list[str]:
+    """One line per day, from office_hours, else business_profiles.business_hours, else 9-5 weekdays"""
+    if office_hours:
+        by_day = {row["day_of_week"]: row for row in office_hours}
+        lines = []
+        for index, day in enumerate(DAY_NAMES):
+            row = by_day.get(index)
+            if row is None or not row.get("is_active", True):
+                lines.append(f"{day}: Closed")
+            else:
+                lines.append(f"{day}: {_format_time(row['start_time'])} to {_format_time(row['end_time'])}")
+        return lines
+    business_hours = _json_field(business_hours)
+    if isinstance(business_hours, dict):
+        lines = []
+        for day in DAY_NAMES[1:] + DAY_NAMES[:1]:
+            entry = business_hours.get(day.lower()) or {}
+            lines.append(f"{day}: {_format_time(entry['start'])} to {_format_time(entry['end'])}"
+                         if entry.get("open") else f"{day}: Closed")
+        return lines
+    return list(DEFAULT_HOURS)
+
+
+class BusinessMetadataService:
+    """Per-section cached business metadata, refreshed by table change counters"""
+
+    def __init__(self, store, cache: Optional[TenantCache] = None, poll_interval: float = 1.0,
+                 ttl: float = 3600.0, clock=time.monotonic, retry_interval: float = 5.0):
+        self.store = store
+        self.cache = cache if cache is not None else TenantCache(64 * 1024 * 1024, 1024 * 1024, ttl, clock)
+        self.poll_interval = poll_interval
+        self._clock = clock
+        # user_id -> (checked_at, {table: version})
+        self._versions: dict = {}
+        self.retry_interval = retry_interval
+        # Current backoff while the counters are unreadable (0 when they are), and when to try again
+        self._versions_backoff = 0.0
+        self._versions_retry_at = 0.0
+        self.builds = 0
+
+    async def sections(self, user_id: str, names=SECTIONS) -> dict:
+        """{section: (hash, data)} for the requested sections, rebuilding stale ones"""
+        versions = await self._table_versions(user_id)
+        result = {}
+        for name in names:
+            sources = tuple(versions.get(table, 0) for table, feeds in TABLE_SECTIONS.items() if name in feeds)
+            entry = self.cache.get(user_id, name)
+            if entry is None or entry[0] != sources:
+                data = await self._build(user_id, name)
+                entry = (sources, content_hash(data), data)
+                self.cache.set(user_id, name, entry)
+                self.builds += 1
+            result[name] = entry[1:]
+        return result
+
+    async def read(self, user_id: str, query: str = "") -> dict:
+        """Snapshot document for a resource read, honouring the conditional parameters"""
+        params = parse_qs(query)
+        names = SECTIONS
+        if "sections" in params:
+            names = tuple(name for value in params["sections"] for name in value.split(",") if name)
+            unknown = sorted(set(names) - set(SECTIONS))
+            if unknown:
+                raise ValueError(f"Unknown sections: {', '.join(unknown)} (available: {', '.join(SECTIONS)})")
+        known = {}
+        for value in params.get("known", []):
+            for pair in value.split(","):
+                name, _, digest = pair.partition(":")
+                known[name] = digest
+
+        sections = await self.sections(user_id, names)
+        etag = snapshot_etag({name: digest for name, (digest, _) in sections.items()})
+        document = {"business_id": user_id, "etag": etag}
+        if params.get("if_none_match", [None])[0] == etag:
+            document["not_modified"] = True
+            return document
+        document["sections"] = {
+            name: {"hash": digest, "not_modified": True} if known.get(name) == digest
+            else {"hash": digest, "data": data}
+            for name, (digest, data) in sections.items()
+        }
+        return document
+
+    def invalidate(self, user_id: str, table: Optional[str] = None):
+        """Drop cached sections after a write this process made itself (all of them without a table)"""
+        for name in TABLE_SECTIONS.get(table, SECTIONS) if table else SECTIONS:
+            self.cache.invalidate(user_id, name)
+
+    async def _table_versions(self, user_id: str) -> dict:
+        now = self._clock()
+        checked = self._versions.get(user_id)
+        if checked is not None and now - checked[0] < self.poll_interval:
+            return checked[1]
+        # Until the counters can be read again, keep the last ones seen
+        versions = checked[1] if checked is not None else {}
+        if now >= self._versions_retry_at:
+            try:
+                rows = await self.store.query(
+                    "SELECT source_table, version FROM business_metadata_versions WHERE user_id = ?", (user_id,))
+            except Exception as e:
+                # Without the change counters, sections only refresh when their TTL runs out
+                if not self._versions_backoff:
+                    print(f"business_metadata_versions unavailable, relying on TTL: {e!r}", file=sys.stderr)
+                self._versions_backoff = min(max(self._versions_backoff * 2, self.retry_interval),
+                                             MAX_RETRY_INTERVAL)
+                self._versions_retry_at = now + self._versions_backoff
+            else:
+                versions = {row["source_table"]: row["version"] for row in rows}
+                if self._versions_backoff:
+                    print("business_metadata_versions available again", file=sys.stderr)
+                    self._versions_backoff = 0.0
+        self._versions[user_id] = (now, versions)
+        return versions
+
+    async def _profile_row(self, user_id: str) -> dict:
+        rows = await self.store.query(
+            "SELECT * FROM business_profiles WHERE user_id = ? AND is_active = ? LIMIT 1", (user_id, True))
+        return rows[0] if rows else {}
+
+    async def _build(self, user_id: str, name: str):
+        if name == "profile":
+            profile = await self._profile_row(user_id)
+            return {
+                "practice_name": profile.get("business_name") or "Our Practice",
+                "location": profile.get("business_address") or "",
+                "phone": profile.get("business_phone") or "",
+                "email": profile.get("business_email") or "",
+            }
+        if name == "team":
+            rows = await self.store.query(
+                "SELECT * FROM staff_members WHERE user_id = ? AND is_active = ? ORDER BY last_name, first_name, id",
+                (user_id, True))
+            return [
+                {"id": row["id"], "name": f"{row['first_name']} {row['last_name']}".strip(),
+                 "title": row.get("title") or row.get("job_title")}
+                for row in rows
+            ]
+        if name == "services":
+            names = set()
+            for sql in ("SELECT service_name AS name FROM business_services WHERE user_id = ? AND is_active = ?",
+                        "SELECT name FROM appointment_types WHERE user_id = ? AND is_active = ?"):
+                names.update(row["name"] for row in await self.store.query(sql, (user_id, True)) if row["name"])
+            return sorted(names)
+        if name == "hours":
+            office_hours = await self.store.query(
+                "SELECT day_of_week, start_time, end_time, is_active FROM office_hours WHERE user_id = ?",
+                (user_id,))
+            business_hours = None if office_hours else (await self._profile_row(user_id)).get("business_hours")
+            return format_hours(office_hours, business_hours)
+        if name == "insurance":
+            accepted = _json_field((await self._profile_row(user_id)).get("insurance_accepted"))
+            return [str(plan) for plan in accepted] if isinstance(accepted, list) else []
+        raise ValueError(f"Unknown section: {name}")
+
+
+def parse_business_uri(uri: str) -> tuple[str, str]:
+    """(user_id, query) from call-center://business/{id}?..."""
+    base, _, query = uri.partition("?")
+    user_id = base[len(BUSINESS_URI_PREFIX):]
+    if not base.startswith(BUSINESS_URI_PREFIX) or not user_id or "/" in user_id:
+        raise ValueError(f"Expected {BUSINESS_URI_TEMPLATE}, got {uri}")
+    return user_id, query
+
+
+_service: Optional[BusinessMetadataService] = None
+
+
+async def get_business_metadata_service() -> BusinessMetadataService:
+    """Return the process-wide service over the shared call log store"""
+    global _service
+    if _service is None:
+        from call_log_store import get_call_log_store
+
+        store = await get_call_log_store()
+        _service = _service or BusinessMetadataService(store)
+    return _service
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+Offline enrichment of call_logs: sentiment, keywords and action items
+
+Fills `sentiment_score`, `keywords` and `action_items` (and `call_analysis`
+when Retell left it empty) for calls that have a transcript but no keywords
+yet, without calling out to a model:
+
+    sentiment     lexicon weights summed over the caller's lines (all lines
+                  when the transcript has no speaker labels), flipped and
+                  damped within three words of a negation, squashed into
+                  [-1, 1] as x / sqrt(x^2 + 15)
+    keywords      the top TF-IDF terms of each transcript, stopwords removed
+    action_items  sentences where someone commits to or asks for a
+                  follow-up ("we'll send a confirmation text")
+
+The job runs in two passes over call_logs, both streamed in keyset order and
+fanned out chunk by chunk to a process pool:
+
+    1. document frequencies over every transcript not yet counted, for IDF,
+       in (created_at, id) order so calls written late are still counted
+    2. analysis of every transcript without keywords, in (started_at, id)
+       order, written back with one bulk UPDATE per chunk
+
+Inside a worker a chunk is tokenized once into flat term/document id arrays,
+and sentiment, negation scopes and TF-IDF ranking are NumPy operations over
+those arrays. The checkpoint file (JSON, replaced atomically) holds the
+document frequencies and the (created_at, id) position they cover, saved
+once pass 1 finishes; an interrupted count starts over from the last saved
+position. Pass 2 needs no checkpoint: rows it has written have keywords, so
+the next run picks up whatever is left, however late it arrived.
+
+Usage:
+    python call_enrichment.py                          # CALL_CENTER_DB_URL, resuming from the checkpoint
+    python call_enrichment.py --workers 4 --chunk-size 2000
+    python call_enrichment.py --max-chunks 50          # stop after 50 chunks, continue next run
+    python call_enrichment.py --restart                # recount document frequencies from scratch
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import re
+import sys
+import time
+from array import array
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Optional
+
+import numpy as np
+
+from call_log_store import DEFAULT_DB_PATH, SQLiteCallLogStore
+from transcript_archive import tokenize
+
+
+DEFAULT_CHECKPOINT = os.path.join(os.path.dirname(DEFAULT_DB_PATH), "call_enrichment.checkpoint.json")
+# Bumped when the checkpoint's position changes meaning; older checkpoints are recounted
+CHECKPOINT_FORMAT = 2
+ENRICHMENT_VERSION = "lexicon-tfidf-1"
+TOP_KEYWORDS = 8
+MAX_ACTION_ITEMS = 5
+NEGATION_SCOPE = 3
+NEGATION_SCALE = -0.74
+SENTIMENT_ALPHA = 15.0
+# Labels above/below which call_analysis.user_sentiment is Positive/Negative
+SENTIMENT_THRESHOLD = 0.05
+
+# Word weights on VADER's -4..4 scale, tuned for service calls; tokens lose apostrophes ("don't" -> "dont")
+LEXICON = {
+    "appreciate": 2.0, "awesome": 3.1, "best": 3.2, "glad": 2.0, "good": 1.9, "great": 3.1,
+    "happy": 2.7, "helpful": 2.0, "love": 3.2, "lovely": 2.8, "nice": 1.8, "perfect": 2.7,
+    "pleased": 2.2, "quick": 1.0, "resolved": 1.8, "thank": 1.5, "thanks": 1.9, "wonderful": 2.7,
+    "excellent": 2.7, "fantastic": 2.6, "amazing": 2.8, "easy": 1.9, "fine": 0.8, "friendly": 2.2,
+    "convenient": 1.7, "fixed": 1.2, "welcome": 2.0, "works": 1.0, "worked": 1.0, "relieved": 1.5,
+    "angry": -2.3, "annoyed": -1.6, "annoying": -1.8, "awful": -2.0, "bad": -2.5, "broken": -1.9,
+    "cancel": -0.6, "charged": -0.6, "complaint": -1.5, "confused": -1.3, "confusing": -1.4,
+    "disappointed": -1.9, "disappointing": -2.2, "emergency": -1.6, "error": -1.7, "frustrated": -2.4,
+    "frustrating": -1.9, "furious": -2.9, "hate": -2.7, "horrible": -2.5, "hurt": -2.4, "hurts": -2.1,
+    "issue": -0.7, "late": -0.9, "mistake": -1.3, "overcharged": -2.3, "pain": -2.3, "problem": -1.7,
+    "refund": -0.8, "ridiculous": -2.1, "rude": -2.0, "sorry": -0.3, "terrible": -2.1, "unacceptable": -2.0,
+    "unhappy": -1.8, "upset": -1.6, "waiting": -0.6, "worst": -3.1, "wrong": -2.1,
+}
+NEGATIONS = frozenset((
+    "not", "no", "never", "nothing", "nobody", "neither", "nor", "without", "hardly", "dont", "doesnt",
+    "didnt", "isnt", "arent", "wasnt", "werent", "cant", "cannot", "couldnt", "wont", "wouldnt",
+    "shouldnt", "havent", "hasnt", "hadnt", "aint",
+))
+STOPWORDS = NEGATIONS | frozenset("""
+a about above after again all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further get got had
+has have having he her here hers him his how i if in into is it its itself just let lets me more
+most my myself now of off on once only or other our ours out over own same she should so some such
+than that thats the their theirs them then there theres these they this those through to too under
+until up us very was we were what whats when where which while who whom why will with would you
+your yours yourself im ive id ill youre youve youll youd weve well wed hes shes theyre theyll
+okay ok yes yeah yep uh um hmm oh hi hello hey bye goodbye please thank thanks sure right like
+know think want need going gonna one two today day time call calling help see look back really sorry
+agent user customer caller
+""".split())
+CALLER_LABELS = frozenset(("user", "customer", "caller", "patient", "client"))
+_SPEAKER = re.compile(r"\s*([A-Za-z][A-Za-z ]{0,20}?)\s*:\s*")
+_SENTENCE = re.compile(r"[^.!?\n]+[.!?]?")
+_ACTION = re.compile(
+    r"\b(?:i(?:'|’)ll|i will|we(?:'|’)ll|we will|i(?:'|’)m going to|we(?:'|’)re going to|"
+    r"please|can you|could you|would you|i need to|i(?:'|’)d like to|i want to|make sure to|"
+    r"remember to|don(?:'|’)t forget to)\s+(?:\w+\s+){0,2}?"
+    r"(?:send|call|email|text|schedule|book|reschedule|cancel|follow|confirm|forward|transfer|update|"
+    r"mail|remind|refund|fax|arrange|bring|submit|verify)\b"
+    r"|\bcall (?:you|me|them|him|her) back\b|\bfollow[- ]up\b",
+    re.IGNORECASE)
+
+
+def split_speakers(text: str):
+    """Yield (is_caller, line_text) for each transcript line, dropping "User:"-style labels"""
+    for line in text.splitlines():
+        match = _SPEAKER.match(line)
+        if match and len(line) > match.end():
+            yield match.group(1).strip().lower() in CALLER_LABELS, line[match.end():]
+        elif line.strip():
+            yield None, line
+
+
+def extract_action_items(text: str, limit: int = MAX_ACTION_ITEMS) -> list[str]:
+    """Follow-up sentences, in transcript order and without duplicates"""
+    items: dict = {}
+    for _, line in split_speakers(text):
+        for sentence in _SENTENCE.findall(line):
+            sentence = sentence.strip()
+            if sentence and _ACTION.search(sentence):
+                items.setdefault(sentence.lower(), sentence)
+                if len(items) >= limit:
+                    return list(items.values())
+    return list(items.values())
+
+
+def document_frequencies(texts: list[str]) -> Counter:
+    """Number of transcripts each keyword candidate appears in"""
+    counts: Counter = Counter()
+    for text in texts:
+        terms = set()
+        for _, line in split_speakers(text):
+            terms.update(tokenize(line))
+        counts.update(term for term in terms if _is_candidate(term))
+    return counts
+
+
+def _is_candidate(term: str) -> bool:
+    return len(term) > 2 and term not in STOPWORDS and not term.isdigit()
+
+
+def analyze(texts: list[str], df: dict, docs: int, top_k: int = TOP_KEYWORDS) -> list[tuple]:
+    """(sentiment_score, keywords, action_items) per transcript, scored against `docs` transcripts' `df`"""
+    n = len(texts)
+    vocab: dict = {}
+    term_ids, line_docs, line_callers, line_lengths = array("q"), array("q"), array("b"), array("q")
+    for doc, text in enumerate(texts):
+        for is_caller, body in split_speakers(text or ""):
+            ids = [vocab.setdefault(term, len(vocab)) for term in tokenize(body)]
+            term_ids.extend(ids)
+            line_docs.append(doc)
+            line_callers.append(bool(is_caller))
+            line_lengths.append(len(ids))
+    terms = list(vocab)
+    term_ids = np.array(term_ids, dtype=np.int64)
+    line_lengths = np.array(line_lengths, dtype=np.int64)
+    doc_ids = np.repeat(np.array(line_docs, dtype=np.int64), line_lengths)
+    line_ids = np.repeat(np.arange(len(line_lengths)), line_lengths)
+    caller = np.repeat(np.array(line_callers, dtype=np.bool_), line_lengths)
+
+    # Sentiment: a token is negated when one of the NEGATION_SCOPE tokens before it, on its line, negates
+    weights = np.array([LEXICON.get(term, 0.0) for term in terms], dtype=np.float64)[term_ids]
+    negates = np.array([term in NEGATIONS for term in terms], dtype=np.bool_)[term_ids]
+    negated = np.zeros(len(term_ids), dtype=np.bool_)
+    for shift in range(1, NEGATION_SCOPE + 1):
+        negated[shift:] |= negates[:-shift] & (line_ids[shift:] == line_ids[:-shift])
+    weights = np.where(negated, weights * NEGATION_SCALE, weights)
+    caller_tokens = np.bincount(doc_ids[caller], minlength=n)
+    raw = np.where(caller_tokens > 0,
+                   np.bincount(doc_ids[caller], weights[caller], minlength=n),
+                   np.bincount(doc_ids, weights, minlength=n))
+    sentiment = np.round(raw / np.sqrt(raw * raw + SENTIMENT_ALPHA), 3)
+
+    # Keywords: TF-IDF per (document, term) pair, ranked within each document
+    candidate = np.array([_is_candidate(term) for term in terms], dtype=np.bool_)[term_ids]
+    width = max(len(terms), 1)
+    pairs, counts = np.unique(doc_ids[candidate] * width + term_ids[candidate], return_counts=True)
+    pair_docs, pair_terms = pairs // width, pairs % width
+    idf = np.log((1.0 + docs) / (1.0 + np.array([df.get(term, 0) for term in terms], dtype=np.float64))) + 1.0
+    lengths = np.bincount(pair_docs, counts, minlength=n)
+    scores = counts / lengths[pair_docs] * idf[pair_terms]
+    # Highest score first within a document; ties go to the alphabetically first term
+    alphabetical = np.argsort(np.argsort(np.array(terms, dtype=object))) if terms else np.zeros(0, dtype=np.int64)
+    order = np.lexsort((alphabetical[pair_terms], -scores, pair_docs))
+    ranked_docs = pair_docs[order]
+    rank = np.arange(len(order)) - np.searchsorted(ranked_docs, ranked_docs)
+    keep = order[rank < top_k]
+    keywords: list[list] = [[] for _ in range(n)]
+    for doc, term in zip(pair_docs[keep].tolist(), pair_terms[keep].tolist()):
+        keywords[doc].append(terms[term])
+
+    return [(float(sentiment[doc]), keywords[doc], extract_action_items(text or ""))
+            for doc, text in enumerate(texts)]
+
+
+def sentiment_label(score: float) -> str:
+    if score >= SENTIMENT_THRESHOLD:
+        return "Positive"
+    if score <= -SENTIMENT_THRESHOLD:
+        return "Negative"
+    return "Neutral"
+
+
+# Worker state, set once per pool process by the initializer instead of shipping the DF table per chunk
+_worker_df: dict = {}
+_worker_docs = 0
+_worker_top_k = TOP_KEYWORDS
+
+
+def _init_worker(df: dict, docs: int, top_k: int):
+    global _worker_df, _worker_docs, _worker_top_k
+    _worker_df, _worker_docs, _worker_top_k = df, docs, top_k
+
+
+def _analyze_chunk(texts: list[str]) -> list[tuple]:
+    return analyze(texts, _worker_df, _worker_docs, _worker_top_k)
+
+
+class Checkpoint:
+    """Document frequencies and the (created_at, id) position they cover, saved as JSON by write-and-rename"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.df_after: Optional[list] = None
+        self.docs = 0
+        self.df: dict = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("format") == CHECKPOINT_FORMAT:
+                self.df_after, self.docs = state.get("df_after"), state.get("docs", 0)
+                self.df = state.get("df", {})
+
+    def save(self):
+        state = {"format": CHECKPOINT_FORMAT, "version": ENRICHMENT_VERSION, "df_after": self.df_after,
+                 "docs": self.docs, "df": self.df}
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+async def _chunks(store, key: str, where: str, after: Optional[list], chunk_size: int):
+    """Yield call_logs rows matching `where` in (`key`, id) order, `chunk_size` at a time"""
+    select = (f"SELECT id, {key}, transcript FROM call_logs WHERE transcript IS NOT NULL "
+              f"AND {key} IS NOT NULL{where}")
+    order = f" ORDER BY {key}, id LIMIT {int(chunk_size)}"
+    while True:
+        if after is None:
+            rows = await store.query(select + order)
+        else:
+            rows = await store.query(select + f" AND ({key}, id) > (?, ?)" + order,
+                                     (datetime.fromisoformat(after[0]), after[1]))
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        after = [rows[-1][key], rows[-1]["id"]]
+
+
+def _executor(workers: int, initargs: tuple):
+    if workers <= 0:
+        return None
+    # fork shares the parent's imports; elsewhere the initializer ships the state once per process
+    method = "fork" if "fork" in multiprocessing.get_all_start_methods() else None
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context(method),
+                               initializer=_init_worker, initargs=initargs)
+
+
+async def _pipeline(store, key, where, after, chunk_size, max_chunks, workers, initargs, function, commit):
+    """Run `function` over chunks on the pool, at most 2 per worker in flight, committing in order"""
+    loop = asyncio.get_running_loop()
+    pool = _executor(workers, initargs)
+    if pool is None:
+        _init_worker(*initargs)
+    pending: deque = deque()
+    chunks = 0
+    try:
+        async for rows in _chunks(store, key, where, after, chunk_size):
+            texts = [row["transcript"] for row in rows]
+            if pool is None:
+                future = loop.create_future()
+                future.set_result(function(texts))
+            else:
+                future = loop.run_in_executor(pool, function, texts)
+            pending.append((rows, future))
+            chunks += 1
+            if len(pending) >= 2 * max(workers, 1):
+                rows, future = pending.popleft()
+                await commit(rows, await future)
+            if max_chunks is not None and chunks >= max_chunks:
+                break
+        while pending:
+            rows, future = pending.popleft()
+            await commit(rows, await future)
+    finally:
+        for _, future in pending:
+            future.cancel()
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    return chunks
+
+
+def _count_chunk(texts: list[str]) -> dict:
+    return dict(document_frequencies(texts))
+
+
+async def enrich_calls(store, checkpoint_path: str = DEFAULT_CHECKPOINT, workers: int = 0,
+                       chunk_size: int = 1000, top_k: int = TOP_KEYWORDS,
+                       max_chunks: Optional[int] = None) -> dict:
+    """Count every call not yet covered by the checkpoint, then enrich every call without keywords
+
+    `workers` is the process pool size (0 analyzes in this process). `max_chunks`
+    bounds the enrichment pass, leaving the rest for the next run; document
+    frequencies are always brought up to date first, so IDF covers every transcript.
+    Returns what this run did.
+    """
+    checkpoint = Checkpoint(checkpoint_path)
+    stats = {"counted": 0, "enriched": 0, "chunks": 0}
+    as_text = isinstance(store, SQLiteCallLogStore)
+
+    async def count(rows, frequencies):
+        for term, value in frequencies.items():
+            checkpoint.df[term] = checkpoint.df.get(term, 0) + value
+        checkpoint.docs += len(rows)
+        checkpoint.df_after = [rows[-1]["created_at"], rows[-1]["id"]]
+        stats["counted"] += len(rows)
+
+    stats["chunks"] += await _pipeline(store, "created_at", "", checkpoint.df_after, chunk_size, None, workers,
+                                       ({}, 0, top_k), _count_chunk, count)
+    if stats["counted"]:
+        checkpoint.save()
+
+    async def write(rows, results):
+        now = datetime.now(timezone.utc)
+        updates = []
+        for row, (score, keywords, actions) in zip(rows, results):
+            analysis = json.dumps({"user_sentiment": sentiment_label(score), "enrichment": ENRICHMENT_VERSION},
+                                  separators=(",", ":"))
+            # SQLite keeps the text[] columns as JSON text
+            if as_text:
+                keywords, actions = json.dumps(keywords), json.dumps(actions)
+            updates.append((score, keywords, actions, analysis, now, row["id"]))
+        await store.execute_many(
+            "UPDATE call_logs SET sentiment_score = ?, keywords = ?, action_items = ?, "
+            "call_analysis = COALESCE(call_analysis, ?), updated_at = ? WHERE id = ?", updates)
+        stats["enriched"] += len(rows)
+
+    stats["chunks"] += await _pipeline(store, "started_at", " AND keywords IS NULL", None, chunk_size, max_chunks,
+                                       workers, (checkpoint.df, checkpoint.docs, top_k), _analyze_chunk, write)
+    stats["vocabulary"] = len(checkpoint.df)
+    return stats
+
+
+async def main():
+    from call_log_store import open_call_log_store
+
+    parser = argparse.ArgumentParser(description="Enrich call_logs with sentiment, keywords and action items")
+    parser.add_argument("--db-url", help="Database URL (default: CALL_CENTER_DB_URL)")
+    parser.add_argument("--checkpoint", default=os.environ.get("CALL_CENTER_ENRICHMENT_CHECKPOINT",
+                                                               DEFAULT_CHECKPOINT))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (0: analyze in this process)")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--top-k", type=int, default=TOP_KEYWORDS, help="Keywords per call")
+    parser.add_argument("--max-chunks", type=int, help="Stop enriching after this many chunks")
+    parser.add_argument("--restart", action="store_true", help="Discard the checkpoint and recount document frequencies")
+    args = parser.parse_args()
+
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    store = await open_call_log_store(args.db_url)
+    started = time.perf_counter()
+    try:
+        stats = await enrich_calls(store, args.checkpoint, args.workers, args.chunk_size, args.top_k,
+                                   args.max_chunks)
+    finally:
+        await store.close()
+    elapsed = time.perf_counter() - started
+    print(f"Counted {stats['counted']} and enriched {stats['enriched']} transcripts in {elapsed:.2f}s "
+          f"({stats['enriched'] / elapsed if elapsed else math.inf:,.0f}/s, {args.workers} workers, "
+          f"{stats['vocabulary']:,} terms)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Streaming export of customer_call_logs for billing and BI
+
+Reads every matching call through one open cursor (CallLogStore.stream), a
+batch at a time, and writes each batch out before reading the next, so
+memory stays flat however many calls are exported:
+
+    parquet     Parquet, zstd-compressed, one row group per batch (requires pyarrow)
+    arrow       Arrow IPC file (requires pyarrow)
+    ndjson      gzip-compressed newline-delimited JSON, with no extra dependencies
+    auto        parquet when pyarrow is installed, otherwise ndjson
+
+Rows come out in start order, each carrying the call's ids, agent,
+direction, type, numbers, start and end time, `duration_ms`,
+`disconnection_reason`, the raw `call_cost` JSON and its `combined_cost`.
+In the same pass the export adds every call into per-tenant, per-agent,
+per-day (UTC) rollups (calls, total duration, total cost), written next to
+the export as `<name>.rollups.<ext>` in the same format, a day at a time as
+each day ends. Both files are written under a temporary name and renamed into
+place once complete, so readers never see a partial export.
+
+Usage:
+    python call_log_export.py calls.parquet
+    python call_log_export.py calls.ndjson.gz --format ndjson --since 2024-01-01 --user-id <uuid>
+"""
+
+import argparse
+import asyncio
+import gzip
+import importlib.util
+import json
+import os
+import re
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from call_log_store import open_call_log_store
+from serializers import Serializer
+
+
+FORMATS = ("auto", "parquet", "arrow", "ndjson")
+SUFFIXES = {"parquet": ".parquet", "arrow": ".arrow", "ndjson": ".ndjson.gz"}
+EXPORT_COLUMNS = (
+    "id", "user_id", "call_id", "agent_id", "agent_name", "agent_version", "direction", "call_type",
+    "from_number", "to_number", "start_timestamp", "end_timestamp", "duration_ms", "disconnection_reason",
+    "call_cost",
+)
+TIME_COLUMNS = ("start_timestamp", "end_timestamp")
+ROLLUP_COLUMNS = ("user_id", "agent_id", "agent_name", "day", "calls", "duration_ms", "combined_cost")
+GZIP_LEVEL = 6
+
+
+def resolve_format(format: str) -> str:
+    """The concrete format for `format`, checking pyarrow is installed when it is needed"""
+    if format not in FORMATS:
+        raise ValueError(f"Unknown export format: {format} (expected one of {', '.join(FORMATS)})")
+    if format == "ndjson":
+        return format
+    # Optional dependency, only for parquet and arrow; imported by the writers that use it
+    if importlib.util.find_spec("pyarrow") is None:
+        if format == "auto":
+            return "ndjson"
+        raise ValueError(f"{format} export requires pyarrow (pip install pyarrow); "
+                         f"use format ndjson without it")
+    return "parquet" if format == "auto" else format
+
+
+def rollup_path(path: str, format: str) -> str:
+    """calls.parquet -> calls.rollups.parquet"""
+    suffix = SUFFIXES[format]
+    base = path[:-len(suffix)] if path.endswith(suffix) else path
+    return base + ".rollups" + suffix
+
+
+# Retell's call_cost is {"product_costs": [...], ..., "combined_cost": <number>}
+COST_PATTERN = r'"combined_cost"\s*:\s*(?P<cost>-?[0-9][0-9.eE+-]*)'
+_COST = re.compile(COST_PATTERN)
+
+
+def _combined_cost(text: Optional[str]) -> Optional[float]:
+    match = _COST.search(text) if text else None
+    try:
+        return float(match.group("cost")) if match else None
+    except ValueError:
+        return None
+
+
+class _Exporter:
+    """Writes row batches to the export while adding them into rollups; write() runs off the event loop
+
+    Calls arrive in start order, so once a batch reaches a new day the
+    rollups of earlier days are final: they are written out and forgotten,
+    and only the current day's are held, however long the export spans.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        # (user_id, agent_id, day) -> [agent_name, calls, duration_ms, combined_cost], open days only
+        self.rollups: dict = {}
+        self.rollup_count = 0
+        self.combined_cost = 0.0
+        # Newest day seen so far
+        self.day: Optional[str] = None
+        self.closed = False
+
+    def _add(self, key: tuple, agent_name, calls: int, duration, cost):
+        total = self.rollups.get(key)
+        if total is None:
+            self.rollups[key] = [agent_name, calls, duration or 0, cost or 0.0]
+        else:
+            total[1] += calls
+            total[2] += duration or 0
+            total[3] += cost or 0.0
+        self.combined_cost += cost or 0.0
+
+    def _close_days(self, final: bool = False):
+        done = [key for key in self.rollups if final or (key[2] is not None and key[2] < self.day)]
+        if not done:
+            return
+        done.sort(key=lambda key: tuple("" if part is None else part for part in (key[2], key[0], key[1])))
+        columns = {name: [] for name in ROLLUP_COLUMNS}
+        for key in done:
+            agent_name, calls, duration, cost = self.rollups.pop(key)
+            for name, value in zip(ROLLUP_COLUMNS, key[:2] + (agent_name, key[2], calls, duration, round(cost, 4))):
+                columns[name].append(value)
+        self.rollup_count += len(done)
+        self._write_rollups(columns)
+
+    def finish(self):
+        """Write the last open rollups; the export is complete once close() returns"""
+        self._close_days(final=True)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._close()
+
+
+class _NdjsonExporter(_Exporter):
+    """gzip-compressed JSON lines, one row at a time in Python"""
+
+    def __init__(self, path: str, rollup_path: str):
+        super().__init__()
+        self.dumps = Serializer().dumps
+        self.loads = json.loads
+        try:
+            import orjson  # optional dependency, only used when installed
+            self.loads = orjson.loads
+        except ImportError:
+            pass
+        self.file = gzip.open(path, "wb", compresslevel=GZIP_LEVEL)
+        self.rollup_file = gzip.open(rollup_path, "wb", compresslevel=GZIP_LEVEL)
+
+    def write(self, rows: list):
+        dumps, loads, lines = self.dumps, self.loads, []
+        newest = self.day
+        for row in rows:
+            call = dict(zip(EXPORT_COLUMNS, row))
+            text = call["call_cost"]
+            cost = call["combined_cost"] = _combined_cost(text)
+            if text:
+                # call_cost as the object it is rather than a JSON string inside JSON
+                try:
+                    call["call_cost"] = loads(text)
+                except ValueError:
+                    pass
+            start = call["start_timestamp"]
+            day = start[:10] if start else None
+            if day and (newest is None or day > newest):
+                newest = day
+            self._add((call["user_id"], call["agent_id"], day), call["agent_name"], 1, call["duration_ms"], cost)
+            lines.append(dumps(call))
+        lines.append("")
+        self.file.write("\n".join(lines).encode())
+        self.rows += len(rows)
+        self.day = newest
+        self._close_days()
+
+    def _write_rollups(self, columns: dict):
+        lines = [self.dumps(dict(zip(ROLLUP_COLUMNS, row))) for row in zip(*columns.values())]
+        lines.append("")
+        self.rollup_file.write("\n".join(lines).encode())
+
+    def _close(self):
+        self.file.close()
+        self.rollup_file.close()
+
+
+class _ArrowExporter(_Exporter):
+    """Parquet or Arrow IPC; parsing, cost extraction and rollups are Arrow compute kernels"""
+
+    # Rollup rows buffered per row group / record batch
+    ROLLUP_BATCH = 65_536
+
+    def __init__(self, path: str, rollup_path: str, format: str):
+        super().__init__()
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        self.pa, self.pc, self.format = pa, pc, format
+        time_type = pa.timestamp("ms", tz="UTC")
+        types = {"agent_version": pa.int32(), "duration_ms": pa.int64(), "combined_cost": pa.float64(),
+                 "start_timestamp": time_type, "end_timestamp": time_type, "calls": pa.int64()}
+        self.schema = pa.schema([(name, types.get(name, pa.string())) for name in EXPORT_COLUMNS + ("combined_cost",)])
+        self.rollup_schema = pa.schema([(name, types.get(name, pa.string())) for name in ROLLUP_COLUMNS])
+        self.writer = self._open(path, self.schema)
+        self.rollup_writer = self._open(rollup_path, self.rollup_schema)
+        self.pending = {name: [] for name in ROLLUP_COLUMNS}
+
+    def _open(self, path: str, schema):
+        if self.format == "parquet":
+            import pyarrow.parquet as pq
+
+            return pq.ParquetWriter(path, schema, compression="zstd")
+        return self.pa.ipc.new_file(path, schema)
+
+    def write(self, rows: list):
+        pa, pc = self.pa, self.pc
+        arrays = []
+        for field, values in zip(self.schema, zip(*rows)):
+            if field.name in TIME_COLUMNS:
+                # ISO text with any offset -> UTC; microseconds are truncated to ms
+                utc = pa.array(values, pa.string()).cast(pa.timestamp("us", tz="UTC"))
+                arrays.append(utc.cast(field.type, safe=False))
+            else:
+                arrays.append(pa.array(values, field.type))
+        matches = pc.extract_regex(arrays[-1], COST_PATTERN)
+        arrays.append(pc.struct_field(matches, [0]).cast(pa.float64()))
+        batch = pa.record_batch(arrays, schema=self.schema)
+        self.writer.write_batch(batch)
+        self.rows += len(rows)
+
+        day = batch.column("start_timestamp").cast(pa.date32()).cast(pa.string())
+        table = pa.table({"user_id": batch.column("user_id"), "agent_id": batch.column("agent_id"), "day": day,
+                          "agent_name": batch.column("agent_name"), "duration_ms": batch.column("duration_ms"),
+                          "combined_cost": batch.column("combined_cost")})
+        groups = table.group_by(["user_id", "agent_id", "day"], use_threads=False).aggregate([
+            ("agent_name", "min"), ("duration_ms", "sum"), ("combined_cost", "sum"), ([], "count_all")])
+        for group in groups.to_pylist():
+            self._add((group["user_id"], group["agent_id"], group["day"]), group["agent_name_min"],
+                      group["count_all"], group["duration_ms_sum"], group["combined_cost_sum"])
+        newest = pc.max(day).as_py()
+        if newest is not None and (self.day is None or newest > self.day):
+            self.day = newest
+        self._close_days()
+
+    def _write_rollups(self, columns: dict):
+        for name, values in columns.items():
+            self.pending[name].extend(values)
+        if len(self.pending["day"]) >= self.ROLLUP_BATCH:
+            self._flush_rollups()
+
+    def _flush_rollups(self):
+        if self.pending["day"]:
+            self.rollup_writer.write_table(self.pa.table(self.pending, schema=self.rollup_schema))
+            self.pending = {name: [] for name in ROLLUP_COLUMNS}
+
+    def finish(self):
+        super().finish()
+        self._flush_rollups()
+
+    def _close(self):
+        self.writer.close()
+        self.rollup_writer.close()
+
+
+async def export_call_logs(store, path: str, format: str = "auto", user_id: Optional[str] = None,
+                           since: Optional[datetime] = None, until: Optional[datetime] = None,
+                           batch_size: int = 10_000) -> dict:
+    """Export customer_call_logs (optionally one tenant's, calls starting in [since, until)) to `path`
+
+    Returns a summary: rows, format, both paths, the export's size in bytes,
+    the number of rollups, the total cost and the elapsed seconds.
+    """
+    format = resolve_format(format)
+    where, params = ["1 = 1"], []
+    for clause, value in (("user_id = ?", user_id), ("start_timestamp >= ?", since), ("start_timestamp < ?", until)):
+        if value is not None:
+            where.append(clause)
+            params.append(value)
+    # Start order (the keyset index, read backwards) lets rollups of past days be written out early
+    sql = (f"SELECT {', '.join(EXPORT_COLUMNS)} FROM customer_call_logs WHERE {' AND '.join(where)} "
+           f"ORDER BY start_timestamp, id")
+
+    started = time.perf_counter()
+    final_rollups = rollup_path(path, format)
+    partial, rollup_partial = path + ".partial", final_rollups + ".partial"
+    try:
+        exporter = (_NdjsonExporter(partial, rollup_partial) if format == "ndjson"
+                    else _ArrowExporter(partial, rollup_partial, format))
+        try:
+            async for rows in store.stream(sql, tuple(params), batch_size):
+                # Encoding and compression hold the GIL, but not the event loop
+                await asyncio.to_thread(exporter.write, rows)
+            await asyncio.to_thread(exporter.finish)
+        finally:
+            exporter.close()
+        os.replace(partial, path)
+        os.replace(rollup_partial, final_rollups)
+    finally:
+        for leftover in (partial, rollup_partial):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+    return {
+        "rows": exporter.rows,
+        "format": format,
+        "path": path,
+        "bytes": os.path.getsize(path),
+        "rollups_path": final_rollups,
+        "rollups": exporter.rollup_count,
+        "combined_cost": round(exporter.combined_cost, 2),
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def parse_time(value: Optional[str]) -> Optional[datetime]:
+    """ISO date or timestamp as an aware datetime (UTC when no offset is given)"""
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value)
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+async def main_async(args) -> dict:
+    store = await open_call_log_store(args.db_url)
+    try:
+        return await export_call_logs(store, args.path, args.format, args.user_id,
+                                      parse_time(args.since), parse_time(args.until), args.batch_size)
+    finally:
+        await store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export customer_call_logs to Parquet, Arrow or NDJSON")
+    parser.add_argument("path", help="Output file; rollups go to <name>.rollups.<ext> next to it")
+    parser.add_argument("--format", choices=FORMATS, default="auto")
+    parser.add_argument("--since", help="Only calls starting at or after this ISO date/timestamp")
+    parser.add_argument("--until", help="Only calls starting before this ISO date/timestamp")
+    parser.add_argument("--user-id", help="Only this business's calls")
+    parser.add_argument("--db-url", help="Call log database (default: CALL_CENTER_DB_URL)")
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    args = parser.parse_args()
+    summary = asyncio.run(main_async(args))
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
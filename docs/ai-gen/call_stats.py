@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Incremental call statistics engine for get_call_stats
+
+Consumes call start/end events and keeps rolling counters, wait-time histograms
+and satisfaction averages for three windows: today, last hour and last 5 minutes.
+Every window is a ring of fixed-width buckets with running totals, so recording
+an event is O(1), expiring old buckets is amortized O(1), and reading a snapshot
+costs the same whether the day had 1k or 10M calls.
+"""
+
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+
+# Upper bounds (seconds) of the wait-time histogram buckets; the last bucket is open-ended
+WAIT_BUCKETS = (5, 10, 15, 20, 30, 45, 60, 90, 120, 180, 300, 600, float("inf"))
+
+
+_EMPTY_HISTOGRAM = (0,) * len(WAIT_BUCKETS)
+
+
+def _bucket_index(wait_seconds: float) -> int:
+    for i, bound in enumerate(WAIT_BUCKETS):
+        if wait_seconds <= bound:
+            return i
+    return len(WAIT_BUCKETS) - 1
+
+
+class _Totals:
+    """Additive counters shared by buckets and window totals"""
+
+    __slots__ = ("calls", "wait_count", "wait_sum", "sat_count", "sat_sum", "duration_sum", "histogram")
+
+    def __init__(self):
+        self.calls = 0
+        self.wait_count = 0
+        self.wait_sum = 0.0
+        self.sat_count = 0
+        self.sat_sum = 0.0
+        self.duration_sum = 0.0
+        self.histogram = [0] * len(WAIT_BUCKETS)
+
+    def add(self, wait_seconds: Optional[float], satisfaction: Optional[float], duration_seconds: Optional[float]):
+        self.calls += 1
+        if wait_seconds is not None:
+            self.wait_count += 1
+            self.wait_sum += wait_seconds
+            self.histogram[_bucket_index(wait_seconds)] += 1
+        if satisfaction is not None:
+            self.sat_count += 1
+            self.sat_sum += satisfaction
+        if duration_seconds is not None:
+            self.duration_sum += duration_seconds
+
+    def reset(self):
+        self.calls = self.wait_count = self.sat_count = 0
+        self.wait_sum = self.sat_sum = self.duration_sum = 0.0
+        self.histogram[:] = _EMPTY_HISTOGRAM
+
+    def subtract(self, other: "_Totals"):
+        self.calls -= other.calls
+        self.wait_count -= other.wait_count
+        self.wait_sum -= other.wait_sum
+        self.sat_count -= other.sat_count
+        self.sat_sum -= other.sat_sum
+        self.duration_sum -= other.duration_sum
+        hist = self.histogram
+        for i, n in enumerate(other.histogram):
+            hist[i] -= n
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket containing the q-th wait time"""
+        if not self.wait_count:
+            return None
+        target = q * self.wait_count
+        seen = 0
+        for bound, n in zip(WAIT_BUCKETS, self.histogram):
+            seen += n
+            if seen >= target:
+                return bound
+        return WAIT_BUCKETS[-1]
+
+    def summary(self) -> dict:
+        return {
+            "completed_calls": self.calls,
+            "average_wait_seconds": round(self.wait_sum / self.wait_count, 1) if self.wait_count else None,
+            "p50_wait_seconds": self.percentile(0.5),
+            "p90_wait_seconds": self.percentile(0.9),
+            "average_duration_seconds": round(self.duration_sum / self.calls, 1) if self.calls else None,
+            "satisfaction_score": round(self.sat_sum / self.sat_count, 2) if self.sat_count else None,
+            "wait_histogram": dict(zip(map(_bucket_label, WAIT_BUCKETS), self.histogram)),
+        }
+
+
+def _bucket_label(bound: float) -> str:
+    return "600s+" if bound == float("inf") else f"<={bound}s"
+
+
+class SlidingWindow:
+    """Fixed-span window made of `span // bucket_seconds` ring buckets"""
+
+    def __init__(self, span_seconds: int, bucket_seconds: int):
+        self.span = span_seconds
+        self.bucket_seconds = bucket_seconds
+        self.size = span_seconds // bucket_seconds
+        self.buckets = [_Totals() for _ in range(self.size)]
+        self.totals = _Totals()
+        self.head = None  # absolute index of the newest bucket
+
+    def _advance(self, slot: int):
+        if self.head is None:
+            self.head = slot
+            return
+        if slot <= self.head:
+            return
+        # Each bucket is cleared at most once per lap, so this is amortized O(1)
+        for expired in range(self.head + 1, min(slot, self.head + self.size) + 1):
+            bucket = self.buckets[expired % self.size]
+            if bucket.calls:
+                self.totals.subtract(bucket)
+                bucket.reset()
+        self.head = slot
+
+    def add(self, ts: float, wait_seconds, satisfaction, duration_seconds):
+        slot = int(ts // self.bucket_seconds)
+        self._advance(slot)
+        if slot <= self.head - self.size:
+            return  # older than the window
+        self.buckets[slot % self.size].add(wait_seconds, satisfaction, duration_seconds)
+        self.totals.add(wait_seconds, satisfaction, duration_seconds)
+
+    def read(self, now: float) -> _Totals:
+        self._advance(int(now // self.bucket_seconds))
+        return self.totals
+
+
+class DayWindow:
+    """Calendar-day counters that reset at local midnight"""
+
+    def __init__(self, utc_offset_minutes: int = 0):
+        self.tz = timezone(timedelta(minutes=utc_offset_minutes))
+        self.day_start = float("-inf")
+        self.day_end = float("-inf")
+        self.totals = _Totals()
+
+    def _roll(self, ts: float):
+        if ts < self.day_end:
+            return
+        midnight = datetime.fromtimestamp(ts, self.tz).replace(hour=0, minute=0, second=0, microsecond=0)
+        self.day_start = midnight.timestamp()
+        self.day_end = (midnight + timedelta(days=1)).timestamp()
+        self.totals = _Totals()
+
+    def add(self, ts: float, wait_seconds, satisfaction, duration_seconds):
+        self._roll(ts)
+        if ts >= self.day_start:
+            self.totals.add(wait_seconds, satisfaction, duration_seconds)
+
+    def read(self, now: float) -> _Totals:
+        self._roll(now)
+        return self.totals
+
+
+class CallStatsEngine:
+    """Rolling call center statistics fed by call start/end events"""
+
+    def __init__(self, utc_offset_minutes: int = 0):
+        self.today = DayWindow(utc_offset_minutes)
+        self.last_hour = SlidingWindow(3600, 60)
+        self.last_5_min = SlidingWindow(300, 5)
+        self._windows = (self.today, self.last_hour, self.last_5_min)
+        self.active_calls: dict[str, tuple[float, Optional[str]]] = {}
+        self.queued_calls: set[str] = set()
+        self.busy_agents: dict[str, int] = {}
+        # Calls ended by live events while a backfill runs, so it does not count them again
+        self._live_ends: Optional[set[str]] = None
+
+    def record_start(self, call_id: str, ts: Optional[float] = None, agent_id: Optional[str] = None,
+                     queued: bool = False):
+        """A call was received; `queued` means it is waiting for an agent"""
+        ts = time.time() if ts is None else ts
+        if call_id in self.active_calls:
+            return
+        self.active_calls[call_id] = (ts, agent_id)
+        if queued:
+            self.queued_calls.add(call_id)
+        elif agent_id:
+            self.busy_agents[agent_id] = self.busy_agents.get(agent_id, 0) + 1
+
+    def record_answer(self, call_id: str, agent_id: Optional[str] = None):
+        """A queued call was picked up by an agent"""
+        if call_id not in self.queued_calls:
+            return
+        self.queued_calls.discard(call_id)
+        started, known_agent = self.active_calls[call_id]
+        agent_id = agent_id or known_agent
+        self.active_calls[call_id] = (started, agent_id)
+        if agent_id:
+            self.busy_agents[agent_id] = self.busy_agents.get(agent_id, 0) + 1
+
+    def record_end(self, call_id: str, ts: Optional[float] = None, wait_seconds: Optional[float] = None,
+                   satisfaction: Optional[float] = None, duration_seconds: Optional[float] = None):
+        """A call finished; the completed-call windows are updated in O(1)"""
+        ts = time.time() if ts is None else ts
+        if self._live_ends is not None:
+            self._live_ends.add(call_id)
+        started = self.active_calls.pop(call_id, None)
+        if started is not None:
+            start_ts, agent_id = started
+            if call_id in self.queued_calls:
+                self.queued_calls.discard(call_id)
+            elif agent_id and agent_id in self.busy_agents:
+                self.busy_agents[agent_id] -= 1
+                if not self.busy_agents[agent_id]:
+                    del self.busy_agents[agent_id]
+            if duration_seconds is None:
+                duration_seconds = max(ts - start_ts, 0.0)
+        for window in self._windows:
+            window.add(ts, wait_seconds, satisfaction, duration_seconds)
+
+    def record_call(self, end_ts: float, wait_seconds: Optional[float] = None,
+                    satisfaction: Optional[float] = None, duration_seconds: Optional[float] = None):
+        """Record an already-completed call (backfill from call logs)"""
+        for window in self._windows:
+            window.add(end_ts, wait_seconds, satisfaction, duration_seconds)
+
+    def snapshot(self, now: Optional[float] = None) -> dict:
+        """Current statistics; constant time regardless of call volume"""
+        now = time.time() if now is None else now
+        today = self.today.read(now)
+        summary = today.summary()
+        return {
+            "total_calls_today": today.calls + len(self.active_calls),
+            "average_wait_time": _format_mm_ss(summary["average_wait_seconds"]),
+            "calls_in_queue": len(self.queued_calls),
+            "active_calls": len(self.active_calls),
+            "busy_agents": len(self.busy_agents),
+            "satisfaction_score": summary["satisfaction_score"],
+            "windows": {
+                "today": summary,
+                "last_hour": self.last_hour.read(now).summary(),
+                "last_5_min": self.last_5_min.read(now).summary(),
+            },
+            "timestamp": datetime.fromtimestamp(now, timezone.utc).isoformat().replace("+00:00", "Z"),
+        }
+
+
+def _format_mm_ss(seconds: Optional[float]) -> Optional[str]:
+    if seconds is None:
+        return None
+    seconds = int(round(seconds))
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+async def backfill_from_store(engine: CallStatsEngine, store, now: Optional[float] = None,
+                              user_id: Optional[str] = None) -> int:
+    """Replay today's completed calls (one business's, or every business's for None) into the engine
+
+    Calls the engine sees end through live events meanwhile are skipped, so
+    a call is counted once whichever side reads it first.
+    """
+    now = time.time() if now is None else now
+    midnight = datetime.fromtimestamp(now, engine.today.tz).replace(hour=0, minute=0, second=0, microsecond=0)
+    count = 0
+    engine._live_ends = set()
+    try:
+        async for rows, _ in store.iter_chunks(10_000_000, chunk_size=2000, user_id=user_id):
+            for row in rows:
+                start = datetime.fromisoformat(row["start_timestamp"])
+                if start < midnight:
+                    return count
+                if row.get("call_id") in engine._live_ends:
+                    continue
+                end = row.get("end_timestamp")
+                end_ts = datetime.fromisoformat(end).timestamp() if end else start.timestamp()
+                duration_ms = row.get("duration_ms")
+                engine.record_call(end_ts, duration_seconds=duration_ms / 1000 if duration_ms is not None else None)
+                count += 1
+        return count
+    finally:
+        engine._live_ends = None
+
+
+# Engines per business (None: every business), and the backfill each one's readers wait on
+_engines: dict[Optional[str], CallStatsEngine] = {}
+_backfills: dict[Optional[str], asyncio.Future] = {}
+
+
+def get_stats_engines(user_id: Optional[str]) -> list[CallStatsEngine]:
+    """Engines that count a business's calls: its own and the every-business one, once requested"""
+    return [_engines[key] for key in dict.fromkeys((user_id, None)) if key in _engines]
+
+
+async def _backfill(engine: CallStatsEngine, user_id: Optional[str]) -> CallStatsEngine:
+    try:
+        from call_log_store import get_call_log_store
+
+        await backfill_from_store(engine, await get_call_log_store(), user_id=user_id)
+    except (FileNotFoundError, ValueError, ImportError) as e:
+        print(f"Call stats backfill skipped: {e}", file=sys.stderr)
+    return engine
+
+
+async def get_warm_stats_engine(user_id: Optional[str] = None) -> CallStatsEngine:
+    """Return the business's stats engine once today's calls are backfilled from the store
+
+    Concurrent first readers wait on one backfill. If it fails, the engine
+    is dropped and the next reader backfills a fresh one.
+    """
+    backfill = _backfills.get(user_id)
+    if backfill is None:
+        engine = _engines[user_id] = CallStatsEngine()
+        backfill = _backfills[user_id] = asyncio.ensure_future(_backfill(engine, user_id))
+    try:
+        return await asyncio.shield(backfill)
+    except Exception:
+        if _backfills.get(user_id) is backfill:
+            del _backfills[user_id], _engines[user_id]
+        raise
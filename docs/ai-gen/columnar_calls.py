@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Columnar in-memory call log store for analytics
+
+Keeps call logs as NumPy columns instead of a list of dicts: timestamps and
+durations as int64 epoch milliseconds, sentiment as float32, low-cardinality
+strings (tenant, agent, direction, disconnection reason, caller number) as
+int32 codes into a per-column dictionary, and unique strings (id, call_id)
+packed into one byte buffer with offsets. A record costs tens of bytes rather
+than the ~1 KiB of a row dict, and filters and group-bys are single vectorized
+passes (comparisons on codes, np.bincount over group codes).
+
+Requires NumPy.
+
+Usage:
+    calls = ColumnarCallLogs()
+    calls.append_rows(rows)                  # dicts as returned by CallLogStore
+    calls.group_by("agent_id", calls.filter(direction="inbound"))
+    calls.page(100, cursor=None)             # same rows/cursor as get_call_logs
+"""
+
+import math
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+import numpy as np
+
+from call_log_store import decode_cursor, encode_cursor, get_call_log_store
+from tenant_cache import MB, TenantCache
+
+
+NULL_MS = np.iinfo(np.int64).min
+
+# Columns held as dictionary codes; code 0 is always None
+DICTIONARY_COLUMNS = (
+    "user_id", "agent_id", "agent_name", "from_number", "to_number", "direction",
+    "call_type", "disconnection_reason",
+)
+# Unique per row, packed into a byte buffer
+STRING_COLUMNS = ("id", "call_id")
+TIME_COLUMNS = ("start_timestamp", "end_timestamp")
+GROUP_KEYS = DICTIONARY_COLUMNS + ("hour",)
+
+
+class StringDictionary:
+    """Value <-> int32 code mapping for one column"""
+
+    def __init__(self):
+        self.values: list = [None]
+        self.codes: dict = {None: 0}
+
+    def encode(self, values: Iterable) -> np.ndarray:
+        codes, table = self.codes, self.values
+        out = []
+        for value in values:
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(table)
+                table.append(value)
+            out.append(code)
+        return np.fromiter(out, dtype=np.int32, count=len(out))
+
+    def code(self, value) -> int:
+        """Code for a filter value; -1 when the value never occurs"""
+        return self.codes.get(value, -1)
+
+    def nbytes(self) -> int:
+        return sys.getsizeof(self.values) + sys.getsizeof(self.codes) + sum(
+            sys.getsizeof(v) for v in self.values if v is not None)
+
+
+class PackedStrings:
+    """Append-only string column: one UTF-8 buffer plus int64 end offsets"""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.ends = np.zeros(1024, dtype=np.int64)
+        self.size = 0
+
+    def extend(self, values: list):
+        encoded = [("" if v is None else v).encode() for v in values]
+        if self.size + len(encoded) > len(self.ends):
+            self.ends = np.resize(self.ends, max(2 * len(self.ends), self.size + len(encoded)))
+        base = len(self.data)
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        self.ends[self.size:self.size + len(encoded)] = base + np.cumsum(lengths)
+        self.data += b"".join(encoded)
+        self.size += len(encoded)
+
+    def __getitem__(self, i: int) -> str:
+        start = int(self.ends[i - 1]) if i else 0
+        return self.data[start:int(self.ends[i])].decode()
+
+    def nbytes(self) -> int:
+        return len(self.data) + self.size * 8
+
+
+def _to_ms(values: list) -> np.ndarray:
+    """ISO timestamps -> epoch ms, with NULL_MS for missing values"""
+    if values and all(v is not None and v.endswith("+00:00") for v in values):
+        # Fast path for the UTC strings the stores return
+        parsed = np.array([v[:-6] for v in values], dtype="datetime64[ms]")
+        return parsed.astype(np.int64)
+    return np.fromiter(
+        (NULL_MS if v is None else int(datetime.fromisoformat(v).timestamp() * 1000) for v in values),
+        dtype=np.int64, count=len(values),
+    )
+
+
+def _iso(ms: int) -> Optional[str]:
+    if ms == NULL_MS:
+        return None
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).isoformat()
+
+
+class ColumnarCallLogs:
+    """Call logs as NumPy columns with dictionary-encoded strings"""
+
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self.dictionaries = {name: StringDictionary() for name in DICTIONARY_COLUMNS}
+        self.strings = {name: PackedStrings() for name in STRING_COLUMNS}
+        self.columns = {name: np.zeros(capacity, dtype=np.int32) for name in DICTIONARY_COLUMNS}
+        for name in TIME_COLUMNS + ("duration_ms",):
+            self.columns[name] = np.full(capacity, NULL_MS, dtype=np.int64)
+        self.columns["sentiment_score"] = np.full(capacity, np.nan, dtype=np.float32)
+        self._order: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _reserve(self, extra: int):
+        needed = self.size + extra
+        capacity = len(self.columns["start_timestamp"])
+        if needed <= capacity:
+            return
+        capacity = max(2 * capacity, needed)
+        for name, column in self.columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self.columns[name] = grown
+
+    def append_rows(self, rows: list[dict]):
+        """Append rows shaped like CallLogStore results (customer_call_logs columns)"""
+        if not rows:
+            return
+        self._reserve(len(rows))
+        lo, hi = self.size, self.size + len(rows)
+        cols = self.columns
+        for name in DICTIONARY_COLUMNS:
+            cols[name][lo:hi] = self.dictionaries[name].encode(row.get(name) for row in rows)
+        for name in STRING_COLUMNS:
+            self.strings[name].extend([row.get(name) for row in rows])
+        for name in TIME_COLUMNS:
+            cols[name][lo:hi] = _to_ms([row.get(name) for row in rows])
+        cols["duration_ms"][lo:hi] = [NULL_MS if row.get("duration_ms") is None else row["duration_ms"]
+                                      for row in rows]
+        cols["sentiment_score"][lo:hi] = [math.nan if row.get("sentiment_score") is None else row["sentiment_score"]
+                                          for row in rows]
+        self.size = hi
+        self._order = None
+
+    async def load(self, store, limit: int, chunk_size: int = 5000, user_id: Optional[str] = None) -> int:
+        """Append up to `limit` newest rows from a CallLogStore"""
+        loaded = 0
+        async for rows, _ in store.iter_chunks(limit, chunk_size=chunk_size, user_id=user_id):
+            self.append_rows(rows)
+            loaded += len(rows)
+        return loaded
+
+    def column(self, name: str) -> np.ndarray:
+        if name == "hour":
+            return (self.column("start_timestamp") // 3_600_000) % 24
+        return self.columns[name][:self.size]
+
+    def nbytes(self) -> int:
+        """Approximate memory held, including dictionaries and packed strings"""
+        return (
+            sum(column[:self.size].nbytes for column in self.columns.values())
+            + sum(d.nbytes() for d in self.dictionaries.values())
+            + sum(s.nbytes() for s in self.strings.values())
+        )
+
+    def filter(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None, **equals) -> np.ndarray:
+        """Boolean mask of rows with start in [start_ms, end_ms) and matching dictionary columns"""
+        mask = np.ones(self.size, dtype=bool)
+        starts = self.column("start_timestamp")
+        if start_ms is not None:
+            mask &= starts >= start_ms
+        if end_ms is not None:
+            mask &= starts < end_ms
+        for name, value in equals.items():
+            if name not in self.dictionaries:
+                raise ValueError(f"Cannot filter on {name}")
+            mask &= self.column(name) == self.dictionaries[name].code(value)
+        return mask
+
+    def group_by(self, key: str, mask: Optional[np.ndarray] = None) -> dict:
+        """Calls, total and average duration per value of `key` (a dictionary column or "hour")"""
+        if key not in GROUP_KEYS:
+            raise ValueError(f"Cannot group by {key}")
+        codes = self.column(key)
+        durations = self.column("duration_ms")
+        known = durations != NULL_MS
+        if mask is not None:
+            codes, durations, known = codes[mask], durations[mask], known[mask]
+        groups = 24 if key == "hour" else len(self.dictionaries[key].values)
+        calls = np.bincount(codes, minlength=groups)
+        timed = np.bincount(codes, weights=known, minlength=groups)
+        total_ms = np.bincount(codes, weights=np.where(known, durations, 0), minlength=groups)
+        labels = range(24) if key == "hour" else self.dictionaries[key].values
+        return {
+            label: {
+                "calls": int(calls[i]),
+                "total_duration_seconds": round(total_ms[i] / 1000, 1),
+                "average_duration_seconds": round(total_ms[i] / timed[i] / 1000, 1) if timed[i] else None,
+            }
+            for i, label in enumerate(labels) if calls[i]
+        }
+
+    def _window(self, since_ms: int, until_ms: int) -> dict:
+        ends = self.column("end_timestamp")
+        mask = (ends >= since_ms) & (ends < until_ms)
+        durations = self.column("duration_ms")[mask]
+        durations = durations[durations != NULL_MS]
+        sentiment = self.column("sentiment_score")[mask]
+        sentiment = sentiment[~np.isnan(sentiment)]
+        return {
+            "completed_calls": int(mask.sum()),
+            "average_duration_seconds": round(float(durations.mean()) / 1000, 1) if len(durations) else None,
+            "average_sentiment": round(float(sentiment.mean()), 3) if len(sentiment) else None,
+        }
+
+    def call_stats(self, now: Optional[float] = None) -> dict:
+        """get_call_stats-style totals computed from the stored rows (UTC day)"""
+        now_ms = int((time.time() if now is None else now) * 1000)
+        midnight_ms = now_ms - now_ms % 86_400_000
+        starts = self.column("start_timestamp")
+        active = (starts <= now_ms) & (starts >= midnight_ms) & (self.column("end_timestamp") == NULL_MS)
+        today = self._window(midnight_ms, now_ms + 1)
+        return {
+            "total_calls_today": today["completed_calls"] + int(active.sum()),
+            "active_calls": int(active.sum()),
+            "busy_agents": int(len(np.unique(self.column("agent_id")[active]))),
+            "windows": {
+                "today": today,
+                "last_hour": self._window(now_ms - 3_600_000, now_ms + 1),
+                "last_5_min": self._window(now_ms - 300_000, now_ms + 1),
+            },
+            "timestamp": datetime.fromtimestamp(now_ms / 1000, timezone.utc).isoformat().replace("+00:00", "Z"),
+        }
+
+    def _sorted(self) -> np.ndarray:
+        """Row positions ordered by (start_timestamp, id), newest first"""
+        if self._order is None:
+            ids = self.strings["id"]
+            id_rank = np.argsort(np.array([ids[i] for i in range(self.size)], dtype=object), kind="stable")
+            ranks = np.empty(self.size, dtype=np.int64)
+            ranks[id_rank] = np.arange(self.size)
+            self._order = np.lexsort((-ranks, -self.column("start_timestamp")))
+        return self._order
+
+    def row(self, i: int) -> dict:
+        out = {}
+        for name in STRING_COLUMNS:
+            out[name] = self.strings[name][i]
+        for name in DICTIONARY_COLUMNS:
+            out[name] = self.dictionaries[name].values[self.columns[name][i]]
+        for name in TIME_COLUMNS:
+            out[name] = _iso(int(self.columns[name][i]))
+        duration = int(self.columns["duration_ms"][i])
+        out["duration_ms"] = None if duration == NULL_MS else duration
+        return out
+
+    def page(self, limit: int, cursor: Optional[str] = None, mask: Optional[np.ndarray] = None
+             ) -> tuple[list[dict], Optional[str]]:
+        """Newest-first rows after `cursor`, with the same keyset cursor as get_call_logs"""
+        order = self._sorted()
+        if mask is not None:
+            order = order[mask[order]]
+        position = 0
+        if cursor:
+            after_start, after_id = decode_cursor(cursor)
+            after_ms = int(datetime.fromisoformat(after_start).timestamp() * 1000)
+            starts = self.column("start_timestamp")[order]
+            # starts is descending: skip rows newer than the cursor, then ties with id >= cursor id
+            position = int(np.searchsorted(-starts, -after_ms, side="left"))
+            ids = self.strings["id"]
+            while position < len(order) and starts[position] == after_ms and ids[int(order[position])] >= after_id:
+                position += 1
+        chosen = order[position:position + limit]
+        rows = [self.row(int(i)) for i in chosen]
+        exhausted = position + limit >= len(order)
+        next_cursor = None if exhausted or not rows else encode_cursor(rows[-1]["start_timestamp"], rows[-1]["id"])
+        return rows, next_cursor
+
+
+_ALL_TENANTS = "*"
+_calls: Optional[TenantCache] = None
+
+
+async def get_columnar_call_logs(user_id: Optional[str] = None, max_age: float = 300.0) -> ColumnarCallLogs:
+    """Return the columnar copy of `user_id`'s customer_call_logs, reloaded after `max_age` seconds
+
+    Each tenant has its own copy of its newest CALL_CENTER_ANALYTICS_ROWS
+    rows (default 1,000,000), so a busy business never pushes another's
+    history out of the window; user_id None loads every tenant's calls.
+    Copies share CALL_CENTER_CACHE_MB in least recently used order.
+    """
+    global _calls
+    if _calls is None:
+        max_bytes = int(float(os.environ.get("CALL_CENTER_CACHE_MB", "256")) * MB)
+        _calls = TenantCache(max_bytes, max_bytes, ttl=max_age, sizeof=lambda calls: calls.nbytes())
+    tenant = user_id or _ALL_TENANTS
+    calls = _calls.get(tenant, "calls")
+    if calls is None:
+        store = await get_call_log_store()
+        calls = ColumnarCallLogs()
+        started = time.perf_counter()
+        await calls.load(store, int(os.environ.get("CALL_CENTER_ANALYTICS_ROWS", "1000000")), user_id=user_id)
+        print(f"Columnar call logs loaded for {tenant}: {len(calls)} rows, {calls.nbytes() / 1e6:.1f} MB "
+              f"in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+        _calls.set(tenant, "calls", calls)
+    return calls
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Customer history lookup for the Call Center MCP servers
+
+Callers are matched by phone number, which is stored in whatever format the
+source wrote (`+1-555-...`, `(555) 123-4567`, `15551234567`). Numbers are
+normalized to E.164 once, when a number is first indexed or a call log lands,
+and an in-memory index per business maps each normalized number to the
+customer IDs and raw spellings seen for it. History reads then hit the
+`(user_id, from_number)` index with exact values.
+
+A lookup value with anything but digits and phone punctuation is tried as a
+customer ID first (a uuid can hold enough digits to pass for a number).
+Customers added after a business was indexed are picked up on an index miss.
+
+Assembled histories are kept in a TTL cache partitioned per business (see
+tenant_cache.TenantCache) and dropped as soon as a new call log for that
+number is recorded, so repeated lookups during a live call are served from
+memory and one busy business cannot evict the others' histories.
+"""
+
+import asyncio
+import re
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from tenant_cache import TenantCache, tenant_cache_from_env
+
+
+HISTORY_CALLS = 20
+HISTORY_APPOINTMENTS = 10
+
+_NON_DIGITS = re.compile(r"\D")
+_PHONE_CHARS = re.compile(r"[\d\s+().-]+")
+_KEYPAD = str.maketrans(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZ",
+    "22233344455566677778889999",
+)
+
+
+def normalize_phone(raw: Optional[str], default_country: str = "1") -> Optional[str]:
+    """Normalize a phone number to E.164 (`+15551234567`), or None if it is not one
+
+    Follows the dashboard's rules (strip formatting, assume the default country
+    for 10-digit numbers) and also accepts `00` international prefixes and
+    vanity letters such as `1-800-DENTAL`.
+    """
+    if not raw:
+        return None
+    text = raw.strip().upper()
+    if text[:1] == "+" or text[:1].isdigit():
+        text = text.translate(_KEYPAD)
+    digits = _NON_DIGITS.sub("", text)
+    if text.startswith("00"):
+        digits = digits[2:]
+    elif not text.startswith("+") and len(digits) == 10:
+        digits = default_country + digits
+    if not 8 <= len(digits) <= 15 or digits[0] == "0":
+        return None
+    return "+" + digits
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire `ttl` seconds after being set"""
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 300.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> Any:
+        entry = self._data.get(key)
+        if entry is None or entry[0] <= self._clock():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value):
+        self._data[key] = (self._clock() + self.ttl, value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+@dataclass
+class PhoneEntry:
+    """Everything known about one normalized number within a business"""
+    customer_ids: set = field(default_factory=set)
+    raw_numbers: set = field(default_factory=set)
+
+
+class PhoneIndex:
+    """Normalized phone -> customers and stored spellings, built per business"""
+
+    def __init__(self):
+        self._entries: dict = {}
+        self._customers: dict = {}
+        self._loaded: set = set()
+
+    def add(self, user_id: str, raw: Optional[str], customer_id: Optional[str] = None) -> Optional[str]:
+        phone = normalize_phone(raw)
+        if phone is None:
+            return None
+        entry = self._entries.get((user_id, phone))
+        if entry is None:
+            entry = self._entries[user_id, phone] = PhoneEntry()
+        entry.raw_numbers.add(raw)
+        if customer_id:
+            entry.customer_ids.add(customer_id)
+            self._customers[user_id, customer_id] = phone
+        return phone
+
+    def get(self, user_id: str, phone: str) -> Optional[PhoneEntry]:
+        return self._entries.get((user_id, phone))
+
+    def customer_phone(self, user_id: str, customer_id: str) -> Optional[str]:
+        return self._customers.get((user_id, customer_id))
+
+    def is_loaded(self, user_id: str) -> bool:
+        return user_id in self._loaded
+
+    async def load(self, store, user_id: str):
+        """Index a business's customers and every distinct caller number"""
+        customers = await store.query("SELECT id, phone FROM customers WHERE user_id = ?", (user_id,))
+        for row in customers:
+            self.add(user_id, row["phone"], row["id"])
+        callers = await store.query(
+            "SELECT DISTINCT from_number FROM customer_call_logs WHERE user_id = ?", (user_id,))
+        for row in callers:
+            self.add(user_id, row["from_number"])
+        self._loaded.add(user_id)
+        print(f"Phone index built for {user_id}: {len(customers)} customers, {len(callers)} numbers",
+              file=sys.stderr)
+
+
+class CustomerHistoryService:
+    """Cached per-caller history assembled from customers, call logs and appointments"""
+
+    def __init__(self, store, cache: Optional[TenantCache] = None, ttl: float = 300.0):
+        self.store = store
+        self.index = PhoneIndex()
+        self.cache = cache or tenant_cache_from_env(ttl)
+        self._index_lock = asyncio.Lock()
+
+    async def lookup(self, user_id: str, customer: str) -> dict:
+        """History for a customer ID or any spelling of their phone number"""
+        if not self.index.is_loaded(user_id):
+            # Concurrent first lookups (a batch) wait for one index build
+            async with self._index_lock:
+                if not self.index.is_loaded(user_id):
+                    await self.index.load(self.store, user_id)
+
+        phone = await self._phone_for(user_id, customer)
+        history = self.cache.get(user_id, phone)
+        if history is None:
+            entry = self.index.get(user_id, phone)
+            if entry is None or not entry.customer_ids:
+                await self._index_new_customers(user_id, phone)
+                entry = self.index.get(user_id, phone)
+            history = await self._assemble(user_id, phone, entry or PhoneEntry())
+            self.cache.set(user_id, phone, history)
+        return history
+
+    async def _phone_for(self, user_id: str, customer: str) -> str:
+        """Normalized number of a customer ID, or of the value itself as a phone number"""
+        if _PHONE_CHARS.fullmatch(customer):
+            phone = normalize_phone(customer)
+            if phone is not None:
+                return phone
+        phone = self.index.customer_phone(user_id, customer)
+        if phone is None:
+            rows = await self.store.query(
+                "SELECT phone FROM customers WHERE id = ? AND user_id = ?", (customer, user_id))
+            if rows:
+                phone = self.record_customer(user_id, customer, rows[0]["phone"])
+            else:
+                # Vanity numbers such as 1-800-DENTAL
+                phone = normalize_phone(customer)
+        if phone is None:
+            raise ValueError(f"Unknown customer: {customer}")
+        return phone
+
+    async def _index_new_customers(self, user_id: str, phone: str):
+        # Customers created since the business was indexed; the last four digits are
+        # contiguous in every stored format, so they narrow the scan before normalizing
+        rows = await self.store.query(
+            "SELECT id, phone FROM customers WHERE user_id = ? AND phone LIKE ?", (user_id, f"%{phone[-4:]}"))
+        for row in rows:
+            if normalize_phone(row["phone"]) == phone:
+                self.record_customer(user_id, row["id"], row["phone"])
+
+    def record_call_log(self, user_id: str, from_number: Optional[str]) -> Optional[str]:
+        """Index a newly stored call log's number and drop its cached history"""
+        phone = self.index.add(user_id, from_number)
+        if phone is not None:
+            self.cache.invalidate(user_id, phone)
+        return phone
+
+    def record_customer(self, user_id: str, customer_id: str, phone: Optional[str]) -> Optional[str]:
+        """Index a customer's number and drop its cached history"""
+        normalized = self.index.add(user_id, phone, customer_id)
+        if normalized is not None:
+            self.cache.invalidate(user_id, normalized)
+        return normalized
+
+    async def _assemble(self, user_id: str, phone: str, entry: PhoneEntry) -> dict:
+        customers, calls, appointments = [], [], []
+        total_calls = 0
+        customer_ids = sorted(entry.customer_ids)
+        if customer_ids:
+            marks = ", ".join("?" * len(customer_ids))
+            customers = await self.store.query(
+                f"SELECT id, first_name, last_name, email, phone FROM customers WHERE id IN ({marks})",
+                tuple(customer_ids))
+            appointments = await self.store.query(
+                f"SELECT appointment_date, start_time, status, title, staff_id FROM appointments "
+                f"WHERE customer_id IN ({marks}) "
+                f"ORDER BY appointment_date DESC, start_time DESC LIMIT {HISTORY_APPOINTMENTS}",
+                tuple(customer_ids))
+        raw_numbers = sorted(entry.raw_numbers)
+        if raw_numbers:
+            marks = ", ".join("?" * len(raw_numbers))
+            params = (user_id, *raw_numbers)
+            calls = await self.store.query(
+                f"SELECT call_id, agent_name, start_timestamp, duration_ms, direction, disconnection_reason "
+                f"FROM customer_call_logs WHERE user_id = ? AND from_number IN ({marks}) "
+                f"ORDER BY start_timestamp DESC LIMIT {HISTORY_CALLS}", params)
+            total_calls = (await self.store.query(
+                f"SELECT COUNT(*) AS n FROM customer_call_logs WHERE user_id = ? AND from_number IN ({marks})",
+                params))[0]["n"]
+
+        interactions = [
+            {
+                "date": row["start_timestamp"],
+                "type": "phone_call",
+                "call_id": row["call_id"],
+                "direction": row["direction"],
+                "duration": _duration(row["duration_ms"]),
+                "agent": row["agent_name"],
+                "resolution": row["disconnection_reason"],
+            }
+            for row in calls
+        ]
+        return {
+            "customer_id": customers[0]["id"] if customers else None,
+            "phone": phone,
+            "customers": customers,
+            "total_interactions": total_calls,
+            "last_contact": interactions[0]["date"] if interactions else None,
+            "interactions": interactions,
+            "appointments": appointments,
+        }
+
+
+def _duration(duration_ms) -> Optional[str]:
+    if duration_ms is None:
+        return None
+    seconds = int(duration_ms) // 1000
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+_service: Optional[CustomerHistoryService] = None
+
+
+async def get_customer_history_service() -> CustomerHistoryService:
+    """Return the process-wide service over the shared call log store"""
+    global _service
+    if _service is None:
+        from call_log_store import get_call_log_store
+
+        store = await get_call_log_store()
+        _service = _service or CustomerHistoryService(store)
+    return _service
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+Persistent deployment job queue behind deploy_agent
+
+deploy_agent only records a job in a local SQLite database and returns its
+deployment ID; a fixed pool of async workers claims queued jobs (one atomic
+UPDATE ... RETURNING each) and runs them against the Retell API, so at most
+`concurrency` deployments talk to Retell at once however many are requested.
+Jobs survive restarts: a worker holds a lease on the job it runs and renews
+it while the job runs, and a `running` job whose lease expired (its process
+died) is claimed again like a queued one. Several processes can share the
+queue without taking each other's live jobs.
+
+A job submitted with an idempotency key that was already used by the same
+business returns the existing job instead of deploying twice. Retryable
+Retell failures (timeouts, 429, 5xx) are retried with exponential backoff.
+
+Each deployed agent is also recorded in `retell_agents` (Retell agent ID ->
+user_id), the mapping webhook ingest and get_retell_agents route by.
+
+`deployed_agents` remembers the Retell LLM and agent IDs for each
+(user_id, agent_name) and the hash of the config last sent. A step is
+recorded as soon as Retell accepts it, so a retried job never creates a
+second LLM, and a redeploy whose rendered config did not change makes no API
+calls at all.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+from agent_templates import PromptCache
+from call_log_store import DEFAULT_DB_PATH
+from retell_client import RetellAPIError, RetellClient, get_retell_client
+
+
+DEFAULT_QUEUE_PATH = os.path.join(os.path.dirname(DEFAULT_DB_PATH), "deployments.db")
+TERMINAL = ("succeeded", "failed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS deployment_jobs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    deployment_id TEXT NOT NULL UNIQUE,
+    user_id TEXT NOT NULL DEFAULT '',
+    idempotency_key TEXT,
+    agent_name TEXT NOT NULL,
+    business_type TEXT NOT NULL,
+    template TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_after REAL NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    owner TEXT,
+    lease_until REAL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    UNIQUE (user_id, idempotency_key)
+);
+CREATE INDEX IF NOT EXISTS deployment_jobs_queued_idx ON deployment_jobs (status, run_after, seq);
+CREATE TABLE IF NOT EXISTS deployed_agents (
+    user_id TEXT NOT NULL,
+    agent_name TEXT NOT NULL,
+    llm_id TEXT,
+    llm_hash TEXT,
+    agent_id TEXT,
+    agent_hash TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (user_id, agent_name)
+);
+"""
+LEASE_INDEX = "CREATE INDEX IF NOT EXISTS deployment_jobs_lease_idx ON deployment_jobs (status, lease_until)"
+
+DEPLOYED_COLUMNS = ("llm_id", "llm_hash", "agent_id", "agent_hash")
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _job(row: Optional[sqlite3.Row]) -> Optional[dict]:
+    """Public view of a job row"""
+    if row is None:
+        return None
+    return {
+        "deployment_id": row["deployment_id"],
+        "status": row["status"],
+        "agent_name": row["agent_name"],
+        "business_type": row["business_type"],
+        "template": row["template"],
+        "idempotency_key": row["idempotency_key"],
+        "attempts": row["attempts"],
+        "result": json.loads(row["result"]) if row["result"] else None,
+        "error": row["error"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+    }
+
+
+class DeploymentQueue:
+    """SQLite-backed job table; blocking calls run on a worker thread under one lock
+
+    Jobs are claimed for `lease` seconds under this queue's `owner` ID.
+    """
+
+    def __init__(self, path: str = DEFAULT_QUEUE_PATH, lease: float = 30.0):
+        self.path = path
+        self.lease = lease
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        # Queues created before leases: a running job without one counts as expired
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(deployment_jobs)")}
+        for column, kind in (("owner", "TEXT"), ("lease_until", "REAL")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE deployment_jobs ADD COLUMN {column} {kind}")
+        self._conn.execute(LEASE_INDEX)
+        self._lock = threading.Lock()
+
+    def _run(self, sql: str, params: tuple = ()) -> list[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    async def _call(self, sql: str, params: tuple = ()) -> list[sqlite3.Row]:
+        return await asyncio.to_thread(self._run, sql, params)
+
+    async def enqueue(self, user_id: Optional[str], agent_name: str, business_type: str, template: str,
+                      metadata: dict, idempotency_key: Optional[str] = None) -> tuple[dict, bool]:
+        """Queue a deployment; returns (job, created), with the earlier job for a reused key"""
+        now = _now()
+        rows = await self._call(
+            "INSERT INTO deployment_jobs (deployment_id, user_id, idempotency_key, agent_name, business_type, "
+            "template, metadata, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (user_id, idempotency_key) DO NOTHING RETURNING *",
+            (f"DEPLOY-{uuid.uuid4().hex[:12]}", user_id or "", idempotency_key, agent_name, business_type,
+             template, json.dumps(metadata, sort_keys=True), now, now),
+        )
+        if rows:
+            return _job(rows[0]), True
+        rows = await self._call("SELECT * FROM deployment_jobs WHERE user_id = ? AND idempotency_key = ?",
+                                (user_id or "", idempotency_key))
+        return _job(rows[0]), False
+
+    async def get(self, deployment_id: str, user_id: Optional[str] = None) -> Optional[dict]:
+        sql = "SELECT * FROM deployment_jobs WHERE deployment_id = ?"
+        params: tuple = (deployment_id,)
+        if user_id is not None:
+            sql, params = sql + " AND user_id = ?", params + (user_id,)
+        rows = await self._call(sql, params)
+        return _job(rows[0]) if rows else None
+
+    async def claim(self) -> Optional[dict]:
+        """Lease the oldest due job (queued, or running under an expired lease) and return it
+
+        The job comes back with its user_id and metadata.
+        """
+        now = time.time()
+        rows = await self._call(
+            "UPDATE deployment_jobs SET status = 'running', attempts = attempts + 1, owner = ?, lease_until = ?, "
+            "updated_at = ? WHERE seq = (SELECT seq FROM deployment_jobs "
+            "WHERE (status = 'queued' AND run_after <= ?) "
+            "OR (status = 'running' AND (lease_until IS NULL OR lease_until < ?)) "
+            "ORDER BY seq LIMIT 1) RETURNING *",
+            (self.owner, now + self.lease, _now(), now, now),
+        )
+        if not rows:
+            return None
+        job = _job(rows[0])
+        job["user_id"] = rows[0]["user_id"]
+        job["metadata"] = json.loads(rows[0]["metadata"])
+        return job
+
+    async def next_due(self) -> Optional[float]:
+        """Seconds until the earliest queued job may run, or None if nothing is queued"""
+        rows = await self._call("SELECT MIN(run_after) AS run_after FROM deployment_jobs WHERE status = 'queued'")
+        run_after = rows[0]["run_after"]
+        return None if run_after is None else max(run_after - time.time(), 0.0)
+
+    async def renew(self, deployment_id: str) -> bool:
+        """Extend this queue's lease on a running job; False if the lease was lost"""
+        rows = await self._call(
+            "UPDATE deployment_jobs SET lease_until = ? WHERE deployment_id = ? AND status = 'running' "
+            "AND owner = ? RETURNING seq",
+            (time.time() + self.lease, deployment_id, self.owner),
+        )
+        return bool(rows)
+
+    async def finish(self, deployment_id: str, status: str, result: Optional[dict] = None,
+                     error: Optional[str] = None) -> bool:
+        """Record the outcome of a job this queue still leases; False if another worker took it over"""
+        rows = await self._call(
+            "UPDATE deployment_jobs SET status = ?, result = ?, error = ?, owner = NULL, lease_until = NULL, "
+            "updated_at = ? WHERE deployment_id = ? AND status = 'running' AND owner = ? RETURNING seq",
+            (status, json.dumps(result) if result is not None else None, error, _now(), deployment_id, self.owner),
+        )
+        return bool(rows)
+
+    async def retry(self, deployment_id: str, error: str, delay: float) -> bool:
+        rows = await self._call(
+            "UPDATE deployment_jobs SET status = 'queued', error = ?, run_after = ?, owner = NULL, "
+            "lease_until = NULL, updated_at = ? WHERE deployment_id = ? AND status = 'running' AND owner = ? "
+            "RETURNING seq",
+            (error, time.time() + delay, _now(), deployment_id, self.owner),
+        )
+        return bool(rows)
+
+    async def deployed(self, user_id: Optional[str], agent_name: str) -> dict:
+        rows = await self._call("SELECT * FROM deployed_agents WHERE user_id = ? AND agent_name = ?",
+                                (user_id or "", agent_name))
+        return dict(rows[0]) if rows else {}
+
+    async def save_deployed(self, user_id: Optional[str], agent_name: str, **fields):
+        columns = [c for c in DEPLOYED_COLUMNS if c in fields]
+        await self._call(
+            f"INSERT INTO deployed_agents (user_id, agent_name, updated_at, {', '.join(columns)}) "
+            f"VALUES (?, ?, ?, {', '.join('?' * len(columns))}) ON CONFLICT (user_id, agent_name) DO UPDATE SET "
+            + ", ".join(f"{c} = excluded.{c}" for c in columns + ["updated_at"]),
+            (user_id or "", agent_name, _now(), *(fields[c] for c in columns)),
+        )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class DeploymentService:
+    """Bounded pool of workers that run queued deployments against Retell"""
+
+    def __init__(self, queue: DeploymentQueue, retell: Optional[RetellClient], prompts: Optional[PromptCache] = None,
+                 concurrency: int = 4, max_attempts: int = 5, retry_delay: float = 2.0, poll_interval: float = 1.0,
+                 store=None):
+        self.queue = queue
+        self.retell = retell
+        # Call log store holding retell_agents; None skips recording the mapping
+        self.store = store
+        self.prompts = prompts or PromptCache()
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self.api_calls = 0
+        self._wake = asyncio.Event()
+        self._changed: dict = {}
+        self._workers: list = []
+
+    def start(self):
+        if self.retell is not None and not self._workers:
+            self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(self, user_id: Optional[str], arguments: dict) -> tuple[dict, bool]:
+        """Queue a deploy_agent request; returns (job, created)"""
+        if self.retell is None:
+            raise RuntimeError("RETELL_API_KEY environment variable is required to deploy agents")
+        business_type = arguments.get("business_type", "general")
+        template = self.prompts.template_name(business_type, arguments.get("template"))
+        # Fail on a missing template now rather than in the worker
+        self.prompts.template(template)
+        job, created = await self.queue.enqueue(
+            user_id, arguments["agent_name"], business_type, template,
+            arguments.get("metadata") or {}, arguments.get("idempotency_key"),
+        )
+        if created:
+            self._wake.set()
+        return job, created
+
+    async def status(self, deployment_id: str, user_id: Optional[str] = None, wait: float = 0.0) -> Optional[dict]:
+        """Current job state; with `wait`, block up to that many seconds for the job to finish"""
+        job = await self.queue.get(deployment_id, user_id)
+        deadline = time.monotonic() + wait
+        while job is not None and job["status"] not in TERMINAL and (remaining := deadline - time.monotonic()) > 0:
+            changed = self._changed.setdefault(deployment_id, asyncio.Event())
+            try:
+                # Poll too, in case another process runs the job
+                await asyncio.wait_for(changed.wait(), min(remaining, self.poll_interval))
+            except asyncio.TimeoutError:
+                pass
+            job = await self.queue.get(deployment_id, user_id)
+        return job
+
+    def _notify(self, deployment_id: str):
+        changed = self._changed.pop(deployment_id, None)
+        if changed is not None:
+            changed.set()
+
+    async def _work(self):
+        while True:
+            try:
+                job = await self.queue.claim()
+            except Exception as e:
+                print(f"Deployment queue unavailable: {e!r}", file=sys.stderr)
+                job = None
+            if job is None:
+                self._wake.clear()
+                due = await self.queue.next_due()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), min(due, self.poll_interval)
+                                           if due is not None else self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._notify(job["deployment_id"])
+            await self._run(job)
+            self._notify(job["deployment_id"])
+
+    async def _heartbeat(self, deployment_id: str):
+        """Renew the job's lease until cancelled"""
+        while True:
+            await asyncio.sleep(self.queue.lease / 3)
+            if not await self.queue.renew(deployment_id):
+                print(f"Lost the lease on deployment {deployment_id}", file=sys.stderr)
+                return
+
+    async def _run(self, job: dict):
+        deployment_id = job["deployment_id"]
+        heartbeat = asyncio.create_task(self._heartbeat(deployment_id))
+        try:
+            result = await self.deploy(job)
+        except RetellAPIError as e:
+            if e.retryable and job["attempts"] < self.max_attempts:
+                await self.queue.retry(deployment_id, str(e), self.retry_delay * 2 ** (job["attempts"] - 1))
+                self._wake.set()
+            else:
+                await self.queue.finish(deployment_id, "failed", error=str(e))
+        except Exception as e:
+            print(f"Deployment {deployment_id} failed: {e!r}", file=sys.stderr)
+            await self.queue.finish(deployment_id, "failed", error=str(e) or repr(e))
+        else:
+            await self.queue.finish(deployment_id, "succeeded", result=result)
+        finally:
+            heartbeat.cancel()
+
+    async def deploy(self, job: dict) -> dict:
+        """Create or update the job's Retell LLM and agent, skipping steps whose config is unchanged"""
+        user_id, agent_name = job["user_id"], job["agent_name"]
+        rendered = self.prompts.render(job["template"], job["business_type"], agent_name, job["metadata"])
+        record = await self.queue.deployed(user_id, agent_name)
+
+        llm_id, llm_action = await self._sync(
+            user_id, agent_name, "llm", record, rendered["llm"], rendered["llm_hash"],
+            self.retell.create_llm, self.retell.update_llm,
+        )
+        agent_body = {**rendered["agent"], "response_engine": {"type": "retell-llm", "llm_id": llm_id}}
+        agent_id, agent_action = await self._sync(
+            user_id, agent_name, "agent", record, agent_body, f"{rendered['agent_hash']}:{llm_id}",
+            self.retell.create_agent, self.retell.update_agent,
+        )
+        if self.store is not None and user_id:
+            # Route the new agent's calls to this business
+            await self.store.execute(
+                "INSERT INTO retell_agents (retell_agent_id, user_id) VALUES (?, ?) "
+                "ON CONFLICT (retell_agent_id) DO UPDATE SET user_id = excluded.user_id",
+                (agent_id, user_id))
+        return {"llm_id": llm_id, "agent_id": agent_id, "llm": llm_action, "agent": agent_action}
+
+    async def _sync(self, user_id, agent_name, kind, record, body, digest, create, update) -> tuple[str, str]:
+        existing = record.get(f"{kind}_id")
+        if existing and record.get(f"{kind}_hash") == digest:
+            return existing, "unchanged"
+        action = "updated"
+        if existing:
+            self.api_calls += 1
+            try:
+                await update(existing, body)
+            except RetellAPIError as e:
+                # Deleted on the Retell side: create it again
+                if e.status != 404:
+                    raise
+                existing = None
+        if not existing:
+            self.api_calls += 1
+            existing, action = (await create(body))[f"{kind}_id"], "created"
+        await self.queue.save_deployed(user_id, agent_name, **{f"{kind}_id": existing, f"{kind}_hash": digest})
+        record[f"{kind}_id"], record[f"{kind}_hash"] = existing, digest
+        return existing, action
+
+
+_service: Optional[DeploymentService] = None
+
+
+async def get_deployment_service() -> DeploymentService:
+    """Return the process-wide service over the shared queue and call log store"""
+    global _service
+    if _service is None:
+        concurrency = int(os.environ.get("CALL_CENTER_DEPLOY_WORKERS", "4"))
+        try:
+            retell = get_retell_client()
+        except RuntimeError as e:
+            print(f"Deployments disabled: {e}", file=sys.stderr)
+            retell = None
+        queue = DeploymentQueue(os.environ.get("CALL_CENTER_DEPLOY_DB") or DEFAULT_QUEUE_PATH)
+        try:
+            from call_log_store import get_call_log_store
+
+            store = await get_call_log_store()
+        except Exception as e:
+            print(f"Deployed agents will not be added to retell_agents: {e!r}", file=sys.stderr)
+            store = None
+        service = DeploymentService(queue, retell, concurrency=concurrency, store=store)
+        if _service is None:
+            _service = service
+            _service.start()
+    return _service
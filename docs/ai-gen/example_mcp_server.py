@@ -5,220 +5,477 @@ This server provides tools for managing call center operations.
 """
 
 import asyncio
-import json
+import uuid
+from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs
+
 from mcp.server import Server
+from mcp.server.lowlevel.helper_types import ReadResourceContents
 from mcp.types import (
     Resource,
+    ResourceTemplate,
+    ResourceUpdatedNotification,
+    ResourceUpdatedNotificationParams,
+    ServerCapabilities,
+    ServerNotification,
     Tool,
-    TextContent,
-    ListResourcesResult,
-    ListToolsResult,
-    ReadResourceResult,
-    CallToolResult,
 )
+from pydantic import AnyUrl
+
+from admission import BULK, LIVE_CALL, admission_from_env
+from agent_presence import AGENTS_URI, get_presence_registry
+
+from batch_operations import (
+    AGENT_STATUS_PROPERTIES,
+    MAX_BATCH,
+    batch_schema,
+    get_customer_histories,
+    update_agent_statuses,
+)
+from business_metadata import (
+    BUSINESS_URI_PREFIX,
+    BUSINESS_URI_TEMPLATE,
+    get_business_metadata_service,
+    parse_business_uri,
+)
+from call_log_store import get_call_log_store
+from call_stats import get_stats_engines, get_warm_stats_engine
+from customer_history import get_customer_history_service
+from serializers import ToolResult, get_serializer
+from server_metrics import METRICS_RESOURCES, ServerMetrics, start_metrics_dump_from_env
+from tenant_cache import resolve_tenant, session_tenant
+from tool_registry import ToolArgumentError, ToolRegistry
+from webhook_ingest import start_ingest_from_env
+
+
+def _tenant(arguments: Dict[str, Any]) -> str:
+    """Business owner whose calendar or customers a tool works on"""
+    user_id = resolve_tenant(arguments)
+    if not user_id:
+        raise ToolArgumentError("arguments.user_id is required when the session has no tenant "
+                                "and CALL_CENTER_USER_ID is not set")
+    return user_id
+
+
+def _parse_time(value: str, field: str) -> datetime:
+    from slot_index import business_time
+
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError as e:
+        raise ToolArgumentError(f"arguments.{field} must be an ISO 8601 datetime") from e
+    # Calendars are kept in business local time; times with an offset are converted to it
+    return business_time(parsed)
+
+
+class _SubscribableServer(Server):
+    """Server that advertises resources/subscribe, which it handles for the agents resource"""
+
+    def get_capabilities(self, notification_options, experimental_capabilities) -> ServerCapabilities:
+        capabilities = super().get_capabilities(notification_options, experimental_capabilities)
+        if capabilities.resources is not None:
+            capabilities.resources.subscribe = True
+        return capabilities
 
 
 class CallCenterMCPServer:
     def __init__(self):
-        self.server = Server("call-center-automation")
+        self.server = _SubscribableServer("call-center-automation")
+        self.admission = admission_from_env()
+        self.metrics = ServerMetrics(admission=self.admission)
+        self.tools = ToolRegistry(self.metrics, self.admission)
+        # Webhook ingest and metrics dump, started by main() when configured
+        self.background_tasks: list[asyncio.Task] = []
+        self.register_tools()
         self.setup_handlers()
     
     def setup_handlers(self):
         """Set up MCP protocol handlers"""
         
         @self.server.list_resources()
-        async def list_resources() -> ListResourcesResult:
+        async def list_resources() -> list[Resource]:
             """List available resources"""
-            return ListResourcesResult(
-                resources=[
-                    Resource(
-                        uri="call-center://stats",
-                        name="Call Center Statistics",
-                        description="Current call center statistics and metrics",
-                        mimeType="application/json"
-                    ),
-                    Resource(
-                        uri="call-center://agents",
-                        name="Agent Status",
-                        description="Current status of all call center agents",
-                        mimeType="application/json"
-                    ),
-                ]
-            )
+            return [
+                Resource(
+                    uri="call-center://stats",
+                    name="Call Center Statistics",
+                    description="Current call center statistics and metrics",
+                    mimeType="application/json"
+                ),
+                Resource(
+                    uri=AGENTS_URI,
+                    name="Agent Status",
+                    description="Current status of all call center agents. Subscribe for per-tick deltas; "
+                                "?since=<version> returns only agents changed after that version",
+                    mimeType="application/json"
+                ),
+                *(Resource(uri=uri, name=name, description=description, mimeType=mime_type)
+                  for uri, name, description, mime_type in METRICS_RESOURCES),
+            ]
+
+        @self.server.list_resource_templates()
+        async def list_resource_templates() -> list[ResourceTemplate]:
+            return [
+                ResourceTemplate(
+                    uriTemplate=BUSINESS_URI_TEMPLATE,
+                    name="Business Metadata",
+                    description="Practice details, team, services, hours and insurance for a business owner "
+                                "(user_id), with a hash per section. ?if_none_match=<etag> or "
+                                "?known=<section>:<hash>,... skip data the reader already has",
+                    mimeType="application/json"
+                ),
+            ]
         
         @self.server.read_resource()
-        async def read_resource(uri: str) -> ReadResourceResult:
+        async def read_resource(uri: AnyUrl) -> list[ReadResourceContents]:
             """Read a specific resource"""
-            if uri == "call-center://stats":
-                stats = {
-                    "total_calls_today": 150,
-                    "average_wait_time": "2:30",
-                    "calls_in_queue": 5,
-                    "active_agents": 12,
-                    "resolved_tickets": 89
-                }
-                return ReadResourceResult(
-                    contents=[TextContent(type="text", text=json.dumps(stats, indent=2))]
-                )
-            elif uri == "call-center://agents":
-                agents = {
-                    "agents": [
-                        {"id": 1, "name": "Sarah", "status": "available", "calls_today": 23},
-                        {"id": 2, "name": "Mike", "status": "on_call", "calls_today": 18},
-                        {"id": 3, "name": "Emma", "status": "break", "calls_today": 15},
-                    ]
-                }
-                return ReadResourceResult(
-                    contents=[TextContent(type="text", text=json.dumps(agents, indent=2))]
-                )
-            else:
-                raise ValueError(f"Unknown resource: {uri}")
+            uri = str(uri)
+            name = BUSINESS_URI_TEMPLATE if uri.startswith(BUSINESS_URI_PREFIX) else uri.partition("?")[0]
+            return await self.metrics.call("resource", name, self.read_resource, uri)
+
+        @self.server.subscribe_resource()
+        async def subscribe_resource(uri: AnyUrl):
+            """Push agent status deltas to this session once per tick"""
+            if str(uri) != AGENTS_URI:
+                raise ValueError(f"Subscriptions are only available for {AGENTS_URI}")
+            session = self.server.request_context.session
+
+            async def send(version: int, since: int, changes: Optional[list]):
+                params = {"version": version, "since": since}
+                if changes is None:
+                    params["truncated"] = True
+                else:
+                    params["changes"] = changes
+                await session.send_notification(ServerNotification(ResourceUpdatedNotification(
+                    method="notifications/resources/updated",
+                    params=ResourceUpdatedNotificationParams(uri=AGENTS_URI, **params),
+                )))
+
+            (await get_presence_registry(resolve_tenant())).subscribe(session, send)
+
+        @self.server.unsubscribe_resource()
+        async def unsubscribe_resource(uri: AnyUrl):
+            (await get_presence_registry(resolve_tenant())).unsubscribe(self.server.request_context.session)
         
+        tool_list = [Tool(**definition) for definition in self.tools.definitions()]
+
         @self.server.list_tools()
-        async def list_tools() -> ListToolsResult:
+        async def list_tools() -> list[Tool]:
             """List available tools"""
-            return ListToolsResult(
-                tools=[
-                    Tool(
-                        name="schedule_callback",
-                        description="Schedule a callback for a customer",
-                        inputSchema={
-                            "type": "object",
-                            "properties": {
-                                "customer_phone": {
-                                    "type": "string",
-                                    "description": "Customer phone number"
-                                },
-                                "preferred_time": {
-                                    "type": "string",
-                                    "description": "Preferred callback time (ISO format)"
-                                },
-                                "reason": {
-                                    "type": "string",
-                                    "description": "Reason for callback"
-                                }
-                            },
-                            "required": ["customer_phone", "preferred_time", "reason"]
-                        }
-                    ),
-                    Tool(
-                        name="get_customer_history",
-                        description="Get customer interaction history",
-                        inputSchema={
-                            "type": "object",
-                            "properties": {
-                                "customer_id": {
-                                    "type": "string",
-                                    "description": "Customer ID or phone number"
-                                }
-                            },
-                            "required": ["customer_id"]
-                        }
-                    ),
-                    Tool(
-                        name="update_agent_status",
-                        description="Update agent availability status",
-                        inputSchema={
-                            "type": "object",
-                            "properties": {
-                                "agent_id": {
-                                    "type": "string",
-                                    "description": "Agent ID"
-                                },
-                                "status": {
-                                    "type": "string",
-                                    "enum": ["available", "busy", "break", "offline"],
-                                    "description": "New agent status"
-                                }
-                            },
-                            "required": ["agent_id", "status"]
-                        }
-                    )
-                ]
-            )
+            return tool_list
         
-        @self.server.call_tool()
-        async def call_tool(name: str, arguments: Dict[str, Any]) -> CallToolResult:
+        # Arguments are checked by the registry's precompiled validators
+        @self.server.call_tool(validate_input=False)
+        async def call_tool(name: str, arguments: Dict[str, Any]) -> ToolResult:
             """Execute a tool"""
-            if name == "schedule_callback":
-                customer_phone = arguments["customer_phone"]
-                preferred_time = arguments["preferred_time"]
-                reason = arguments["reason"]
-                
-                # Mock scheduling logic
-                callback_id = f"CB_{hash(customer_phone + preferred_time) % 10000}"
-                
-                result = {
-                    "success": True,
-                    "callback_id": callback_id,
-                    "message": f"Callback scheduled for {customer_phone} at {preferred_time}",
-                    "reason": reason
-                }
-                
-                return CallToolResult(
-                    content=[TextContent(type="text", text=json.dumps(result, indent=2))]
-                )
-            
-            elif name == "get_customer_history":
-                customer_id = arguments["customer_id"]
-                
-                # Mock customer history
-                history = {
-                    "customer_id": customer_id,
-                    "total_interactions": 5,
-                    "last_contact": "2024-01-15T10:30:00Z",
-                    "interactions": [
-                        {
-                            "date": "2024-01-15T10:30:00Z",
-                            "type": "phone_call",
-                            "duration": "15:30",
-                            "agent": "Sarah",
-                            "resolution": "billing_inquiry_resolved"
-                        },
-                        {
-                            "date": "2024-01-10T14:15:00Z",
-                            "type": "email",
-                            "agent": "Mike",
-                            "resolution": "product_question_answered"
-                        }
-                    ]
-                }
-                
-                return CallToolResult(
-                    content=[TextContent(type="text", text=json.dumps(history, indent=2))]
-                )
-            
-            elif name == "update_agent_status":
-                agent_id = arguments["agent_id"]
-                status = arguments["status"]
-                
-                result = {
-                    "success": True,
-                    "agent_id": agent_id,
-                    "new_status": status,
-                    "timestamp": "2024-01-16T12:00:00Z"
-                }
-                
-                return CallToolResult(
-                    content=[TextContent(type="text", text=json.dumps(result, indent=2))]
-                )
-            
-            else:
-                raise ValueError(f"Unknown tool: {name}")
+            return await self.tools.dispatch(name, arguments)
+
+    async def read_resource(self, uri: str) -> list[ReadResourceContents]:
+        base, _, query = uri.partition("?")
+        mime_type = "application/json"
+        if base == "call-center://stats":
+            stats = (await get_warm_stats_engine(resolve_tenant())).snapshot()
+            text = get_serializer().dumps(stats)
+        elif base == AGENTS_URI:
+            since = parse_qs(query).get("since", [None])[0]
+            try:
+                registry = await get_presence_registry(resolve_tenant())
+                text = registry.render(None if since is None else int(since))
+            except ValueError as e:
+                raise ValueError(f"Invalid since version: {since}") from e
+        elif base.startswith("call-center://metrics"):
+            text, mime_type = await self.metrics.read(uri)
+        elif base.startswith(BUSINESS_URI_PREFIX):
+            user_id, query = parse_business_uri(uri)
+            tenant = session_tenant()
+            if tenant is not None and tenant != user_id:
+                raise ValueError(f"This session belongs to business {tenant}")
+            text = get_serializer().dumps(await (await get_business_metadata_service()).read(user_id, query))
+        else:
+            raise ValueError(f"Unknown resource: {uri}")
+        return [ReadResourceContents(content=text, mime_type=mime_type)]
+    
+    def register_tools(self):
+        """Register tool handlers and their input schemas"""
+        self.tools.register(
+            name="schedule_callback",
+            description="Schedule a callback for a customer",
+            input_schema={
+                "type": "object",
+                "properties": {
+                    "customer_phone": {
+                        "type": "string",
+                        "description": "Customer phone number"
+                    },
+                    "preferred_time": {
+                        "type": "string",
+                        "description": "Preferred callback time (ISO format)"
+                    },
+                    "reason": {
+                        "type": "string",
+                        "description": "Reason for callback"
+                    },
+                    "duration_minutes": {
+                        "type": "integer",
+                        "description": "Length of the callback (default: 15)",
+                        "default": 15,
+                        "minimum": 5,
+                        "maximum": 480
+                    },
+                    "user_id": {
+                        "type": "string",
+                        "description": "Business owner id (default: the session tenant or CALL_CENTER_USER_ID)"
+                    }
+                },
+                "required": ["customer_phone", "preferred_time", "reason"]
+            },
+            handler=self.schedule_callback,
+            priority=LIVE_CALL,
+        )
+        self.tools.register(
+            name="find_available_slots",
+            description="Find the earliest open appointment or callback times",
+            input_schema={
+                "type": "object",
+                "properties": {
+                    "appointment_type_id": {
+                        "type": "string",
+                        "description": "Appointment type to book (uses its duration, buffers and allowed staff)"
+                    },
+                    "duration_minutes": {
+                        "type": "integer",
+                        "description": "Length when no appointment type is given (default: 30)",
+                        "default": 30,
+                        "minimum": 5,
+                        "maximum": 480
+                    },
+                    "after": {
+                        "type": "string",
+                        "description": "Earliest start time (ISO format, default: now)"
+                    },
+                    "count": {
+                        "type": "integer",
+                        "description": "Number of slots to return (default: 5)",
+                        "default": 5,
+                        "minimum": 1,
+                        "maximum": 100
+                    },
+                    "user_id": {
+                        "type": "string",
+                        "description": "Business owner id (default: the session tenant or CALL_CENTER_USER_ID)"
+                    }
+                },
+                "required": []
+            },
+            handler=self.find_available_slots,
+            priority=LIVE_CALL,
+        )
+        self.tools.register(
+            name="get_customer_history",
+            description="Get customer interaction history",
+            input_schema={
+                "type": "object",
+                "properties": {
+                    "customer_id": {
+                        "type": "string",
+                        "description": "Customer ID or phone number"
+                    },
+                    "user_id": {
+                        "type": "string",
+                        "description": "Business owner id (default: the session tenant or CALL_CENTER_USER_ID)"
+                    }
+                },
+                "required": ["customer_id"]
+            },
+            handler=self.get_customer_history,
+            priority=LIVE_CALL,
+        )
+        self.tools.register(
+            name="get_customer_histories",
+            description="Get interaction history for many customers in one call",
+            input_schema={
+                "type": "object",
+                "properties": {
+                    "customer_ids": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Customer IDs or phone numbers",
+                        "minItems": 1,
+                        "maxItems": MAX_BATCH
+                    },
+                    "user_id": {
+                        "type": "string",
+                        "description": "Business owner id (default: the session tenant or CALL_CENTER_USER_ID)"
+                    }
+                },
+                "required": ["customer_ids"]
+            },
+            handler=self.get_customer_histories,
+            priority=BULK,
+        )
+        self.tools.register(
+            name="update_agent_status",
+            description="Update agent availability status",
+            input_schema={
+                "type": "object",
+                "properties": AGENT_STATUS_PROPERTIES,
+                "required": ["agent_id", "status"]
+            },
+            handler=self.update_agent_status,
+        )
+        self.tools.register(
+            name="update_agent_statuses",
+            description="Update many agents' availability in one call (one transaction)",
+            input_schema=batch_schema("updates", AGENT_STATUS_PROPERTIES, ["agent_id", "status"],
+                                      "Status changes, each like update_agent_status's arguments"),
+            handler=self.update_agent_statuses,
+            priority=BULK,
+        )
+    
+    async def schedule_callback(self, arguments: Dict[str, Any]) -> ToolResult:
+        """Schedule a customer callback"""
+        from slot_index import SLOT_MINUTES, get_slot_index
+
+        customer_phone = arguments["customer_phone"]
+        preferred_time = arguments["preferred_time"]
+        reason = arguments["reason"]
+        user_id = _tenant(arguments)
+        start = _parse_time(preferred_time, "preferred_time")
+
+        index = await get_slot_index(user_id)
+        slots, _ = index.slots_for(minutes=arguments.get("duration_minutes", 15))
+        try:
+            staff_id = index.book_first_available(start, slots)
+        except ValueError:
+            # Outside the horizon or off the slot grid; offer the nearest times instead
+            staff_id = None
+
+        if staff_id is None:
+            alternatives = index.next_free_slots(slots, start, count=3)
+            result = {
+                "success": False,
+                "message": f"No staff available at {preferred_time}",
+                "alternatives": [slot.to_dict() for slot in alternatives],
+            }
+            return get_serializer().result(result)
+
+        callback_id = f"CB_{uuid.uuid4().hex[:12]}"
+        end = start + timedelta(minutes=slots * SLOT_MINUTES)
+        try:
+            store = await get_call_log_store()
+            await store.execute(
+                "INSERT INTO appointments (id, business_id, user_id, staff_id, appointment_date, start_time, "
+                "end_time, duration_minutes, title, notes, status, booking_source) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'scheduled', 'phone')",
+                (str(uuid.uuid4()), index.business_id or user_id, user_id, staff_id, start.date(),
+                 start.time(), end.time(), slots * SLOT_MINUTES, f"Callback: {reason}",
+                 f"{callback_id} {customer_phone}"),
+            )
+        except Exception:
+            index.release(staff_id, start, slots)
+            raise
+
+        result = {
+            "success": True,
+            "callback_id": callback_id,
+            "staff_id": staff_id,
+            "message": f"Callback scheduled for {customer_phone} at {start.isoformat()}",
+            "reason": reason
+        }
+
+        return get_serializer().result(result)
+
+    async def find_available_slots(self, arguments: Dict[str, Any]) -> ToolResult:
+        """List the earliest open start times"""
+        from slot_index import business_time, get_slot_index
+
+        user_id = _tenant(arguments)
+        after = _parse_time(arguments["after"], "after") if arguments.get("after") else business_time()
+
+        index = await get_slot_index(user_id)
+        try:
+            slots, staff_ids = index.slots_for(
+                arguments.get("appointment_type_id"), arguments.get("duration_minutes", 30)
+            )
+        except ValueError as e:
+            raise ToolArgumentError(f"arguments.appointment_type_id: {e}") from e
+        found = index.next_free_slots(slots, after, arguments.get("count", 5), staff_ids)
+        return get_serializer().result([slot.to_dict() for slot in found])
+    
+    async def get_customer_history(self, arguments: Dict[str, Any]) -> ToolResult:
+        """Look up a customer's interaction history"""
+        customer_id = arguments["customer_id"]
+        user_id = _tenant(arguments)
+
+        service = await get_customer_history_service()
+        history = await service.lookup(user_id, customer_id)
+
+        return get_serializer().result(history)
+    
+    async def get_customer_histories(self, arguments: Dict[str, Any]) -> ToolResult:
+        """Look up several customers' histories, in request order"""
+        user_id = _tenant(arguments)
+
+        service = await get_customer_history_service()
+        histories = await get_customer_histories(service, user_id, arguments["customer_ids"])
+
+        return get_serializer().result(histories)
+    
+    async def update_agent_status(self, arguments: Dict[str, Any]) -> ToolResult:
+        """Record an agent availability change"""
+        store = await get_call_log_store()
+        result, = await update_agent_statuses(store, [arguments], resolve_tenant())
+        await self._publish_statuses([result])
+        
+        return get_serializer().result(result)
+    
+    async def update_agent_statuses(self, arguments: Dict[str, Any]) -> ToolResult:
+        """Record many availability changes in one transaction"""
+        store = await get_call_log_store()
+        results = await update_agent_statuses(store, arguments["updates"], resolve_tenant())
+        await self._publish_statuses(results)
+        
+        return get_serializer().result(results)
+    
+    async def _publish_statuses(self, results: list[dict]):
+        """Hand stored status changes to the business's presence registry"""
+        registry = await get_presence_registry(resolve_tenant())
+        for result in results:
+            registry.update(result["agent_id"], result["new_status"],
+                            datetime.fromisoformat(result["timestamp"]).timestamp())
     
     async def run(self):
         """Run the MCP server"""
         from mcp.server.stdio import stdio_server
         
         async with stdio_server() as streams:
-            await self.server.run(streams[0], streams[1])
+            await self.server.run(streams[0], streams[1], self.server.create_initialization_options())
+
+    async def stop_background_tasks(self):
+        """Cancel the background tasks and wait for them to finish"""
+        for task in self.background_tasks:
+            task.cancel()
+        await asyncio.gather(*self.background_tasks, return_exceptions=True)
+        self.background_tasks.clear()
 
 
 async def main():
     """Main entry point"""
+    from mcp_socket_transport import parse_transport_args, serve_socket
+
+    args = parse_transport_args("Example MCP Server for Call Center Automation")
     server = CallCenterMCPServer()
-    await server.run()
+    tasks = (await start_ingest_from_env(stats=get_stats_engines, history=get_customer_history_service),
+             start_metrics_dump_from_env(server.metrics))
+    server.background_tasks += [task for task in tasks if task is not None]
+    try:
+        if args.listen:
+            await serve_socket(server.server, args)
+        else:
+            await server.run()
+    finally:
+        await server.stop_background_tasks()
 
 
 if __name__ == "__main__":
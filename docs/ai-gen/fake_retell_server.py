@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Retell REST API, for tests and benchmarks
+
+Implements the LLM and agent endpoints the deployment queue and
+get_retell_agents use, keeping everything in memory. Each request can be
+delayed (`latency`) and a fraction can fail with 500 or 429 (`error_rate`),
+so retry paths and connection pooling can be exercised without the real API;
+tests can also queue exact statuses in `fail_next`. Per-endpoint request
+counts are kept in `requests`.
+
+Usage:
+    python fake_retell_server.py --port 8787 --latency 0.05
+    RETELL_BASE_URL=http://127.0.0.1:8787 RETELL_API_KEY=test python working_mcp_server.py
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import sys
+import time
+from collections import Counter
+from typing import Optional
+
+
+_REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+            429: "Too Many Requests", 500: "Internal Server Error"}
+
+
+class FakeRetellServer:
+    """In-memory Retell API over HTTP/1.1 keep-alive connections"""
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.llms: dict = {}
+        self.agents: dict = {}
+        self.requests: Counter = Counter()
+        # Statuses returned by the next requests, in order, before error_rate applies
+        self.fail_next: list = []
+        self._ids = itertools.count(1)
+        self._random = random.Random(seed)
+        self._server: Optional[asyncio.base_events.Server] = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start listening; returns the base URL"""
+        self._server = await asyncio.start_server(self._serve, host, port)
+        bound_host, bound_port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{bound_host}:{bound_port}"
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                length = 0
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header.decode("latin-1").partition(":")
+                    if name.strip().lower() == "content-length":
+                        length = int(value)
+                body = json.loads(await reader.readexactly(length)) if length else None
+                status, payload = await self.handle(method, target, body)
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {_REASONS.get(status, 'Error')}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle(self, method: str, target: str, body: Optional[dict]) -> tuple[int, object]:
+        path = target.split("?", 1)[0]
+        route, _, resource_id = path.lstrip("/").partition("/")
+        self.requests[f"{method} /{route}"] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.fail_next:
+            status = self.fail_next.pop(0)
+            return status, {"error_message": _REASONS.get(status, "Error")}
+        if self.error_rate and self._random.random() < self.error_rate:
+            status = self._random.choice((429, 500))
+            return status, {"error_message": _REASONS[status]}
+
+        now = int(time.time() * 1000)
+        if method == "POST" and route == "create-retell-llm":
+            llm_id = f"llm_fake{next(self._ids):08d}"
+            self.llms[llm_id] = {**(body or {}), "llm_id": llm_id, "version": 0, "last_modification_timestamp": now}
+            return 201, self.llms[llm_id]
+        if method == "PATCH" and route == "update-retell-llm":
+            if resource_id not in self.llms:
+                return 404, {"error_message": f"LLM {resource_id} not found"}
+            llm = self.llms[resource_id]
+            llm.update(body or {}, version=llm["version"] + 1, last_modification_timestamp=now)
+            return 200, llm
+        if method == "POST" and route == "create-agent":
+            agent_id = f"agent_fake{next(self._ids):08d}"
+            self.agents[agent_id] = {**(body or {}), "agent_id": agent_id, "version": 0,
+                                     "last_modification_timestamp": now}
+            return 201, self.agents[agent_id]
+        if method == "PATCH" and route == "update-agent":
+            if resource_id not in self.agents:
+                return 404, {"error_message": f"Agent {resource_id} not found"}
+            agent = self.agents[resource_id]
+            agent.update(body or {}, version=agent["version"] + 1, last_modification_timestamp=now)
+            return 200, agent
+        if method == "GET" and route == "get-agent":
+            agent = self.agents.get(resource_id)
+            return (200, agent) if agent else (404, {"error_message": f"Agent {resource_id} not found"})
+        if method == "GET" and route == "list-agents":
+            return 200, list(self.agents.values())
+        return 404, {"error_message": f"No route for {method} {path}"}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Run a local fake Retell API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with 429/500")
+    args = parser.parse_args()
+
+    server = FakeRetellServer(args.latency, args.error_rate)
+    url = await server.start(args.host, args.port)
+    print(f"Fake Retell API on {url}", file=sys.stderr)
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
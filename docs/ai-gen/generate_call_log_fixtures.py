@@ -0,0 +1,522 @@
+#!/usr/bin/env python3
+"""
+Generate synthetic call log fixtures for offline benchmarking
+
+Writes `customer_call_logs` and `call_logs` rows shaped like the Supabase tables
+(see docs/DATABASE_SCHEMA.md) into a local SQLite file or a Postgres database.
+SQLite fixtures also get one business's scheduling tables (staff, office hours,
+holidays, availability, appointment types and appointments) and its profile
+and services.
+
+Usage:
+    python generate_call_log_fixtures.py --rows 100000
+    python generate_call_log_fixtures.py --rows 100000 --db /tmp/calls.db
+    python generate_call_log_fixtures.py --rows 100000 --postgres-url postgresql://localhost/calls
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+from call_log_store import DEFAULT_DB_PATH
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS customer_call_logs (
+    id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    call_record_url TEXT,
+    call_id TEXT UNIQUE,
+    agent_id TEXT,
+    agent_name TEXT,
+    duration_ms INTEGER,
+    transcript TEXT,
+    public_log_url TEXT,
+    disconnection_reason TEXT,
+    call_cost TEXT,
+    call_analysis TEXT,
+    from_number TEXT,
+    to_number TEXT,
+    direction TEXT,
+    telephony_identifier TEXT,
+    start_timestamp TEXT,
+    end_timestamp TEXT,
+    agent_version INTEGER,
+    call_type TEXT
+);
+CREATE INDEX IF NOT EXISTS customer_call_logs_start_id_idx
+    ON customer_call_logs (start_timestamp DESC, id DESC);
+
+CREATE TABLE IF NOT EXISTS call_logs (
+    id TEXT PRIMARY KEY,
+    call_id TEXT NOT NULL,
+    agent_id TEXT,
+    client_id TEXT NOT NULL,
+    phone_number TEXT,
+    call_status TEXT DEFAULT 'started',
+    started_at TEXT,
+    ended_at TEXT,
+    duration INTEGER,
+    transcript TEXT,
+    call_summary TEXT,
+    call_analysis TEXT,
+    sentiment_score REAL,
+    keywords TEXT,
+    action_items TEXT,
+    retell_data TEXT,
+    created_at TEXT,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS call_logs_started_id_idx
+    ON call_logs (started_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS call_logs_created_id_idx
+    ON call_logs (created_at, id);
+CREATE INDEX IF NOT EXISTS customer_call_logs_user_from_idx
+    ON customer_call_logs (user_id, from_number);
+
+-- Written by the MCP servers (see docs/sql/create-call-center-ops-tables.sql)
+CREATE TABLE IF NOT EXISTS support_tickets (
+    id TEXT PRIMARY KEY,
+    user_id TEXT,
+    title TEXT NOT NULL,
+    description TEXT NOT NULL,
+    priority TEXT NOT NULL DEFAULT 'medium',
+    skill TEXT,
+    status TEXT NOT NULL DEFAULT 'open',
+    assigned_to TEXT,
+    created_at TEXT,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_support_tickets_user_status ON support_tickets(user_id, status);
+CREATE TABLE IF NOT EXISTS call_center_agent_status (
+    agent_id TEXT NOT NULL,
+    user_id TEXT,
+    status TEXT NOT NULL,
+    skills TEXT,
+    max_tickets INTEGER NOT NULL DEFAULT 5,
+    updated_at TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS call_center_agent_status_business_agent_key
+    ON call_center_agent_status ((COALESCE(CAST(user_id AS TEXT), '')), agent_id);
+
+-- agent -> business owner, as the webhook route resolves it
+CREATE TABLE IF NOT EXISTS retell_agents (
+    retell_agent_id TEXT PRIMARY KEY,
+    user_id TEXT
+);
+"""
+
+SCHEDULING_SCHEMA = """
+CREATE TABLE IF NOT EXISTS customers (
+    id TEXT PRIMARY KEY,
+    business_id TEXT NOT NULL,
+    user_id TEXT,
+    first_name TEXT NOT NULL,
+    last_name TEXT NOT NULL,
+    email TEXT,
+    phone TEXT,
+    is_active INTEGER DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS customers_user_idx ON customers (user_id);
+CREATE TABLE IF NOT EXISTS staff_members (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    first_name TEXT NOT NULL,
+    last_name TEXT NOT NULL,
+    is_active INTEGER DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS office_hours (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    business_id TEXT NOT NULL,
+    day_of_week INTEGER NOT NULL,
+    start_time TEXT NOT NULL,
+    end_time TEXT NOT NULL,
+    is_active INTEGER DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS business_holidays (
+    id TEXT PRIMARY KEY,
+    business_id TEXT NOT NULL,
+    user_id TEXT,
+    holiday_date TEXT NOT NULL,
+    holiday_name TEXT NOT NULL,
+    is_recurring INTEGER DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS staff_availability (
+    id TEXT PRIMARY KEY,
+    calendar_id TEXT NOT NULL,
+    staff_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    start_time TEXT,
+    end_time TEXT,
+    is_available INTEGER DEFAULT 1,
+    is_override INTEGER DEFAULT 0,
+    reason TEXT,
+    user_id TEXT
+);
+CREATE TABLE IF NOT EXISTS appointment_types (
+    id TEXT PRIMARY KEY,
+    business_id TEXT,
+    user_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    duration_minutes INTEGER NOT NULL DEFAULT 30,
+    buffer_before_minutes INTEGER NOT NULL DEFAULT 0,
+    buffer_after_minutes INTEGER NOT NULL DEFAULT 0,
+    allowed_staff_ids TEXT DEFAULT '[]',
+    is_active INTEGER DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS appointments (
+    id TEXT PRIMARY KEY,
+    business_id TEXT NOT NULL,
+    user_id TEXT,
+    customer_id TEXT,
+    staff_id TEXT NOT NULL,
+    appointment_type_id TEXT,
+    appointment_date TEXT NOT NULL,
+    start_time TEXT NOT NULL,
+    end_time TEXT NOT NULL,
+    duration_minutes INTEGER NOT NULL DEFAULT 30,
+    title TEXT,
+    notes TEXT,
+    status TEXT DEFAULT 'scheduled',
+    booking_source TEXT DEFAULT 'online'
+);
+CREATE INDEX IF NOT EXISTS appointments_user_date_idx ON appointments (user_id, appointment_date);
+CREATE INDEX IF NOT EXISTS appointments_customer_idx ON appointments (customer_id);
+CREATE TABLE IF NOT EXISTS business_profiles (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    business_name TEXT,
+    business_phone TEXT,
+    business_email TEXT,
+    business_address TEXT,
+    business_hours TEXT,
+    insurance_accepted TEXT DEFAULT '[]',
+    is_active INTEGER DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS business_services (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    service_name TEXT NOT NULL,
+    service_description TEXT,
+    price REAL,
+    duration_minutes INTEGER,
+    is_active INTEGER DEFAULT 1
+);
+-- Change counters for business_metadata.py, bumped by the triggers below
+CREATE TABLE IF NOT EXISTS business_metadata_versions (
+    user_id TEXT NOT NULL,
+    source_table TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, source_table)
+);
+""" + "".join(
+    f"""CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_metadata_version AFTER {event} ON {table}
+BEGIN
+    INSERT INTO business_metadata_versions (user_id, source_table, version) VALUES ({row}.user_id, '{table}', 1)
+    ON CONFLICT (user_id, source_table) DO UPDATE SET version = version + 1;
+END;
+"""
+    for table in ("business_profiles", "staff_members", "business_services", "appointment_types", "office_hours")
+    for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD"))
+)
+
+POSTGRES_INDEXES = """
+CREATE INDEX IF NOT EXISTS customer_call_logs_start_id_idx
+    ON customer_call_logs (start_timestamp DESC, id DESC);
+CREATE INDEX IF NOT EXISTS call_logs_started_id_idx
+    ON call_logs (started_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS call_logs_created_id_idx
+    ON call_logs (created_at, id);
+CREATE INDEX IF NOT EXISTS customer_call_logs_user_from_idx
+    ON customer_call_logs (user_id, from_number);
+CREATE UNIQUE INDEX IF NOT EXISTS customer_call_logs_call_id_key
+    ON customer_call_logs (call_id);
+"""
+
+AGENTS = [
+    ("agent_123abc", "Dental Reception AI"),
+    ("agent_456def", "Customer Support AI"),
+    ("agent_789ghi", "Medical Front Desk AI"),
+    ("agent_012jkl", "Restaurant Host AI"),
+]
+DISCONNECTION_REASONS = ["user_hangup", "agent_hangup", "call_transfer", "voicemail_reached", "inactivity"]
+TRANSCRIPT_LINES = [
+    "Agent: Thank you for calling, how can I help you today?",
+    "User: I'd like to book a cleaning appointment next week.",
+    "User: Can I reschedule my appointment to Thursday afternoon?",
+    "User: What insurance plans do you accept?",
+    "Agent: Let me check the available times for you.",
+    "Agent: You're all set, we'll send a confirmation text.",
+    "User: I have a billing question about my last visit.",
+]
+
+
+def generate_rows(count: int, seed: int = 42, tenants: int = 20, transcripts: bool = False):
+    """Yield (customer_call_log, call_log) row tuples, oldest first"""
+    rng = random.Random(seed)
+    tenant_ids = [str(uuid.UUID(int=rng.getrandbits(128), version=4)) for _ in range(tenants)]
+    # Repeat callers, so phone lookups have histories to find
+    callers = [rng.randint(1000000, 9999999) for _ in range(min(max(count // 8, 1), 200_000))]
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    ts = start
+
+    for i in range(count):
+        ts += timedelta(seconds=rng.randint(1, 90))
+        duration_ms = rng.randint(15_000, 900_000)
+        end = ts + timedelta(milliseconds=duration_ms)
+        agent_id, agent_name = AGENTS[i % len(AGENTS)]
+        tenant = tenant_ids[rng.randrange(tenants)]
+        call_id = f"call_{i:010d}"
+        local = callers[rng.randrange(len(callers))]
+        # Sources disagree on formatting; a quarter use the dashboard's dashed style
+        from_number = f"+1-555-{local // 10000:03d}-{local % 10000:04d}" if i % 4 == 3 else f"+1555{local}"
+        transcript = "\n".join(rng.sample(TRANSCRIPT_LINES, 3)) if transcripts else None
+        start_iso, end_iso = ts.isoformat(), end.isoformat()
+        cost = json.dumps({"combined_cost": round(duration_ms / 60000 * 7.5, 2), "total_duration_seconds": duration_ms // 1000})
+
+        yield (
+            (
+                str(uuid.UUID(int=rng.getrandbits(128), version=4)), end_iso, end_iso, tenant, None,
+                call_id, agent_id, agent_name, duration_ms, transcript, None,
+                DISCONNECTION_REASONS[rng.randrange(len(DISCONNECTION_REASONS))], cost, None,
+                from_number, "+18003368251", "inbound" if rng.random() < 0.8 else "outbound", None,
+                start_iso, end_iso, 1, "phone_call",
+            ),
+            (
+                str(uuid.UUID(int=rng.getrandbits(128), version=4)), call_id, None, tenant, from_number,
+                "completed", start_iso, end_iso, duration_ms // 1000, transcript, None, None,
+                round(rng.uniform(-1, 1), 3), None, None, None, end_iso, end_iso,
+            ),
+        )
+
+
+def generate_scheduling_rows(user_id: str, staff_count: int, start_date: date, days: int,
+                             seed: int = 42, utilization: float = 0.4, phones: list = ()) -> dict:
+    """Rows for the scheduling tables of one business, keyed by table name
+
+    Office hours are Mon-Fri 9:00-17:00 and Sat 9:00-13:00. About 5% of
+    staff-days are marked unavailable, and appointments fill roughly
+    `utilization` of the remaining hours. Each of `phones` (E.164) becomes a
+    customer, written in one of several local formats, who owns some of the
+    appointments.
+    """
+    # Offset the seed so staff and customer ids never repeat the call log tenant ids
+    rng = random.Random(seed + 1)
+    new_id = lambda: str(uuid.UUID(int=rng.getrandbits(128), version=4))
+    business_id = user_id
+    staff = [
+        {"id": new_id(), "user_id": user_id, "first_name": f"Staff{i}", "last_name": "Member", "is_active": 1}
+        for i in range(staff_count)
+    ]
+    office_hours = [
+        {"id": new_id(), "user_id": user_id, "business_id": business_id, "day_of_week": dow,
+         "start_time": "09:00:00", "end_time": "17:00:00" if dow != 6 else "13:00:00", "is_active": 1}
+        for dow in range(1, 7)
+    ]
+    holidays = [
+        {"id": new_id(), "business_id": business_id, "user_id": user_id,
+         "holiday_date": holiday, "holiday_name": name, "is_recurring": 1}
+        for holiday, name in (("2024-01-01", "New Year's Day"), ("2024-07-04", "Independence Day"),
+                              ("2024-12-25", "Christmas Day"))
+    ]
+    services = [
+        {"id": new_id(), "business_id": business_id, "user_id": user_id, "name": name,
+         "duration_minutes": minutes, "buffer_before_minutes": 0, "buffer_after_minutes": buffer,
+         "allowed_staff_ids": "[]", "is_active": 1}
+        for name, minutes, buffer in (("Checkup", 30, 0), ("Cleaning", 60, 10), ("Consultation", 45, 5))
+    ]
+
+    profiles = [{
+        "id": new_id(), "user_id": user_id, "business_name": "Example Dental", "business_phone": "+15550100000",
+        "business_email": "front-desk@example.com", "business_address": "100 Main St, Springfield, IL 62701",
+        "business_hours": None, "insurance_accepted": json.dumps(["Delta Dental", "Aetna", "Cigna"]),
+        "is_active": 1,
+    }]
+    business_services = [
+        {"id": new_id(), "user_id": user_id, "service_name": name, "service_description": None,
+         "price": price, "duration_minutes": minutes, "is_active": 1}
+        for name, price, minutes in (("Cleaning", 120.0, 60), ("Whitening", 350.0, 90))
+    ]
+
+    customers = []
+    for i, phone in enumerate(phones):
+        national = phone[-10:]
+        spelled = (phone, f"({national[:3]}) {national[3:6]}-{national[6:]}", national, f"1-{national[:3]}-{national[3:6]}-{national[6:]}")
+        customers.append({
+            "id": new_id(), "business_id": business_id, "user_id": user_id,
+            "first_name": f"Customer{i}", "last_name": "Example", "email": f"customer{i}@example.com",
+            "phone": spelled[i % len(spelled)], "is_active": 1,
+        })
+
+    availability, appointments = [], []
+    for member in staff:
+        for offset in range(days):
+            day = start_date + timedelta(days=offset)
+            if rng.random() < 0.05:
+                availability.append({
+                    "id": new_id(), "calendar_id": member["id"], "staff_id": member["id"],
+                    "date": day.isoformat(), "start_time": None, "end_time": None,
+                    "is_available": 0, "is_override": 1, "reason": "Time off", "user_id": user_id,
+                })
+                continue
+            if day.weekday() == 6:
+                continue
+            close = 13 * 60 if day.weekday() == 5 else 17 * 60
+            minute = 9 * 60
+            while minute < close:
+                length = rng.choice((30, 45, 60))
+                if minute + length <= close and rng.random() < utilization:
+                    appointments.append({
+                        "id": new_id(), "business_id": business_id, "user_id": user_id,
+                        "staff_id": member["id"], "appointment_date": day.isoformat(),
+                        "start_time": f"{minute // 60:02d}:{minute % 60:02d}:00",
+                        "end_time": f"{(minute + length) // 60:02d}:{(minute + length) % 60:02d}:00",
+                        "duration_minutes": length, "status": "scheduled", "booking_source": "online",
+                        "customer_id": customers[rng.randrange(len(customers))]["id"] if customers else None,
+                    })
+                minute += length
+
+    return {
+        "customers": customers,
+        "staff_members": staff,
+        "office_hours": office_hours,
+        "business_holidays": holidays,
+        "appointment_types": services,
+        "staff_availability": availability,
+        "appointments": appointments,
+        "business_profiles": profiles,
+        "business_services": business_services,
+    }
+
+
+def write_scheduling_sqlite(conn, rows_by_table: dict):
+    """Insert generate_scheduling_rows() output into SQLite"""
+    conn.executescript(SCHEDULING_SCHEMA)
+    with conn:
+        for table, rows in rows_by_table.items():
+            if rows:
+                columns = list(rows[0])
+                conn.executemany(
+                    f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                    [tuple(row[c] for c in columns) for row in rows],
+                )
+
+
+def write_sqlite(path: str, count: int, seed: int, transcripts: bool, batch_size: int = 5000,
+                 staff: int = 0):
+    """Write fixtures to a SQLite file, replacing any existing one"""
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.executescript(SQLITE_SCHEMA)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+
+    tenant = next(generate_rows(1, seed))[0][3]
+    with conn:
+        conn.executemany("INSERT INTO retell_agents VALUES (?, ?)", [(agent_id, tenant) for agent_id, _ in AGENTS])
+    phones = set()
+    customer_batch, call_batch = [], []
+    for customer_row, call_row in generate_rows(count, seed, transcripts=transcripts):
+        customer_batch.append(customer_row)
+        call_batch.append(call_row)
+        if customer_row[3] == tenant and len(phones) < 20 * staff:
+            phones.add(call_row[4].replace("-", ""))
+        if len(customer_batch) >= batch_size:
+            _flush_sqlite(conn, customer_batch, call_batch)
+            customer_batch, call_batch = [], []
+    _flush_sqlite(conn, customer_batch, call_batch)
+
+    if staff:
+        write_scheduling_sqlite(
+            conn, generate_scheduling_rows(tenant, staff, date.today(), 90, seed, phones=sorted(phones)))
+        print(f"Scheduling fixtures: {staff} staff, {len(phones)} customers for user_id {tenant}",
+              file=sys.stderr)
+    conn.close()
+
+
+def _flush_sqlite(conn, customer_batch, call_batch):
+    if not customer_batch:
+        return
+    with conn:
+        conn.executemany(f"INSERT INTO customer_call_logs VALUES ({', '.join('?' * 22)})", customer_batch)
+        conn.executemany(f"INSERT INTO call_logs VALUES ({', '.join('?' * 18)})", call_batch)
+
+
+async def write_postgres(dsn: str, count: int, seed: int, transcripts: bool, batch_size: int = 5000):
+    """COPY fixtures into existing Postgres tables"""
+    import asyncpg  # optional dependency, only needed for Postgres
+
+    customer_columns = [
+        "id", "created_at", "updated_at", "user_id", "call_record_url", "call_id", "agent_id",
+        "agent_name", "duration_ms", "transcript", "public_log_url", "disconnection_reason",
+        "call_cost", "call_analysis", "from_number", "to_number", "direction",
+        "telephony_identifier", "start_timestamp", "end_timestamp", "agent_version", "call_type",
+    ]
+    call_columns = [
+        "id", "call_id", "agent_id", "client_id", "phone_number", "call_status", "started_at",
+        "ended_at", "duration", "transcript", "call_summary", "call_analysis", "sentiment_score",
+        "keywords", "action_items", "retell_data", "created_at", "updated_at",
+    ]
+    customer_ts = {1, 2, 18, 19}
+    call_ts = {6, 7, 16, 17}
+
+    def convert(row, ts_positions):
+        return tuple(
+            datetime.fromisoformat(v) if i in ts_positions and v is not None else
+            uuid.UUID(v) if i == 0 else v
+            for i, v in enumerate(row)
+        )
+
+    conn = await asyncpg.connect(dsn)
+    try:
+        await conn.execute(POSTGRES_INDEXES)
+        customer_batch, call_batch = [], []
+        for customer_row, call_row in generate_rows(count, seed, transcripts=transcripts):
+            customer_batch.append(convert(customer_row, customer_ts))
+            call_batch.append(convert(call_row, call_ts))
+            if len(customer_batch) >= batch_size:
+                await conn.copy_records_to_table("customer_call_logs", records=customer_batch, columns=customer_columns)
+                await conn.copy_records_to_table("call_logs", records=call_batch, columns=call_columns)
+                customer_batch, call_batch = [], []
+        if customer_batch:
+            await conn.copy_records_to_table("customer_call_logs", records=customer_batch, columns=customer_columns)
+            await conn.copy_records_to_table("call_logs", records=call_batch, columns=call_columns)
+    finally:
+        await conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic call log fixtures")
+    parser.add_argument("--rows", type=int, default=10_000, help="Rows per table (default: 10000)")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="SQLite output path")
+    parser.add_argument("--postgres-url", help="Load into Postgres instead of SQLite")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--transcripts", action="store_true", help="Include short transcripts")
+    parser.add_argument("--staff", type=int, default=10,
+                        help="Staff members for the scheduling tables (SQLite only, 0 to skip)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.postgres_url:
+        asyncio.run(write_postgres(args.postgres_url, args.rows, args.seed, args.transcripts))
+        target = args.postgres_url
+    else:
+        write_sqlite(args.db, args.rows, args.seed, args.transcripts, staff=args.staff)
+        target = args.db
+    elapsed = time.perf_counter() - started
+    print(f"Wrote {args.rows} rows per table to {target} in {elapsed:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
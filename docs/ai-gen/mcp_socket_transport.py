@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Multi-client socket transport for the Call Center MCP servers
+
+Serves many MCP sessions from one process over TCP or a Unix socket, using the
+same newline-delimited JSON-RPC framing as stdio. Each connection gets its own
+ServerSession on the shared `mcp.server.Server`, so there is no per-client
+process startup or interpreter memory.
+
+Limits:
+    max_sessions          concurrent sessions; extra connections wait up to
+                          admission_timeout for a slot, then get a busy error
+    max_inflight          unanswered requests per session; the reader stops
+                          reading that socket until responses go out, so a
+                          chatty client is throttled by TCP flow control
+    max_message_bytes     largest accepted JSON-RPC line
+    workers               size of the loop's default thread pool, shared by
+                          asyncio.to_thread and registry tools marked blocking
+
+With --tenant-workers N the listening process only routes: it starts N
+copies of the server, peeks at each connection's `initialize` request for
+the tenant the client declares (capabilities.experimental.tenant.user_id)
+and passes the socket itself (SCM_RIGHTS) to the worker that owns that
+tenant on a consistent-hash ring. Every session of a business then lands on
+the same process, and so do its cache partitions; sessions without a
+tenant are spread round-robin. Limits apply per worker.
+
+Usage:
+    python working_mcp_server.py --listen 127.0.0.1:8765
+    python working_mcp_server.py --listen unix:/tmp/call-center-mcp.sock --max-sessions 512
+    python working_mcp_server.py --listen 127.0.0.1:8765 --tenant-workers 8
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import anyio
+from mcp import types
+from mcp.shared.message import SessionMessage
+
+from tenant_cache import ConsistentHashRing, tenant_from_initialize
+
+
+BUSY_ERROR = {
+    "jsonrpc": "2.0",
+    "id": None,
+    "error": {"code": -32000, "message": "Server busy: too many sessions, retry later"},
+}
+# How much of a new connection the tenant router looks at for `initialize`
+ROUTE_PEEK_BYTES = 64 * 1024
+# The listening process keeps webhook ingest; workers would only duplicate it
+ROUTER_ONLY_ENV = ("CALL_CENTER_SPOOL_DIR",)
+
+
+class SocketTransportServer:
+    """Accepts socket connections and runs one MCP session per connection"""
+
+    def __init__(self, app, *, max_sessions: int = 256, max_inflight: int = 16,
+                 max_message_bytes: int = 4 * 1024 * 1024, admission_timeout: float = 5.0,
+                 workers: int = 8):
+        self.app = app
+        self.init_options = app.create_initialization_options()
+        self.max_sessions = max_sessions
+        self.max_inflight = max_inflight
+        self.max_message_bytes = max_message_bytes
+        self.admission_timeout = admission_timeout
+        self.workers = workers
+        self.active_sessions = 0
+        self.total_sessions = 0
+        self.rejected_sessions = 0
+        self._slots = asyncio.Semaphore(max_sessions)
+
+    async def serve(self, address: str):
+        """Listen on HOST:PORT or unix:/path until cancelled"""
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="mcp-worker"))
+
+        if address.startswith("unix:"):
+            server = await asyncio.start_unix_server(
+                self._handle_connection, path=address[len("unix:"):], limit=self.max_message_bytes)
+        else:
+            host, _, port = address.rpartition(":")
+            server = await asyncio.start_server(
+                self._handle_connection, host or "127.0.0.1", int(port), limit=self.max_message_bytes)
+
+        print(f"MCP socket transport listening on {address}", file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+
+    async def serve_handoff(self, fd: int):
+        """Serve connections a TenantRouter passes over the inherited socket `fd`, until it closes"""
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="mcp-worker"))
+        channel = socket.socket(fileno=fd)
+        channel.setblocking(False)
+        sessions: set = set()
+        while True:
+            await _readable(loop, channel)
+            try:
+                data, fds, _, _ = socket.recv_fds(channel, 1, 1)
+            except BlockingIOError:
+                continue
+            if not data:
+                break
+            for handed in fds:
+                reader, writer = await asyncio.open_connection(sock=socket.socket(fileno=handed),
+                                                               limit=self.max_message_bytes)
+                session = asyncio.ensure_future(self._handle_connection(reader, writer))
+                sessions.add(session)
+                session.add_done_callback(sessions.discard)
+        channel.close()
+        if sessions:
+            await asyncio.wait(sessions)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.admission_timeout)
+        except asyncio.TimeoutError:
+            self.rejected_sessions += 1
+            writer.write(json.dumps(BUSY_ERROR).encode() + b"\n")
+            await _close(writer)
+            return
+
+        self.active_sessions += 1
+        self.total_sessions += 1
+        try:
+            await self._run_session(reader, writer)
+        except Exception as e:
+            print(f"MCP session ended with error: {e!r}", file=sys.stderr)
+        finally:
+            self.active_sessions -= 1
+            self._slots.release()
+            await _close(writer)
+
+    async def _run_session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        read_send, read_recv = anyio.create_memory_object_stream[SessionMessage | Exception](self.max_inflight)
+        write_send, write_recv = anyio.create_memory_object_stream[SessionMessage](self.max_inflight)
+        inflight = _InflightLimiter(self.max_inflight)
+
+        async with anyio.create_task_group() as tg:
+            async def read_until_disconnect():
+                await self._read_loop(reader, read_send, inflight)
+                # The client is gone: abandon its unanswered requests and free the slot
+                tg.cancel_scope.cancel()
+
+            tg.start_soon(read_until_disconnect)
+            tg.start_soon(self._write_loop, writer, write_recv, inflight)
+            async with write_send:
+                await self.app.run(read_recv, write_send, self.init_options)
+            tg.cancel_scope.cancel()
+
+    async def _read_loop(self, reader: asyncio.StreamReader, read_send, inflight: "_InflightLimiter"):
+        async with read_send:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Line exceeded max_message_bytes; the stream cannot be resynchronized
+                    await read_send.send(ValueError(f"Message larger than {self.max_message_bytes} bytes"))
+                    return
+                if not line:
+                    return
+                try:
+                    message = types.JSONRPCMessage.model_validate_json(line)
+                except Exception as exc:
+                    await read_send.send(exc)
+                    continue
+                if isinstance(message.root, types.JSONRPCRequest):
+                    await inflight.acquire(message.root.id)
+                await read_send.send(SessionMessage(message))
+
+    async def _write_loop(self, writer: asyncio.StreamWriter, write_recv, inflight: "_InflightLimiter"):
+        async with write_recv:
+            async for session_message in write_recv:
+                root = session_message.message.root
+                writer.write(session_message.message.model_dump_json(by_alias=True, exclude_none=True).encode())
+                writer.write(b"\n")
+                await writer.drain()
+                if isinstance(root, (types.JSONRPCResponse, types.JSONRPCError)):
+                    inflight.release(root.id)
+
+
+class _InflightLimiter:
+    """Caps unanswered client requests per session"""
+
+    def __init__(self, limit: int):
+        self._semaphore = asyncio.Semaphore(limit)
+        self._pending: set = set()
+
+    async def acquire(self, request_id):
+        await self._semaphore.acquire()
+        self._pending.add(request_id)
+
+    def release(self, request_id):
+        if request_id in self._pending:
+            self._pending.discard(request_id)
+            self._semaphore.release()
+
+
+class TenantRouter:
+    """Hands each connection to the worker process that owns its tenant"""
+
+    def __init__(self, worker_command: list[str], workers: int, *, peek_timeout: float = 5.0):
+        self.worker_command = worker_command
+        self.workers = workers
+        self.peek_timeout = peek_timeout
+        self.ring = ConsistentHashRing(range(workers))
+        self.routed = [0] * workers
+        self._channels: list = []
+        self._processes: list = []
+        self._round_robin = 0
+        self._routing: set = set()
+
+    def worker_for(self, tenant) -> int:
+        if tenant is None:
+            self._round_robin += 1
+            return self._round_robin % self.workers
+        return self.ring.node_for(tenant)
+
+    async def serve(self, address: str):
+        """Start the workers, then listen on HOST:PORT or unix:/path until cancelled"""
+        env = {key: value for key, value in os.environ.items() if key not in ROUTER_ONLY_ENV}
+        metrics_file = env.pop("CALL_CENTER_METRICS_FILE", None)
+        state_dir = env.pop("CALL_CENTER_STATE_DIR", None)
+        for worker in range(self.workers):
+            if metrics_file:
+                root, ext = os.path.splitext(metrics_file)
+                env["CALL_CENTER_METRICS_FILE"] = f"{root}-worker{worker}{ext}"
+            if state_dir:
+                # A worker keeps the same tenants across restarts, so its own state directory stays warm
+                env["CALL_CENTER_STATE_DIR"] = os.path.join(state_dir, f"worker{worker}")
+            # Datagram-like records: one byte and one descriptor per connection
+            parent, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+            self._processes.append(await asyncio.create_subprocess_exec(
+                *self.worker_command, "--handoff-fd", str(child.fileno()), pass_fds=[child.fileno()], env=env))
+            child.close()
+            self._channels.append(parent)
+
+        if address.startswith("unix:"):
+            listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            listener.bind(address[len("unix:"):])
+            listener.listen(1024)
+        else:
+            host, _, port = address.rpartition(":")
+            listener = socket.create_server((host or "127.0.0.1", int(port)), backlog=1024)
+        listener.setblocking(False)
+
+        loop = asyncio.get_running_loop()
+        print(f"MCP tenant router listening on {address} ({self.workers} workers)", file=sys.stderr)
+        try:
+            while True:
+                conn, _ = await loop.sock_accept(listener)
+                routing = asyncio.ensure_future(self._route(conn))
+                self._routing.add(routing)
+                routing.add_done_callback(self._routing.discard)
+        finally:
+            listener.close()
+            for channel in self._channels:
+                channel.close()
+            for process in self._processes:
+                if process.returncode is None:
+                    process.terminate()
+
+    async def _route(self, conn: socket.socket):
+        try:
+            line = await asyncio.wait_for(self._peek_line(conn), self.peek_timeout)
+            worker = self.worker_for(tenant_from_initialize(line))
+            socket.send_fds(self._channels[worker], [b"c"], [conn.fileno()])
+            self.routed[worker] += 1
+        except (asyncio.TimeoutError, OSError) as e:
+            print(f"MCP connection not routed: {e!r}", file=sys.stderr)
+        finally:
+            # The worker holds its own copy of the descriptor now
+            conn.close()
+
+    async def _peek_line(self, conn: socket.socket) -> bytes:
+        """The connection's first line, left unread for the worker"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await _readable(loop, conn)
+            data = conn.recv(ROUTE_PEEK_BYTES, socket.MSG_PEEK)
+            if not data or b"\n" in data or len(data) >= ROUTE_PEEK_BYTES:
+                return data.partition(b"\n")[0]
+            # The rest of the line is still in flight
+            await asyncio.sleep(0.001)
+
+
+async def _readable(loop: asyncio.AbstractEventLoop, sock: socket.socket):
+    ready = loop.create_future()
+    loop.add_reader(sock.fileno(), lambda: ready.done() or ready.set_result(None))
+    try:
+        await ready
+    finally:
+        loop.remove_reader(sock.fileno())
+
+
+async def _close(writer: asyncio.StreamWriter):
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except (ConnectionError, OSError):
+        pass
+
+
+def parse_transport_args(description: str, argv: Optional[list] = None) -> argparse.Namespace:
+    """Command-line options shared by the servers' main()"""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--listen", metavar="ADDRESS",
+                        help="Serve many clients on HOST:PORT or unix:/path instead of stdio")
+    parser.add_argument("--max-sessions", type=int, default=256, help="Concurrent sessions (default: 256)")
+    parser.add_argument("--max-inflight", type=int, default=16,
+                        help="Unanswered requests per session (default: 16)")
+    parser.add_argument("--workers", type=int, default=8, help="Blocking handler threads (default: 8)")
+    parser.add_argument("--tenant-workers", type=int, default=0,
+                        help="Route sessions by tenant to this many worker processes (default: serve in-process)")
+    parser.add_argument("--handoff-fd", type=int, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+async def serve_socket(app, args: argparse.Namespace):
+    """Run `app` on a socket transport configured from parse_transport_args()"""
+    if args.tenant_workers > 0 and args.handoff_fd is None:
+        # Workers get the same address but serve only what the router hands them
+        worker_command = [sys.executable, sys.argv[0], "--listen", args.listen,
+                          "--max-sessions", str(args.max_sessions), "--max-inflight", str(args.max_inflight),
+                          "--workers", str(args.workers)]
+        await TenantRouter(worker_command, args.tenant_workers).serve(args.listen)
+        return
+
+    transport = SocketTransportServer(
+        app,
+        max_sessions=args.max_sessions,
+        max_inflight=args.max_inflight,
+        workers=args.workers,
+    )
+    if args.handoff_fd is not None:
+        await transport.serve_handoff(args.handoff_fd)
+    else:
+        await transport.serve(args.listen)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Retell agent listings behind get_retell_agents
+
+Agent lists come from Retell's `list-agents` over the process-wide
+RetellClient (one keep-alive connection pool), behind two layers that keep
+a burst of sessions asking for agents at once from becoming a burst of
+upstream calls:
+
+    single-flight            concurrent reads of the same key share one
+                             upstream request and its result (or error)
+    stale-while-revalidate   a value younger than `ttl` is served from
+                             memory; until `ttl + stale_ttl` it is still
+                             served at once while one background request
+                             refreshes it; older values are fetched again
+                             (coalesced) before answering
+
+A failed background refresh keeps the stale value, and is retried at most
+every `retry_interval` seconds, until it ages out. `list-agents` covers the
+whole Retell account, so one cached list serves every business; each
+business sees the agents `retell_agents` assigns to it (the mapping the
+webhook route uses, cached the same way).
+
+Configuration:
+    CALL_CENTER_RETELL_AGENTS_TTL     seconds a list is fresh (default: 30)
+    CALL_CENTER_RETELL_AGENTS_STALE   seconds it may be served stale after that (default: 300)
+"""
+
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+
+class SingleFlight:
+    """At most one call in flight per key; concurrent callers of a key await the same call"""
+
+    def __init__(self):
+        self._calls: dict = {}
+        self.calls = 0
+        self.shared = 0
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    async def do(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fetch())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+            self.calls += 1
+        else:
+            self.shared += 1
+        # A caller that is cancelled must not cancel the call the others are waiting on
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Future):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Marks the error retrieved even if every caller gave up waiting
+            task.exception()
+
+
+class StaleWhileRevalidateCache:
+    """Values fetched through SingleFlight, served stale for `stale_ttl` while one refresh runs"""
+
+    def __init__(self, ttl: float, stale_ttl: float, retry_interval: float = 1.0, clock=time.monotonic):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.retry_interval = retry_interval
+        self.flight = SingleFlight()
+        self._clock = clock
+        # key -> (fetched_at, value)
+        self._entries: dict = {}
+        self._retry_at: dict = {}
+        self._refreshes: set = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refresh_errors = 0
+
+    async def get(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            now = self._clock()
+            age = now - entry[0]
+            if age < self.ttl:
+                self.hits += 1
+                return entry[1]
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                if not self.flight.in_flight(key) and now >= self._retry_at.get(key, 0.0):
+                    self._revalidate(key, fetch)
+                return entry[1]
+        self.misses += 1
+        return await self.flight.do(key, lambda: self._load(key, fetch))
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Forget one key, or everything"""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    async def refreshed(self):
+        """Wait for the background refreshes running now"""
+        await asyncio.gather(*self._refreshes, return_exceptions=True)
+
+    async def close(self):
+        for task in list(self._refreshes):
+            task.cancel()
+        await asyncio.gather(*self._refreshes, return_exceptions=True)
+
+    async def _load(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        value = await fetch()
+        self._entries[key] = (self._clock(), value)
+        self._retry_at.pop(key, None)
+        return value
+
+    def _revalidate(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]):
+        task = asyncio.ensure_future(self.flight.do(key, lambda: self._load(key, fetch)))
+        self._refreshes.add(task)
+        task.add_done_callback(lambda done: self._refreshed(key, done))
+
+    def _refreshed(self, key: Hashable, task: asyncio.Future):
+        self._refreshes.discard(task)
+        if task.cancelled() or task.exception() is None:
+            return
+        self.refresh_errors += 1
+        self._retry_at[key] = self._clock() + self.retry_interval
+        print(f"Refreshing {key} failed, serving the cached value: {task.exception()!r}", file=sys.stderr)
+
+
+def agent_summary(agent: dict) -> dict:
+    """The fields get_retell_agents returns for one Retell agent object"""
+    modified = agent.get("last_modification_timestamp")
+    engine = agent.get("response_engine") or {}
+    return {
+        "agent_id": agent["agent_id"],
+        "agent_name": agent.get("agent_name"),
+        "version": agent.get("version"),
+        "is_published": agent.get("is_published"),
+        "voice_id": agent.get("voice_id"),
+        "language": agent.get("language"),
+        "llm_id": engine.get("llm_id"),
+        "last_modified": (datetime.fromtimestamp(modified / 1000, timezone.utc).isoformat()
+                          if isinstance(modified, (int, float)) else None),
+    }
+
+
+class AgentDirectory:
+    """Retell agents per business, coalesced and cached in front of the Retell API"""
+
+    def __init__(self, retell, store=None, ttl: float = 30.0, stale_ttl: float = 300.0, clock=time.monotonic):
+        self.retell = retell
+        self.store = store
+        self.cache = StaleWhileRevalidateCache(ttl, stale_ttl, clock=clock)
+
+    async def agents(self, user_id: Optional[str] = None) -> list[dict]:
+        """Summaries of the account's agents, only `user_id`'s when given and a store is set"""
+        agents = await self.cache.get("list-agents", self._list_agents)
+        if user_id is None or self.store is None:
+            return agents
+        owners = await self.cache.get("retell_agents", self._owners)
+        return [agent for agent in agents if owners.get(agent["agent_id"]) == user_id]
+
+    async def _list_agents(self) -> list[dict]:
+        # list-agents can return several versions of an agent; keep the newest
+        latest: dict = {}
+        for agent in await self.retell.list_agents():
+            current = latest.get(agent["agent_id"])
+            if current is None or (agent.get("version") or 0) > (current.get("version") or 0):
+                latest[agent["agent_id"]] = agent
+        return [agent_summary(agent) for agent in latest.values()]
+
+    async def _owners(self) -> dict:
+        rows = await self.store.query("SELECT retell_agent_id, user_id FROM retell_agents")
+        return {row["retell_agent_id"]: row["user_id"] for row in rows}
+
+
+_directory: Optional[AgentDirectory] = None
+
+
+async def get_agent_directory() -> AgentDirectory:
+    """Return the process-wide directory over the shared Retell client and call log store"""
+    global _directory
+    if _directory is None:
+        from call_log_store import get_call_log_store
+        from retell_client import get_retell_client
+
+        retell = get_retell_client()
+        store = await get_call_log_store()
+        _directory = _directory or AgentDirectory(
+            retell, store,
+            ttl=float(os.environ.get("CALL_CENTER_RETELL_AGENTS_TTL", "30")),
+            stale_ttl=float(os.environ.get("CALL_CENTER_RETELL_AGENTS_STALE", "300")),
+        )
+    return _directory
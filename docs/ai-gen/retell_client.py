@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Minimal async client for the Retell REST API
+
+Covers the calls the deployment queue makes (create/update LLM and agent,
+list agents) over one pooled httpx connection pool. Errors carry the HTTP
+status so callers can tell retryable failures (timeouts, 408, 429, 5xx)
+from requests Retell will never accept.
+
+`get_retell_client()` returns the process-wide client, so deployments and
+agent listings share one set of keep-alive connections
+(`CALL_CENTER_RETELL_CONNECTIONS`, default 16).
+
+Set RETELL_API_KEY, and RETELL_BASE_URL to point at fake_retell_server.py
+for local runs.
+"""
+
+import os
+from typing import Optional
+
+
+DEFAULT_BASE_URL = "https://api.retellai.com"
+
+
+class RetellAPIError(RuntimeError):
+    """A Retell request failed; `status` is None for connection errors and timeouts"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+    @property
+    def retryable(self) -> bool:
+        return self.status is None or self.status in (408, 429) or self.status >= 500
+
+
+class RetellClient:
+    """Retell API calls over a shared keep-alive connection pool"""
+
+    def __init__(self, api_key: str, base_url: str = DEFAULT_BASE_URL, max_connections: int = 16,
+                 timeout: float = 30.0):
+        import httpx  # installed with the MCP SDK
+
+        self.base_url = base_url.rstrip("/")
+        self._http = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={"Authorization": f"Bearer {api_key}"},
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=timeout,
+        )
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "RetellClient":
+        api_key = os.environ.get("RETELL_API_KEY")
+        if not api_key:
+            raise RuntimeError("RETELL_API_KEY environment variable is required")
+        return cls(api_key, os.environ.get("RETELL_BASE_URL") or DEFAULT_BASE_URL, **kwargs)
+
+    async def _request(self, method: str, path: str, body: Optional[dict] = None):
+        import httpx
+
+        try:
+            response = await self._http.request(method, path, json=body)
+        except httpx.HTTPError as e:
+            raise RetellAPIError(f"{method} {path} failed: {e!r}") from e
+        if response.status_code >= 400:
+            raise RetellAPIError(f"{method} {path} returned {response.status_code}: {response.text[:200]}",
+                                 response.status_code)
+        return response.json()
+
+    async def create_llm(self, config: dict) -> dict:
+        return await self._request("POST", "/create-retell-llm", config)
+
+    async def update_llm(self, llm_id: str, config: dict) -> dict:
+        return await self._request("PATCH", f"/update-retell-llm/{llm_id}", config)
+
+    async def create_agent(self, config: dict) -> dict:
+        return await self._request("POST", "/create-agent", config)
+
+    async def update_agent(self, agent_id: str, config: dict) -> dict:
+        return await self._request("PATCH", f"/update-agent/{agent_id}", config)
+
+    async def list_agents(self) -> list[dict]:
+        return await self._request("GET", "/list-agents")
+
+    async def close(self):
+        await self._http.aclose()
+
+
+_client: Optional[RetellClient] = None
+
+
+def get_retell_client() -> RetellClient:
+    """Return the process-wide client; RuntimeError without RETELL_API_KEY"""
+    global _client
+    if _client is None:
+        _client = RetellClient.from_env(
+            max_connections=int(os.environ.get("CALL_CENTER_RETELL_CONNECTIONS", "16")))
+    return _client
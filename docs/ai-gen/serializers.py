@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+JSON encoding of tool and resource responses for the Call Center MCP servers
+
+Tool results used to be `json.dumps(value, indent=2)`, often with an emoji
+banner glued in front, so clients had to strip text before parsing and paid
+for the indentation on every row. A Serializer encodes them instead:
+
+    compact     no whitespace, UTF-8 left unescaped (the default)
+    pretty      indent=2, for reading responses by hand
+
+Backends are the standard library `json` and, when it is installed,
+`orjson` (several times faster, and it takes datetimes and numpy scalars
+natively). Both produce the same JSON for the values the tools return.
+
+result() returns the text content plus the same value as structuredContent,
+with any banner as its own text block so the JSON block always parses.
+encode_rows() encodes a large row list incrementally, one JSON array per
+~64 KiB chunk, so no single string holds the whole result; such results
+carry only their summary as structured content, since repeating every row
+in structuredContent would double the bytes on the wire.
+
+Configuration:
+    CALL_CENTER_RESPONSE_FORMAT     compact (default) or pretty
+    CALL_CENTER_JSON_BACKEND        auto (default: orjson if installed), json or orjson
+"""
+
+import json
+import os
+from typing import Any, Iterable, Iterator, Optional
+
+from mcp import types
+
+
+CHUNK_BYTES = 64 * 1024
+FORMATS = ("compact", "pretty")
+BACKENDS = ("auto", "json", "orjson")
+
+# What Serializer.result() returns: text content plus structuredContent, the
+# pair the MCP call_tool handler accepts
+ToolResult = tuple[list[types.TextContent], dict]
+
+
+def _default(value: Any) -> Any:
+    """Values json cannot encode natively: datetimes as ISO 8601, numpy scalars as numbers, the rest as str"""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if hasattr(value, "item") and hasattr(value, "dtype"):
+        return value.item()
+    return str(value)
+
+
+class Serializer:
+    """Encodes response values as JSON text with one backend and format"""
+
+    def __init__(self, format: str = "compact", backend: str = "auto", chunk_bytes: int = CHUNK_BYTES):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown response format: {format} (expected one of {', '.join(FORMATS)})")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown JSON backend: {backend} (expected one of {', '.join(BACKENDS)})")
+        orjson = None
+        if backend != "json":
+            try:
+                import orjson  # optional dependency, only used when installed
+            except ImportError:
+                if backend == "orjson":
+                    raise
+        self.format = format
+        self.backend = "orjson" if orjson else "json"
+        self.chunk_bytes = chunk_bytes
+
+        if orjson:
+            option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+            if format == "pretty":
+                option |= orjson.OPT_INDENT_2
+            encode = orjson.dumps
+            self._encode = lambda value: encode(value, default=_default, option=option).decode()
+        else:
+            self._encode = json.JSONEncoder(
+                ensure_ascii=False, default=_default,
+                **({"indent": 2} if format == "pretty" else {"separators": (",", ":")}),
+            ).encode
+
+    @property
+    def name(self) -> str:
+        return f"{self.backend}-{self.format}"
+
+    def dumps(self, value: Any) -> str:
+        return self._encode(value)
+
+    def encode_rows(self, rows: Iterable[Any]) -> Iterator[str]:
+        """Encode `rows` as a series of JSON arrays of about chunk_bytes each
+
+        Rows are pulled and encoded a batch at a time. The batch size starts
+        from the first row's encoded size and adapts to the chunks actually
+        produced, so only one chunk is held at once.
+        """
+        batch: list = []
+        per_chunk = 0
+        for row in rows:
+            if not per_chunk:
+                per_chunk = max(self.chunk_bytes // (len(self.dumps(row)) + 1), 1)
+            batch.append(row)
+            if len(batch) >= per_chunk:
+                text = self.dumps(batch)
+                yield text
+                per_chunk = max(int(per_chunk * self.chunk_bytes / max(len(text), 1)), 1)
+                batch = []
+        if batch:
+            yield self.dumps(batch)
+
+    def result(self, value: Any, header: Optional[str] = None) -> ToolResult:
+        """Tool result for `value`: (text content, structured content) for the MCP call_tool handler"""
+        content = [types.TextContent(type="text", text=self.dumps(value))]
+        if header:
+            content.insert(0, types.TextContent(type="text", text=header))
+        # structuredContent must be an object; other values are wrapped like FastMCP does
+        return content, value if isinstance(value, dict) else {"result": value}
+
+    def rows_result(self, chunks: Iterable[str], summary: dict, header: Optional[str] = None) -> ToolResult:
+        """Tool result for already encoded row chunks: one text block per chunk, the summary as structured content"""
+        content = [types.TextContent(type="text", text=text) for text in chunks]
+        if header:
+            content.insert(0, types.TextContent(type="text", text=header))
+        content.append(types.TextContent(type="text", text=self.dumps(summary)))
+        return content, summary
+
+
+_serializer: Optional[Serializer] = None
+
+
+def get_serializer() -> Serializer:
+    """Process-wide serializer configured from the environment"""
+    global _serializer
+    if _serializer is None:
+        _serializer = Serializer(os.environ.get("CALL_CENTER_RESPONSE_FORMAT", "compact"),
+                                 os.environ.get("CALL_CENTER_JSON_BACKEND", "auto"))
+    return _serializer
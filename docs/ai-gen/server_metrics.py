@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Per-tool and per-resource metrics for the Call Center MCP servers
+
+ToolRegistry.dispatch (for a registry given metrics) and ServerMetrics.call()
+wrap tool and resource handlers. Each call records its latency in an
+HDR-style log-linear histogram (32 linear sub-buckets per power of two, so
+any percentile is within ~3% of the true value), its response size in bytes,
+or its failure by exception type. Every call and error is counted; past a
+tool's first 1024 calls only one in 16 is timed and sized, which keeps the
+cost on a ~20 µs tools/call round trip well under 2%.
+
+Everything is exposed as the `call-center://metrics` resource (JSON), as
+Prometheus text exposition (`call-center://metrics/prometheus`, and a file
+rewritten every 15 s when CALL_CENTER_METRICS_FILE is set, for the node
+exporter textfile collector), and on demand as a cProfile or tracemalloc
+report: reading `call-center://metrics/profile?mode=cpu&seconds=5` profiles
+the event loop thread for that long while requests keep being served.
+"""
+
+import asyncio
+import os
+import sys
+import time
+from typing import Any, Optional
+
+
+METRICS_URI = "call-center://metrics"
+PROMETHEUS_URI = "call-center://metrics/prometheus"
+PROFILE_URI = "call-center://metrics/profile"
+
+SUB_BUCKET_BITS = 6
+_SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+_HALF = _SUB_BUCKETS >> 1
+# ns up to 2^44 (~4.9 hours)
+_BUCKETS = _SUB_BUCKETS + (44 - SUB_BUCKET_BITS) * _HALF
+
+# Prometheus `le` boundaries in seconds
+PROMETHEUS_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                      1.0, 2.5, 5.0, 10.0, 30.0)
+MAX_SERIES = 1000
+
+
+def bucket_index(value: int) -> int:
+    """Histogram bucket for a non-negative integer: exact below 64, then 32 per power of two"""
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    if shift <= 0:
+        return value
+    index = (shift << (SUB_BUCKET_BITS - 1)) + (value >> shift)
+    return index if index < _BUCKETS else _BUCKETS - 1
+
+
+def bucket_upper(index: int) -> int:
+    """Largest value that falls into bucket `index`"""
+    if index < _SUB_BUCKETS:
+        return index
+    shift, offset = divmod(index - _SUB_BUCKETS, _HALF)
+    shift += 1
+    return ((offset + _HALF + 1) << shift) - 1
+
+
+class Series:
+    """Counters and a latency histogram for one tool or resource
+
+    `calls` and `errors` count every call. Latency and response size are
+    recorded for the first EXACT_CALLS calls and then for one call in
+    `sample_every`, so rarely used tools are measured in full and busy ones
+    cost a counter increment most of the time.
+    """
+
+    EXACT_CALLS = 1024
+
+    __slots__ = ("calls", "errors", "error_types", "sample_mask", "samples", "error_samples", "latency_ns", "latency_sum_ns",
+                 "latency_max_ns", "bytes_sum", "bytes_max")
+
+    def __init__(self, sample_every: int = 1):
+        if sample_every < 1 or sample_every & (sample_every - 1):
+            raise ValueError(f"sample_every must be a power of two, got {sample_every}")
+        self.calls = 0
+        self.errors = 0
+        self.error_types: dict = {}
+        self.sample_mask = sample_every - 1
+        self.samples = 0
+        self.error_samples = 0
+        self.latency_ns = [0] * _BUCKETS
+        self.latency_sum_ns = 0
+        self.latency_max_ns = 0
+        self.bytes_sum = 0
+        self.bytes_max = 0
+
+    def sample(self) -> bool:
+        """Count a call; True when its latency and size should be recorded"""
+        self.calls = calls = self.calls + 1
+        return not calls & self.sample_mask or calls <= self.EXACT_CALLS
+
+    def record(self, elapsed_ns: int, size: int):
+        """Latency and response size of a sampled successful call (no allocation, one list update)"""
+        self.samples += 1
+        self.latency_sum_ns += elapsed_ns
+        if elapsed_ns > self.latency_max_ns:
+            self.latency_max_ns = elapsed_ns
+        shift = elapsed_ns.bit_length() - SUB_BUCKET_BITS
+        if shift <= 0:
+            self.latency_ns[elapsed_ns] += 1
+        else:
+            index = (shift << (SUB_BUCKET_BITS - 1)) + (elapsed_ns >> shift)
+            self.latency_ns[index if index < _BUCKETS else _BUCKETS - 1] += 1
+        self.bytes_sum += size
+        if size > self.bytes_max:
+            self.bytes_max = size
+
+    def record_error(self, error: BaseException, elapsed_ns: Optional[int] = None):
+        """A failed call, with its latency when it was sampled"""
+        self.errors += 1
+        error_type = type(error).__name__
+        self.error_types[error_type] = self.error_types.get(error_type, 0) + 1
+        if elapsed_ns is not None:
+            self.samples += 1
+            self.error_samples += 1
+            self.latency_sum_ns += elapsed_ns
+            if elapsed_ns > self.latency_max_ns:
+                self.latency_max_ns = elapsed_ns
+            self.latency_ns[bucket_index(elapsed_ns)] += 1
+
+    def percentile_ns(self, q: float) -> int:
+        if not self.samples:
+            return 0
+        rank = max(int(self.samples * q + 0.5), 1)
+        seen = 0
+        for index, count in enumerate(self.latency_ns):
+            seen += count
+            if seen >= rank:
+                return min(bucket_upper(index), self.latency_max_ns)
+        return self.latency_max_ns
+
+    def summary(self) -> dict:
+        ms = 1e-6
+        sized = self.samples - self.error_samples
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "error_types": dict(self.error_types),
+            "sampled": self.samples,
+            "latency_ms": {
+                "mean": round(self.latency_sum_ns / self.samples * ms, 3) if self.samples else 0,
+                "p50": round(self.percentile_ns(0.5) * ms, 3),
+                "p90": round(self.percentile_ns(0.9) * ms, 3),
+                "p99": round(self.percentile_ns(0.99) * ms, 3),
+                "max": round(self.latency_max_ns * ms, 3),
+            },
+            "response_bytes": {
+                "mean": round(self.bytes_sum / sized) if sized > 0 else 0,
+                "max": self.bytes_max,
+            },
+        }
+
+
+def payload_bytes(result: Any) -> int:
+    """UTF-8 size of the text in a handler result (tool content list, resource contents or a string)"""
+    if type(result) is str:
+        return len(result) if result.isascii() else len(result.encode())
+    if type(result) is tuple and len(result) == 2 and type(result[1]) is dict:
+        # (content, structuredContent): the structured copy is the same JSON again, not counted
+        result = result[0]
+    size = 0
+    if type(result) is list or type(result) is tuple:
+        for item in result:
+            text = getattr(item, "text", None) or getattr(item, "content", None)
+            if type(text) is str:
+                size += len(text) if text.isascii() else len(text.encode())
+            elif type(text) is bytes:
+                size += len(text)
+    return size
+
+
+class ServerMetrics:
+    """Metric series keyed by (kind, name), where kind is "tool" or "resource" """
+
+    def __init__(self, clock=time.perf_counter_ns, sample_every: int = 16, admission=None):
+        self._clock = clock
+        self.sample_every = sample_every
+        # admission.AdmissionController whose queues the JSON snapshot reports
+        self.admission = admission
+        self.started = time.time()
+        self.series: dict = {}
+        self._profiling = asyncio.Lock()
+
+    def series_for(self, kind: str, name: str) -> Series:
+        """The series for (kind, name), created on first use"""
+        series = self.series.get((kind, name))
+        if series is None:
+            # Resource URIs come from clients; keep the label set bounded
+            key = (kind, name) if len(self.series) < MAX_SERIES else (kind, "_other")
+            series = self.series.get(key)
+            if series is None:
+                # Resource reads are rarer and heavier than tool calls: record all of them
+                series = self.series[key] = Series(self.sample_every if kind == "tool" else 1)
+        return series
+
+    async def call(self, kind: str, name: str, handler, *args):
+        """Await handler(*args), recording its latency, response size or failure"""
+        series = self.series_for(kind, name)
+        if not series.sample():
+            try:
+                return await handler(*args)
+            except BaseException as e:
+                series.record_error(e)
+                raise
+        clock = self._clock
+        started = clock()
+        try:
+            result = await handler(*args)
+        except BaseException as e:
+            series.record_error(e, clock() - started)
+            raise
+        series.record(clock() - started, payload_bytes(result))
+        return result
+
+    def snapshot(self) -> dict:
+        """JSON body of the metrics resource"""
+        body: dict = {"uptime_seconds": round(time.time() - self.started, 1), "tools": {}, "resources": {}}
+        for (kind, name), series in sorted(self.series.items()):
+            body["tools" if kind == "tool" else "resources"][name] = series.summary()
+        if self.admission is not None:
+            body["admission"] = self.admission.stats()
+        # Only imported by a memory profile; not worth loading to answer "no"
+        body["tracemalloc"] = "tracemalloc" in sys.modules and sys.modules["tracemalloc"].is_tracing()
+        return body
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition format"""
+        lines = [
+            "# HELP mcp_handler_duration_seconds Tool and resource handler latency (sampled calls)",
+            "# TYPE mcp_handler_duration_seconds histogram",
+        ]
+        counters = []
+        for (kind, name), series in sorted(self.series.items()):
+            labels = f'kind="{kind}",name="{_escape(name)}"'
+            # Buckets collapse to the fixed boundaries; a bucket counts toward the first `le` above its top
+            cumulative = 0
+            index = 0
+            for le in PROMETHEUS_BUCKETS:
+                limit = int(le * 1e9)
+                while index < _BUCKETS and bucket_upper(index) <= limit:
+                    cumulative += series.latency_ns[index]
+                    index += 1
+                lines.append(f'mcp_handler_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f'mcp_handler_duration_seconds_bucket{{{labels},le="+Inf"}} {series.samples}')
+            lines.append(f"mcp_handler_duration_seconds_sum{{{labels}}} {series.latency_sum_ns / 1e9:.9f}")
+            lines.append(f"mcp_handler_duration_seconds_count{{{labels}}} {series.samples}")
+            counters.append((labels, series))
+
+        lines += ["# HELP mcp_handler_calls_total Calls, including failed ones",
+                  "# TYPE mcp_handler_calls_total counter"]
+        lines += [f"mcp_handler_calls_total{{{labels}}} {series.calls}" for labels, series in counters]
+        lines += ["# HELP mcp_handler_response_bytes UTF-8 bytes returned by sampled successful calls",
+                  "# TYPE mcp_handler_response_bytes summary"]
+        for labels, series in counters:
+            lines.append(f"mcp_handler_response_bytes_sum{{{labels}}} {series.bytes_sum}")
+            lines.append(f"mcp_handler_response_bytes_count{{{labels}}} {series.samples - series.error_samples}")
+        lines += ["# HELP mcp_handler_errors_total Failed calls by exception type",
+                  "# TYPE mcp_handler_errors_total counter"]
+        for labels, series in counters:
+            for error_type, count in sorted(series.error_types.items()):
+                lines.append(f'mcp_handler_errors_total{{{labels},error="{error_type}"}} {count}')
+        lines += ["# HELP mcp_process_uptime_seconds Seconds since metrics started",
+                  "# TYPE mcp_process_uptime_seconds gauge",
+                  f"mcp_process_uptime_seconds {time.time() - self.started:.1f}"]
+        return "\n".join(lines) + "\n"
+
+    async def profile(self, mode: str = "cpu", seconds: float = 5.0, top: int = 30) -> str:
+        """Profile the event loop thread (cpu) or allocations (memory) for `seconds`; returns a text report
+
+        Handlers marked blocking run on worker threads and are not seen by the CPU profile.
+        """
+        if mode not in ("cpu", "memory"):
+            raise ValueError(f"Unknown profile mode: {mode} (expected cpu or memory)")
+        if self._profiling.locked():
+            raise ValueError("A profile is already running")
+        import cProfile
+        import io
+        import pstats
+        import tracemalloc
+
+        async with self._profiling:
+            if mode == "cpu":
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    await asyncio.sleep(seconds)
+                finally:
+                    profiler.disable()
+                out = io.StringIO()
+                pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(top)
+                return f"CPU profile of the event loop thread, {seconds:g}s\n" + out.getvalue()
+
+            started_here = not tracemalloc.is_tracing()
+            if started_here:
+                tracemalloc.start(10)
+            try:
+                before = tracemalloc.take_snapshot()
+                await asyncio.sleep(seconds)
+                after = tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+            finally:
+                if started_here:
+                    tracemalloc.stop()
+            lines = [f"Allocation growth over {seconds:g}s (traced now {current / 1e6:.1f} MB, "
+                     f"peak {peak / 1e6:.1f} MB)"]
+            lines += [str(stat) for stat in after.compare_to(before, "lineno")[:top]]
+            return "\n".join(lines) + "\n"
+
+    async def read(self, uri: str) -> tuple[str, str]:
+        """Serve one of the metrics resources; returns (text, mime type)"""
+        from urllib.parse import parse_qs, urlsplit
+
+        parts = urlsplit(uri)
+        path = f"{parts.scheme}://{parts.netloc}{parts.path}"
+        if path == METRICS_URI:
+            import json
+
+            return json.dumps(self.snapshot(), indent=2), "application/json"
+        if path == PROMETHEUS_URI:
+            return self.prometheus(), "text/plain; version=0.0.4"
+        if path == PROFILE_URI:
+            query = parse_qs(parts.query)
+            try:
+                seconds = min(max(float(query.get("seconds", ["5"])[0]), 0.1), 60.0)
+                top = int(query.get("top", ["30"])[0])
+            except ValueError as e:
+                raise ValueError(f"Invalid profile parameters: {parts.query}") from e
+            return await self.profile(query.get("mode", ["cpu"])[0], seconds, top), "text/plain"
+        raise ValueError(f"Unknown metrics resource: {uri}")
+
+    async def dump_prometheus(self, path: str, interval: float = 15.0):
+        """Rewrite `path` with the Prometheus text every `interval` seconds until cancelled"""
+        while True:
+            try:
+                with open(path + ".tmp", "w") as f:
+                    f.write(self.prometheus())
+                os.replace(path + ".tmp", path)
+            except OSError as e:
+                print(f"Could not write metrics to {path}: {e!r}", file=sys.stderr)
+            await asyncio.sleep(interval)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+METRICS_RESOURCES = (
+    (METRICS_URI, "Server Metrics", "Per-tool and per-resource latency percentiles, response sizes and errors",
+     "application/json"),
+    (PROMETHEUS_URI, "Server Metrics (Prometheus)", "The same metrics in Prometheus text format",
+     "text/plain"),
+    (PROFILE_URI, "Profile", "Read with ?mode=cpu|memory&seconds=5 to profile the server for that long",
+     "text/plain"),
+)
+
+
+def start_metrics_dump_from_env(metrics: ServerMetrics) -> Optional[asyncio.Task]:
+    """Write Prometheus text to CALL_CENTER_METRICS_FILE periodically, if it is set"""
+    path = os.environ.get("CALL_CENTER_METRICS_FILE")
+    if not path:
+        return None
+    return asyncio.create_task(metrics.dump_prometheus(path))
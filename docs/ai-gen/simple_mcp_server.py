@@ -4,104 +4,82 @@ Simple MCP Server for testing Claude Code integration
 """
 
 import asyncio
-import json
 from mcp import server, types
 
+from batch_operations import TICKET_PROPERTIES, create_tickets
+from call_log_store import get_call_log_store
+from call_stats import get_warm_stats_engine
+from serializers import ToolResult, get_serializer
+from tenant_cache import resolve_tenant
+from tool_registry import ToolRegistry
+
 
 # Create server instance
 app = server.Server("simple-call-center")
+tools = ToolRegistry()
+
+
+@tools.tool(
+    name="get_call_stats",
+    description="Get current call center statistics",
+    input_schema={
+        "type": "object",
+        "properties": {},
+        "required": []
+    }
+)
+async def get_call_stats(arguments: dict) -> ToolResult:
+    stats = (await get_warm_stats_engine(resolve_tenant())).snapshot()
+    return get_serializer().result(stats)
+
+
+@tools.tool(
+    name="create_ticket",
+    description="Create a support ticket",
+    input_schema={
+        "type": "object",
+        "properties": TICKET_PROPERTIES,
+        "required": ["title", "description"]
+    }
+)
+async def create_ticket(arguments: dict) -> ToolResult:
+    store = await get_call_log_store()
+    ticket, = await create_tickets(store, [arguments], resolve_tenant())
+
+    assignee = f"assigned to {ticket['assigned_to']}" if ticket["assigned_to"] else "queued"
+    return get_serializer().result(ticket, header=f"Created ticket {ticket['ticket_id']} ({assignee})")
+
+
+TOOL_LIST = [types.Tool(**definition) for definition in tools.definitions()]
 
 
 @app.list_tools()
 async def list_tools() -> list[types.Tool]:
     """List available tools"""
-    return [
-        types.Tool(
-            name="get_call_stats",
-            description="Get current call center statistics",
-            inputSchema={
-                "type": "object",
-                "properties": {},
-                "required": []
-            }
-        ),
-        types.Tool(
-            name="create_ticket",
-            description="Create a support ticket",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "title": {
-                        "type": "string",
-                        "description": "Ticket title"
-                    },
-                    "description": {
-                        "type": "string", 
-                        "description": "Ticket description"
-                    },
-                    "priority": {
-                        "type": "string",
-                        "enum": ["low", "medium", "high", "urgent"],
-                        "description": "Ticket priority"
-                    }
-                },
-                "required": ["title", "description"]
-            }
-        )
-    ]
-
-
-@app.call_tool()
-async def call_tool(name: str, arguments: dict) -> list[types.TextContent]:
+    return TOOL_LIST
+
+
+# Arguments are checked by the registry's precompiled validators
+@app.call_tool(validate_input=False)
+async def call_tool(name: str, arguments: dict) -> ToolResult:
     """Handle tool calls"""
-    
-    if name == "get_call_stats":
-        stats = {
-            "total_calls_today": 127,
-            "average_wait_time": "3:45",
-            "calls_in_queue": 8,
-            "available_agents": 15,
-            "busy_agents": 7,
-            "satisfaction_score": 4.2
-        }
-        return [types.TextContent(
-            type="text", 
-            text=json.dumps(stats, indent=2)
-        )]
-    
-    elif name == "create_ticket":
-        title = arguments.get("title", "")
-        description = arguments.get("description", "")
-        priority = arguments.get("priority", "medium")
-        
-        ticket_id = f"TICKET-{abs(hash(title + description)) % 10000:04d}"
-        
-        ticket = {
-            "ticket_id": ticket_id,
-            "title": title,
-            "description": description,
-            "priority": priority,
-            "status": "open",
-            "created_at": "2024-01-16T12:00:00Z",
-            "assigned_to": "auto-assignment-queue"
-        }
-        
-        return [types.TextContent(
-            type="text",
-            text=f"Created ticket {ticket_id}\n\n" + json.dumps(ticket, indent=2)
-        )]
-    
-    else:
-        raise ValueError(f"Unknown tool: {name}")
+    return await tools.dispatch(name, arguments)
 
 
 async def main():
+    from mcp_socket_transport import parse_transport_args, serve_socket
+
+    args = parse_transport_args("Simple MCP Server for testing Claude Code integration")
+    if args.listen:
+        await serve_socket(app, args)
+        return
+
     # Import here to avoid issues with event loop
     from mcp.server.stdio import stdio_server
-    
+
     async with stdio_server() as (read_stream, write_stream):
-        await app.run(read_stream, write_stream)
+        await app.run(read_stream, write_stream, app.create_initialization_options())
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
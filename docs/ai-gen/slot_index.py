@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+Slot-search index for callback and appointment scheduling
+
+Each staff member's free time for each day of the booking horizon is a bitset of
+5-minute slots (bit i = slot starting at i * 5 minutes after midnight, business
+local time). The index is built once from `office_hours`, `business_holidays`,
+`staff_availability` and existing `appointments`; bookings and cancellations
+flip bits in place instead of re-querying.
+
+Finding the starts of k consecutive free slots is a handful of shift/AND
+operations on the day's bitset (run_starts), and a per-day union over all
+staff lets whole days be skipped without touching individual staff.
+
+With CALL_CENTER_STATE_DIR set, each built index and every booking are also
+logged to the warm state (see warm_state); after a restart the same day's
+index is read back from it instead of being rebuilt from six queries.
+
+Calendar rows are naive business-local times in CALL_CENTER_TIMEZONE (an IANA
+name, default the server's zone). The horizon starts on the business-local
+date the index was built, and get_slot_index() rebuilds it once that date
+has passed.
+"""
+
+import json
+import math
+import os
+import sys
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta, tzinfo
+from typing import Any, Iterable, Optional
+from zoneinfo import ZoneInfo
+
+
+SLOT_MINUTES = 5
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+FULL_DAY = (1 << SLOTS_PER_DAY) - 1
+CANCELLED_STATUSES = {"cancelled", "canceled", "no_show", "rescheduled"}
+
+
+def business_timezone() -> tzinfo:
+    """Zone the calendars are kept in: CALL_CENTER_TIMEZONE, else the server's local zone"""
+    name = os.environ.get("CALL_CENTER_TIMEZONE")
+    return ZoneInfo(name) if name else datetime.now().astimezone().tzinfo
+
+
+def business_time(moment: Optional[datetime] = None) -> datetime:
+    """Naive business-local wall time of `moment` (default now); naive input is already local"""
+    if moment is None:
+        return datetime.now(business_timezone()).replace(tzinfo=None)
+    if moment.tzinfo is None:
+        return moment
+    return moment.astimezone(business_timezone()).replace(tzinfo=None)
+
+
+def run_starts(mask: int, k: int) -> int:
+    """Bits i such that bits i..i+k-1 of mask are all set (O(log k) shifts)"""
+    if k <= 1:
+        return mask
+    span = 1
+    while span < k and mask:
+        step = min(span, k - span)
+        mask &= mask >> step
+        span += step
+    return mask
+
+
+def _minutes(value) -> int:
+    if isinstance(value, str):
+        value = time.fromisoformat(value)
+    return value.hour * 60 + value.minute
+
+
+def _span(start, end) -> int:
+    """Mask of the slots covering [start, end); partial slots count as busy/closed"""
+    first = _minutes(start) // SLOT_MINUTES
+    end_minutes = _minutes(end) or 24 * 60
+    last = math.ceil(end_minutes / SLOT_MINUTES)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def _date(value) -> date:
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _id_list(value) -> list:
+    # uuid[] from Postgres, JSON text from the SQLite fixture
+    if isinstance(value, str):
+        return json.loads(value) if value.startswith("[") else [v for v in value.strip("{}").split(",") if v]
+    return list(value or ())
+
+
+def _weekday(day: date) -> int:
+    # office_hours.day_of_week uses 0 = Sunday, like the dashboard
+    return (day.weekday() + 1) % 7
+
+
+@dataclass(frozen=True)
+class Service:
+    """Bookable service length, from appointment_types"""
+    id: str
+    name: str
+    duration_minutes: int
+    buffer_before_minutes: int = 0
+    buffer_after_minutes: int = 0
+    allowed_staff_ids: tuple = ()
+
+    @property
+    def slots(self) -> int:
+        total = self.buffer_before_minutes + self.duration_minutes + self.buffer_after_minutes
+        return max(math.ceil(total / SLOT_MINUTES), 1)
+
+
+@dataclass(frozen=True)
+class Slot:
+    """A bookable start time for one staff member"""
+    start: datetime
+    end: datetime
+    staff_id: str
+
+    def to_dict(self) -> dict:
+        return {"start": self.start.isoformat(), "end": self.end.isoformat(), "staff_id": self.staff_id}
+
+
+@dataclass
+class SlotIndex:
+    """Per-staff, per-day free-slot bitsets over a fixed booking horizon"""
+    start_date: date
+    days: int
+    staff_ids: list = field(default_factory=list)
+    services: dict = field(default_factory=dict)
+    business_id: Optional[str] = None
+
+    def __post_init__(self):
+        self._position = {staff_id: i for i, staff_id in enumerate(self.staff_ids)}
+        self._base = [[0] * self.days for _ in self.staff_ids]
+        self._free = [[0] * self.days for _ in self.staff_ids]
+        self._any = [0] * self.days
+        # (slots, offset) -> (per-staff run starts, their union); dropped when the day changes
+        self._runs: dict = {}
+        # warm_state.StateTable that bookings are logged to, if any
+        self.journal = None
+
+    @classmethod
+    def build(cls, start_date: date, days: int, staff: Iterable[dict], office_hours: Iterable[dict],
+              holidays: Iterable[dict] = (), availability: Iterable[dict] = (),
+              appointments: Iterable[dict] = (), services: Iterable[dict] = ()) -> "SlotIndex":
+        """Build the index from table rows (dicts keyed by column name)"""
+        staff_ids = [row["id"] for row in staff if row.get("is_active", True)]
+        index = cls(start_date, days, staff_ids, {
+            row["id"]: Service(
+                id=row["id"],
+                name=row["name"],
+                duration_minutes=row.get("duration_minutes") or 30,
+                buffer_before_minutes=row.get("buffer_before_minutes") or 0,
+                buffer_after_minutes=row.get("buffer_after_minutes") or 0,
+                allowed_staff_ids=tuple(_id_list(row.get("allowed_staff_ids"))),
+            )
+            for row in services if row.get("is_active", True)
+        })
+
+        weekly = [0] * 7
+        for row in office_hours:
+            if row.get("is_active", True):
+                weekly[row["day_of_week"]] |= _span(row["start_time"], row["end_time"])
+
+        closed_dates, closed_recurring = set(), set()
+        for row in holidays:
+            holiday = _date(row["holiday_date"])
+            if row.get("is_recurring"):
+                closed_recurring.add((holiday.month, holiday.day))
+            else:
+                closed_dates.add(holiday)
+
+        open_masks = []
+        for offset in range(days):
+            day = start_date + timedelta(days=offset)
+            closed = day in closed_dates or (day.month, day.day) in closed_recurring
+            open_masks.append(0 if closed else weekly[_weekday(day)])
+        for base in index._base:
+            base[:] = open_masks
+
+        # Overrides replace the day's hours; plain unavailable rows block time
+        overrides: dict = {}
+        blocked: list = []
+        for row in availability:
+            pos = index._position.get(row["staff_id"])
+            offset = (_date(row["date"]) - start_date).days
+            if pos is None or not 0 <= offset < days:
+                continue
+            if row.get("start_time") and row.get("end_time"):
+                window = _span(row["start_time"], row["end_time"])
+            else:
+                window = FULL_DAY
+            if row.get("is_available", True):
+                if row.get("is_override"):
+                    overrides[pos, offset] = overrides.get((pos, offset), 0) | window
+                else:
+                    index._base[pos][offset] |= window
+            else:
+                blocked.append((pos, offset, window))
+        for (pos, offset), window in overrides.items():
+            index._base[pos][offset] = window
+        for pos, offset, window in blocked:
+            index._base[pos][offset] &= ~window
+
+        for pos, base in enumerate(index._base):
+            index._free[pos] = list(base)
+
+        for row in appointments:
+            if (row.get("status") or "scheduled") in CANCELLED_STATUSES:
+                continue
+            pos = index._position.get(row["staff_id"])
+            offset = (_date(row["appointment_date"]) - start_date).days
+            if pos is not None and 0 <= offset < days:
+                index._free[pos][offset] &= ~_span(row["start_time"], row["end_time"])
+
+        for offset in range(days):
+            union = 0
+            for free in index._free:
+                union |= free[offset]
+            index._any[offset] = union
+        return index
+
+    def to_state(self) -> Iterable[tuple[str, Any]]:
+        """(key, JSON value) pairs from_state() rebuilds the index from; masks are hex"""
+        yield "meta", {"start_date": self.start_date.isoformat(), "days": self.days, "staff_ids": self.staff_ids,
+                       "business_id": self.business_id,
+                       "services": [dict(vars(service), allowed_staff_ids=list(service.allowed_staff_ids))
+                                    for service in self.services.values()]}
+        for pos, staff_id in enumerate(self.staff_ids):
+            yield f"base/{staff_id}", [format(mask, "x") for mask in self._base[pos]]
+            yield f"free/{staff_id}", [format(mask, "x") for mask in self._free[pos]]
+
+    @classmethod
+    def from_state(cls, table) -> "SlotIndex":
+        meta = table.get("meta")
+        services = {row["id"]: Service(**dict(row, allowed_staff_ids=tuple(row["allowed_staff_ids"])))
+                    for row in meta["services"]}
+        index = cls(date.fromisoformat(meta["start_date"]), meta["days"], meta["staff_ids"], services,
+                    meta["business_id"])
+        for pos, staff_id in enumerate(index.staff_ids):
+            index._base[pos] = [int(mask, 16) for mask in table.get(f"base/{staff_id}")]
+            index._free[pos] = [int(mask, 16) for mask in table.get(f"free/{staff_id}")]
+        for offset in range(index.days):
+            union = 0
+            for free in index._free:
+                union |= free[offset]
+            index._any[offset] = union
+        return index
+
+    def _log(self, pos: int):
+        if self.journal is not None:
+            self.journal.put(f"free/{self.staff_ids[pos]}", [format(mask, "x") for mask in self._free[pos]])
+
+    def _locate(self, start: datetime) -> tuple[int, int]:
+        offset = (start.date() - self.start_date).days
+        if not 0 <= offset < self.days:
+            raise ValueError(f"{start.isoformat()} is outside the booking horizon")
+        minutes = start.hour * 60 + start.minute
+        if minutes % SLOT_MINUTES or start.second or start.microsecond:
+            raise ValueError(f"Start times must fall on {SLOT_MINUTES}-minute boundaries: {start.isoformat()}")
+        return offset, minutes // SLOT_MINUTES
+
+    def slots_for(self, service_id: Optional[str] = None, minutes: Optional[int] = None) -> tuple[int, tuple]:
+        """Slot count and allowed staff for a service or a plain duration"""
+        if service_id is not None:
+            service = self.services.get(service_id)
+            if service is None:
+                raise ValueError(f"Unknown service: {service_id}")
+            return service.slots, service.allowed_staff_ids
+        return max(math.ceil((minutes or 30) / SLOT_MINUTES), 1), ()
+
+    def next_free_slots(self, slots: int, after: datetime, count: int = 5,
+                        staff_ids: Iterable[str] = ()) -> list[Slot]:
+        """Earliest `count` distinct start times with `slots` consecutive free slots"""
+        eligible = [self._position[s] for s in staff_ids if s in self._position] if staff_ids \
+            else range(len(self.staff_ids))
+        after_offset = (after.date() - self.start_date).days
+        after_minutes = after.hour * 60 + after.minute + (1 if after.second or after.microsecond else 0)
+        results: list[Slot] = []
+
+        for offset in range(max(after_offset, 0), self.days):
+            floor = 0
+            if offset == after_offset:
+                floor = math.ceil(after_minutes / SLOT_MINUTES)
+            allowed = FULL_DAY & ~((1 << floor) - 1)
+            if not run_starts(self._any[offset], slots) & allowed:
+                continue
+
+            runs, combined = self._day_runs(slots, offset)
+            if staff_ids:
+                combined = 0
+                for pos in eligible:
+                    combined |= runs[pos]
+            combined &= allowed
+            day = self.start_date + timedelta(days=offset)
+            while combined and len(results) < count:
+                low = combined & -combined
+                combined ^= low
+                slot = low.bit_length() - 1
+                pos = next(p for p in eligible if runs[p] & low)
+                start = datetime.combine(day, time()) + timedelta(minutes=slot * SLOT_MINUTES)
+                results.append(Slot(start, start + timedelta(minutes=slots * SLOT_MINUTES), self.staff_ids[pos]))
+            if len(results) >= count:
+                break
+        return results
+
+    def _day_runs(self, slots: int, offset: int) -> tuple[list, int]:
+        cached = self._runs.get((slots, offset))
+        if cached is None:
+            runs = [run_starts(free[offset], slots) for free in self._free]
+            combined = 0
+            for starts in runs:
+                combined |= starts
+            cached = self._runs[slots, offset] = (runs, combined)
+        return cached
+
+    def _changed(self, pos: int, offset: int):
+        # Refresh only the changed staff member's runs in each cached length
+        free = self._free[pos][offset]
+        for (slots, cached_offset), (runs, _) in list(self._runs.items()):
+            if cached_offset == offset:
+                runs[pos] = run_starts(free, slots)
+                combined = 0
+                for starts in runs:
+                    combined |= starts
+                self._runs[slots, offset] = (runs, combined)
+
+    def is_free(self, staff_id: str, start: datetime, slots: int) -> bool:
+        pos = self._position.get(staff_id)
+        if pos is None:
+            return False
+        offset, slot = self._locate(start)
+        needed = ((1 << slots) - 1) << slot
+        return self._free[pos][offset] & needed == needed
+
+    def book(self, staff_id: str, start: datetime, slots: int) -> bool:
+        """Mark slots busy if they are all free; the day union stays a safe superset"""
+        if not self.is_free(staff_id, start, slots):
+            return False
+        offset, slot = self._locate(start)
+        pos = self._position[staff_id]
+        self._free[pos][offset] &= ~(((1 << slots) - 1) << slot)
+        self._changed(pos, offset)
+        self._log(pos)
+        return True
+
+    def release(self, staff_id: str, start: datetime, slots: int):
+        """Free previously booked slots, within the staff member's working hours"""
+        pos = self._position.get(staff_id)
+        if pos is None:
+            return
+        offset, slot = self._locate(start)
+        freed = (((1 << slots) - 1) << slot) & self._base[pos][offset]
+        self._free[pos][offset] |= freed
+        self._any[offset] |= freed
+        self._changed(pos, offset)
+        self._log(pos)
+
+    def book_first_available(self, start: datetime, slots: int, staff_ids: Iterable[str] = ()) -> Optional[str]:
+        """Book the first eligible staff member free at `start`; returns their id"""
+        for staff_id in (staff_ids or self.staff_ids):
+            if self.book(staff_id, start, slots):
+                return staff_id
+        return None
+
+
+async def load_slot_index(store, user_id: str, start_date: Optional[date] = None, days: int = 90) -> SlotIndex:
+    """Build a tenant's index from the scheduling tables through the call log store"""
+    start_date = start_date or business_time().date()
+    end_date = start_date + timedelta(days=days)
+    params = (user_id,)
+    window = (user_id, start_date, end_date)
+    staff = await store.query("SELECT id, is_active FROM staff_members WHERE user_id = ?", params)
+    office_hours = await store.query(
+        "SELECT business_id, day_of_week, start_time, end_time, is_active FROM office_hours WHERE user_id = ?",
+        params)
+    holidays = await store.query(
+        "SELECT holiday_date, is_recurring FROM business_holidays WHERE user_id = ?", params)
+    availability = await store.query(
+        "SELECT staff_id, date, start_time, end_time, is_available, is_override FROM staff_availability "
+        "WHERE user_id = ? AND date >= ? AND date < ?", window)
+    appointments = await store.query(
+        "SELECT staff_id, appointment_date, start_time, end_time, status FROM appointments "
+        "WHERE user_id = ? AND appointment_date >= ? AND appointment_date < ?", window)
+    services = await store.query(
+        "SELECT id, name, duration_minutes, buffer_before_minutes, buffer_after_minutes, "
+        "allowed_staff_ids, is_active FROM appointment_types WHERE user_id = ?", params)
+    index = SlotIndex.build(start_date, days, staff, office_hours, holidays, availability, appointments, services)
+    index.business_id = next((row["business_id"] for row in office_hours if row.get("business_id")), None)
+    return index
+
+
+_indexes = None
+
+
+async def get_slot_index(user_id: str) -> SlotIndex:
+    """Return the tenant's index, read back from the warm state or built from the database on first use
+
+    Indexes live in a tenant-partitioned cache, so with many businesses the
+    least recently used calendars are dropped (and rebuilt when needed)
+    instead of growing without bound. An index built on an earlier day is
+    rebuilt, so the horizon always starts today and reaches `days` ahead.
+    """
+    global _indexes
+    if _indexes is None:
+        from tenant_cache import tenant_cache_from_env
+
+        _indexes = tenant_cache_from_env()
+    today = business_time().date()
+    index = _indexes.get(user_id, "slots")
+    if index is None or index.start_date != today:
+        from warm_state import get_warm_state
+
+        state = get_warm_state()
+        name = f"slots/{user_id}"
+        journal = state.filled(name) if state is not None else None
+        if journal is not None and journal.get("meta", {}).get("start_date") == today.isoformat():
+            index = SlotIndex.from_state(journal)
+        else:
+            from call_log_store import get_call_log_store
+
+            index = await load_slot_index(await get_call_log_store(), user_id, today)
+            print(f"Slot index built for {user_id}: {len(index.staff_ids)} staff, {index.days} days",
+                  file=sys.stderr)
+            if state is not None:
+                journal = state.fill(name, index.to_state())
+        index.journal = journal
+        _indexes.set(user_id, "slots", index)
+    return index
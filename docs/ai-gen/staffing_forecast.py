@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Erlang C staffing and wait-time forecast for forecast_staffing
+
+Builds a weekly arrival profile from customer_call_logs: calls per 15-minute
+interval of the week (Monday 00:00 UTC first, 672 intervals) averaged over the
+times that interval occurred in the history (at least once, so a business
+with days of history is not scaled up to a week), and the mean handle time
+of the calls in each interval. For
+every interval and scenario (service level target, answer time, volume
+growth) it finds the fewest agents meeting the target under Erlang C, with
+the expected wait (ASA) and an abandonment estimate at that staffing.
+
+Everything is vectorized with NumPy. Erlang C is evaluated for all agent
+counts 0..N of all intervals at once from log-space terms
+
+    log(A^k / k!) = k log A - log k!
+
+whose running sums use np.logaddexp.accumulate, so traffic of hundreds of
+Erlangs neither overflows A^k / k! nor loses the small terms. Service level
+is monotone in the number of agents, so the agents needed for a target are
+a count over a boolean mask rather than a search.
+
+Abandonment assumes callers wait an exponentially distributed time with mean
+`patience_seconds` for an answer, against the Erlang C wait of queued calls
+(exponential with rate (N - A) / handle time): P(abandon) = P(wait) / (1 +
+(N - A) * patience / handle time). It does not feed abandoned calls back into
+the load (Erlang A), so it errs towards more agents.
+
+Requires NumPy.
+"""
+
+import math
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+
+INTERVAL_SECONDS = 900
+WEEK_INTERVALS = 7 * 24 * 3600 // INTERVAL_SECONDS
+WEEK_MS = 7 * 86_400_000
+# 1970-01-01 was a Thursday; shifts epoch intervals so that index 0 is Monday 00:00 UTC
+_EPOCH_OFFSET = 3 * 24 * 3600 // INTERVAL_SECONDS
+# Largest (scenarios x intervals x agent counts) comparison made at once
+_BLOCK_CELLS = 2_000_000
+
+
+class Scenario(NamedTuple):
+    """A staffing target: `service_level` of calls answered within `answer_seconds`, at `growth` x volume"""
+
+    service_level: float = 0.8
+    answer_seconds: float = 20.0
+    growth: float = 1.0
+
+
+def week_intervals(start_ms: np.ndarray) -> np.ndarray:
+    """Index of the 15-minute interval of the week (Monday 00:00 UTC = 0) of each epoch-ms timestamp"""
+    return (start_ms // (INTERVAL_SECONDS * 1000) + _EPOCH_OFFSET) % WEEK_INTERVALS
+
+
+def interval_occurrences(since_ms: int, until_ms: int) -> np.ndarray:
+    """How many times each interval of the week occurs, wholly or in part, in [since_ms, until_ms)"""
+    interval_ms = INTERVAL_SECONDS * 1000
+    first = since_ms // interval_ms
+    total = max(-(-until_ms // interval_ms) - first, 0)
+    counts = np.full(WEEK_INTERVALS, total // WEEK_INTERVALS, dtype=np.int64)
+    counts[(first + _EPOCH_OFFSET + np.arange(total % WEEK_INTERVALS)) % WEEK_INTERVALS] += 1
+    return counts
+
+
+def arrival_profile(start_ms: np.ndarray, duration_ms: np.ndarray, observed) -> tuple[np.ndarray, np.ndarray]:
+    """Mean calls per interval and mean handle seconds per interval
+
+    `observed` is how many times each interval occurs in the history
+    (interval_occurrences), or a number of weeks for all of them; counts are
+    divided by at least 1. Calls with an unknown duration count as arrivals
+    but not towards handle time; intervals without a timed call use the mean
+    over all calls.
+    """
+    intervals = week_intervals(start_ms)
+    arrivals = np.bincount(intervals, minlength=WEEK_INTERVALS) / np.maximum(observed, 1)
+    timed = duration_ms >= 0
+    count = np.bincount(intervals[timed], minlength=WEEK_INTERVALS)
+    total = np.bincount(intervals[timed], weights=duration_ms[timed] / 1000, minlength=WEEK_INTERVALS)
+    overall = total.sum() / count.sum() if count.sum() else 0.0
+    handle = np.divide(total, count, out=np.full(WEEK_INTERVALS, overall), where=count > 0)
+    return arrivals, handle
+
+
+def log_erlang_c(traffic: np.ndarray, max_agents: int) -> np.ndarray:
+    """log P(wait) for 0..max_agents agents: shape traffic.shape + (max_agents + 1,)
+
+    P(wait) is 1 (log 0) wherever agents <= traffic, the queue never drains.
+    """
+    traffic = np.asarray(traffic, dtype=np.float64)
+    agents = np.arange(max_agents + 1, dtype=np.float64)
+    log_factorial = np.concatenate(([0.0], np.cumsum(np.log(agents[1:]))))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_traffic = np.log(traffic)[..., None]
+        # log(A^k / k!), and log(sum over j < k) at index k
+        log_terms = agents * log_traffic - log_factorial
+        log_terms[..., 0] = 0.0
+        log_sums = np.logaddexp.accumulate(log_terms, axis=-1)
+        log_below = np.concatenate((np.full(traffic.shape + (1,), -np.inf), log_sums[..., :-1]), axis=-1)
+        # The last term of Erlang C's numerator: A^N / N! * N / (N - A)
+        log_last = log_terms + np.log(agents) - np.log(agents - traffic[..., None])
+        log_wait = log_last - np.logaddexp(log_below, log_last)
+    stable = agents > traffic[..., None]
+    log_wait = np.where(stable, log_wait, 0.0)
+    # No traffic: nobody waits, even with no agents
+    return np.where(traffic[..., None] > 0, log_wait, -np.inf)
+
+
+def _agents_bound(traffic: np.ndarray) -> int:
+    peak = float(traffic.max()) if traffic.size else 0.0
+    return int(math.ceil(peak + 8 * math.sqrt(peak) + 16))
+
+
+def forecast(arrivals: np.ndarray, handle_seconds: np.ndarray, scenarios: list,
+             patience_seconds: float = 120.0, interval_seconds: int = INTERVAL_SECONDS) -> dict:
+    """Agents needed per (scenario, interval), with the wait and abandonment they give
+
+    Returns arrays of shape (len(scenarios), len(arrivals)): `agents`,
+    `wait_seconds` (mean over all calls, answered at once or not), `waiting`
+    (share of calls that queue), `service_level`, `abandonment` and `occupancy`.
+    """
+    arrivals = np.asarray(arrivals, dtype=np.float64)
+    handle_seconds = np.asarray(handle_seconds, dtype=np.float64)
+    targets = np.array([s.service_level for s in scenarios], dtype=np.float64)
+    answer = np.array([s.answer_seconds for s in scenarios], dtype=np.float64)
+    growth = np.array([s.growth for s in scenarios], dtype=np.float64)
+    if not ((targets > 0) & (targets < 1)).all() or (answer < 0).any() or (growth <= 0).any():
+        raise ValueError("Scenarios need 0 < service_level < 1, answer_seconds >= 0 and growth > 0")
+    shape = (len(scenarios), len(arrivals))
+    out = {name: np.zeros(shape) for name in ("wait_seconds", "waiting", "service_level", "abandonment", "occupancy")}
+    out["agents"] = np.zeros(shape, dtype=np.int64)
+
+    # Scenarios sharing a volume share their Erlang C table
+    for factor in np.unique(growth):
+        members = np.flatnonzero(growth == factor)
+        traffic = arrivals * factor * handle_seconds / interval_seconds
+        max_agents = _agents_bound(traffic)
+        while True:
+            log_wait = log_erlang_c(traffic, max_agents)
+            unmet = _fill(out, members, traffic, handle_seconds, log_wait, targets, answer, patience_seconds)
+            if not unmet:
+                break
+            max_agents *= 2
+    return out
+
+
+def _fill(out: dict, members: np.ndarray, traffic: np.ndarray, handle: np.ndarray, log_wait: np.ndarray,
+          targets: np.ndarray, answer: np.ndarray, patience: float) -> bool:
+    """Fill `out` rows of `members` from one Erlang C table; True if a target needs more agents than it has"""
+    intervals = np.arange(len(traffic))[None]
+    agents = np.arange(log_wait.shape[-1], dtype=np.float64)
+    spare = agents - traffic[:, None]
+    # Queued calls wait Exp((N - A) / handle time); guard idle intervals without calls
+    rate = np.where(spare > 0, spare, 0.0) / np.where(handle > 0, handle, 1.0)[:, None]
+    block = max(1, _BLOCK_CELLS // log_wait.size)
+    # Scenarios sharing an answer time share log P(wait > T) and differ only in the threshold
+    for seconds in np.unique(answer[members]):
+        group = members[answer[members] == seconds]
+        # log P(wait > T) = log P(wait) - rate * T, non-increasing in agents; 0 where the queue never drains
+        log_late = np.where(spare > 0, log_wait - rate * seconds, 0.0)
+        log_late = np.where(traffic[:, None] > 0, log_late, -np.inf)
+        for lo in range(0, len(group), block):
+            rows = group[lo:lo + block]
+            with np.errstate(divide="ignore"):
+                log_allowed = np.log1p(-targets[rows])
+            needed = (log_late[None] > log_allowed[:, None, None]).sum(axis=-1)
+            if (needed >= len(agents)).any():
+                return True
+
+            wait = np.exp(log_wait[intervals, needed])
+            queue_rate = rate[intervals, needed]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                out["wait_seconds"][rows] = np.where(wait > 0, wait / queue_rate, 0.0)
+                out["occupancy"][rows] = np.where(needed > 0, traffic / needed, 0.0)
+            out["agents"][rows] = needed
+            out["waiting"][rows] = wait
+            out["service_level"][rows] = 1.0 - np.exp(log_late[intervals, needed])
+            out["abandonment"][rows] = wait / (1.0 + queue_rate * patience)
+    return False
+
+
+def history_window(calls, user_id: Optional[str], weeks: float, until_ms: Optional[int] = None):
+    """Start times and durations of `user_id`'s calls in the `weeks` weeks before `until_ms`
+
+    `until_ms` defaults to just after the newest call. Returns (start_ms,
+    duration_ms with -1 for unknown, interval_occurrences from the first call
+    in the window to `until_ms`).
+    """
+    from columnar_calls import NULL_MS
+
+    mask = calls.filter(user_id=user_id) if user_id else calls.filter()
+    starts = calls.column("start_timestamp")
+    mask &= starts != NULL_MS
+    if until_ms is None:
+        until_ms = int(starts[mask].max()) + 1 if mask.any() else 0
+    since_ms = until_ms - int(weeks * WEEK_MS)
+    mask &= (starts >= since_ms) & (starts < until_ms)
+    starts = starts[mask]
+    durations = calls.column("duration_ms")[mask]
+    durations = np.where(durations == NULL_MS, -1, durations)
+    observed = interval_occurrences(int(starts.min()) if len(starts) else until_ms, until_ms)
+    return starts, durations, observed
+
+
+def interval_label(index: int) -> str:
+    """"Mon 09:15" for an interval index"""
+    moment = datetime.fromtimestamp((index - _EPOCH_OFFSET) * INTERVAL_SECONDS, timezone.utc)
+    return moment.strftime("%a %H:%M")
+
+
+def staffing_report(arrivals: np.ndarray, handle_seconds: np.ndarray, scenarios: list, result: dict,
+                    intervals: bool = True) -> list[dict]:
+    """forecast_staffing's per-scenario summaries, with per-interval lists when `intervals`"""
+    report = []
+    for i, scenario in enumerate(scenarios):
+        load = arrivals * scenario.growth
+        calls = load.sum()
+        agents = result["agents"][i]
+        summary = {
+            **scenario._asdict(),
+            "peak_agents": int(agents.max()),
+            "peak_interval": interval_label(int(agents.argmax())),
+            "agent_hours": round(float(agents.sum()) * INTERVAL_SECONDS / 3600, 1),
+            "average_wait_seconds": round(float((load * result["wait_seconds"][i]).sum() / calls), 1) if calls else 0.0,
+            "abandonment_rate": round(float((load * result["abandonment"][i]).sum() / calls), 4) if calls else 0.0,
+            "service_level_achieved": round(float((load * result["service_level"][i]).sum() / calls), 4) if calls else 1.0,
+        }
+        if intervals:
+            summary["agents"] = agents.tolist()
+            summary["wait_seconds"] = np.round(result["wait_seconds"][i], 1).tolist()
+            summary["abandonment"] = np.round(result["abandonment"][i], 4).tolist()
+        report.append(summary)
+    return report
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Tenant-aware caching and routing for the Call Center MCP servers
+
+Nearly every table is per business (`customer_call_logs.user_id`,
+`appointments.business_id`, `staff_members`), so cached data is too. A
+single shared LRU lets one busy business push every other business's
+histories and calendars out of memory. TenantCache tracks a partition per
+tenant instead: each is capped at `tenant_bytes`, so a tenant past its
+quota evicts only its own oldest entries, while below the quotas all
+tenants share `max_bytes` in plain LRU order.
+
+The tenant of a request is, in order:
+    - the session's tenant, declared by the client at initialize as
+      capabilities.experimental.tenant.user_id; a `user_id` argument naming
+      another business is rejected, so a session cannot read other tenants
+    - the tool's `user_id` argument
+    - CALL_CENTER_USER_ID (one stdio process per business)
+
+ConsistentHashRing maps tenants onto worker processes; with
+`--tenant-workers N` the socket transport routes every session of a tenant
+to the same worker, so its cache partition stays on one core (see
+mcp_socket_transport.TenantRouter).
+
+Configuration:
+    CALL_CENTER_CACHE_MB            memory for each tenant-partitioned cache (default: 256)
+    CALL_CENTER_TENANT_CACHE_MB     quota of one tenant within it (default: 32)
+"""
+
+import bisect
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Iterable, Optional
+
+from tool_registry import ToolArgumentError
+
+
+TENANT_CAPABILITY = "tenant"
+MB = 1024 * 1024
+
+
+def session_tenant() -> Optional[str]:
+    """Tenant the current MCP session declared at initialize, if any"""
+    from mcp.server.lowlevel.server import request_ctx
+
+    context = request_ctx.get(None)
+    params = context and context.session.client_params
+    experimental = params and params.capabilities.experimental
+    if not experimental:
+        return None
+    return (experimental.get(TENANT_CAPABILITY) or {}).get("user_id")
+
+
+def resolve_tenant(arguments: Optional[dict] = None) -> Optional[str]:
+    """Tenant of the current request: session tenant, `user_id` argument, then CALL_CENTER_USER_ID"""
+    requested = (arguments or {}).get("user_id")
+    tenant = session_tenant()
+    if tenant is not None:
+        if requested and requested != tenant:
+            raise ToolArgumentError(f"arguments.user_id {requested} does not match this session's business {tenant}")
+        return tenant
+    return requested or os.environ.get("CALL_CENTER_USER_ID")
+
+
+def tenant_from_initialize(line: bytes) -> Optional[str]:
+    """Tenant declared in a raw `initialize` request, for routing before a session exists"""
+    try:
+        message = json.loads(line)
+        tenant = message["params"]["capabilities"]["experimental"][TENANT_CAPABILITY]["user_id"]
+    except (ValueError, KeyError, TypeError):
+        return None
+    return tenant if isinstance(tenant, str) else None
+
+
+def estimate_size(value: Any, _depth: int = 0) -> int:
+    """Approximate bytes held by a cached value (containers, strings, numbers, numpy arrays, objects)"""
+    size = sys.getsizeof(value)
+    if _depth > 8:
+        return size
+    if isinstance(value, dict):
+        size += sum(estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, _depth + 1) for item in value)
+    elif hasattr(value, "nbytes"):
+        size += value.nbytes
+    elif hasattr(value, "__dict__"):
+        size += estimate_size(vars(value), _depth + 1)
+    return size
+
+
+class _Partition:
+    __slots__ = ("keys", "bytes", "hits", "misses", "evictions")
+
+    def __init__(self):
+        # This tenant's keys, least recently used first
+        self.keys: OrderedDict = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+class TenantCache:
+    """LRU cache partitioned by tenant, with a per-tenant and a total memory quota
+
+    Entries expire `ttl` seconds after being set. A value larger than a
+    tenant's whole quota is not cached.
+    """
+
+    def __init__(self, max_bytes: int = 256 * MB, tenant_bytes: int = 32 * MB, ttl: float = float("inf"),
+                 clock=time.monotonic, sizeof: Callable[[Any], int] = estimate_size):
+        self.max_bytes = max_bytes
+        self.tenant_bytes = min(tenant_bytes, max_bytes)
+        self.ttl = ttl
+        self.bytes = 0
+        self._clock = clock
+        self._sizeof = sizeof
+        self._partitions: dict = {}
+        # (tenant, key) -> (expires or None, size, value) across all tenants, least recently used first
+        self._entries: OrderedDict = OrderedDict()
+
+    def _partition(self, tenant: str) -> _Partition:
+        partition = self._partitions.get(tenant)
+        if partition is None:
+            partition = self._partitions[tenant] = _Partition()
+        return partition
+
+    def get(self, tenant: str, key) -> Any:
+        entry = self._entries.get((tenant, key))
+        if entry is not None and (entry[0] is None or entry[0] > self._clock()):
+            partition = self._partitions[tenant]
+            self._entries.move_to_end((tenant, key))
+            partition.keys.move_to_end(key)
+            partition.hits += 1
+            return entry[2]
+        if entry is not None:
+            self._remove(tenant, key)
+        self._partition(tenant).misses += 1
+        return None
+
+    def set(self, tenant: str, key, value, size: Optional[int] = None):
+        size = self._sizeof(value) if size is None else size
+        if (tenant, key) in self._entries:
+            self._remove(tenant, key)
+        if size > self.tenant_bytes:
+            return
+        partition = self._partition(tenant)
+        expires = self._clock() + self.ttl if self.ttl != float("inf") else None
+        self._entries[tenant, key] = (expires, size, value)
+        partition.keys[key] = None
+        partition.bytes += size
+        self.bytes += size
+        # Past its quota a tenant evicts its own oldest entries; below the
+        # quotas, tenants share the cache in plain LRU order
+        while partition.bytes > self.tenant_bytes:
+            self._evict(tenant, next(iter(partition.keys)))
+        while self.bytes > self.max_bytes:
+            self._evict(*next(iter(self._entries)))
+
+    def invalidate(self, tenant: str, key):
+        if (tenant, key) in self._entries:
+            self._remove(tenant, key)
+
+    def drop(self, tenant: str):
+        """Forget everything cached for `tenant`"""
+        partition = self._partitions.get(tenant)
+        for key in list(partition.keys) if partition else ():
+            self._remove(tenant, key)
+        self._partitions.pop(tenant, None)
+
+    def _remove(self, tenant: str, key):
+        _, size, _ = self._entries.pop((tenant, key))
+        partition = self._partitions[tenant]
+        del partition.keys[key]
+        partition.bytes -= size
+        self.bytes -= size
+
+    def _evict(self, tenant: str, key):
+        self._remove(tenant, key)
+        self._partitions[tenant].evictions += 1
+
+    @property
+    def hits(self) -> int:
+        return sum(p.hits for p in self._partitions.values())
+
+    @property
+    def misses(self) -> int:
+        return sum(p.misses for p in self._partitions.values())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        """Per-tenant entries, bytes, hits, misses and evictions, largest first"""
+        tenants = sorted(self._partitions.items(), key=lambda item: -item[1].bytes)
+        return {
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "tenant_bytes": self.tenant_bytes,
+            "tenants": {tenant: {"entries": len(p.keys), "bytes": p.bytes, "hits": p.hits,
+                                 "misses": p.misses, "evictions": p.evictions} for tenant, p in tenants},
+        }
+
+
+def tenant_cache_from_env(ttl: float = float("inf")) -> TenantCache:
+    """TenantCache sized by CALL_CENTER_CACHE_MB and CALL_CENTER_TENANT_CACHE_MB"""
+    return TenantCache(int(float(os.environ.get("CALL_CENTER_CACHE_MB", "256")) * MB),
+                       int(float(os.environ.get("CALL_CENTER_TENANT_CACHE_MB", "32")) * MB), ttl)
+
+
+def _ring_hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class ConsistentHashRing:
+    """Maps keys to nodes so that adding or removing a node moves only ~1/N of the keys"""
+
+    def __init__(self, nodes: Iterable, replicas: int = 128):
+        self.nodes = list(nodes)
+        if not self.nodes:
+            raise ValueError("ConsistentHashRing needs at least one node")
+        points = sorted((_ring_hash(f"{node}#{replica}"), node)
+                        for node in self.nodes for replica in range(replicas))
+        self._hashes = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def node_for(self, key: str):
+        index = bisect.bisect(self._hashes, _ring_hash(key))
+        return self._owners[index % len(self._owners)]
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Tests for priority admission control: budgets, reserved slots, deadlines and shedding
+"""
+
+import asyncio
+
+from admission import BULK, INTERACTIVE, LIVE_CALL, AdmissionController, OverloadedError, PriorityClass
+from server_metrics import ServerMetrics
+from tool_registry import ToolRegistry
+
+
+CLASSES = (
+    PriorityClass(LIVE_CALL, concurrency=1.0, reserved=0.25, max_wait=2.0, max_queue=4.0),
+    PriorityClass(INTERACTIVE, concurrency=0.75, reserved=0.125, max_wait=1.0, max_queue=2.0),
+    PriorityClass(BULK, concurrency=0.25, reserved=0.0, max_wait=0.1, max_queue=0.125),
+)
+
+
+def test_reserved_slots_and_priority_order():
+    async def run():
+        admission = AdmissionController(8, CLASSES)
+        bulk = [await admission.acquire(BULK) for _ in range(2)]
+        # Bulk is capped at 2 of 8; one more may wait, the next is refused at once
+        queued_bulk = asyncio.ensure_future(admission.acquire(BULK, "get_call_logs"))
+        await asyncio.sleep(0)
+        try:
+            await admission.acquire(BULK, "get_call_logs")
+            raise AssertionError("expected OverloadedError")
+        except OverloadedError as e:
+            assert "get_call_logs (bulk) was not admitted" in str(e) and e.retry_after > 0
+
+        interactive = [await admission.acquire(INTERACTIVE) for _ in range(4)]
+        # 6 running: interactive may not take the last 2 slots, live calls may
+        queued_interactive = asyncio.ensure_future(admission.acquire(INTERACTIVE))
+        live = [await admission.acquire(LIVE_CALL) for _ in range(2)]
+        queued_live = asyncio.ensure_future(admission.acquire(LIVE_CALL))
+        await asyncio.sleep(0)
+        assert admission.running == 8 and not queued_live.done()
+
+        # A freed bulk slot goes to the live call first; interactive starts once fewer than 6 run
+        admission.release(bulk.pop())
+        live.append(await queued_live)
+        admission.release(live.pop())
+        admission.release(interactive.pop())
+        await asyncio.sleep(0)
+        assert not queued_interactive.done()
+        admission.release(live.pop())
+        interactive.append(await queued_interactive)
+        # Bulk only starts while fewer than 5 run
+        assert not queued_bulk.done()
+        stats = admission.stats()["classes"]
+        assert (stats[BULK]["running"], stats[BULK]["waiting"], stats[BULK]["shed"]) == (1, 1, 1)
+
+        # Still queued at its deadline: refused
+        try:
+            await queued_bulk
+            raise AssertionError("expected OverloadedError")
+        except OverloadedError as e:
+            assert "waited 0.1s" in str(e)
+        assert admission.stats()["classes"][BULK]["expired"] == 1
+
+        for token in bulk + interactive + live:
+            admission.release(token)
+        assert admission.running == 0
+        # A waiter cancelled by its caller leaves nothing behind
+        held = [await admission.acquire(LIVE_CALL) for _ in range(8)]
+        waiter = asyncio.ensure_future(admission.acquire(LIVE_CALL))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        for token in held:
+            admission.release(token)
+        assert admission.running == 0 and admission.stats()["classes"][LIVE_CALL]["waiting"] == 0
+
+    asyncio.run(run())
+
+
+def test_registry_sheds_bulk_and_keeps_live_calls_moving():
+    async def run():
+        admission = AdmissionController(4, CLASSES)
+        metrics = ServerMetrics(admission=admission)
+        tools = ToolRegistry(metrics, admission)
+
+        @tools.tool("export", "Bulk export", priority=BULK)
+        async def export(arguments):
+            await asyncio.sleep(0.05)
+            return "rows"
+
+        @tools.tool("lookup", "Live lookup", priority=LIVE_CALL)
+        async def lookup(arguments):
+            return "history"
+
+        try:
+            tools.register("bad", "Unknown class", {"type": "object"}, export, priority="urgent")
+            raise AssertionError("expected ValueError")
+        except ValueError as e:
+            assert "urgent" in str(e)
+
+        exports = [asyncio.ensure_future(tools.dispatch("export", {})) for _ in range(20)]
+        await asyncio.sleep(0.01)
+        assert await asyncio.gather(*(tools.dispatch("lookup", {}) for _ in range(3))) == ["history"] * 3
+        results = await asyncio.gather(*exports, return_exceptions=True)
+        shed = [result for result in results if isinstance(result, OverloadedError)]
+        assert results.count("rows") >= 1 and len(shed) >= 15
+        snapshot = metrics.snapshot()
+        assert snapshot["tools"]["export"]["error_types"] == {"OverloadedError": len(shed)}
+        assert snapshot["admission"]["classes"][BULK]["admitted"] == results.count("rows")
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    for test in (test_reserved_slots_and_priority_order, test_registry_sheds_bulk_and_keeps_live_calls_moving):
+        test()
+        print(f"{test.__name__}: PASSED")
+    print("\n=== Test PASSED ===")
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Tests for the agent presence registry
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+
+import agent_presence
+import call_log_store
+from agent_presence import PresenceRegistry, get_presence_registry, group_changes
+from call_log_store import SQLiteCallLogStore
+from generate_call_log_fixtures import write_sqlite
+
+
+def test_group_changes():
+    changes = [
+        {"agent_id": "a", "status": "busy", "since": "t1"},
+        {"agent_id": "b", "status": "available", "since": "t1"},
+        {"agent_id": "c", "status": "busy", "since": "t1"},
+    ]
+    assert group_changes(changes) == [
+        {"status": "busy", "since": "t1", "agent_ids": ["a", "c"]},
+        {"status": "available", "since": "t1", "agent_ids": ["b"]},
+    ]
+
+
+def test_publish_coalesces_and_merges_lagging_subscribers():
+    async def run():
+        registry = PresenceRegistry(tick=3600, inline_limit=2, clock=lambda: 0)
+        sent, failed = [], []
+        release = asyncio.Event()
+
+        async def slow(version, since, groups):
+            sent.append((version, since, groups))
+            await release.wait()
+
+        async def broken(version, since, groups):
+            failed.append(version)
+            raise ConnectionResetError("gone")
+
+        registry.subscribe("slow", slow)
+        registry.subscribe("broken", broken)
+
+        # Flapping within a tick publishes only the final state
+        registry.update("a", "busy")
+        registry.update("a", "available")
+        assert registry.publish() == 1
+        await asyncio.sleep(0)
+        assert sent == [(1, 0, [{"status": "available", "since": "1970-01-01T00:00:00+00:00", "agent_ids": ["a"]}])]
+        assert failed == [1] and list(registry.subscribers) == ["slow"]
+
+        # While the first send is stuck, two more versions queue up and are merged
+        registry.update("b", "busy")
+        registry.publish()
+        registry.update("a", "offline")
+        registry.update("c", "busy")
+        registry.publish()
+        release.set()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        # Three agents exceed inline_limit=2: announced by version only
+        assert sent[1:] == [(3, 1, None)]
+        assert registry.subscribers["slow"].version == 3
+        registry.unsubscribe("slow")
+        assert registry.subscribers == {}
+
+    asyncio.run(run())
+
+
+def test_render_delta_and_reset():
+    registry = PresenceRegistry(history=2, clock=lambda: 0)
+    for version, agent_id in enumerate(("a", "b", "c"), start=1):
+        registry.update(agent_id, "busy")
+        registry.publish()
+        assert registry.version == version
+
+    delta = json.loads(registry.render(1))
+    assert delta["version"] == 3 and delta["since"] == 1
+    assert delta["changes"][0]["agent_ids"] == ["b", "c"]
+    assert registry.render(1) is registry.render(1)
+    assert json.loads(registry.render(3))["changes"] == []
+
+    # Version 0 fell out of the two-version history: full snapshot instead
+    reset = json.loads(registry.render(0))
+    assert reset["reset"] is True and [a["agent_id"] for a in reset["agents"]] == ["a", "b", "c"]
+    assert "reset" not in json.loads(registry.render())
+
+
+def test_reads_are_current_before_the_tick():
+    async def run():
+        registry = PresenceRegistry(tick=3600, clock=lambda: 0)
+        sent = []
+
+        async def send(version, since, groups):
+            sent.append(version)
+
+        registry.subscribe("s", send)
+        assert json.loads(registry.render())["agents"] == []
+        registry.update("a", "busy")
+        registry.update("a", "available")
+        registry.update("b", "break")
+        await asyncio.sleep(0)
+        # Both reads show the latest state; nobody has been notified yet
+        assert [(a["agent_id"], a["status"]) for a in json.loads(registry.render())["agents"]] == [
+            ("a", "available"), ("b", "break")]
+        assert json.loads(registry.render(0))["changes"] == [
+            {"status": "available", "since": "1970-01-01T00:00:00+00:00", "agent_ids": ["a"]},
+            {"status": "break", "since": "1970-01-01T00:00:00+00:00", "agent_ids": ["b"]}]
+        assert sent == [] and registry.version == 0
+
+        assert registry.publish() == 2
+        await asyncio.sleep(0)
+        assert sent == [1] and json.loads(registry.render(1))["changes"] == []
+        registry.unsubscribe("s")
+
+    asyncio.run(run())
+
+
+def test_each_business_has_its_own_registry():
+    async def run(db):
+        store = SQLiteCallLogStore(db)
+        await store.execute_many(
+            "INSERT INTO call_center_agent_status (agent_id, user_id, status, updated_at) VALUES (?, ?, ?, ?)",
+            [("ann", "biz-1", "busy", "t1"), ("ann", "biz-2", "break", "t2"), ("ann", None, "offline", "t3"),
+             ("bob", "biz-1", "available", "t4")])
+        call_log_store._store, agent_presence._registries = store, {}
+        try:
+            first, second, unscoped = [await get_presence_registry(user_id) for user_id in ("biz-1", "biz-2", None)]
+            assert await get_presence_registry("biz-1") is first and first is not second
+            assert {a: v["status"] for a, v in first.agents.items()} == {"ann": "busy", "bob": "available"}
+            assert {a: v["status"] for a, v in second.agents.items()} == {"ann": "break"}
+            assert {a: v["status"] for a, v in unscoped.agents.items()} == {"ann": "offline"}
+
+            sent = []
+
+            async def send(version, since, groups):
+                sent.append(groups)
+
+            second.subscribe("s", send)
+            first.update("ann", "offline")
+            first.publish()
+            second.publish()
+            await asyncio.sleep(0)
+            assert sent == [] and second.agents["ann"]["status"] == "break"
+            second.unsubscribe("s")
+        finally:
+            for registry in agent_presence._registries.values():
+                registry._ticker.cancel()
+            call_log_store._store, agent_presence._registries = None, {}
+            await store.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "presence.db")
+        write_sqlite(db, 10, 42, transcripts=False)
+        asyncio.run(run(db))
+
+
+if __name__ == "__main__":
+    for test in (test_group_changes, test_publish_coalesces_and_merges_lagging_subscribers,
+                 test_render_delta_and_reset, test_reads_are_current_before_the_tick,
+                 test_each_business_has_its_own_registry):
+        test()
+        print(f"{test.__name__}: PASSED")
+    print("\n=== Test PASSED ===")
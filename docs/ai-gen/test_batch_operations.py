@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Tests for batch ticket, agent status and customer history operations
+"""
+
+import asyncio
+import os
+import tempfile
+
+from batch_operations import create_tickets, get_customer_histories, update_agent_statuses
+from call_log_store import SQLiteCallLogStore
+from customer_history import CustomerHistoryService
+from generate_call_log_fixtures import generate_rows, write_sqlite
+
+
+def _with_store(test):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "batch.db")
+        write_sqlite(db, 500, 42, transcripts=False, staff=1)
+
+        async def run():
+            store = SQLiteCallLogStore(db)
+            try:
+                await test(store)
+            finally:
+                await store.close()
+        asyncio.run(run())
+
+
+def test_batches_write_in_one_transaction_and_keep_order():
+    async def check(store):
+        tickets = await create_tickets(store, [
+            {"title": "A", "description": "first"},
+            {"title": "B", "description": "second", "priority": "urgent"},
+        ])
+        assert [t["title"] for t in tickets] == ["A", "B"]
+        assert tickets[0]["priority"] == "medium"
+        rows = await store.query("SELECT id, priority FROM support_tickets ORDER BY title")
+        assert [(r["id"], r["priority"]) for r in rows] == [(tickets[0]["ticket_id"], "medium"),
+                                                            (tickets[1]["ticket_id"], "urgent")]
+
+        results = await update_agent_statuses(store, [
+            {"agent_id": "agent_1", "status": "busy"},
+            {"agent_id": "agent_2", "status": "break"},
+            {"agent_id": "agent_1", "status": "available"},
+        ])
+        assert [r["new_status"] for r in results] == ["busy", "break", "available"]
+        rows = await store.query("SELECT agent_id, status FROM call_center_agent_status ORDER BY agent_id")
+        assert [(r["agent_id"], r["status"]) for r in rows] == [("agent_1", "available"), ("agent_2", "break")]
+
+    _with_store(check)
+
+
+def test_agent_ids_are_scoped_to_their_business():
+    async def check(store):
+        await update_agent_statuses(store, [{"agent_id": "a2", "status": "available"}], "u1")
+        await update_agent_statuses(store, [{"agent_id": "a2", "status": "offline"}], "u2")
+        await update_agent_statuses(store, [{"agent_id": "a2", "status": "break"}], "u2")
+        rows = await store.query("SELECT user_id, status FROM call_center_agent_status WHERE agent_id = 'a2' "
+                                 "ORDER BY user_id")
+        assert [(r["user_id"], r["status"]) for r in rows] == [("u1", "available"), ("u2", "break")]
+
+    _with_store(check)
+
+
+def test_customer_histories_mark_unknown_customers_in_place():
+    async def check(store):
+        tenant = next(generate_rows(1))[0][3]
+        number = (await store.query(
+            "SELECT from_number FROM customer_call_logs WHERE user_id = ? LIMIT 1", (tenant,)))[0]["from_number"]
+        histories = await get_customer_histories(
+            CustomerHistoryService(store), tenant, [number, "no-such-customer", number])
+        assert histories[0]["total_interactions"] >= 1
+        assert histories[1] == {"customer_id": "no-such-customer", "error": "Unknown customer: no-such-customer"}
+        assert histories[2] is histories[0]
+
+    _with_store(check)
+
+
+if __name__ == "__main__":
+    for test in (test_batches_write_in_one_transaction_and_keep_order, test_agent_ids_are_scoped_to_their_business,
+                 test_customer_histories_mark_unknown_customers_in_place):
+        test()
+        print(f"{test.__name__}: PASSED")
+    print("\n=== Test PASSED ===")
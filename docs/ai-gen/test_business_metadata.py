@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Tests for business metadata sections, change counters and conditional reads
+"""
+
+import asyncio
+import os
+import tempfile
+
+from business_metadata import BusinessMetadataService, content_hash, format_hours, parse_business_uri
+from call_log_store import SQLiteCallLogStore
+from generate_call_log_fixtures import generate_rows, write_sqlite
+
+
+def test_hours_and_hashes():
+    hours = format_hours([{"day_of_week": 1, "start_time": "08:30:00", "end_time": "12:00:00", "is_active": 1},
+                          {"day_of_week": 2, "start_time": "13:00:00", "end_time": "00:00:00", "is_active": 0}])
+    assert hours[:3] == ["Sunday: Closed", "Monday: 8:30 AM to 12:00 PM", "Tuesday: Closed"]
+    assert format_hours([], '{"monday": {"open": true, "start": "09:00", "end": "17:30"}}')[0] == \
+        "Monday: 9:00 AM to 5:30 PM"
+    assert format_hours([])[1] == "Monday: 9:00 AM to 5:00 PM"
+    assert content_hash({"a": 1, "b": [2]}) == content_hash({"b": [2], "a": 1}) != content_hash({"a": 2})
+    assert parse_business_uri("call-center://business/biz-1?known=a:b") == ("biz-1", "known=a:b")
+
+
+def test_conditional_reads_and_section_refresh():
+    async def run(db):
+        tenant = next(generate_rows(1))[0][3]
+        store = SQLiteCallLogStore(db)
+        now = [0.0]
+        service = BusinessMetadataService(store, poll_interval=1.0, clock=lambda: now[0])
+        try:
+            first = await service.read(tenant)
+            sections = first["sections"]
+            assert sections["profile"]["data"]["practice_name"] == "Example Dental"
+            assert sections["services"]["data"] == ["Checkup", "Cleaning", "Consultation", "Whitening"]
+            assert sections["insurance"]["data"] == ["Delta Dental", "Aetna", "Cigna"]
+            assert len(sections["team"]["data"]) == 3 and sections["hours"]["data"][0] == "Sunday: Closed"
+            assert service.builds == 5
+
+            # Nothing changed: the etag matches, or every known section comes back without data
+            assert await service.read(tenant, f"if_none_match={first['etag']}") == {
+                "business_id": tenant, "etag": first["etag"], "not_modified": True}
+            known = ",".join(f"{name}:{section['hash']}" for name, section in sections.items())
+            again = await service.read(tenant, f"known={known}")
+            assert all(section.get("not_modified") for section in again["sections"].values())
+            assert service.builds == 5
+
+            # An office_hours write bumps its counter; only the hours section is rebuilt
+            await store.execute("UPDATE office_hours SET start_time = '08:00:00' WHERE user_id = ? "
+                                "AND day_of_week = 1", (tenant,))
+            assert (await service.read(tenant, f"if_none_match={first['etag']}")).get("not_modified")
+            now[0] = 1.5
+            changed = await service.read(tenant, f"known={known}")
+            assert service.builds == 6
+            assert changed["etag"] != first["etag"]
+            assert changed["sections"]["hours"]["data"][1] == "Monday: 8:00 AM to 5:00 PM"
+            assert [name for name, section in changed["sections"].items() if "data" in section] == ["hours"]
+
+            only = await service.read(tenant, "sections=team,hours")
+            assert list(only["sections"]) == ["team", "hours"]
+            try:
+                await service.read(tenant, "sections=menu")
+                raise AssertionError("expected ValueError")
+            except ValueError as e:
+                assert "menu" in str(e)
+        finally:
+            await store.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "metadata.db")
+        write_sqlite(db, 100, 42, transcripts=False, staff=3)
+        asyncio.run(run(db))
+
+
+def test_change_counters_are_retried_after_a_backoff():
+    class FlakyStore(SQLiteCallLogStore):
+        down = True
+        version_queries = 0
+
+        async def query(self, sql, params=()):
+            if "business_metadata_versions" in sql:
+                self.version_queries += 1
+                if self.down:
+                    raise ConnectionError("relation does not exist")
+            return await super().query(sql, params)
+
+    async def run(db):
+        tenant = next(generate_rows(1))[0][3]
+        store = FlakyStore(db)
+        now = [0.0]
+        service = BusinessMetadataService(store, poll_interval=1.0, clock=lambda: now[0], retry_interval=5.0)
+        try:
+            first = await service.read(tenant)
+            # Failed at 0: not asked again before 5, then backing off to 10 more
+            for at, queries in ((2.0, 1), (5.0, 2), (12.0, 2), (15.0, 3)):
+                now[0] = at
+                await service.read(tenant)
+                assert store.version_queries == queries, (at, store.version_queries)
+
+            # The counters are back: changes are picked up again without a restart
+            store.down = False
+            await store.execute("UPDATE office_hours SET start_time = '07:00:00' WHERE user_id = ? "
+                                "AND day_of_week = 1", (tenant,))
+            now[0] = 35.0
+            changed = await service.read(tenant)
+            assert changed["etag"] != first["etag"] and store.version_queries == 4
+            assert changed["sections"]["hours"]["data"][1] == "Monday: 7:00 AM to 5:00 PM"
+            now[0] = 36.5
+            await service.read(tenant)
+            assert store.version_queries == 5
+        finally:
+            await store.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "metadata.db")
+        write_sqlite(db, 100, 42, transcripts=False, staff=3)
+        asyncio.run(run(db))
+
+
+if __name__ == "__main__":
+    for test in (test_hours_and_hashes, test_conditional_reads_and_section_refresh,
+                 test_change_counters_are_retried_after_a_backoff):
+        test()
+        print(f"{test.__name__}: PASSED")
+    print("\n=== Test PASSED ===")
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Tests for lexicon sentiment, TF-IDF keywords, action items and checkpointed enrichment runs
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+
+from call_enrichment import Checkpoint, analyze, document_frequencies, enrich_calls, extract_action_items
+from call_log_store import SQLiteCallLogStore
+from generate_call_log_fixtures import write_sqlite
+
+
+def test_sentiment_keywords_and_action_items():
+    texts = [
+        "Agent: Thank you for calling.\n"
+        "User: I am not happy, the bill is wrong and I was overcharged.\n"
+        "Agent: We'll send a corrected invoice and call you back tomorrow.",
+        "User: Great, that was really helpful!\nAgent: Sorry about the wait.",
+        "no speaker labels, just a refund for the invoice",
+        "",
+    ]
+    df = document_frequencies(texts)
+    assert df["invoice"] == 2 and df["bill"] == 1 and "the" not in df and "agent" not in df
+    (angry, keywords, actions), (pleased, _, none), (unlabelled, _, _), empty = analyze(texts, df, len(texts))
+    # Only the caller's lines count, and "not happy" is negative
+    assert -1 < angry < -0.5 and 0.5 < pleased < 1 and unlabelled < 0
+    assert empty == (0.0, [], [])
+    # "invoice" is in two transcripts, so it ranks below the terms unique to this one
+    assert keywords[-1] == "invoice" and set(keywords[:-1]) == {
+        "bill", "corrected", "happy", "overcharged", "send", "tomorrow", "wrong"}
+    assert actions == ["We'll send a corrected invoice and call you back tomorrow."] and none == []
+    assert analyze(texts[:1], df, len(texts), top_k=2)[0][1] == ["bill", "corrected"]
+    assert extract_action_items("User: Could you please email me the forms? Thanks.\n"
+                                "Agent: Let me check. I'll make sure to follow up.") == [
+        "Could you please email me the forms?", "I'll make sure to follow up."]
+
+
+def test_enrichment_resumes_from_checkpoint():
+    async def run(db, checkpoint):
+        store = SQLiteCallLogStore(db)
+        try:
+            first = await enrich_calls(store, checkpoint, workers=0, chunk_size=50, max_chunks=2)
+            assert (first["counted"], first["enriched"]) == (300, 100)
+            state = Checkpoint(checkpoint)
+            assert state.docs == 300 and state.df_after is not None
+
+            # The rest goes through the process pool; enriched calls are not read again
+            second = await enrich_calls(store, checkpoint, workers=2, chunk_size=50)
+            assert (second["counted"], second["enriched"]) == (0, 200)
+            third = await enrich_calls(store, checkpoint, workers=2, chunk_size=50)
+            assert (third["counted"], third["enriched"]) == (0, 0)
+
+            # A call written late but started before everything else is still counted and enriched
+            await store.execute(
+                "INSERT INTO call_logs (id, call_id, client_id, started_at, transcript, created_at, updated_at) "
+                "VALUES ('late', 'call_late', 'tenant', '2000-01-01T00:00:00+00:00', 'User: please send my invoice', "
+                "'2099-01-01T00:00:00+00:00', '2099-01-01T00:00:00+00:00')")
+            late = await enrich_calls(store, checkpoint, workers=0, chunk_size=50)
+            assert (late["counted"], late["enriched"]) == (1, 1) and Checkpoint(checkpoint).docs == 301
+            await store.execute("DELETE FROM call_logs WHERE id = 'late'")
+            return state
+        finally:
+            await store.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "calls.db")
+        checkpoint = os.path.join(tmp, "enrichment.json")
+        write_sqlite(db, 300, 42, transcripts=True)
+        state = asyncio.run(run(db, checkpoint))
+
+        conn = sqlite3.connect(db)
+        rows = conn.execute("SELECT transcript, sentiment_score, keywords, action_items, call_analysis "
+                            "FROM call_logs ORDER BY started_at, id").fetchall()
+        conn.close()
+        assert len(rows) == 300 and all(row[2] is not None for row in rows)
+        # Pool and in-process runs score against the same document frequencies
+        expected = analyze([row[0] for row in rows], state.df, state.docs)
+        for (_, score, keywords, actions, analysis), (want_score, want_keywords, want_actions) in zip(rows, expected):
+            assert (score, json.loads(keywords), json.loads(actions)) == (want_score, want_keywords, want_actions)
+            assert json.loads(analysis)["user_sentiment"] in ("Positive", "Neutral", "Negative")
+        assert any(json.loads(row[3]) for row in rows)
+
+
+if __name__ == "__main__":
+    for test in (test_sentiment_keywords_and_action_items, test_enrichment_resumes_from_checkpoint):
+        test()
+        print(f"{test.__name__}: PASSED")
+    print("\n=== Test PASSED ===")
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Tests for the streaming call log export and its cost rollups
+"""
+
+import asyncio
+import gzip
+import importlib.util
+import json
+import os
+import sqlite3
+import tempfile
+from collections import defaultdict
+
+from call_log_export import export_call_logs, parse_time, resolve_format, rollup_path
+from call_log_store import SQLiteCallLogStore
+from generate_call_log_fixtures import generate_rows, write_sqlite
+
+
+HAVE_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+
+def _read(path: str, format: str) -> list[dict]:
+    if format == "ndjson":
+        with gzip.open(path) as file:
+            return [json.loads(line) for line in file]
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(path) if format == "parquet" else pa.ipc.open_file(path).read_all()
+    return table.to_pylist()
+
+
+def test_store_streams_in_batches():
+    async def run(db):
+        store = SQLiteCallLogStore(db)
+        sizes = [len(rows) async for rows in store.stream("SELECT id FROM customer_call_logs WHERE duration_ms > ?",
+                                                          (0,), batch_size=300)]
+        # Stopping early closes the cursor's connection
+        async for rows in store.stream("SELECT id FROM customer_call_logs", batch_size=10):
+            break
+        await store.close()
+        return sizes
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "calls.db")
+        write_sqlite(db, 1000, 42, transcripts=False)
+        assert asyncio.run(run(db)) == [300, 300, 300, 100]
+
+
+def test_export_rows_and_rollups():
+    formats = ["ndjson"] + (["parquet", "arrow"] if HAVE_PYARROW else [])
+    assert resolve_format("auto") == ("parquet" if HAVE_PYARROW else "ndjson")
+    if not HAVE_PYARROW:
+        try:
+            resolve_format("parquet")
+            raise AssertionError("expected ValueError")
+        except ValueError as e:
+            assert "pyarrow" in str(e)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "calls.db")
+        write_sqlite(db, 3000, 42, transcripts=False)
+        with sqlite3.connect(db) as conn:
+            conn.execute("UPDATE customer_call_logs SET call_cost = 'not json' WHERE call_id = 'call_0000000007'")
+            conn.execute("UPDATE customer_call_logs SET call_cost = NULL WHERE call_id = 'call_0000000008'")
+        # generate_rows's first tenant does not depend on the row count
+        tenant = next(generate_rows(1))[0][3]
+        expected = defaultdict(lambda: [0, 0, 0.0])
+        mine = since = 0
+        costs, starts = {}, {}
+        for call, _ in generate_rows(3000):
+            start, user_id, cost = call[18], call[3], json.loads(call[12])["combined_cost"]
+            costs[call[5]] = cost
+            starts[call[5]] = start
+            if call[5] in ("call_0000000007", "call_0000000008"):
+                cost = 0.0
+            total = expected[(user_id, call[6], start[:10])]
+            total[0] += 1
+            total[1] += call[8]
+            total[2] += cost
+            mine += user_id == tenant
+            since += user_id == tenant and start >= "2024-01-02"
+
+        async def run(path, format, **filters):
+            store = SQLiteCallLogStore(db)
+            try:
+                return await export_call_logs(store, path, format, batch_size=700, **filters)
+            finally:
+                await store.close()
+
+        for format in formats:
+            path = os.path.join(tmp, f"calls.{format}")
+            summary = asyncio.run(run(path, format))
+            assert summary["rows"] == 3000 and summary["rollups"] == len(expected)
+            rows = _read(path, format)
+            assert len(rows) == 3000 and len({row["id"] for row in rows}) == 3000
+            by_call = {row["call_id"]: row for row in rows}
+            assert by_call["call_0000000007"]["combined_cost"] is None
+            assert by_call["call_0000000008"]["call_cost"] is None
+            first = by_call["call_0000000000"]
+            assert first["combined_cost"] == costs["call_0000000000"]
+            if format == "ndjson":
+                assert first["call_cost"]["combined_cost"] == first["combined_cost"]
+                assert first["start_timestamp"] == starts["call_0000000000"]
+            else:
+                assert json.loads(first["call_cost"])["combined_cost"] == first["combined_cost"]
+                assert first["start_timestamp"] == parse_time(starts["call_0000000000"]) and first["duration_ms"] > 0
+
+            rollups = _read(rollup_path(path, format), format)
+            assert len(rollups) == len(expected)
+            for rollup in rollups:
+                calls, duration, cost = expected[(rollup["user_id"], rollup["agent_id"], rollup["day"])]
+                assert (rollup["calls"], rollup["duration_ms"]) == (calls, duration)
+                assert abs(rollup["combined_cost"] - cost) < 1e-6
+
+        filtered = asyncio.run(run(os.path.join(tmp, "mine.ndjson.gz"), "ndjson", user_id=tenant,
+                                   since=parse_time("2024-01-02")))
+        assert filtered["rows"] == since and 0 < since < mine
+        assert not [name for name in os.listdir(tmp) if name.endswith(".partial")]
+
+
+if __name__ == "__main__":
+    for test in (test_store_streams_in_batches, test_export_rows_and_rollups):
+        test()
+        print(f"{test.__name__}: PASSED")
+    print("\n=== Test PASSED ===")
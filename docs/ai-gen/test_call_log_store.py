@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Tests for keyset paging and cursors in the call log store
+"""
+
+import asyncio
+import os
+import tempfile
+
+from call_log_store import CALL_LOG_TABLES, CallLogStore, SQLiteCallLogStore, decode_cursor, encode_cursor
+from generate_call_log_fixtures import write_sqlite
+
+
+async def _all(store, limit, **kwargs) -> list:
+    return [row async for chunk, _ in store.iter_chunks(limit, **kwargs) for row in chunk]
+
+
+async def _keyset_pages(db: str):
+    store = SQLiteCallLogStore(db)
+    expected = await store.query("SELECT id FROM customer_call_logs ORDER BY start_timestamp DESC, id DESC")
+
+    # Chunks follow each other without gaps or repeats, newest first
+    rows, cursors = [], []
+    async for chunk, cursor in store.iter_chunks(10_000, chunk_size=70):
+        rows += chunk
+        cursors.append(cursor)
+    assert [row["id"] for row in rows] == [row["id"] for row in expected]
+    assert cursors[-1] is None and None not in cursors[:-1]
+
+    # Every cursor resumes exactly after the chunk that produced it
+    for i, cursor in enumerate(cursors[:-1]):
+        following = await _all(store, 10_000, cursor=cursor)
+        assert [row["id"] for row in following] == [row["id"] for row in rows[70 * (i + 1):]]
+
+    # `limit` caps the rows over chunks; the last cursor still continues the listing
+    first = [(chunk, cursor) async for chunk, cursor in store.iter_chunks(25, chunk_size=10)]
+    assert [len(chunk) for chunk, _ in first] == [10, 10, 5]
+    assert [row["id"] for row in await _all(store, 5, cursor=first[-1][1])] == \
+        [row["id"] for row in rows[25:30]]
+
+    # Rows sharing a start time are ordered and split by id
+    start = rows[0]["start_timestamp"]
+    await store.execute_many(
+        "INSERT INTO customer_call_logs (id, created_at, updated_at, user_id, call_id, start_timestamp) "
+        "VALUES (?, ?, ?, ?, ?, ?)", [(f"zz-tie-{i}", start, start, "tie", f"tie-{i}", start) for i in range(5)])
+    cursor, ties = None, []
+    for _ in range(5):
+        chunk, cursor = [page async for page in store.iter_chunks(1, cursor=cursor, user_id="tie")][0]
+        ties += [row["id"] for row in chunk]
+    assert ties == [f"zz-tie-{i}" for i in reversed(range(5))]
+    assert await _all(store, 10, cursor=cursor, user_id="tie") == []
+
+    # The tenant filter applies to both tables (user_id, client_id)
+    tenant = rows[0]["user_id"]
+    mine = await _all(store, 10_000, chunk_size=33, user_id=tenant)
+    assert mine and {row["user_id"] for row in mine} == {tenant}
+    assert [row["id"] for row in mine] == [row["id"] for row in rows if row["user_id"] == tenant]
+    calls = await _all(store, 10_000, source="call_logs", user_id=tenant)
+    assert len(calls) == len(mine) and {row["client_id"] for row in calls} == {tenant}
+    assert list(calls[0]) == list(CALL_LOG_TABLES["call_logs"].columns)
+
+    for bad in ({"cursor": "not-a-cursor"}, {"source": "no_such_table"}):
+        try:
+            await _all(store, 10, **bad)
+            raise AssertionError(f"expected ValueError for {bad}")
+        except ValueError:
+            pass
+
+    # stream() yields the same rows as tuples, a batch at a time
+    batches = [batch async for batch in store.stream(
+        "SELECT id FROM customer_call_logs WHERE user_id = ? ORDER BY start_timestamp DESC, id DESC",
+        (tenant,), batch_size=7)]
+    assert max(len(batch) for batch in batches) == 7
+    assert [row for batch in batches for (row,) in batch] == [row["id"] for row in mine]
+    await store.close()
+
+
+def test_keyset_pages_and_cursors():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "calls.db")
+        write_sqlite(db, 600, seed=3, transcripts=False)
+        asyncio.run(_keyset_pages(db))
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("2024-03-01T10:00:00+00:00", "row-1")
+    assert "=" not in cursor and decode_cursor(cursor) == ("2024-03-01T10:00:00+00:00", "row-1")
+    for bad in ("", "%%%", encode_cursor("only", "x")[:-4]):
+        try:
+            decode_cursor(bad)
+            raise AssertionError(f"expected ValueError for {bad!r}")
+        except ValueError:
+            pass
+
+
+def test_store_interface_is_abstract():
+    class Partial(CallLogStore):
+        async def query(self, sql, params=()):
+            return []
+
+    for cls in (CallLogStore, Partial):
+        try:
+            cls()
+            raise AssertionError(f"{cls.__name__} should not be instantiable")
+        except TypeError as e:
+            assert "execute_many" in str(e)
+
+
+if __name__ == "__main__":
+    for test in (test_keyset_pages_and_cursors, test_cursor_round_trip, test_store_interface_is_abstract):
+        test()
+        print(f"{test.__name__}: PASSED")
+    print("\n=== Test PASSED ===")
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Tests for the incremental call stats engine
+"""
+
+import asyncio
+import time
+from datetime import datetime, timezone
+
+import call_log_store
+import call_stats
+from call_stats import CallStatsEngine, get_stats_engines, get_warm_stats_engine
+
+DAY = 1_705_363_200.0  # 2024-01-16T00:00:00Z
+
+
+def test_windows_expire_independently():
+    """Calls leave the 5-minute window before the hour window and the day"""
+    engine = CallStatsEngine()
+    engine.record_start("call_1", DAY + 3600, agent_id="agent_1")
+    engine.record_end("call_1", DAY + 3700, wait_seconds=12, satisfaction=4)
+
+    stats = engine.snapshot(DAY + 3720)
+    assert stats["total_calls_today"] == 1
+    assert stats["average_wait_time"] == "0:12"
+    assert stats["windows"]["last_5_min"]["completed_calls"] == 1
+
+    stats = engine.snapshot(DAY + 3700 + 301)
+    assert stats["windows"]["last_5_min"]["completed_calls"] == 0
+    assert stats["windows"]["last_hour"]["completed_calls"] == 1
+
+    stats = engine.snapshot(DAY + 3700 + 3601)
+    assert stats["windows"]["last_hour"]["completed_calls"] == 0
+    assert stats["windows"]["today"]["completed_calls"] == 1
+
+    stats = engine.snapshot(DAY + 86_400)
+    assert stats["total_calls_today"] == 0
+
+
+def test_queue_and_busy_agents():
+    """Queued calls count until answered; busy agents until the call ends"""
+    engine = CallStatsEngine()
+    engine.record_start("call_1", DAY + 10, queued=True)
+    engine.record_start("call_2", DAY + 11, agent_id="agent_2")
+    assert engine.snapshot(DAY + 12)["calls_in_queue"] == 1
+
+    engine.record_answer("call_1", "agent_1")
+    stats = engine.snapshot(DAY + 13)
+    assert stats["calls_in_queue"] == 0
+    assert stats["busy_agents"] == 2
+
+    engine.record_end("call_1", DAY + 60, wait_seconds=3)
+    engine.record_end("call_2", DAY + 61)
+    stats = engine.snapshot(DAY + 62)
+    assert stats["busy_agents"] == 0
+    assert stats["active_calls"] == 0
+    assert stats["windows"]["today"]["p50_wait_seconds"] == 5
+
+
+class _GatedStore:
+    """Today's calls for two businesses, served once `gate` is set"""
+
+    def __init__(self, failures: int = 0):
+        now = datetime.fromtimestamp(time.time(), timezone.utc).isoformat()
+        self.rows = [{"user_id": user_id, "call_id": call_id, "start_timestamp": now, "end_timestamp": now,
+                      "duration_ms": 60_000} for user_id, call_id in (("a", "a1"), ("a", "a2"), ("b", "b1"))]
+        self.gate = asyncio.Event()
+        self.reads: list = []
+        self.failures = failures
+
+    async def iter_chunks(self, limit, chunk_size=500, cursor=None, source="customer_call_logs", user_id=None):
+        self.reads.append(user_id)
+        await self.gate.wait()
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("database went away")
+        yield [row for row in self.rows if user_id in (None, row["user_id"])], None
+
+
+def test_backfill_runs_once_per_business():
+    async def run():
+        store = call_log_store._store = _GatedStore(failures=1)
+        failed = asyncio.ensure_future(get_warm_stats_engine("c"))
+        readers = [asyncio.ensure_future(get_warm_stats_engine(user_id)) for user_id in ("a", "a", "b")]
+        await asyncio.sleep(0.01)
+        # A call ends live while its business is still backfilling
+        engine, = get_stats_engines("a")
+        engine.record_end("a1", duration_seconds=60)
+        store.gate.set()
+
+        try:
+            await failed
+        except ConnectionError:
+            pass
+        else:
+            raise AssertionError("failed backfill was not reported")
+        first, second, other = await asyncio.gather(*readers)
+        assert first is second is engine and store.reads == ["c", "a", "b"]
+        assert first.snapshot()["windows"]["today"]["completed_calls"] == 2
+        assert other.snapshot()["windows"]["today"]["completed_calls"] == 1
+
+        # The failed business backfills again, into a fresh engine, on its next read
+        retried = await get_warm_stats_engine("c")
+        assert store.reads == ["c", "a", "b", "c"] and retried.snapshot()["total_calls_today"] == 0
+        assert await get_warm_stats_engine("a") is first and len(store.reads) == 4
+
+    try:
+        asyncio.run(run())
+    finally:
+        call_log_store._store = None
+        call_stats._engines.clear()
+        call_stats._backfills.clear()
+
+
+if __name__ == "__main__":
+    for test in (test_windows_expire_independently, test_queue_and_busy_agents, test_backfill_runs_once_per_business):
+        test()
+        print(f"{test.__name__}: PASSED")
+    print("\n=== Test PASSED ===")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Tests for the columnar call log store
+"""
+
+import asyncio
+import os
+import tempfile
+from collections import Counter
+from datetime import datetime
+
+import call_log_store
+import columnar_calls
+from call_log_store import SQLiteCallLogStore
+from columnar_calls import ColumnarCallLogs, get_columnar_call_logs
+from generate_call_log_fixtures import write_sqlite
+
+
+def test_columnar_matches_row_store():
+    async def run(db):
+        store = SQLiteCallLogStore(db)
+        rows = [row async for chunk, _ in store.iter_chunks(3000) for row in chunk]
+        calls = ColumnarCallLogs(capacity=16)
+        assert await calls.load(store, 3000, chunk_size=700) == len(rows)
+
+        # Pages and cursors line up with get_call_logs
+        expected, cursor = [], None
+        async for chunk, cursor in store.iter_chunks(250, chunk_size=250):
+            expected = chunk
+        page, next_cursor = calls.page(250)
+        assert page == expected
+        following = [row async for chunk, _ in store.iter_chunks(40, cursor=cursor) for row in chunk]
+        assert calls.page(40, next_cursor)[0] == following
+
+        inbound = [row for row in rows if row["direction"] == "inbound"]
+        groups = calls.group_by("disconnection_reason", calls.filter(direction="inbound"))
+        assert {k: v["calls"] for k, v in groups.items()} == Counter(r["disconnection_reason"] for r in inbound)
+        agent = rows[0]["agent_id"]
+        total = sum(r["duration_ms"] for r in rows if r["agent_id"] == agent) / 1000
+        assert abs(calls.group_by("agent_id")[agent]["total_duration_seconds"] - total) < 0.1
+        hours = Counter(datetime.fromisoformat(r["start_timestamp"]).hour for r in rows)
+        assert {k: v["calls"] for k, v in calls.group_by("hour").items()} == hours
+        assert not calls.filter(agent_id="no-such-agent").any()
+
+        newest = datetime.fromisoformat(rows[0]["end_timestamp"]).timestamp()
+        stats = calls.call_stats(now=newest)
+        assert stats["windows"]["last_5_min"]["completed_calls"] >= 1
+        assert stats["total_calls_today"] >= stats["windows"]["last_hour"]["completed_calls"]
+        await store.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "columnar.db")
+        write_sqlite(db, 3000, 42, transcripts=False)
+        asyncio.run(run(db))
+
+
+def test_each_tenant_keeps_its_own_window():
+    async def run(db):
+        store = SQLiteCallLogStore(db)
+        rows = [row async for chunk, _ in store.iter_chunks(3000) for row in chunk]
+        tenant = rows[-1]["user_id"]
+        newest = [row["id"] for row in rows if row["user_id"] == tenant][:100]
+
+        # Other tenants' newer calls fill the shared window, not the tenant's own copy
+        everyone = await get_columnar_call_logs()
+        assert len(everyone) == 100 and everyone.filter(user_id=tenant).sum() < 100
+        calls = await get_columnar_call_logs(tenant)
+        assert [row["id"] for row in calls.page(100)[0]] == newest
+        assert calls is await get_columnar_call_logs(tenant)
+        await store.close()
+        await call_log_store._store.close()
+
+    saved = {key: os.environ.get(key) for key in ("CALL_CENTER_DB_URL", "CALL_CENTER_ANALYTICS_ROWS")}
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "columnar.db")
+        write_sqlite(db, 3000, 42, transcripts=False)
+        os.environ.update(CALL_CENTER_DB_URL=f"sqlite:///{db}", CALL_CENTER_ANALYTICS_ROWS="100")
+        try:
+            asyncio.run(run(db))
+        finally:
+            call_log_store._store = columnar_calls._calls = None
+            for key, value in saved.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+
+
+if __name__ == "__main__":
+    for test in (test_columnar_matches_row_store, test_each_tenant_keeps_its_own_window):
+        test()
+        print(f"{test.__name__}: PASSED")
+    print("\n=== Test PASSED ===")
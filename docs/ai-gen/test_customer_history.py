@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Tests for phone normalization and the customer history cache
+"""
+
+import asyncio
+import os
+import tempfile
+
+from call_log_store import SQLiteCallLogStore
+from customer_history import CustomerHistoryService, TTLCache, normalize_phone
+from generate_call_log_fixtures import generate_rows, write_sqlite
+
+
+def test_normalize_phone():
+    for raw in ("+1-555-123-4567", "(555) 123-4567", "15551234567", "555.123.4567"):
+        assert normalize_phone(raw) == "+15551234567"
+    assert normalize_phone("0044 20 7946 0958") == "+442079460958"
+    assert normalize_phone("1-800-FLOWERS") == "+18003569377"
+    assert normalize_phone("CUSTOMER1") is None
+    assert normalize_phone("12345") is None
+
+
+def test_ttl_cache_evicts_oldest_and_expired():
+    now = [0.0]
+    cache = TTLCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    now[0] = 11
+    assert cache.get("a") is None
+    assert len(cache) == 1
+
+
+def test_lookup_matches_any_format_and_refreshes_on_new_call():
+    async def run(db):
+        tenant = next(generate_rows(1))[0][3]
+        store = SQLiteCallLogStore(db)
+        service = CustomerHistoryService(store)
+        number = (await store.query(
+            "SELECT from_number FROM customer_call_logs WHERE user_id = ? LIMIT 1", (tenant,)))[0]["from_number"]
+        phone = normalize_phone(number)
+
+        history = await service.lookup(tenant, phone)
+        national = phone[-10:]
+        assert await service.lookup(tenant, f"({national[:3]}) {national[3:6]}-{national[6:]}") is history
+        assert history["total_interactions"] >= 1
+
+        new_number = f"{national[:3]}.{national[3:6]}.{national[6:]}"
+        await store.execute(
+            "INSERT INTO customer_call_logs (id, created_at, updated_at, user_id, call_id, from_number, "
+            "start_timestamp) VALUES ('new', 'x', 'x', ?, 'call_new', ?, '2099-01-01T00:00:00+00:00')",
+            (tenant, new_number))
+        service.record_call_log(tenant, new_number)
+        refreshed = await service.lookup(tenant, phone)
+        assert refreshed["total_interactions"] == history["total_interactions"] + 1
+        assert refreshed["interactions"][0]["call_id"] == "call_new"
+        await store.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "history.db")
+        write_sqlite(db, 2000, 42, transcripts=False, staff=2)
+        asyncio.run(run(db))
+
+
+def test_customer_ids_win_over_phone_lookalikes_and_new_customers_are_found():
+    async def run(db):
+        tenant = next(generate_rows(1))[0][3]
+        store = SQLiteCallLogStore(db)
+        service = CustomerHistoryService(store)
+        # This uuid holds 13 digits, enough to pass for a phone number
+        customer_id = "dbf58f5d-a6e6-4ffc-9ebd-c6c4ccf3c802"
+        assert normalize_phone(customer_id) == "+5856649643802"
+        await service.lookup(tenant, "+15550199000")
+
+        # Both customers are created after the business was indexed
+        await store.execute_many(
+            "INSERT INTO customers (id, business_id, user_id, first_name, last_name, phone) "
+            "VALUES (?, ?, ?, 'New', 'Customer', ?)",
+            [(customer_id, tenant, tenant, "(555) 019-8000"), ("c-2", tenant, tenant, "555.019.7000")])
+        history = await service.lookup(tenant, customer_id)
+        assert history["customer_id"] == customer_id and history["phone"] == "+15550198000"
+        assert await service.lookup(tenant, "555-019-8000") is history
+
+        found = await service.lookup(tenant, "+1 555 019 7000")
+        assert found["customer_id"] == "c-2"
+        try:
+            await service.lookup(tenant, "not-a-customer")
+        except ValueError as e:
+            assert str(e) == "Unknown customer: not-a-customer"
+        else:
+            raise AssertionError("unknown customer was accepted")
+        await store.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "history.db")
+        write_sqlite(db, 200, 42, transcripts=False, staff=1)
+        asyncio.run(run(db))
+
+
+if __name__ == "__main__":
+    for test in (test_normalize_phone, test_ttl_cache_evicts_oldest_and_expired,
+                 test_lookup_matches_any_format_and_refreshes_on_new_call,
+                 test_customer_ids_win_over_phone_lookalikes_and_new_customers_are_found):
+        test()
+        print(f"{test.__name__}: PASSED")
+    print("\n=== Test PASSED ===")
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Tests for the deployment queue, prompt cache and fake Retell API
+"""
+
+import asyncio
+import os
+import tempfile
+
+from agent_templates import PromptCache
+from call_log_store import SQLiteCallLogStore
+from deployment_queue import DeploymentQueue, DeploymentService
+from fake_retell_server import FakeRetellServer
+from generate_call_log_fixtures import write_sqlite
+from retell_client import RetellClient
+
+
+METADATA = {
+    "business_name": "Sun Rise Dental",
+    "services": [{"service_name": "Cleaning", "service_description": "Routine cleaning", "price": 120}],
+    "staff": [{"first_name": "Ana", "last_name": "Lopez", "job_title": "Hygienist"}],
+}
+
+
+def test_prompt_cache_renders_once_per_metadata():
+    prompts = PromptCache()
+    first = prompts.render("dental-inbound-receptionist-v01", "dental", "Front Desk", METADATA)
+    again = prompts.render("dental-inbound-receptionist-v01", "dental", "Front Desk", dict(METADATA))
+    assert again is first and prompts.renders == 1 and prompts.hits == 1
+
+    prompt = first["llm"]["general_prompt"]
+    assert prompt.startswith("You are a professional AI receptionist for Sun Rise Dental, a dental practice.")
+    assert "- Cleaning: Routine cleaning (Starting at $120)" in prompt
+    assert "DENTAL PRACTICE GUIDELINES:" in prompt
+    assert "llm_id" not in first["llm"] and "agent_id" not in first["agent"]
+    service_type, = [f for f in first["agent"]["post_call_analysis_data"] if f["name"] == "service_type"]
+    assert service_type["examples"] == ["Cleaning"]
+
+    changed = prompts.render("dental-inbound-receptionist-v01", "dental", "Front Desk",
+                             {**METADATA, "custom_instructions": "Mention the parking lot."})
+    assert prompts.renders == 2 and changed["llm_hash"] != first["llm_hash"]
+    assert changed["agent_hash"] == first["agent_hash"]
+    assert prompts.template_name("restaurant") == "dental-inbound-receptionist-v01"
+    try:
+        prompts.template("missing-template")
+    except ValueError as e:
+        assert "not found" in str(e)
+    else:
+        raise AssertionError("missing template accepted")
+
+
+def test_queue_retries_dedupes_and_skips_unchanged():
+    async def wait_done(service, job):
+        while job["status"] not in ("succeeded", "failed"):
+            job = await service.status(job["deployment_id"], wait=5)
+        return job
+
+    async def run(tmp):
+        fake = FakeRetellServer()
+        retell = RetellClient("test", await fake.start())
+        write_sqlite(os.path.join(tmp, "calls.db"), 10, 42, transcripts=False)
+        store = SQLiteCallLogStore(os.path.join(tmp, "calls.db"))
+        service = DeploymentService(DeploymentQueue(os.path.join(tmp, "jobs.db")), retell,
+                                    concurrency=2, retry_delay=0.01, poll_interval=0.05, store=store)
+        service.start()
+
+        fake.fail_next = [500]
+        jobs = [(await service.submit("tenant", {"agent_name": name, "business_type": "dental",
+                                                 "metadata": METADATA, "idempotency_key": name}))[0]
+                for name in ("a", "b", "c")]
+        repeat, created = await service.submit("tenant", {"agent_name": "a", "business_type": "dental",
+                                                          "idempotency_key": "a"})
+        assert not created and repeat["deployment_id"] == jobs[0]["deployment_id"]
+        done = [await wait_done(service, job) for job in jobs]
+        assert [job["status"] for job in done] == ["succeeded"] * 3
+        assert sorted(job["attempts"] for job in done) == [1, 1, 2]
+        assert len(fake.llms) == 3 and len(fake.agents) == 3
+        assert fake.agents[done[0]["result"]["agent_id"]]["response_engine"]["llm_id"] == done[0]["result"]["llm_id"]
+        # Calls to the new agents are routed to the business that deployed them
+        owners = await store.query("SELECT retell_agent_id, user_id FROM retell_agents WHERE user_id = 'tenant'")
+        assert sorted(row["retell_agent_id"] for row in owners) == sorted(job["result"]["agent_id"] for job in done)
+
+        # Same config: no API calls. New instructions: the LLM is updated, the agent is not.
+        calls = service.api_calls
+        same, _ = await service.submit("tenant", {"agent_name": "a", "business_type": "dental", "metadata": METADATA})
+        same = await wait_done(service, same)
+        assert same["result"]["llm"] == same["result"]["agent"] == "unchanged" and service.api_calls == calls
+        edited, _ = await service.submit("tenant", {"agent_name": "b", "business_type": "dental",
+                                                    "metadata": {**METADATA, "custom_instructions": "Be brief."}})
+        edited = await wait_done(service, edited)
+        assert (edited["result"]["llm"], edited["result"]["agent"]) == ("updated", "unchanged")
+        assert edited["result"]["llm_id"] == done[1]["result"]["llm_id"]
+        assert fake.llms[edited["result"]["llm_id"]]["general_prompt"].count("Be brief.") == 1
+
+        # Rejected requests fail without retrying
+        fake.fail_next = [400]
+        rejected, _ = await service.submit("tenant", {"agent_name": "d", "business_type": "general"})
+        rejected = await wait_done(service, rejected)
+        assert rejected["status"] == "failed" and rejected["attempts"] == 1 and "400" in rejected["error"]
+
+        # A job that outlives its lease keeps it through heartbeats; other processes leave it alone
+        service.queue.lease, fake.latency = 0.15, 0.2
+        slow, _ = await service.submit("tenant", {"agent_name": "f", "business_type": "general"})
+        other = DeploymentQueue(os.path.join(tmp, "jobs.db"), lease=0.15)
+        while (await other.get(slow["deployment_id"]))["status"] == "queued":
+            await asyncio.sleep(0.01)
+        for _ in range(5):
+            assert await other.claim() is None
+            await asyncio.sleep(0.1)
+        slow = await wait_done(service, slow)
+        assert slow["status"] == "succeeded" and slow["attempts"] == 1
+
+        await service.stop()
+        await retell.close()
+        await fake.close()
+        await store.close()
+
+        # A job whose worker died is claimed again once its lease expires
+        queue = DeploymentQueue(os.path.join(tmp, "jobs.db"), lease=0.2)
+        await queue.enqueue("tenant", "e", "general", "dental-inbound-receptionist-v01", {})
+        claimed = await queue.claim()
+        assert claimed["status"] == "running" and await queue.claim() is None
+        assert await other.claim() is None and await queue.renew(claimed["deployment_id"])
+        await asyncio.sleep(0.25)
+        taken = await other.claim()
+        assert taken["deployment_id"] == claimed["deployment_id"] and taken["attempts"] == 2
+        # The first worker's late result is ignored
+        assert not await queue.renew(claimed["deployment_id"])
+        assert not await queue.finish(claimed["deployment_id"], "failed", error="late")
+        assert await other.finish(claimed["deployment_id"], "succeeded", result={})
+        assert (await other.get(claimed["deployment_id"]))["status"] == "succeeded"
+        queue.close()
+        other.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run(tmp))
+
+
+if __name__ == "__main__":
+    for test in (test_prompt_cache_renders_once_per_metadata, test_queue_retries_dedupes_and_skips_unchanged):
+        test()
+        print(f"{test.__name__}: PASSED")
+    print("\n=== Test PASSED ===")
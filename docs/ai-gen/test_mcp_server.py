@@ -3,75 +3,61 @@
 Test script to verify MCP server functionality
 """
 
-import json
-import subprocess
+import asyncio
+import os
 import sys
+import tempfile
+
+from bench_mcp_rpc import DEFAULT_SESSION, compare, load_session, run_load, server_command
+from generate_call_log_fixtures import write_sqlite
+
 
 def test_mcp_server():
-    """Test the MCP server with a simple JSON-RPC call"""
-    
-    # JSON-RPC initialize message
-    init_message = {
-        "jsonrpc": "2.0",
-        "id": 1,
-        "method": "initialize",
-        "params": {
-            "protocolVersion": "2024-11-05",
-            "capabilities": {
-                "tools": {}
-            },
-            "clientInfo": {
-                "name": "test-client",
-                "version": "1.0.0"
-            }
-        }
-    }
-    
-    try:
-        # Start the MCP server process
-        server_path = r"C:\repo\call-center-automation\docs\ai-gen\working_mcp_server.py"
-        python_path = r"C:\Users\jz8us\AppData\Local\Programs\Python\Python312\python.exe"
-        
-        process = subprocess.Popen(
-            [python_path, server_path],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        
-        # Send initialize message
-        init_json = json.dumps(init_message) + "\n"
-        stdout, stderr = process.communicate(input=init_json, timeout=5)
-        
-        print("=== MCP Server Test Results ===")
-        print(f"Return code: {process.returncode}")
-        print(f"STDOUT: {stdout}")
-        if stderr:
-            print(f"STDERR: {stderr}")
-            
-        # Check if we got a valid JSON-RPC response
-        if stdout.strip():
-            try:
-                response = json.loads(stdout.strip().split('\n')[0])
-                print(f"Valid JSON-RPC response: {response}")
-                return True
-            except json.JSONDecodeError as e:
-                print(f"Invalid JSON response: {e}")
-                return False
-        else:
-            print("No response received")
-            return False
-            
-    except subprocess.TimeoutExpired:
-        process.kill()
-        print("Test timed out - server may be working but waiting for more input")
-        return True
-    except Exception as e:
-        print(f"Test failed with error: {e}")
-        return False
+    """Replay the recorded session against the working server over stdio and check every response"""
+    session = load_session(DEFAULT_SESSION)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "calls.db")
+        write_sqlite(db, 2000, 42, transcripts=True)
+        # Both servers index transcripts into one archive directory, as stdio sessions on one machine do
+        env = {**os.environ, "CALL_CENTER_DB_URL": f"sqlite:///{db}",
+               "CALL_CENTER_TRANSCRIPT_DIR": os.path.join(tmp, "transcripts")}
+        env.pop("CALL_CENTER_SPOOL_DIR", None)
+        results = asyncio.run(asyncio.wait_for(
+            run_load(server_command("working_mcp_server.py"), [session], concurrency=2, iterations=2,
+                     pipeline=4, warmup=0, env=env),
+            timeout=60))
+
+    print("=== MCP Server Test Results ===")
+    for name, stats in results["methods"].items():
+        print(f"{name}: {stats['count']} calls, p50 {stats['p50_ms']:.1f} ms")
+    assert results["errors"] == 0
+    requests = sum(1 for message in session[1:] if "id" in message)
+    assert results["requests"] == 2 * 2 * requests
+    assert "tools/list" in results["methods"] and "tools/call get_call_stats" in results["methods"]
+
+
+def test_baseline_comparison_flags_regressions():
+    baseline = {"requests_per_sec": 1000, "p50_ms": 2.0, "p99_ms": 10.0, "startup_ms": 500,
+                "cpu_ms_per_request": 1.0, "peak_rss_mb": 100,
+                "methods": {"tools/list": {"p50_ms": 1.0}, "tools/call get_call_logs": {"p50_ms": 5.0}}}
+    same = {**baseline, "cpu_ms_per_request": None,
+            "methods": {"tools/list": {"p50_ms": 1.4}, "tools/call get_call_logs": {"p50_ms": 5.5}}}
+    # tools/list is 40% slower but by less than the 0.5 ms noise floor
+    assert compare(same, baseline, 0.2) == []
+    worse = {**same, "requests_per_sec": 700, "peak_rss_mb": 130,
+             "methods": {"tools/list": {"p50_ms": 1.0}, "tools/call get_call_logs": {"p50_ms": 8.0}}}
+    regressions = compare(worse, baseline, 0.2)
+    assert [line.split(":")[0] for line in regressions] == ["requests/s", "peak RSS MiB",
+                                                             "tools/call get_call_logs p50 ms"]
+
 
 if __name__ == "__main__":
-    success = test_mcp_server()
+    try:
+        test_mcp_server()
+        test_baseline_comparison_flags_regressions()
+        success = True
+    except (AssertionError, asyncio.TimeoutError, OSError) as e:
+        print(f"Test failed: {e!r}")
+        success = False
     print(f"\n=== Test {'PASSED' if success else 'FAILED'} ===")
-    sys.exit(0 if success else 1)
\ No newline at end of file
+    sys.exit(0 if success else 1)
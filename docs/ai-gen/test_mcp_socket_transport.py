@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Tests for the socket transport: framing, tenant routing and disconnects
+"""
+
+import asyncio
+import json
+import os
+import socket
+import tempfile
+
+from mcp import types
+from mcp.server import Server
+
+from mcp_socket_transport import BUSY_ERROR, SocketTransportServer, TenantRouter
+from tenant_cache import TENANT_CAPABILITY, session_tenant
+
+
+def _app() -> Server:
+    app = Server("socket-transport-test")
+    release = asyncio.Event()
+    app.release = release
+
+    @app.list_tools()
+    async def list_tools() -> list[types.Tool]:
+        return [types.Tool(name=name, description=name, inputSchema={"type": "object"})
+                for name in ("whoami", "hang")]
+
+    @app.call_tool()
+    async def call_tool(name: str, arguments: dict) -> list[types.TextContent]:
+        if name == "hang":
+            await release.wait()
+        return [types.TextContent(type="text", text=str(session_tenant()))]
+
+    return app
+
+
+def _initialize(tenant=None, request_id=1) -> dict:
+    capabilities = {"experimental": {TENANT_CAPABILITY: {"user_id": tenant}}} if tenant else {}
+    return {"jsonrpc": "2.0", "id": request_id, "method": "initialize",
+            "params": {"protocolVersion": "2024-11-05", "capabilities": capabilities,
+                       "clientInfo": {"name": "test", "version": "1"}}}
+
+
+def _line(message: dict) -> bytes:
+    return json.dumps(message).encode() + b"\n"
+
+
+def _call(request_id: int, name: str) -> dict:
+    return {"jsonrpc": "2.0", "id": request_id, "method": "tools/call", "params": {"name": name, "arguments": {}}}
+
+
+async def _recv(reader) -> dict:
+    return json.loads(await asyncio.wait_for(reader.readline(), 5))
+
+
+async def _open_session(path: str, tenant=None):
+    reader, writer = await asyncio.open_unix_connection(path)
+    writer.write(_line(_initialize(tenant)))
+    assert (await _recv(reader))["result"]["serverInfo"]["name"] == "socket-transport-test"
+    writer.write(_line({"jsonrpc": "2.0", "method": "notifications/initialized"}))
+    return reader, writer
+
+
+async def _serving(transport: SocketTransportServer, path: str) -> asyncio.Task:
+    task = asyncio.create_task(transport.serve("unix:" + path))
+    while not os.path.exists(path):
+        await asyncio.sleep(0.01)
+    return task
+
+
+async def _until(condition, timeout: float = 5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+def test_framing_and_session_tenants():
+    async def run(path):
+        transport = SocketTransportServer(_app(), max_message_bytes=64 * 1024)
+        server = await _serving(transport, path)
+        try:
+            first, first_writer = await _open_session(path, "biz-1")
+            second, second_writer = await _open_session(path, "biz-2")
+
+            # Two requests in one write, the second split across writes
+            data = _line({"jsonrpc": "2.0", "id": 2, "method": "ping"}) + _line(_call(3, "whoami"))
+            first_writer.write(data[:len(data) - 10])
+            await first_writer.drain()
+            await asyncio.sleep(0.05)
+            first_writer.write(data[len(data) - 10:])
+            replies = {reply["id"]: reply for reply in [await _recv(first), await _recv(first)]}
+            assert replies[2]["result"] == {}
+            assert replies[3]["result"]["content"][0]["text"] == "biz-1"
+
+            # Each session keeps the tenant it declared
+            second_writer.write(_line(_call(2, "whoami")))
+            assert (await _recv(second))["result"]["content"][0]["text"] == "biz-2"
+            assert transport.active_sessions == 2
+
+            # Invalid JSON is skipped; the session keeps working
+            second_writer.write(b"{not json\n" + _line({"jsonrpc": "2.0", "id": 3, "method": "ping"}))
+            assert (await _recv(second))["id"] == 3
+
+            # A line over max_message_bytes ends that session only
+            first_writer.write(b'{"jsonrpc": "2.0", "id": 4, "method": "ping", "pad": "' + b"x" * 70_000 + b'"}\n')
+            assert await asyncio.wait_for(first.read(), 5) == b""
+            await _until(lambda: transport.active_sessions == 1)
+            second_writer.write(_line({"jsonrpc": "2.0", "id": 5, "method": "ping"}))
+            assert (await _recv(second))["id"] == 5
+            second_writer.close()
+            await _until(lambda: transport.active_sessions == 0)
+        finally:
+            server.cancel()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run(os.path.join(tmp, "mcp.sock")))
+
+
+def test_disconnects_free_their_session_slot():
+    async def run(path):
+        app = _app()
+        transport = SocketTransportServer(app, max_sessions=1, admission_timeout=0.2)
+        server = await _serving(transport, path)
+        try:
+            reader, writer = await _open_session(path)
+            # While the only slot is taken, the next client is told the server is busy
+            busy_reader, busy_writer = await asyncio.open_unix_connection(path)
+            assert await _recv(busy_reader) == BUSY_ERROR
+            assert await asyncio.wait_for(busy_reader.read(), 5) == b""
+            busy_writer.close()
+            assert transport.rejected_sessions == 1
+
+            # A client that hangs up with a request still running gives its slot back
+            writer.write(_line(_call(2, "hang")))
+            await writer.drain()
+            await asyncio.sleep(0.05)
+            writer.close()
+            await _until(lambda: transport.active_sessions == 0)
+            app.release.set()
+
+            reader, writer = await _open_session(path, "biz-3")
+            writer.write(_line(_call(2, "whoami")))
+            assert (await _recv(reader))["result"]["content"][0]["text"] == "biz-3"
+            writer.close()
+            assert transport.total_sessions == 2
+        finally:
+            server.cancel()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run(os.path.join(tmp, "mcp.sock")))
+
+
+def test_router_hands_connections_to_the_tenants_worker():
+    async def run():
+        router = TenantRouter([], 4, peek_timeout=1.0)
+        channels = [socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET) for _ in range(4)]
+        router._channels = [parent for parent, _ in channels]
+        # The same tenant always goes to the same worker; sessions without one rotate
+        assert router.worker_for("biz-1") == router.worker_for("biz-1") == router.ring.node_for("biz-1")
+        assert len({router.worker_for(None) for _ in range(4)}) == 4
+
+        transport = SocketTransportServer(_app())
+        owner = router.ring.node_for("biz-7")
+        worker = asyncio.create_task(transport.serve_handoff(os.dup(channels[owner][1].fileno())))
+        try:
+            client, served = socket.socketpair()
+            reader, writer = await asyncio.open_connection(sock=client)
+            writer.write(_line(_initialize("biz-7")))
+            await router._route(served)
+            assert router.routed[owner] == 1 and sum(router.routed) == 1
+
+            # The worker reads the initialize request the router only peeked at
+            assert (await _recv(reader))["result"]["serverInfo"]["name"] == "socket-transport-test"
+            writer.write(_line({"jsonrpc": "2.0", "method": "notifications/initialized"}) + _line(_call(2, "whoami")))
+            assert (await _recv(reader))["result"]["content"][0]["text"] == "biz-7"
+            writer.close()
+            await _until(lambda: transport.total_sessions == 1 and transport.active_sessions == 0)
+
+            # A client that never sends a line is dropped without reaching a worker
+            silent, served = socket.socketpair()
+            router.peek_timeout = 0.1
+            await router._route(served)
+            assert sum(router.routed) == 1 and silent.recv(1) == b""
+            silent.close()
+        finally:
+            for parent, child in channels:
+                parent.close()
+                child.close()
+            await asyncio.wait_for(worker, 5)
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    for test in (test_framing_and_session_tenants, test_disconnects_free_their_session_slot,
+                 test_router_hands_connections_to_the_tenants_worker):
+        test()
+        print(f"{test.__name__}: PASSED")
+    print("\n=== Test PASSED ===")
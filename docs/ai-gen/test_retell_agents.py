@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Tests for coalesced, stale-while-revalidate Retell agent listings against fake_retell_server.py
+"""
+
+import asyncio
+import os
+import tempfile
+
+from call_log_store import SQLiteCallLogStore
+from fake_retell_server import FakeRetellServer
+from generate_call_log_fixtures import AGENTS, generate_rows, write_sqlite
+from retell_agents import AgentDirectory, SingleFlight
+from retell_client import RetellAPIError, RetellClient
+
+
+def _seed(fake: FakeRetellServer):
+    for agent_id, name in AGENTS + [("agent_elsewhere", "Other Account AI")]:
+        fake.agents[agent_id] = {"agent_id": agent_id, "agent_name": name, "version": 1,
+                                 "last_modification_timestamp": 1705400000000,
+                                 "response_engine": {"type": "retell-llm", "llm_id": f"llm_{agent_id}"}}
+
+
+def test_single_flight_shares_results_and_errors():
+    async def run():
+        flight, calls = SingleFlight(), []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            if len(calls) == 2:
+                raise RetellAPIError("boom", 500)
+            return len(calls)
+
+        assert await asyncio.gather(*(flight.do("k", fetch) for _ in range(50))) == [1] * 50
+        results = await asyncio.gather(*(flight.do("k", fetch) for _ in range(5)), return_exceptions=True)
+        assert all(isinstance(result, RetellAPIError) for result in results)
+        # A caller giving up does not cancel the shared call
+        waiter = asyncio.ensure_future(flight.do("k", fetch))
+        other = asyncio.ensure_future(flight.do("k", fetch))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        assert await other == 3
+        assert (flight.calls, flight.shared, len(calls)) == (3, 50 - 1 + 5 - 1 + 1, 3)
+
+    asyncio.run(run())
+
+
+def test_agent_directory_coalesces_and_revalidates():
+    async def run(db):
+        fake = FakeRetellServer(latency=0.02)
+        _seed(fake)
+        retell = RetellClient("test", await fake.start())
+        store = SQLiteCallLogStore(db)
+        now = [0.0]
+        directory = AgentDirectory(retell, store, ttl=30, stale_ttl=300, clock=lambda: now[0])
+        try:
+            # 500 concurrent identical reads: one upstream request
+            results = await asyncio.gather(*(directory.agents() for _ in range(500)))
+            assert fake.requests["GET /list-agents"] == 1
+            assert all(result == results[0] for result in results) and len(results[0]) == 5
+            assert results[0][0]["llm_id"] == "llm_agent_123abc"
+            assert results[0][0]["last_modified"].startswith("2024-01-16T")
+
+            # Each business only sees the agents retell_agents assigns to it
+            tenant = next(generate_rows(1))[0][3]
+            mine = await directory.agents(tenant)
+            assert sorted(agent["agent_id"] for agent in mine) == sorted(agent_id for agent_id, _ in AGENTS)
+            assert await directory.agents("someone-else") == []
+
+            # Stale: served at once from memory while one background request refreshes it
+            fake.agents["agent_123abc"].update(agent_name="Renamed AI", version=2)
+            now[0] = 31
+            stale = await asyncio.gather(*(directory.agents() for _ in range(100)))
+            assert stale[0][0]["agent_name"] == "Dental Reception AI"
+            await directory.cache.refreshed()
+            assert fake.requests["GET /list-agents"] == 2
+            assert (await directory.agents())[0]["agent_name"] == "Renamed AI"
+
+            # A failed refresh keeps the stale list and backs off
+            now[0] = 62
+            fake.fail_next = [500]
+            assert (await directory.agents())[0]["agent_name"] == "Renamed AI"
+            await directory.cache.refreshed()
+            assert directory.cache.refresh_errors == 1
+            await directory.agents()
+            assert fake.requests["GET /list-agents"] == 3
+
+            # Too old to serve: readers wait for the fetch, and share its error
+            now[0] = 1000
+            fake.fail_next = [500]
+            errors = await asyncio.gather(*(directory.agents() for _ in range(20)), return_exceptions=True)
+            assert all(isinstance(error, RetellAPIError) and error.status == 500 for error in errors)
+            assert fake.requests["GET /list-agents"] == 4
+            assert len(await directory.agents()) == 5
+        finally:
+            await directory.cache.close()
+            await retell.close()
+            await store.close()
+            await fake.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "calls.db")
+        write_sqlite(db, 10, 42, transcripts=False)
+        asyncio.run(run(db))
+
+
+if __name__ == "__main__":
+    for test in (test_single_flight_shares_results_and_errors, test_agent_directory_coalesces_and_revalidates):
+        test()
+        print(f"{test.__name__}: PASSED")
+    print("\n=== Test PASSED ===")
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Tests for response serializers: formats, chunked row encoding and tool results
+"""
+
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+
+from serializers import Serializer
+
+
+ROWS = [{"call_id": f"call_{i:05d}", "agent_id": "agent_123abc", "duration_ms": i * 1000,
+         "summary": "Caller asked about a refund — résumé attached"} for i in range(3000)]
+
+
+def test_formats_and_default_values():
+    compact = Serializer("compact", "json")
+    pretty = Serializer("pretty", "json")
+    value = {"at": datetime(2026, 1, 2, 3, 4, tzinfo=timezone.utc), "count": np.int64(7),
+             "share": np.float32(0.5), "name": "Zoë"}
+
+    text = compact.dumps(value)
+    assert text == '{"at":"2026-01-02T03:04:00+00:00","count":7,"share":0.5,"name":"Zoë"}'
+    assert json.loads(pretty.dumps(value)) == json.loads(text)
+    assert pretty.dumps(value).startswith('{\n  "at"')
+    assert compact.name == "json-compact" and pretty.name == "json-pretty"
+
+    for bad in ({"format": "yaml"}, {"backend": "pickle"}):
+        try:
+            Serializer(**bad)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"{bad} accepted")
+
+
+def test_encode_rows_chunks_round_trip():
+    serializer = Serializer("compact", "json", chunk_bytes=16 * 1024)
+    chunks = list(serializer.encode_rows(iter(ROWS)))
+
+    assert len(chunks) > 5
+    assert [row for chunk in chunks for row in json.loads(chunk)] == ROWS
+    # Every chunk but the last stays near the target size
+    assert all(8 * 1024 < len(chunk) < 24 * 1024 for chunk in chunks[:-1])
+    assert list(serializer.encode_rows([])) == []
+
+
+def test_results_carry_structured_content():
+    serializer = Serializer("compact", "json")
+
+    content, structured = serializer.result({"ticket_id": "TKT-1"}, header="✅ Created ticket TKT-1")
+    assert [block.text for block in content] == ["✅ Created ticket TKT-1", '{"ticket_id":"TKT-1"}']
+    assert structured == {"ticket_id": "TKT-1"}
+
+    # structuredContent must be an object
+    content, structured = serializer.result([1, 2])
+    assert [block.text for block in content] == ["[1,2]"] and structured == {"result": [1, 2]}
+
+    summary = {"returned": len(ROWS), "next_cursor": None}
+    content, structured = serializer.rows_result(serializer.encode_rows(ROWS), summary, header="Logs")
+    assert content[0].text == "Logs" and json.loads(content[-1].text) == summary and structured == summary
+    assert sum(len(json.loads(block.text)) for block in content[1:-1]) == len(ROWS)
+
+
+if __name__ == "__main__":
+    for test in (test_formats_and_default_values, test_encode_rows_chunks_round_trip,
+                 test_results_carry_structured_content):
+        test()
+        print(f"{test.__name__}: PASSED")
+    print("\n=== Test PASSED ===")
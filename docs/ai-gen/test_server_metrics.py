@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Tests for per-tool metrics, the Prometheus text and on-demand profiles
+"""
+
+import asyncio
+import json
+import random
+
+from server_metrics import (
+    METRICS_URI, PROFILE_URI, PROMETHEUS_URI, Series, ServerMetrics, bucket_index, bucket_upper,
+)
+from tool_registry import ToolArgumentError, ToolRegistry
+
+
+SCHEMA = {"type": "object", "properties": {"text": {"type": "string"}}, "required": ["text"]}
+
+
+class Text:
+    def __init__(self, text):
+        self.text = text
+
+
+def test_histogram_buckets_and_percentiles():
+    previous = -1
+    for value in list(range(200)) + [random.Random(7).randrange(1, 1 << 40) for _ in range(2000)]:
+        index = bucket_index(value)
+        assert value <= bucket_upper(index) <= value * 1.032 + 1
+        assert index == 0 or bucket_upper(index - 1) < value
+    for index in range(1, 1000):
+        assert bucket_upper(index) > previous
+        previous = bucket_upper(index)
+
+    series = Series()
+    for ns in range(1, 10_001):
+        series.record(ns * 1000, 10)
+    assert series.calls == 0 and series.samples == 10_000
+    for q, expected in ((0.5, 5_000_000), (0.9, 9_000_000), (0.99, 9_900_000)):
+        assert expected <= series.percentile_ns(q) <= expected * 1.032
+    assert series.percentile_ns(1.0) == series.latency_max_ns == 10_000_000
+
+
+def test_registry_counts_calls_samples_and_errors():
+    async def echo(arguments):
+        if arguments["text"] == "boom":
+            raise RuntimeError("boom")
+        return [Text(arguments["text"])]
+
+    async def run():
+        metrics = ServerMetrics(sample_every=4)
+        registry = ToolRegistry(metrics)
+        registry.register("echo", "Echo", SCHEMA, echo)
+        for _ in range(Series.EXACT_CALLS + 400):
+            await registry.dispatch("echo", {"text": "héllo"})
+        for arguments in ({"text": "boom"}, {}):
+            try:
+                await registry.dispatch("echo", arguments)
+            except (RuntimeError, ToolArgumentError):
+                pass
+            else:
+                raise AssertionError("error not raised")
+
+        summary = metrics.snapshot()["tools"]["echo"]
+        assert summary["calls"] == Series.EXACT_CALLS + 402 and summary["errors"] == 2
+        assert summary["error_types"] == {"RuntimeError": 1, "ToolArgumentError": 1}
+        # Every call up to EXACT_CALLS, then one in four
+        assert Series.EXACT_CALLS + 100 <= summary["sampled"] <= Series.EXACT_CALLS + 102
+        assert summary["response_bytes"] == {"mean": 6, "max": 6}
+        assert 0 < summary["latency_ms"]["p50"] <= summary["latency_ms"]["p99"] <= summary["latency_ms"]["max"]
+
+        async def read(uri):
+            return uri
+        await metrics.call("resource", "call-center://stats", read, "call-center://stats")
+        text, mime_type = await metrics.read(METRICS_URI)
+        body = json.loads(text)
+        assert mime_type == "application/json" and body["resources"]["call-center://stats"]["calls"] == 1
+
+        text, mime_type = await metrics.read(PROMETHEUS_URI)
+        assert mime_type.startswith("text/plain")
+        assert f'mcp_handler_calls_total{{kind="tool",name="echo"}} {Series.EXACT_CALLS + 402}' in text
+        assert 'mcp_handler_errors_total{kind="tool",name="echo",error="RuntimeError"} 1' in text
+        buckets = [line for line in text.splitlines() if line.startswith('mcp_handler_duration_seconds_bucket{kind="tool"')]
+        counts = [int(line.rsplit(" ", 1)[1]) for line in buckets]
+        assert counts == sorted(counts) and counts[-1] == summary["sampled"]
+
+    asyncio.run(run())
+
+
+def test_profiles_while_serving():
+    async def busy():
+        total = 0
+        while True:
+            total += sum(str(i).count("7") for i in range(2000))
+            await asyncio.sleep(0)
+
+    async def run():
+        metrics = ServerMetrics()
+        worker = asyncio.create_task(busy())
+        cpu, _ = await metrics.read(f"{PROFILE_URI}?mode=cpu&seconds=0.2&top=5")
+        memory, _ = await metrics.read(f"{PROFILE_URI}?mode=memory&seconds=0.2")
+        worker.cancel()
+        assert cpu.startswith("CPU profile") and "busy" in cpu
+        assert memory.startswith("Allocation growth")
+        try:
+            await metrics.read(f"{PROFILE_URI}?mode=disk")
+        except ValueError as e:
+            assert "Unknown profile mode" in str(e)
+        else:
+            raise AssertionError("bad mode accepted")
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    for test in (test_histogram_buckets_and_percentiles, test_registry_counts_calls_samples_and_errors,
+                 test_profiles_while_serving):
+        test()
+        print(f"{test.__name__}: PASSED")
+    print("\n=== Test PASSED ===")
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Tests for the slot-search index
+"""
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+from datetime import date, datetime, timedelta, timezone
+
+import call_log_store
+import slot_index
+from generate_call_log_fixtures import write_sqlite
+from slot_index import SlotIndex, business_time, get_slot_index, run_starts
+
+MONDAY = date(2024, 1, 15)
+
+
+def _index() -> SlotIndex:
+    return SlotIndex.build(
+        MONDAY, 7,
+        staff=[{"id": "s1"}, {"id": "s2"}],
+        office_hours=[{"day_of_week": dow, "start_time": "09:00", "end_time": "12:00"} for dow in range(1, 6)],
+        holidays=[{"holiday_date": "2023-01-16", "is_recurring": True}],
+        availability=[{"staff_id": "s2", "date": "2024-01-15", "is_available": False}],
+        appointments=[
+            {"staff_id": "s1", "appointment_date": "2024-01-15", "start_time": "09:00", "end_time": "10:00"},
+            {"staff_id": "s1", "appointment_date": "2024-01-15", "start_time": "10:30", "end_time": "11:00",
+             "status": "cancelled"},
+        ],
+        services=[{"id": "svc", "name": "Cleaning", "duration_minutes": 50, "buffer_after_minutes": 10,
+                   "allowed_staff_ids": "[\"s2\"]"}],
+    )
+
+
+def test_run_starts():
+    assert run_starts(0b0111_1011, 2) == 0b0011_1001
+    assert run_starts(0b0111_1011, 3) == 0b0001_1000
+    assert run_starts(0b0111_1011, 5) == 0
+
+
+def test_next_free_slots_respects_hours_bookings_and_holidays():
+    """Appointments, days off and recurring holidays all close slots"""
+    index = _index()
+    first = index.next_free_slots(12, datetime(2024, 1, 15, 8, 0), count=2)
+    # s2 is off on Monday and s1 is booked until 10:00; cancelled visits stay free
+    assert [(s.start.hour, s.start.minute, s.staff_id) for s in first] == [(10, 0, "s1"), (10, 5, "s1")]
+
+    # Tuesday matches the recurring Jan 16 holiday, so the allowed staff's next opening is Wednesday
+    slots, staff_ids = index.slots_for("svc")
+    assert slots == 12
+    found = index.next_free_slots(slots, datetime(2024, 1, 15, 11, 1), count=1, staff_ids=staff_ids)
+    assert found[0].start == datetime(2024, 1, 17, 9, 0)
+    assert found[0].staff_id == "s2"
+
+
+def test_book_and_release():
+    index = _index()
+    start = datetime(2024, 1, 15, 10, 0)
+    assert index.next_free_slots(6, start, count=1)[0].start == start
+    assert index.book_first_available(start, 6) == "s1"
+    assert index.book_first_available(start, 6) is None
+    assert index.next_free_slots(6, start, count=1)[0].start == datetime(2024, 1, 15, 10, 30)
+
+    index.release("s1", start, 6)
+    assert index.is_free("s1", start, 6)
+    assert not index.is_free("s1", datetime(2024, 1, 15, 12, 0), 1)
+
+
+def test_times_are_business_local():
+    saved = os.environ.get("CALL_CENTER_TIMEZONE")
+    os.environ["CALL_CENTER_TIMEZONE"] = "America/New_York"
+    try:
+        assert business_time(datetime(2024, 1, 15, 15, 0, tzinfo=timezone.utc)) == datetime(2024, 1, 15, 10, 0)
+        assert business_time(datetime(2024, 7, 15, 15, 0, tzinfo=timezone.utc)) == datetime(2024, 7, 15, 11, 0)
+        assert business_time(datetime(2024, 1, 15, 10, 0)) == datetime(2024, 1, 15, 10, 0)
+    finally:
+        if saved is None:
+            os.environ.pop("CALL_CENTER_TIMEZONE", None)
+        else:
+            os.environ["CALL_CENTER_TIMEZONE"] = saved
+
+
+def test_index_rolls_forward_with_the_date():
+    async def run(tenant):
+        from example_mcp_server import CallCenterMCPServer
+        from tool_registry import ToolArgumentError
+
+        today = business_time().date()
+        index = await get_slot_index(tenant)
+        assert index.start_date == today and await get_slot_index(tenant) is index
+
+        # Once the business-local date moves on, the horizon starts on the new day
+        slot_index.business_time = lambda moment=None: datetime.combine(today + timedelta(days=1), datetime.min.time())
+        rolled = await get_slot_index(tenant)
+        assert rolled is not index and rolled.start_date == today + timedelta(days=1)
+        assert rolled.days == index.days
+
+        server = CallCenterMCPServer()
+        try:
+            await server.find_available_slots({"user_id": tenant, "appointment_type_id": "no-such-type"})
+        except ToolArgumentError as e:
+            assert "appointment_type_id" in str(e)
+        else:
+            raise AssertionError("unknown appointment type was accepted")
+        await call_log_store._store.close()
+
+    saved = os.environ.get("CALL_CENTER_DB_URL")
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "slots.db")
+        write_sqlite(db, 10, 42, transcripts=False, staff=2)
+        conn = sqlite3.connect(db)
+        tenant = conn.execute("SELECT user_id FROM staff_members LIMIT 1").fetchone()[0]
+        conn.close()
+        os.environ["CALL_CENTER_DB_URL"] = f"sqlite:///{db}"
+        try:
+            asyncio.run(run(tenant))
+        finally:
+            slot_index.business_time = business_time
+            call_log_store._store = slot_index._indexes = None
+            if saved is None:
+                os.environ.pop("CALL_CENTER_DB_URL", None)
+            else:
+                os.environ["CALL_CENTER_DB_URL"] = saved
+
+
+if __name__ == "__main__":
+    for test in (test_run_starts, test_next_free_slots_respects_hours_bookings_and_holidays, test_book_and_release,
+                 test_times_are_business_local, test_index_rolls_forward_with_the_date):
+        test()
+        print(f"{test.__name__}: PASSED")
+    print("\n=== Test PASSED ===")
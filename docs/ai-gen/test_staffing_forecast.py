@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Tests for the Erlang C staffing forecast
+"""
+
+import asyncio
+import math
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from call_log_store import SQLiteCallLogStore
+from columnar_calls import ColumnarCallLogs
+from generate_call_log_fixtures import generate_rows, write_sqlite
+from staffing_forecast import (WEEK_INTERVALS, Scenario, arrival_profile, forecast, history_window,
+                               interval_label, interval_occurrences, log_erlang_c, staffing_report)
+
+
+def _erlang_c(traffic: float, agents: int) -> float:
+    # Textbook formula, fine for small traffic
+    if agents <= traffic:
+        return 1.0
+    last = traffic ** agents / math.factorial(agents) * agents / (agents - traffic)
+    return last / (sum(traffic ** k / math.factorial(k) for k in range(agents)) + last)
+
+
+def test_erlang_c_matches_formula_and_stays_finite():
+    traffic = np.array([0.0, 0.5, 2.0, 10.0, 37.5])
+    table = np.exp(log_erlang_c(traffic, 60))
+    for i, a in enumerate(traffic):
+        for n in range(61):
+            expected = 0.0 if a == 0 else _erlang_c(a, n)
+            assert abs(table[i, n] - expected) < 1e-9, (a, n)
+
+    # 100 calls per 15 minutes at 180 s handle time (20 Erlangs), 80% within 20 s
+    result = forecast([100.0], [180.0], [Scenario(0.8, 20), Scenario(0.9, 20), Scenario(0.8, 20, growth=1.5)])
+    agents = result["agents"][:, 0].tolist()
+    assert agents[0] == 24 and agents[1] >= agents[0] and agents[2] > agents[0]
+    assert result["service_level"][0, 0] >= 0.8 > 1 - _erlang_c(20, 23) * math.exp(-3 * 20 / 180)
+    assert abs(result["wait_seconds"][0, 0] - _erlang_c(20, 24) * 180 / 4) < 1e-9
+    assert 0 < result["abandonment"][0, 0] < result["waiting"][0, 0]
+
+    # Thousands of Erlangs: A^k / k! overflows a float, the log-space sums do not
+    big = forecast([40_000.0, 0.0], [120.0, 120.0], [Scenario(0.95, 10)])
+    assert np.isfinite(big["wait_seconds"]).all() and 5333 < big["agents"][0, 0] < 5500
+    assert big["agents"][0, 1] == 0 and big["wait_seconds"][0, 1] == 0
+    try:
+        forecast([1.0], [60.0], [Scenario(1.0, 20)])
+        raise AssertionError("expected ValueError")
+    except ValueError:
+        pass
+
+
+def test_forecast_from_call_history():
+    async def run(db):
+        store = SQLiteCallLogStore(db)
+        calls = ColumnarCallLogs()
+        await calls.load(store, 100_000)
+        await store.close()
+        return calls
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "calls.db")
+        write_sqlite(db, 30_000, 42, transcripts=False)
+        calls = asyncio.run(run(db))
+
+    tenant = next(generate_rows(1))[0][3]
+    starts, durations, observed = history_window(calls, tenant, 1)
+    assert len(starts) and observed.max() == 1 and observed.sum() > 0.99 * WEEK_INTERVALS
+    assert len(history_window(calls, "someone-else", 4)[0]) == 0
+    arrivals, handle = arrival_profile(starts, durations, observed)
+    assert arrivals.shape == handle.shape == (WEEK_INTERVALS,)
+    assert abs((arrivals * observed).sum() - len(starts)) < 1e-6
+    assert 15 <= handle.min() and handle.max() <= 900
+
+    scenarios = [Scenario(level, seconds) for level in (0.7, 0.8, 0.9) for seconds in (10, 30)]
+    result = forecast(arrivals, handle, scenarios)
+    agents = result["agents"]
+    assert (agents[2] >= agents[0]).all() and (agents[4] >= agents[2]).all()
+    assert (agents[0] >= agents[1]).all()
+    assert ((agents > 0) == (arrivals > 0)).all()
+    assert (result["service_level"][:, arrivals > 0] >= np.array([s.service_level for s in scenarios])[:, None]).all()
+
+    report = staffing_report(arrivals, handle, scenarios, result, intervals=False)
+    assert report[0]["peak_agents"] == agents[0].max() and "agents" not in report[0]
+    assert report[0]["service_level_achieved"] >= 0.7
+    assert interval_label(0) == "Mon 00:00" and interval_label(WEEK_INTERVALS - 1) == "Sun 23:45"
+
+
+def test_short_history_is_not_scaled_up_to_a_week():
+    # Ten calls between Monday 09:00 and 09:09
+    monday = datetime(2024, 3, 4, 9, tzinfo=timezone.utc)
+    calls = ColumnarCallLogs()
+    calls.append_rows([{"id": f"c{i}", "user_id": "new", "duration_ms": 120_000,
+                        "start_timestamp": (monday + timedelta(minutes=i)).isoformat()} for i in range(10)])
+    starts, durations, observed = history_window(calls, "new", 4)
+    assert observed.sum() == 1
+    arrivals, handle = arrival_profile(starts, durations, observed)
+    assert arrivals[4 * 9] == 10 and arrivals.sum() == 10 and handle[4 * 9] == 120
+    assert forecast(arrivals, handle, [Scenario()])["agents"].max() <= 5
+
+    # Ten days of history: days seen twice average over two, the rest over one
+    days = 10
+    observed = interval_occurrences(int(monday.timestamp() * 1000), int(monday.timestamp() * 1000) + days * 86_400_000)
+    assert sorted(set(observed.tolist())) == [1, 2] and observed.sum() == days * 96
+    assert (observed[:4 * 9] == 1).all() and (observed[4 * 9:96 * 3 + 4 * 9] == 2).all()
+
+
+if __name__ == "__main__":
+    for test in (test_erlang_c_matches_formula_and_stays_finite, test_forecast_from_call_history,
+                 test_short_history_is_not_scaled_up_to_a_week):
+        test()
+        print(f"{test.__name__}: PASSED")
+    print("\n=== Test PASSED ===")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Tests for tenant-partitioned caches, the hash ring and tenant routing
+"""
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from generate_call_log_fixtures import write_sqlite
+from tenant_cache import ConsistentHashRing, TenantCache, tenant_from_initialize
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_hot_tenant_evicts_only_its_own_entries():
+    now = [0.0]
+    cache = TenantCache(max_bytes=1000, tenant_bytes=600, ttl=10, clock=lambda: now[0], sizeof=lambda value: 100)
+    for key in range(3):
+        cache.set("quiet", key, key)
+    for key in range(50):
+        cache.set("hot", key, key)
+
+    # The hot tenant is held to its quota; the quiet one keeps everything
+    assert [cache.get("quiet", key) for key in range(3)] == [0, 1, 2]
+    assert cache.get("hot", 0) is None and cache.get("hot", 49) == 49
+    assert cache.stats()["tenants"]["hot"]["bytes"] == 600
+
+    # Over the total, the largest partition gives way first
+    for tenant in ("a", "b"):
+        cache.set(tenant, "x", 1)
+    assert cache.bytes <= 1000 and cache.get("a", "x") == 1 and cache.get("quiet", 2) == 2
+    assert cache.stats()["tenants"]["hot"]["bytes"] == 500
+
+    cache.invalidate("quiet", 0)
+    assert cache.get("quiet", 0) is None
+    now[0] = 11
+    assert cache.get("quiet", 1) is None
+    cache.drop("hot")
+    assert "hot" not in cache.stats()["tenants"] and cache.bytes == 300
+
+
+def test_ring_is_stable_and_initialize_names_the_tenant():
+    tenants = [f"tenant-{i}" for i in range(2000)]
+    four = ConsistentHashRing(range(4))
+    five = ConsistentHashRing(range(5))
+    owners = [four.node_for(tenant) for tenant in tenants]
+    assert owners == [four.node_for(tenant) for tenant in tenants]
+    assert min(owners.count(node) for node in range(4)) > 300
+    moved = sum(four.node_for(tenant) != five.node_for(tenant) for tenant in tenants)
+    assert moved < len(tenants) * 0.35
+
+    line = json.dumps({"jsonrpc": "2.0", "id": 1, "method": "initialize", "params": {
+        "capabilities": {"experimental": {"tenant": {"user_id": "biz-1"}}}}}).encode()
+    assert tenant_from_initialize(line) == "biz-1"
+    assert tenant_from_initialize(b'{"params": {"capabilities": {}}}') is None
+    assert tenant_from_initialize(b"not json") is None
+
+
+async def _call(path: str, tenant, tool: str, arguments: dict) -> dict:
+    reader, writer = await asyncio.open_unix_connection(path)
+    capabilities = {"experimental": {"tenant": {"user_id": tenant}}} if tenant else {}
+    for message in (
+        {"jsonrpc": "2.0", "id": 1, "method": "initialize",
+         "params": {"protocolVersion": "2024-11-05", "capabilities": capabilities,
+                    "clientInfo": {"name": "test", "version": "1.0"}}},
+        {"jsonrpc": "2.0", "method": "notifications/initialized"},
+        {"jsonrpc": "2.0", "id": 2, "method": "tools/call", "params": {"name": tool, "arguments": arguments}},
+    ):
+        writer.write(json.dumps(message).encode() + b"\n")
+    await writer.drain()
+    responses = [json.loads(await reader.readline()) for _ in range(2)]
+    writer.close()
+    return responses[1]["result"]
+
+
+def test_router_hands_sessions_to_workers_with_their_tenant():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "calls.db")
+        write_sqlite(db, 10, seed=1, transcripts=False, staff=1)
+        path = os.path.join(tmp, "mcp.sock")
+        server = subprocess.Popen(
+            [sys.executable, "example_mcp_server.py", "--listen", f"unix:{path}", "--tenant-workers", "2"],
+            cwd=HERE, env={**os.environ, "CALL_CENTER_DB_URL": f"sqlite:///{db}"}, stderr=subprocess.DEVNULL)
+        try:
+            deadline = time.monotonic() + 30
+            while not os.path.exists(path) and time.monotonic() < deadline:
+                time.sleep(0.05)
+
+            async def run():
+                # The session's tenant stands in for the user_id argument
+                for tenant in ("biz-1", "biz-2", "biz-3"):
+                    result = await _call(path, tenant, "find_available_slots", {"count": 1})
+                    assert not result.get("isError") and result["structuredContent"] == {"result": []}
+                result = await _call(path, None, "find_available_slots", {"count": 1})
+                assert result["isError"] and "session has no tenant" in result["content"][0]["text"]
+
+                # A session bound to one business cannot name another in user_id
+                result = await _call(path, "biz-1", "find_available_slots", {"count": 1, "user_id": "biz-2"})
+                assert result["isError"] and "does not match" in result["content"][0]["text"]
+                result = await _call(path, "biz-1", "find_available_slots", {"count": 1, "user_id": "biz-1"})
+                assert not result.get("isError")
+
+            asyncio.run(run())
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    for test in (test_hot_tenant_evicts_only_its_own_entries, test_ring_is_stable_and_initialize_names_the_tenant,
+                 test_router_hands_sessions_to_workers_with_their_tenant):
+        test()
+        print(f"{test.__name__}: PASSED")
+    print("\n=== Test PASSED ===")
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Tests for UUIDv7 ticket IDs, the assignment engine and its persistence
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from batch_operations import create_tickets, update_agent_statuses
+from call_log_store import SQLiteCallLogStore
+from generate_call_log_fixtures import write_sqlite
+from ticket_queue import AssignmentEngine, TicketService, uuid7
+from warm_state import WarmState
+
+
+def test_uuid7_ids_are_versioned_and_time_ordered():
+    before = time.time_ns() // 1_000_000
+    ids = [uuid7() for _ in range(20_000)]
+    assert ids == sorted(ids) and len(set(ids)) == len(ids)
+    assert all(u.version == 7 and u.variant == "specified in RFC 4122" for u in ids[:100])
+    assert before <= ids[0].int >> 80 <= time.time_ns() // 1_000_000 + 1
+
+
+def test_engine_matches_skill_load_and_priority():
+    engine = AssignmentEngine()
+    engine.set_agent("ann", "available", ["billing"], max_tickets=2)
+    engine.set_agent("bob", "available", [], max_tickets=2)
+
+    # Billing needs Ann; general work goes to the least loaded agent
+    assert engine.submit("t1", "low", "billing") == "ann"
+    assert engine.submit("t2", "medium") == "bob"
+    assert engine.submit("t3", "medium") == "ann"
+    assert engine.submit("t4", "low", "billing") is None
+    assert engine.submit("t5", "medium") == "bob"
+
+    # Waiting: t4 (low, billing), then t6 (urgent) and t7 (high) for anyone
+    assert engine.submit("t6", "urgent") is None
+    assert engine.submit("t7", "high") is None
+    assert engine.resolve("t2") == [("t6", "bob")]
+    assert engine.resolve("t1") == [("t7", "ann")]
+    assert engine.resolve("t7") == [("t4", "ann")]
+
+    # Going offline hands tickets back; they go to whoever has room
+    engine.set_agent("cy", "available", [], max_tickets=5)
+    made = engine.set_agent("bob", "offline")
+    assert sorted(made) == [("t5", "cy"), ("t6", "cy")]
+    assert engine.agents["bob"].tickets == set()
+    assert engine.stats()["waiting"] == 0
+
+    # A break keeps tickets but takes no new ones; coming back drains the queue
+    engine.set_agent("cy", "break")
+    engine.set_agent("ann", "break")
+    assert engine.submit("t8", "medium") is None
+    assert engine.set_agent("cy", "available") == [("t8", "cy")]
+
+
+def test_service_persists_assignments_and_restores_queue():
+    async def run(db):
+        store = SQLiteCallLogStore(db)
+        try:
+            tenant = "biz-1"
+            await update_agent_statuses(store, [{"agent_id": "ann", "status": "available", "skills": ["billing"],
+                                                 "max_tickets": 1}], tenant)
+            tickets = await create_tickets(store, [
+                {"title": "Refund", "description": "double charge", "skill": "billing"},
+                {"title": "Refund 2", "description": "again", "skill": "billing", "priority": "urgent"},
+            ], tenant)
+            assert [t["assigned_to"] for t in tickets] == ["ann", None]
+            assert [t["status"] for t in tickets] == ["assigned", "open"]
+
+            results = await update_agent_statuses(store, [{"agent_id": "zed", "status": "available",
+                                                           "skills": ["billing"]}], tenant)
+            assert results[0]["assigned_tickets"] == [tickets[1]["ticket_id"]]
+            rows = await store.query("SELECT id, status, assigned_to FROM support_tickets ORDER BY id")
+            assert [(r["status"], r["assigned_to"]) for r in rows] == [("assigned", "ann"), ("assigned", "zed")]
+
+            # A fresh service (a restart) rebuilds agent loads and the queue from the tables
+            service = TicketService(store)
+            loads = []
+            load = service._load
+            service._load = lambda user_id: loads.append(user_id) or load(user_id)
+            # Concurrent first callers share one load, so only one engine writes assignments
+            engine, again = await asyncio.gather(service.engine(tenant), service.engine(tenant))
+            assert engine is again and loads == [tenant]
+            assert engine.agents["ann"].tickets == {tickets[0]["ticket_id"]}
+            assert engine.agents["ann"].skills == {"billing"} and engine.agents["ann"].max_tickets == 1
+
+            # Another process takes Zed offline; his ticket waits until Ann frees up
+            other = SQLiteCallLogStore(db)
+            await update_agent_statuses(other, [{"agent_id": "zed", "status": "offline"}], tenant)
+            await other.close()
+            assert (await service.engine(tenant)).agents["zed"].status == "offline"
+            rows = await store.query("SELECT status, assigned_to FROM support_tickets ORDER BY id")
+            assert [(r["status"], r["assigned_to"]) for r in rows] == [("assigned", "ann"), ("open", None)]
+            assert await service.resolve(tickets[0]["ticket_id"], tenant) == [(tickets[1]["ticket_id"], "ann")]
+            rows = await store.query("SELECT status, assigned_to FROM support_tickets ORDER BY id")
+            assert [(r["status"], r["assigned_to"]) for r in rows] == [("resolved", "ann"), ("assigned", "ann")]
+        finally:
+            await store.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "tickets.db")
+        write_sqlite(db, 10, 42, transcripts=False)
+        asyncio.run(run(db))
+
+
+def test_handed_back_tickets_stay_queued_after_a_restart():
+    async def run(tmp):
+        store = SQLiteCallLogStore(os.path.join(tmp, "tickets.db"))
+        tenant = "biz-1"
+        state = WarmState(os.path.join(tmp, "state"))
+        try:
+            service = TicketService(store, state)
+            await update_agent_statuses(store, [{"agent_id": "zed", "status": "available"}], tenant)
+            ticket, = await service.create([{"title": "Refund", "description": "double charge"}], tenant)
+            assert ticket["assigned_to"] == "zed"
+
+            # Zed goes offline and nobody else is free: the ticket is written back as open and journaled
+            await update_agent_statuses(store, [{"agent_id": "zed", "status": "offline"}], tenant)
+            assert (await service.engine(tenant)).tickets[ticket["ticket_id"]].assigned_to is None
+            rows = await store.query("SELECT status, assigned_to FROM support_tickets")
+            assert [(r["status"], r["assigned_to"]) for r in rows] == [("open", None)]
+            assert state.table(f"tickets/{tenant}").get(ticket["ticket_id"])["assigned_to"] is None
+            state.close(snapshot=False)
+
+            # After a restart from the warm state the next agent to come online picks it up
+            state = WarmState(os.path.join(tmp, "state"))
+            service = TicketService(store, state)
+            assert (await service.engine(tenant)).stats()["waiting"] == 1
+            await update_agent_statuses(store, [{"agent_id": "amy", "status": "available"}], tenant)
+            assert (await service.engine(tenant)).tickets[ticket["ticket_id"]].assigned_to == "amy"
+        finally:
+            state.close()
+            await store.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_sqlite(os.path.join(tmp, "tickets.db"), 10, 42, transcripts=False)
+        asyncio.run(run(tmp))
+
+
+def test_agent_sync_binds_timestamps_as_datetimes():
+    class TextStampStore:
+        """Returns updated_at as ISO text, as the Postgres store does"""
+
+        def __init__(self):
+            self.params = []
+
+        async def query(self, sql, params=()):
+            self.params.append(params)
+            if "call_center_agent_status" in sql:
+                return [{"agent_id": "ann", "status": "available", "skills": None, "max_tickets": 2,
+                         "updated_at": "2024-03-01T10:00:00+00:00"}]
+            return []
+
+        async def execute_many(self, sql, rows):
+            pass
+
+    async def run():
+        store = TextStampStore()
+        service = TicketService(store)
+        await service.engine("biz-1")
+        await service.engine("biz-1")
+        assert store.params[-1] == ("biz-1", datetime(2024, 3, 1, 10, tzinfo=timezone.utc))
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    for test in (test_uuid7_ids_are_versioned_and_time_ordered, test_engine_matches_skill_load_and_priority,
+                 test_service_persists_assignments_and_restores_queue,
+                 test_handed_back_tickets_stay_queued_after_a_restart, test_agent_sync_binds_timestamps_as_datetimes):
+        test()
+        print(f"{test.__name__}: PASSED")
+    print("\n=== Test PASSED ===")
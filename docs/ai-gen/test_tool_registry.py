@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Tests for the tool registry and its precompiled schema validators
+"""
+
+import asyncio
+
+from tool_registry import ToolArgumentError, ToolRegistry
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string", "minLength": 1},
+        "priority": {"type": "string", "enum": ["low", "medium", "high", "urgent"], "default": "medium"},
+        "tags": {"type": "array", "items": {"type": "string"}, "maxItems": 3},
+    },
+    "required": ["title"],
+}
+
+
+def make_registry() -> ToolRegistry:
+    registry = ToolRegistry()
+
+    @registry.tool("create_ticket", "Create a support ticket", SCHEMA)
+    async def create_ticket(arguments: dict):
+        return arguments
+
+    return registry
+
+
+def test_dispatch_fills_defaults():
+    """Validated arguments reach the handler with schema defaults applied"""
+    result = asyncio.run(make_registry().dispatch("create_ticket", {"title": "Login issue"}))
+    assert result == {"title": "Login issue", "priority": "medium"}
+
+
+def test_invalid_arguments_are_rejected():
+    """Each schema keyword produces a ToolArgumentError naming the field"""
+    registry = make_registry()
+    cases = [
+        ({}, "arguments.title is required"),
+        ({"title": ""}, "arguments.title length must be >= 1"),
+        ({"title": "x", "priority": "asap"}, "arguments.priority must be one of"),
+        ({"title": "x", "tags": ["a", 1]}, "arguments.tags[] must be string"),
+        ({"title": "x", "tags": ["a", "b", "c", "d"]}, "arguments.tags must have at most 3"),
+    ]
+    for arguments, message in cases:
+        try:
+            asyncio.run(registry.dispatch("create_ticket", arguments))
+        except ToolArgumentError as e:
+            assert str(e).startswith(message), (arguments, str(e))
+        else:
+            raise AssertionError(f"{arguments} was accepted")
+
+
+def test_unknown_tool_and_cached_listing():
+    """Unknown names raise ValueError; the tool definitions are built once"""
+    registry = make_registry()
+    try:
+        asyncio.run(registry.dispatch("missing", {}))
+    except ValueError as e:
+        assert str(e) == "Unknown tool: missing"
+    else:
+        raise AssertionError("unknown tool was dispatched")
+    assert registry.definitions() is registry.definitions()
+    assert registry.definitions()[0]["inputSchema"] is SCHEMA
+
+
+if __name__ == "__main__":
+    for test in (test_dispatch_fills_defaults, test_invalid_arguments_are_rejected,
+                 test_unknown_tool_and_cached_listing):
+        test()
+        print(f"{test.__name__}: PASSED")
+    print("\n=== Test PASSED ===")
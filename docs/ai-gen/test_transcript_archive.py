@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Tests for the transcript archive
+"""
+
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from call_log_store import SQLiteCallLogStore
+from generate_call_log_fixtures import write_sqlite
+from transcript_archive import TranscriptArchive, parse_query, sync_from_store
+
+
+def test_parse_query():
+    assert parse_query('Refund "cancel my  Appointment" refund') == (
+        ["refund", "cancel", "my", "appointment"], [["cancel", "my", "appointment"]])
+    assert parse_query('"   "') == ([], [])
+
+
+def test_segments_merge_and_reopen():
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = TranscriptArchive(tmp, flush_docs=4, merge_factor=2)
+        for i in range(20):
+            text = f"User: I want to cancel my appointment number {i}." if i % 3 == 0 else f"Agent: call {i} done."
+            archive.add(f"call_{i}", "tenant-a" if i % 2 else "tenant-b", 1_700_000_000_000 + i, text)
+        archive.add("call_3", "tenant-a", 1_700_000_000_003, "cancel my appointment again")
+
+        result = archive.search('"cancel my appointment"', limit=3)
+        assert [m["call_id"] for m in result["matches"]] == ["call_3", "call_18", "call_15"]
+        assert result["candidates"] == 8
+        assert archive.search("appointment 9")["matches"][0]["call_id"] == "call_9"
+        assert archive.search('"my cancel"')["matches"] == []
+        assert {m["call_id"] for m in archive.search("cancel", 20, user_id="tenant-b")["matches"]} == {
+            "call_0", "call_6", "call_12", "call_18"}
+        # 20 docs, flush every 4, merged pairwise by tier
+        assert len(archive.segments) == 2
+        kept = archive.segments[0].path
+        shutil.copy(kept, os.path.join(tmp, "00000001-00000001.tseg"))
+        archive.close()
+
+        # A leftover merge input is dropped on reopen
+        reopened = TranscriptArchive(tmp)
+        assert len(reopened) == 21 and len(reopened.segments) == 2
+        assert reopened.search('"cancel my appointment"', 2)["matches"][1]["call_id"] == "call_18"
+        reopened.close()
+
+
+def test_sync_resumes_from_watermark():
+    async def run(db, directory):
+        store = SQLiteCallLogStore(db)
+        archive = TranscriptArchive(directory, flush_docs=300, database="sqlite:///" + db)
+        assert await sync_from_store(archive, store, chunk_size=256) == 1000
+        hit = archive.search('"reschedule my appointment"', 1)["matches"][0]
+        rows = await store.query("SELECT transcript FROM customer_call_logs WHERE call_id = ?", (hit["call_id"],))
+        assert "reschedule my appointment" in rows[0]["transcript"].lower()
+
+        await store.execute(
+            "INSERT INTO customer_call_logs (id, created_at, updated_at, user_id, call_id, start_timestamp, "
+            "transcript) VALUES ('new', 'x', 'x', 'tenant', 'call_new', '2099-01-01T00:00:00+00:00', "
+            "'User: my invoice is wrong')")
+        # Only the new row is indexed; the call already at the watermark is skipped
+        assert await sync_from_store(archive, store) == 1
+        assert archive.search("invoice")["matches"][0]["call_id"] == "call_new"
+        segments = [segment.path for segment in archive.segments]
+        assert await sync_from_store(archive, store) == 0
+        archive.close()
+
+        # Nor is it re-indexed on the next start
+        reopened = TranscriptArchive(directory, database="sqlite:///" + db)
+        assert await sync_from_store(reopened, store) == 0
+        assert [segment.path for segment in reopened.segments] == segments and len(reopened) == 1001
+        reopened.close()
+        try:
+            TranscriptArchive(directory, database="sqlite:///elsewhere.db")
+            raise AssertionError("expected ValueError for another database")
+        except ValueError:
+            pass
+        await store.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "transcripts.db")
+        write_sqlite(db, 1000, 42, transcripts=True)
+        asyncio.run(run(db, os.path.join(tmp, "archive")))
+
+
+def test_lock_never_blocks_the_event_loop():
+    async def run(directory):
+        archive = TranscriptArchive(directory, flush_docs=2)
+        other = TranscriptArchive(directory)
+        held, release = threading.Event(), threading.Event()
+
+        def hold():
+            with other.locked():
+                held.set()
+                release.wait()
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        held.wait()
+        # Another process has the lock: a full buffer waits instead of blocking
+        for i in range(3):
+            archive.add(f"call_{i}", "tenant", i, f"call {i}")
+        assert archive.buffer.docs == 3 and archive.segments == []
+
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        async def locked_then_released():
+            async with archive.alocked():
+                return time.monotonic()
+
+        ticker = asyncio.create_task(tick())
+        waiter = asyncio.create_task(locked_then_released())
+        await asyncio.sleep(0.2)
+        assert not waiter.done() and ticks >= 5
+        released = time.monotonic()
+        release.set()
+        assert await waiter >= released
+        ticker.cancel()
+        thread.join()
+
+        # Concurrent tasks take turns rather than sharing the lock as "reentrant"
+        inside, overlaps = 0, 0
+
+        async def critical():
+            nonlocal inside, overlaps
+            async with archive.alocked():
+                inside += 1
+                overlaps += inside > 1
+                await asyncio.sleep(0.01)
+                inside -= 1
+
+        await asyncio.gather(*(critical() for _ in range(5)))
+        assert overlaps == 0
+        archive.add("call_3", "tenant", 3, "call 3")
+        assert archive.buffer.docs == 0 and len(archive) == 4
+        archive.close()
+        other.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run(tmp))
+
+
+if __name__ == "__main__":
+    for test in (test_parse_query, test_segments_merge_and_reopen, test_sync_resumes_from_watermark,
+                 test_lock_never_blocks_the_event_loop):
+        test()
+        print(f"{test.__name__}: PASSED")
+    print("\n=== Test PASSED ===")
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Tests for the warm stdio server pool and its launcher
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import warm_launcher
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+INITIALIZE = {"jsonrpc": "2.0", "id": 1, "method": "initialize",
+              "params": {"protocolVersion": "2024-11-05", "capabilities": {},
+                         "clientInfo": {"name": "test", "version": "1.0"}}}
+
+
+def session(env: dict, *args: str) -> subprocess.CompletedProcess:
+    messages = [INITIALIZE, {"jsonrpc": "2.0", "method": "notifications/initialized"},
+                {"jsonrpc": "2.0", "id": 2, "method": "tools/list", "params": {}}]
+    return subprocess.run([sys.executable, "warm_launcher.py", "working_mcp_server.py", *args], cwd=HERE, env=env,
+                          input="".join(json.dumps(message) + "\n" for message in messages),
+                          capture_output=True, text=True, timeout=60)
+
+
+def test_request_encoding_round_trips():
+    os.environ["WARM_LAUNCHER_TEST"] = "a=b c"
+    try:
+        cwd, argv, env = warm_launcher.decode_request(warm_launcher.encode_request(["--listen", "", "x y"])[4:])
+    finally:
+        del os.environ["WARM_LAUNCHER_TEST"]
+    assert cwd == os.getcwd() and argv == ["--listen", "", "x y"]
+    assert env[b"WARM_LAUNCHER_TEST"] == b"a=b c"
+
+
+def test_pool_serves_sessions_and_launcher_falls_back():
+    if not warm_launcher.warm_supported():
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, "CALL_CENTER_WARM_SOCKET": os.path.join(tmp, "pool.sock")}
+
+        # No pool yet: the launcher runs the server itself
+        cold = session(env)
+        assert cold.returncode == 0 and '"serverInfo"' in cold.stdout and '"get_call_stats"' in cold.stdout
+
+        pool = subprocess.Popen([sys.executable, "warm_launcher.py", "--serve", "working_mcp_server.py",
+                                 "--spares", "1"], cwd=HERE, env=env, stderr=subprocess.PIPE, text=True)
+        try:
+            assert "Warm pool" in pool.stderr.readline()
+            for _ in range(3):
+                warm = session(env)
+                assert warm.returncode == 0, warm.stderr
+                responses = [json.loads(line) for line in warm.stdout.splitlines()]
+                assert [response["id"] for response in responses] == [1, 2]
+                assert any(tool["name"] == "deploy_agent" for tool in responses[1]["result"]["tools"])
+
+            # Arguments reach the server's argparse; its exit status and stderr come back
+            rejected = session(env, "--no-such-option")
+            assert rejected.returncode == 2 and "unrecognized arguments" in rejected.stderr
+            assert pool.poll() is None
+        finally:
+            pool.terminate()
+            pool.wait(timeout=10)
+        assert not os.path.exists(env["CALL_CENTER_WARM_SOCKET"])
+
+
+def _foreign_pool(path: str) -> tuple[int, int]:
+    """Fork a listener on `path` running as nobody; returns its pid and a pipe reporting bytes received"""
+    import socket
+
+    os.chmod(os.path.dirname(os.path.dirname(path)), 0o711)
+    os.chmod(os.path.dirname(path), 0o777)
+    ready_r, ready_w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.setuid(65534)
+            listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            listener.bind(path)
+            listener.listen(1)
+            os.write(ready_w, b"listening\n")
+            conn, _ = listener.accept()
+            os.write(ready_w, b"%d\n" % len(conn.recv(65536)))
+        finally:
+            os._exit(0)
+    os.close(ready_w)
+    assert os.read(ready_r, 64) == b"listening\n"
+    return pid, ready_r
+
+
+def test_launcher_only_trusts_its_own_pool():
+    if not warm_launcher.warm_supported():
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        # The default directory must be private: a world-readable one is ignored
+        env = {key: value for key, value in os.environ.items() if key != "CALL_CENTER_WARM_SOCKET"}
+        env["XDG_RUNTIME_DIR"] = tmp
+        private = os.path.join(tmp, f"call-center-{os.getuid()}")
+        os.mkdir(private, 0o755)
+        with open(os.path.join(private, "working_mcp_server.sock"), "w"):
+            pass
+        os.chmod(os.path.join(private, "working_mcp_server.sock"), 0o600)
+        cold = session(env)
+        assert cold.returncode == 0 and '"serverInfo"' in cold.stdout and "not private" in cold.stderr
+
+    if os.getuid() != 0:
+        # Listening as another user needs root
+        return
+    for chown in (False, True):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "shared", "pool.sock")
+            os.mkdir(os.path.dirname(path))
+            pid, reports = _foreign_pool(path)
+            try:
+                os.chmod(path, 0o600)
+                if chown:
+                    # Even a socket file handed to this user is refused when the peer is someone else
+                    os.chown(path, os.getuid(), os.getgid())
+                cold = session({**os.environ, "CALL_CENTER_WARM_SOCKET": path})
+                assert cold.returncode == 0 and '"serverInfo"' in cold.stdout
+                assert ("served by another user" if chown else "not private") in cold.stderr
+                # Connected and hung up at once, before sending anything, or never connected at all
+                if chown:
+                    assert os.read(reports, 64) == b"0\n"
+            finally:
+                os.kill(pid, 9)
+                os.waitpid(pid, 0)
+                os.close(reports)
+
+
+if __name__ == "__main__":
+    for test in (test_request_encoding_round_trips, test_pool_serves_sessions_and_launcher_falls_back,
+                 test_launcher_only_trusts_its_own_pool):
+        test()
+        print(f"{test.__name__}: PASSED")
+    print("\n=== Test PASSED ===")
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Tests for the warm state snapshot and write-ahead log, crash recovery and warm restarts
+"""
+
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+from datetime import date, datetime, time, timedelta, timezone
+
+from agent_presence import PresenceRegistry
+from call_log_store import SQLiteCallLogStore
+from generate_call_log_fixtures import write_sqlite
+from slot_index import SlotIndex
+from ticket_queue import TicketService
+from warm_state import SNAPSHOT_FILE, WarmState
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _contents(state: WarmState) -> dict:
+    return {name: dict(state.tables[name].items()) for name in state.tables if name in state}
+
+
+def _segments(directory: str) -> list:
+    return sorted(name for name in os.listdir(directory) if name.startswith("wal-"))
+
+
+def test_log_replay_and_snapshots():
+    with tempfile.TemporaryDirectory() as tmp:
+        state = WarmState(tmp, snapshot_every=100)
+        model = {"calls": {}, "agents": {}}
+        for i in range(250):
+            state.table("calls").put(f"c{i}", {"i": i, "tags": ["a", "ü"]})
+            model["calls"][f"c{i}"] = {"i": i, "tags": ["a", "ü"]}
+        for i in range(0, 250, 3):
+            state.table("calls").delete(f"c{i}")
+            del model["calls"][f"c{i}"]
+        state.table("agents").clear()
+        state.table("agents").put("ann", "available")
+        model["agents"]["ann"] = "available"
+        assert state.snapshots == 3 and len(_segments(tmp)) == 1
+        assert _contents(state) == model and "missing" not in state
+
+        # Snapshots written from a thread while writes continue into the next segment
+        async def churn():
+            for i in range(400):
+                state.table("calls").put(f"c{i % 50}", i)
+                model["calls"][f"c{i % 50}"] = i
+                if i % 20 == 0:
+                    await asyncio.sleep(0)
+            while state._writing is not None:
+                await state._writing
+
+        asyncio.run(churn())
+        state.table("agents").put("bob", "break")
+        model["agents"]["bob"] = "break"
+        assert state.snapshots > 3 and _contents(state) == model
+        state.close(snapshot=False)
+
+        reopened = WarmState(tmp)
+        assert 0 < reopened.replayed < 100 and _contents(reopened) == model
+        reopened.close()
+        assert WarmState(tmp).replayed == 0 and _segments(tmp) == [f"wal-{reopened.seq + 1:020d}.log"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        state = WarmState(tmp)
+        try:
+            WarmState(tmp)
+            raise AssertionError("expected the directory to be locked")
+        except OSError:
+            pass
+        assert state.filled("agents") is None
+        state.fill("agents", [("ann", 1), ("bob", 2)])
+        assert dict(state.filled("agents").items()) == {"ann": 1, "bob": 2}
+        state.close()
+
+
+CHILD = """
+import os, signal, sys
+from warm_state import WarmState
+state = WarmState(sys.argv[1], snapshot_every=int(sys.argv[2]))
+for i in range(int(sys.argv[3])):
+    state.table("tickets").put(f"t{i}", {"n": i})
+    if i % 2:
+        state.table("tickets").delete(f"t{i - 1}")
+os.kill(os.getpid(), signal.SIGKILL)
+"""
+
+
+def _killed_child(directory: str, snapshot_every: int, records: int):
+    child = subprocess.run([sys.executable, "-c", CHILD, directory, str(snapshot_every), str(records)], cwd=HERE)
+    assert child.returncode == -signal.SIGKILL
+
+
+def test_crash_recovery():
+    expected = {f"t{i}": {"n": i} for i in range(1, 1000, 2)}
+    with tempfile.TemporaryDirectory() as tmp:
+        # Killed between snapshots: everything written survives
+        _killed_child(tmp, 400, 1000)
+        state = WarmState(tmp)
+        assert dict(state.table("tickets").items()) == expected and state.replayed > 0
+
+        # A torn record at the end of the log is cut off; later writes follow the good records
+        state.close(snapshot=False)
+        newest = os.path.join(tmp, _segments(tmp)[-1])
+        size = os.path.getsize(newest)
+        with open(newest, "ab") as f:
+            f.write(b"\x20\x00\x00\x00\xde\xad")
+        state = WarmState(tmp)
+        assert os.path.getsize(newest) == size and dict(state.table("tickets").items()) == expected
+        state.table("tickets").put("late", 1)
+        state.close(snapshot=False)
+        state = WarmState(tmp)
+        assert state.table("tickets").get("late") == 1
+
+        # Killed mid-snapshot: the unfinished file is dropped, the old snapshot and log still hold everything
+        with open(os.path.join(tmp, SNAPSHOT_FILE + ".partial"), "wb") as f:
+            f.write(b"CCSNAP01 half a snapshot")
+        state.close(snapshot=False)
+        state = WarmState(tmp)
+        assert not [name for name in os.listdir(tmp) if name.endswith(".partial")]
+        assert len(state.table("tickets")) == len(expected) + 1
+        state.close()
+
+        # A corrupt snapshot cannot be trusted: the state starts empty, so servers load from the database
+        with open(os.path.join(tmp, SNAPSHOT_FILE), "r+b") as f:
+            f.seek(-3, os.SEEK_END)
+            f.write(b"\xff")
+        state = WarmState(tmp)
+        assert "tickets" not in state and not os.path.exists(os.path.join(tmp, SNAPSHOT_FILE))
+        state.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Damage in an older segment (not a torn tail) discards the state too
+        _killed_child(tmp, 10_000, 1000)
+        with open(os.path.join(tmp, "wal-00000000000000001501.log"), "wb") as f:
+            pass
+        oldest = os.path.join(tmp, _segments(tmp)[0])
+        with open(oldest, "r+b") as f:
+            f.seek(100)
+            f.write(b"\x00\x00")
+        assert len(_segments(tmp)) == 2
+        state = WarmState(tmp)
+        assert "tickets" not in state and state.seq == 0
+        state.close()
+
+
+async def _restart_warm(db: str, tmp: str):
+    store = SQLiteCallLogStore(db)
+    tenant = "biz-1"
+    now = datetime.now(timezone.utc)
+
+    async def agent(agent_id, status, skills=None, max_tickets=None):
+        await store.execute(
+            "INSERT INTO call_center_agent_status (agent_id, user_id, status, skills, max_tickets, updated_at) "
+            "VALUES (?, ?, ?, ?, COALESCE(?, 5), ?) ON CONFLICT ((COALESCE(CAST(user_id AS TEXT), '')), agent_id) "
+            "DO UPDATE SET status = excluded.status, updated_at = excluded.updated_at", (agent_id, tenant, status, skills, max_tickets, now))
+
+    state = WarmState(os.path.join(tmp, "state"))
+    service = TicketService(store, state)
+    await agent("ann", "available", "billing", 1)
+    tickets = await service.create([{"title": "Refund", "description": "double charge", "skill": "billing"},
+                                    {"title": "Refund 2", "description": "again", "skill": "billing"},
+                                    {"title": "Hello", "description": "anyone", "priority": "urgent"}], tenant)
+    await agent("zed", "available")
+    await service.update_agents([{"agent_id": "zed", "status": "available", "skills": ["billing"]}], tenant)
+    engine = await service.engine(tenant)
+    before = {ticket_id: ticket.assigned_to for ticket_id, ticket in engine.tickets.items()}
+    assert before == {tickets[0]["ticket_id"]: "ann", tickets[1]["ticket_id"]: "zed",
+                      tickets[2]["ticket_id"]: "zed"}
+
+    presence = PresenceRegistry(journal=state.fill("agent_status/*", []))
+    presence.update("ann", "available", 1_700_000_000)
+    presence.update("zed", "break", 1_700_000_100)
+    presence.publish()
+
+    today = date.today()
+    index = SlotIndex.build(today, 7, staff=[{"id": "s1"}, {"id": "s2"}],
+                            office_hours=[{"day_of_week": dow, "start_time": "09:00", "end_time": "17:00"}
+                                          for dow in range(7)],
+                            services=[{"id": "svc", "name": "Consult", "duration_minutes": 30,
+                                       "allowed_staff_ids": ["s2"]}])
+    index.journal = state.fill(f"slots/{tenant}", index.to_state())
+    tomorrow = datetime.combine(today + timedelta(days=1), time(10))
+    assert index.book_first_available(tomorrow, 6) == "s1"
+    assert index.book_first_available(tomorrow, 6) == "s2"
+    index.release("s1", tomorrow, 6)
+    state.close(snapshot=False)
+
+    # Restart: nothing but the catch-up look at agent rows is read from the database
+    class CountingStore:
+        def __init__(self):
+            self.queries = []
+
+        async def query(self, sql, params=()):
+            self.queries.append(sql)
+            return await store.query(sql, params)
+
+        def __getattr__(self, name):
+            return getattr(store, name)
+
+    state = WarmState(os.path.join(tmp, "state"))
+    counting = CountingStore()
+    service = TicketService(counting, state)
+    engine = await service.engine(tenant)
+    assert {ticket_id: ticket.assigned_to for ticket_id, ticket in engine.tickets.items()} == before
+    assert engine.agents["ann"].skills == {"billing"} and engine.agents["ann"].max_tickets == 1
+    assert not [sql for sql in counting.queries if "support_tickets" in sql]
+
+    # Another process took Zed offline while this one was down
+    now = datetime.now(timezone.utc)
+    await agent("zed", "offline")
+    engine = await service.engine(tenant)
+    assert engine.agents["zed"].status == "offline"
+    assert await service.resolve(tickets[0]["ticket_id"], tenant) == [(tickets[2]["ticket_id"], "ann")]
+
+    restored = PresenceRegistry()
+    restored.restore(state.filled("agent_status/*"))
+    assert restored.agents == presence.agents
+
+    warm = SlotIndex.from_state(state.filled(f"slots/{tenant}"))
+    assert (warm._base, warm._free, warm._any) == (index._base, index._free, index._any)
+    assert warm.services == index.services and warm.slots_for("svc") == (6, ("s2",))
+    assert warm.next_free_slots(6, tomorrow, 4) == index.next_free_slots(6, tomorrow, 4)
+    state.close()
+    await store.close()
+
+
+def test_servers_restart_warm():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "calls.db")
+        write_sqlite(db, 10, 42, transcripts=False)
+        asyncio.run(_restart_warm(db, tmp))
+
+
+if __name__ == "__main__":
+    for test in (test_log_replay_and_snapshots, test_crash_recovery, test_servers_restart_warm):
+        test()
+        print(f"{test.__name__}: PASSED")
+    print("\n=== Test PASSED ===")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Tests for the Retell webhook ingest worker
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from call_log_store import SQLiteCallLogStore
+from call_stats import CallStatsEngine
+from generate_call_log_fixtures import write_sqlite
+from webhook_ingest import IngestWorker, SpoolWriter
+
+START_MS = 1_705_363_200_000
+
+
+def _spool(spool_dir: str, calls: int):
+    writer = SpoolWriter(spool_dir, max_events=1000, fsync=False)
+    for i in range(calls):
+        call = {"call_id": f"live_{i}", "agent_id": "agent_123abc", "from_number": "(555) 201-0000",
+                "start_timestamp": START_MS + i * 1000}
+        writer.write({"event": "call_started", "call": call})
+        writer.write({"event": "call_ended", "call": {**call, "end_timestamp": START_MS + i * 1000 + 60_000,
+                                                      "duration_ms": 60_000}})
+    writer.write({"event": "call_ended", "call": {"agent_id": "agent_123abc"}})
+    writer.close()
+
+
+class FlakyStore(SQLiteCallLogStore):
+    """Fails the nth write, like a worker killed mid-segment"""
+
+    def __init__(self, path, fail_on: int):
+        super().__init__(path)
+        self.writes = 0
+        self.fail_on = fail_on
+
+    async def execute_many(self, sql, rows):
+        self.writes += 1
+        if self.writes == self.fail_on:
+            raise ConnectionError("database went away")
+        await super().execute_many(sql, rows)
+
+
+def test_replay_after_crash_is_idempotent():
+    async def run(db, spool_dir):
+        flaky = FlakyStore(db, fail_on=3)
+        try:
+            await IngestWorker(flaky, spool_dir, batch_size=50).run_once()
+        except ConnectionError:
+            pass
+        await flaky.close()
+        assert any(name.endswith(".offset") for name in os.listdir(spool_dir))
+
+        store = SQLiteCallLogStore(db)
+        stats = CallStatsEngine()
+        worker = IngestWorker(store, spool_dir, batch_size=50, stats=lambda user_id: [stats])
+        await worker.run_once()
+        rows = await store.query(
+            "SELECT COUNT(*) AS n, COUNT(end_timestamp) AS ended, MIN(from_number) AS phone "
+            "FROM customer_call_logs WHERE call_id LIKE 'live_%'")
+        await store.close()
+
+        assert rows[0] == {"n": 200, "ended": 200, "phone": "+15552010000"}
+        # The resumed worker saw only the events after the last committed batch
+        assert worker.events == 400 - 100
+        assert worker.rejected == 1
+        assert sorted(os.listdir(spool_dir)) == ["rejected"]
+        assert stats.snapshot(START_MS / 1000 + 3600)["active_calls"] == 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "ingest.db")
+        spool_dir = os.path.join(tmp, "spool")
+        write_sqlite(db, 100, 42, transcripts=False)
+        _spool(spool_dir, 200)
+        asyncio.run(run(db, spool_dir))
+
+
+def test_quiet_segments_publish_on_a_timer_and_dead_writers_are_recovered():
+    async def run(db, spool_dir):
+        writer = SpoolWriter(spool_dir, max_seconds=0.1, fsync=False)
+        writer.write({"event": "call_ended", "call": {"call_id": "quiet", "agent_id": "agent_123abc"}})
+        assert [name for name in os.listdir(spool_dir) if name.endswith(".tmp")]
+        # No further event arrives; the segment is published anyway
+        deadline = time.monotonic() + 5
+        while not [name for name in os.listdir(spool_dir) if name.endswith(".ndjson")]:
+            assert time.monotonic() < deadline
+            await asyncio.sleep(0.02)
+        assert not [name for name in os.listdir(spool_dir) if name.endswith(".tmp")]
+        writer.close()
+
+        # A writer killed mid-segment leaves a .tmp with a torn last line; a live one is left alone
+        pid = os.fork()
+        if not pid:
+            os._exit(0)
+        os.waitpid(pid, 0)
+        event = json.dumps({"event": "call_ended", "call": {"call_id": "orphan", "agent_id": "agent_123abc"}})
+        with open(os.path.join(spool_dir, f"{time.time_ns():020d}-{pid}-000001.tmp"), "w") as f:
+            f.write(event + '\n{"event": "call_ended", "ca')
+        live = os.path.join(spool_dir, f"{time.time_ns():020d}-{os.getppid()}-000001.tmp")
+        with open(live, "w") as f:
+            f.write(event + "\n")
+
+        store = SQLiteCallLogStore(db)
+        worker = IngestWorker(store, spool_dir)
+        assert await worker.run_once() == 2 and worker.rejected == 1
+        rows = await store.query("SELECT call_id FROM customer_call_logs WHERE call_id IN ('quiet', 'orphan')")
+        assert sorted(row["call_id"] for row in rows) == ["orphan", "quiet"]
+        assert sorted(os.listdir(spool_dir)) == sorted([os.path.basename(live), "rejected"])
+        await store.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "ingest.db")
+        write_sqlite(db, 10, 42, transcripts=False)
+        asyncio.run(run(db, os.path.join(tmp, "spool")))
+
+
+if __name__ == "__main__":
+    for test in (test_replay_after_crash_is_idempotent,
+                 test_quiet_segments_publish_on_a_timer_and_dead_writers_are_recovered):
+        test()
+        print(f"{test.__name__}: PASSED")
+    print("\n=== Test PASSED ===")
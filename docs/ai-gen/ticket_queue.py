@@ -0,0 +1,546 @@
+#!/usr/bin/env python3
+"""
+Support ticket queue and skill-based assignment for the Call Center MCP servers
+
+Tickets get time-ordered UUIDv7 IDs and are matched to agents as they
+arrive; whatever cannot be assigned waits in the queue until an agent frees
+up. The AssignmentEngine keeps, per skill:
+
+    waiting     one heap per priority of (arrival, ticket_id); the oldest
+                ticket of the most urgent non-empty priority goes first
+    free        a heap of (load, arrival, agent_id, version) over available
+                agents with spare capacity; the least loaded goes first
+
+Every agent has the implicit "general" skill, so tickets without one can go
+to anybody. Heap entries are invalidated lazily (a ticket that is no longer
+waiting, an agent whose version moved on) and skipped when they surface, so
+submitting a ticket, freeing an agent and changing an agent's status are
+all O(log n) plus the stale entries they pop.
+
+TicketService keeps one engine per business, loaded on first use from
+`support_tickets` (status open or assigned) and `call_center_agent_status`,
+and writes each assignment back, as well as each ticket an agent going
+offline hands back to the queue (open, unassigned). create_tickets() and
+update_agent_statuses() in batch_operations go through it, so an agent
+becoming available immediately picks up queued tickets.
+
+The engine lives in the server process. Agent status rows written by
+another process (update_agent_status is served by example_mcp_server,
+create_ticket by working_mcp_server) are picked up by their updated_at
+before each ticket operation; two processes may still both assign the same
+queued ticket, and the later write wins.
+
+With CALL_CENTER_STATE_DIR set, every ticket and agent row the service
+writes or reads is mirrored to the warm state (see warm_state), and a
+restarted server builds each engine from that mirror, then catches up on
+agent changes since its last look, instead of loading from the database.
+"""
+
+import asyncio
+import heapq
+import os
+import time
+import uuid
+import weakref
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Optional
+
+
+PRIORITIES = ("urgent", "high", "medium", "low")
+PRIORITY_RANK = {priority: rank for rank, priority in enumerate(PRIORITIES)}
+GENERAL_SKILL = "general"
+DEFAULT_MAX_TICKETS = 5
+AVAILABLE = "available"
+
+_uuid7_ms = 0
+_uuid7_seq = 0
+
+
+def uuid7() -> uuid.UUID:
+    """Time-ordered UUID (RFC 9562 version 7), increasing within this process
+
+    48 bits of Unix milliseconds, then a 12-bit sequence that orders IDs
+    made in the same millisecond, then 62 random bits.
+    """
+    global _uuid7_ms, _uuid7_seq
+    ms = time.time_ns() // 1_000_000
+    if ms > _uuid7_ms:
+        # Start low in the sequence space so the rest of the millisecond has room
+        _uuid7_ms, _uuid7_seq = ms, int.from_bytes(os.urandom(2), "big") & 0x3FF
+    else:
+        _uuid7_seq += 1
+        if _uuid7_seq > 0xFFF:
+            _uuid7_ms, _uuid7_seq = _uuid7_ms + 1, 0
+    rand_b = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    return uuid.UUID(int=(_uuid7_ms & ((1 << 48) - 1)) << 80 | 0x7 << 76 | _uuid7_seq << 64 | 0b10 << 62 | rand_b)
+
+
+def parse_skills(value) -> frozenset:
+    """Skills from a list or a comma-separated string (as stored)"""
+    if not value:
+        return frozenset()
+    if isinstance(value, str):
+        value = value.split(",")
+    return frozenset(skill.strip().lower() for skill in value if skill.strip())
+
+
+@dataclass
+class Agent:
+    agent_id: str
+    status: str = "offline"
+    skills: frozenset = frozenset()
+    max_tickets: int = DEFAULT_MAX_TICKETS
+    tickets: set = field(default_factory=set)
+    version: int = 0
+
+    @property
+    def can_take(self) -> bool:
+        return self.status == AVAILABLE and len(self.tickets) < self.max_tickets
+
+
+@dataclass
+class Ticket:
+    ticket_id: str
+    priority: str
+    skill: str
+    arrival: int
+    assigned_to: Optional[str] = None
+
+
+class AssignmentEngine:
+    """In-memory ticket queue and agent matcher for one business"""
+
+    def __init__(self):
+        self.agents: dict = {}
+        self.tickets: dict = {}
+        self._waiting: dict = {}
+        self._free: dict = {}
+        self._arrivals = 0
+        self.assignments = 0
+        # Tickets put back in the queue that the database still has assigned, for the caller to write
+        self.released: list = []
+
+    def _next_arrival(self) -> int:
+        self._arrivals += 1
+        return self._arrivals
+
+    def set_agent(self, agent_id: str, status: str, skills=None, max_tickets: Optional[int] = None,
+                  ) -> list[tuple[str, str]]:
+        """Add or update an agent; returns the (ticket_id, agent_id) assignments this made
+
+        An agent going offline hands its open tickets back to the queue (and
+        to `released`); on break or busy it keeps them but takes no new ones.
+        """
+        agent = self.agents.get(agent_id)
+        if agent is None:
+            agent = self.agents[agent_id] = Agent(agent_id)
+        agent.status = status
+        if skills is not None:
+            agent.skills = parse_skills(skills)
+        if max_tickets is not None:
+            agent.max_tickets = max_tickets
+        agent.version += 1
+
+        assignments = []
+        if status == "offline":
+            handed_back = sorted(agent.tickets, key=lambda t: self.tickets[t].arrival)
+            agent.tickets.clear()
+            for ticket_id in handed_back:
+                # Keeps its arrival, so it goes before tickets that came in later
+                ticket = self.tickets[ticket_id]
+                ticket.assigned_to = None
+                reassigned = self._try_assign(ticket)
+                if not reassigned:
+                    self._queue(ticket)
+                    self.released.append(ticket_id)
+                assignments += reassigned
+        assignments += self._fill(agent)
+        return assignments
+
+    def submit(self, ticket_id: str, priority: str = "medium", skill: Optional[str] = None) -> Optional[str]:
+        """Queue a new ticket; returns the agent it was assigned to, if one was free"""
+        if priority not in PRIORITY_RANK:
+            raise ValueError(f"Unknown priority: {priority}")
+        ticket = Ticket(ticket_id, priority, (skill or GENERAL_SKILL).lower(), self._next_arrival())
+        self.tickets[ticket_id] = ticket
+        assigned = self._try_assign(ticket)
+        if not assigned:
+            self._queue(ticket)
+            return None
+        return ticket.assigned_to
+
+    def restore(self, ticket_id: str, priority: str, skill: Optional[str], assigned_to: Optional[str]):
+        """Load an existing ticket in arrival order without assigning it anew
+
+        A ticket stored as assigned to an unknown or offline agent goes back
+        to the queue (and to `released`).
+        """
+        ticket = Ticket(ticket_id, priority if priority in PRIORITY_RANK else "medium",
+                        (skill or GENERAL_SKILL).lower(), self._next_arrival())
+        self.tickets[ticket_id] = ticket
+        agent = self.agents.get(assigned_to) if assigned_to else None
+        if agent is None or agent.status == "offline":
+            self._queue(ticket)
+            if assigned_to:
+                self.released.append(ticket_id)
+            return
+        ticket.assigned_to = agent.agent_id
+        agent.tickets.add(ticket_id)
+
+    def resolve(self, ticket_id: str) -> list[tuple[str, str]]:
+        """Close a ticket; its agent's freed capacity goes to the next queued ticket"""
+        ticket = self.tickets.pop(ticket_id, None)
+        if ticket is None:
+            raise KeyError(ticket_id)
+        if ticket.assigned_to is None:
+            return []
+        agent = self.agents[ticket.assigned_to]
+        agent.tickets.discard(ticket_id)
+        agent.version += 1
+        return self._fill(agent)
+
+    def fill_all(self) -> list[tuple[str, str]]:
+        """Give every agent with spare capacity its share of the queue (after loading)"""
+        assignments = []
+        for agent in self.agents.values():
+            assignments += self._fill(agent)
+        return assignments
+
+    def cancel(self, ticket_id: str):
+        """Forget a ticket whose write failed"""
+        ticket = self.tickets.pop(ticket_id, None)
+        if ticket is not None and ticket.assigned_to is not None:
+            agent = self.agents[ticket.assigned_to]
+            agent.tickets.discard(ticket_id)
+            agent.version += 1
+            self._offer(agent)
+
+    def _queue(self, ticket: Ticket):
+        heaps = self._waiting.get(ticket.skill)
+        if heaps is None:
+            heaps = self._waiting[ticket.skill] = [[] for _ in PRIORITIES]
+        heapq.heappush(heaps[PRIORITY_RANK[ticket.priority]], (ticket.arrival, ticket.ticket_id))
+
+    def _try_assign(self, ticket: Ticket) -> list[tuple[str, str]]:
+        agent = self._best_agent(ticket.skill)
+        if agent is None:
+            return []
+        self._assign(ticket, agent)
+        self._offer(agent)
+        return [(ticket.ticket_id, agent.agent_id)]
+
+    def _best_agent(self, skill: str) -> Optional[Agent]:
+        heap = self._free.get(skill)
+        while heap:
+            load, _, agent_id, version = heap[0]
+            agent = self.agents[agent_id]
+            if agent.version == version and agent.can_take:
+                return agent
+            heapq.heappop(heap)
+        return None
+
+    def _offer(self, agent: Agent):
+        """Publish the agent's current load in every skill's free heap"""
+        if not agent.can_take:
+            return
+        entry = (len(agent.tickets), self._next_arrival(), agent.agent_id, agent.version)
+        for skill in agent.skills | {GENERAL_SKILL}:
+            heap = self._free.setdefault(skill, [])
+            heapq.heappush(heap, entry)
+            if len(heap) > 4 * len(self.agents) + 64:
+                self._compact(skill)
+
+    def _compact(self, skill: str):
+        """Drop stale entries once they outnumber the live ones"""
+        heap = [entry for entry in self._free[skill]
+                if self.agents[entry[2]].version == entry[3] and self.agents[entry[2]].can_take]
+        heapq.heapify(heap)
+        self._free[skill] = heap
+
+    def _next_ticket(self, agent: Agent) -> Optional[Ticket]:
+        """Most urgent, then oldest, waiting ticket the agent has a skill for"""
+        best = None
+        for skill in agent.skills | {GENERAL_SKILL}:
+            heaps = self._waiting.get(skill)
+            if heaps is None:
+                continue
+            for rank, heap in enumerate(heaps):
+                if best is not None and rank > best[0]:
+                    break
+                while heap:
+                    arrival, ticket_id = heap[0]
+                    ticket = self.tickets.get(ticket_id)
+                    if ticket is not None and ticket.assigned_to is None:
+                        break
+                    heapq.heappop(heap)
+                if heap:
+                    if best is None or (rank, heap[0][0]) < best[:2]:
+                        best = (rank, heap[0][0], heap)
+                    break
+        if best is None:
+            return None
+        _, ticket_id = heapq.heappop(best[2])
+        return self.tickets[ticket_id]
+
+    def _fill(self, agent: Agent) -> list[tuple[str, str]]:
+        assignments = []
+        while agent.can_take:
+            ticket = self._next_ticket(agent)
+            if ticket is None:
+                break
+            self._assign(ticket, agent)
+            assignments.append((ticket.ticket_id, agent.agent_id))
+        self._offer(agent)
+        return assignments
+
+    def _assign(self, ticket: Ticket, agent: Agent):
+        ticket.assigned_to = agent.agent_id
+        agent.tickets.add(ticket.ticket_id)
+        agent.version += 1
+        self.assignments += 1
+
+    def stats(self) -> dict:
+        assigned = sum(len(agent.tickets) for agent in self.agents.values())
+        return {
+            "open_tickets": len(self.tickets),
+            "assigned": assigned,
+            "waiting": len(self.tickets) - assigned,
+            "available_agents": sum(agent.can_take for agent in self.agents.values()),
+            "assignments": self.assignments,
+        }
+
+
+def _stamp(value):
+    # updated_at / created_at as sortable ISO text, whether the store returned datetimes or text
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _moment(value) -> datetime:
+    # Stores return timestamps as ISO text; asyncpg only binds datetimes to timestamptz
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+class TicketService:
+    """Per-business assignment engines backed by support_tickets and call_center_agent_status"""
+
+    def __init__(self, store, state=None):
+        self.store = store
+        # warm_state.WarmState the engines' rows are mirrored to, if any
+        self.state = state
+        self._engines: dict = {}
+        # Business -> the one load its concurrent first callers wait on
+        self._loads: dict = {}
+        self._synced: dict = {}
+
+    def _journal(self, user_id: Optional[str], kind: str):
+        """Warm state table mirroring one business's open tickets or agents"""
+        return self.state.table(f"{kind}/{user_id or '*'}") if self.state is not None else None
+
+    def _log_agents(self, user_id: Optional[str], engine: AssignmentEngine, agent_ids):
+        agents = self._journal(user_id, "ticket_agents")
+        if agents is not None:
+            for agent_id in agent_ids:
+                agent = engine.agents[agent_id]
+                agents.put(agent_id, {"status": agent.status, "skills": sorted(agent.skills),
+                                      "max_tickets": agent.max_tickets})
+
+    async def engine(self, user_id: Optional[str], sync: bool = True) -> AssignmentEngine:
+        engine = self._engines.get(user_id)
+        if engine is None:
+            load = self._loads.get(user_id)
+            if load is None:
+                load = self._loads[user_id] = asyncio.ensure_future(self._load_once(user_id))
+            engine = await asyncio.shield(load)
+        elif sync:
+            await self._sync_agents(user_id, engine)
+        return engine
+
+    async def _load_once(self, user_id: Optional[str]) -> AssignmentEngine:
+        try:
+            engine = self._engines[user_id] = await self._load(user_id)
+            return engine
+        finally:
+            del self._loads[user_id]
+
+    async def _agent_rows(self, user_id: Optional[str], since) -> list:
+        tenant, params = ("user_id = ?", [user_id]) if user_id is not None else ("user_id IS NULL", [])
+        if since is not None:
+            tenant += " AND updated_at >= ?"
+            params.append(since)
+        rows = await self.store.query(
+            f"SELECT agent_id, status, skills, max_tickets, updated_at FROM call_center_agent_status "
+            f"WHERE {tenant}", tuple(params))
+        stamps = [_moment(row["updated_at"]) for row in rows if row["updated_at"] is not None]
+        if stamps:
+            synced = max(stamps)
+            if self.state is not None and synced != self._synced.get(user_id):
+                self.state.table("ticket_synced").put(user_id or "*", _stamp(synced))
+            self._synced[user_id] = synced
+        return rows
+
+    async def _sync_agents(self, user_id: Optional[str], engine: AssignmentEngine):
+        """Apply agent status changes another server process wrote since the last look"""
+        assignments, changed = [], []
+        for row in await self._agent_rows(user_id, self._synced.get(user_id)):
+            agent = engine.agents.get(row["agent_id"])
+            skills = parse_skills(row["skills"])
+            max_tickets = row["max_tickets"] if row["max_tickets"] is not None else DEFAULT_MAX_TICKETS
+            if agent is None or (agent.status, agent.skills, agent.max_tickets) != (row["status"], skills,
+                                                                                     max_tickets):
+                assignments += engine.set_agent(row["agent_id"], row["status"], skills, max_tickets)
+                changed.append(row["agent_id"])
+        self._log_agents(user_id, engine, changed)
+        await self._write_assignments(user_id, engine, assignments)
+
+    @staticmethod
+    def _build(agent_rows, ticket_rows) -> AssignmentEngine:
+        engine = AssignmentEngine()
+        for row in agent_rows:
+            agent = engine.agents[row["agent_id"]] = Agent(row["agent_id"], row["status"], parse_skills(row["skills"]))
+            if row["max_tickets"] is not None:
+                agent.max_tickets = row["max_tickets"]
+        for row in ticket_rows:
+            engine.restore(row["id"], row["priority"], row["skill"], row["assigned_to"])
+        return engine
+
+    async def _load(self, user_id: Optional[str]) -> AssignmentEngine:
+        engine = self._restore(user_id)
+        if engine is not None:
+            # Catch up on agent changes made while this server was down
+            await self._sync_agents(user_id, engine)
+        else:
+            tenant, params = ("user_id = ?", (user_id,)) if user_id is not None else ("user_id IS NULL", ())
+            agent_rows = await self._agent_rows(user_id, None)
+            ticket_rows = await self.store.query(
+                f"SELECT id, priority, skill, assigned_to, created_at FROM support_tickets "
+                f"WHERE {tenant} AND status IN ('open', 'assigned') ORDER BY created_at, id", params)
+            engine = self._build(agent_rows, ticket_rows)
+            if self.state is not None:
+                tenant_key = user_id or "*"
+                self.state.fill(f"ticket_agents/{tenant_key}", (
+                    (row["agent_id"], {"status": row["status"], "skills": sorted(parse_skills(row["skills"])),
+                                       "max_tickets": row["max_tickets"]}) for row in agent_rows))
+                self.state.fill(f"tickets/{tenant_key}", (
+                    (row["id"], {"priority": row["priority"], "skill": row["skill"],
+                                 "assigned_to": row["assigned_to"], "created_at": _stamp(row["created_at"])})
+                    for row in ticket_rows))
+        # Match whatever was left waiting with agents that have room
+        await self._write_assignments(user_id, engine, engine.fill_all())
+        return engine
+
+    def _restore(self, user_id: Optional[str]) -> Optional[AssignmentEngine]:
+        """The engine as the warm state last saw it, or None without a complete mirror"""
+        if self.state is None:
+            return None
+        tenant_key = user_id or "*"
+        agents = self.state.filled(f"ticket_agents/{tenant_key}")
+        tickets = self.state.filled(f"tickets/{tenant_key}")
+        if agents is None or tickets is None:
+            return None
+        synced = self.state.table("ticket_synced").get(tenant_key)
+        if synced is not None:
+            self._synced[user_id] = datetime.fromisoformat(synced)
+        agent_rows = [{"agent_id": agent_id, **agent} for agent_id, agent in agents.items()]
+        ticket_rows = sorted(({"id": ticket_id, **ticket} for ticket_id, ticket in tickets.items()),
+                             key=lambda row: (row["created_at"] or "", row["id"]))
+        return self._build(agent_rows, ticket_rows)
+
+    async def create(self, items: list[dict], user_id: Optional[str]) -> list[dict]:
+        """Insert tickets in one transaction, each assigned to a free agent or queued"""
+        engine = await self.engine(user_id)
+        now = datetime.now(timezone.utc)
+        tickets = []
+        for item in items:
+            ticket_id = str(uuid7())
+            priority = item.get("priority", "medium")
+            agent_id = engine.submit(ticket_id, priority, item.get("skill"))
+            tickets.append({
+                "ticket_id": ticket_id,
+                "title": item["title"],
+                "description": item["description"],
+                "priority": priority,
+                "skill": item.get("skill"),
+                "status": "assigned" if agent_id else "open",
+                "created_at": now.isoformat(),
+                "assigned_to": agent_id,
+            })
+        try:
+            await self.store.execute_many(
+                "INSERT INTO support_tickets (id, user_id, title, description, priority, skill, status, "
+                "assigned_to, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (t["ticket_id"], user_id, t["title"], t["description"], t["priority"], t["skill"],
+                     t["status"], t["assigned_to"], now, now)
+                    for t in tickets
+                ],
+            )
+        except BaseException:
+            for ticket in tickets:
+                engine.cancel(ticket["ticket_id"])
+            raise
+        journal = self._journal(user_id, "tickets")
+        if journal is not None:
+            for t in tickets:
+                journal.put(t["ticket_id"], {"priority": t["priority"], "skill": t["skill"],
+                                             "assigned_to": t["assigned_to"], "created_at": t["created_at"]})
+        return tickets
+
+    async def update_agents(self, items: list[dict], user_id: Optional[str]) -> list[list[tuple[str, str]]]:
+        """Apply status changes to the engine; returns the assignments each one made"""
+        # The caller has just written these rows; a sync would apply them first
+        engine = await self.engine(user_id, sync=False)
+        made = [engine.set_agent(item["agent_id"], item["status"], item.get("skills"), item.get("max_tickets"))
+                for item in items]
+        self._log_agents(user_id, engine, dict.fromkeys(item["agent_id"] for item in items))
+        await self._write_assignments(user_id, engine, [pair for pairs in made for pair in pairs])
+        return made
+
+    async def resolve(self, ticket_id: str, user_id: Optional[str]) -> list[tuple[str, str]]:
+        """Mark a ticket resolved; returns the assignments its agent's freed capacity made"""
+        engine = await self.engine(user_id)
+        try:
+            assignments = engine.resolve(ticket_id)
+        except KeyError:
+            raise ValueError(f"Unknown or closed ticket: {ticket_id}") from None
+        now = datetime.now(timezone.utc)
+        await self.store.execute(
+            "UPDATE support_tickets SET status = 'resolved', updated_at = ? WHERE id = ?", (now, ticket_id))
+        journal = self._journal(user_id, "tickets")
+        if journal is not None:
+            journal.delete(ticket_id)
+        await self._write_assignments(user_id, engine, assignments)
+        return assignments
+
+    async def _write_assignments(self, user_id: Optional[str], engine: AssignmentEngine,
+                                 assignments: list[tuple[str, str]]):
+        """Write new assignments, and tickets handed back to the queue that are still waiting, in one batch"""
+        changes = [(ticket_id, None) for ticket_id in dict.fromkeys(engine.released)
+                   if ticket_id in engine.tickets and engine.tickets[ticket_id].assigned_to is None]
+        engine.released.clear()
+        changes += assignments
+        if not changes:
+            return
+        now = datetime.now(timezone.utc)
+        await self.store.execute_many(
+            "UPDATE support_tickets SET assigned_to = ?, status = ?, updated_at = ? WHERE id = ?",
+            [(agent_id, "assigned" if agent_id else "open", now, ticket_id) for ticket_id, agent_id in changes])
+        journal = self._journal(user_id, "tickets")
+        if journal is not None:
+            for ticket_id, agent_id in changes:
+                ticket = journal.get(ticket_id)
+                if ticket is not None:
+                    journal.put(ticket_id, {**ticket, "assigned_to": agent_id})
+
+
+_services: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def get_ticket_service(store) -> TicketService:
+    """The ticket service over `store`, one per store"""
+    service = _services.get(store)
+    if service is None:
+        from warm_state import get_warm_state
+
+        service = _services[store] = TicketService(store, get_warm_state())
+    return service
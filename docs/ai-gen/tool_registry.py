@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Tool registry for the Call Center MCP servers
+
+Maps tool names to handlers with a single dict lookup and compiles each tool's
+JSON `inputSchema` into a validator once, at registration time. The tool list
+never changes after startup, so its definitions are built once.
+
+Usage:
+    tools = ToolRegistry()
+
+    @tools.tool("create_ticket", "Create a support ticket", {...})
+    async def create_ticket(arguments: dict):
+        ...
+
+    result = await tools.dispatch("create_ticket", {"title": "..."})
+"""
+
+import asyncio
+import operator
+import time
+from typing import Any, Callable, Optional
+
+from admission import INTERACTIVE
+from server_metrics import payload_bytes
+
+
+class ToolArgumentError(ValueError):
+    """Tool arguments do not match the tool's inputSchema"""
+
+
+Validator = Callable[[Any], Any]
+
+_TYPE_CHECKS = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+}
+
+# keyword -> (comparison, message, applies-to check, measured quantity)
+_BOUNDS = {
+    "minimum": (operator.ge, "must be >=", _TYPE_CHECKS["number"], lambda v: v),
+    "maximum": (operator.le, "must be <=", _TYPE_CHECKS["number"], lambda v: v),
+    "exclusiveMinimum": (operator.gt, "must be >", _TYPE_CHECKS["number"], lambda v: v),
+    "exclusiveMaximum": (operator.lt, "must be <", _TYPE_CHECKS["number"], lambda v: v),
+    "minLength": (operator.ge, "length must be >=", _TYPE_CHECKS["string"], len),
+    "maxLength": (operator.le, "length must be <=", _TYPE_CHECKS["string"], len),
+    "minItems": (operator.ge, "must have at least", _TYPE_CHECKS["array"], len),
+    "maxItems": (operator.le, "must have at most", _TYPE_CHECKS["array"], len),
+}
+
+
+def compile_schema(schema: dict, path: str = "arguments") -> Validator:
+    """Compile a JSON schema subset into a validator closure
+
+    Supports type, properties, required, additionalProperties (bool), default,
+    enum, minimum/maximum, exclusiveMinimum/exclusiveMaximum, minLength/maxLength,
+    items, minItems/maxItems. The returned validator checks a value and returns
+    it with object defaults filled in, raising ToolArgumentError on the first
+    mismatch. Error paths are fixed at compile time so a passing call never
+    formats a string.
+    """
+    checks: list[Validator] = []
+
+    schema_type = schema.get("type")
+    if schema_type is not None:
+        types = schema_type if isinstance(schema_type, list) else [schema_type]
+        type_checks = tuple(_TYPE_CHECKS[t] for t in types)
+        type_error = f"{path} must be {' or '.join(types)}"
+
+        if len(type_checks) == 1:
+            only_type = type_checks[0]
+
+            def check_type(value):
+                if not only_type(value):
+                    raise ToolArgumentError(type_error)
+                return value
+        else:
+            def check_type(value):
+                for check in type_checks:
+                    if check(value):
+                        return value
+                raise ToolArgumentError(type_error)
+        checks.append(check_type)
+
+    if "enum" in schema:
+        allowed = list(schema["enum"])
+        enum_error = f"{path} must be one of {allowed}"
+
+        def check_enum(value):
+            if value not in allowed:
+                raise ToolArgumentError(enum_error)
+            return value
+        checks.append(check_enum)
+
+    for key, (op, message, applies, measure) in _BOUNDS.items():
+        if key in schema:
+            checks.append(_bound_check(schema[key], op, f"{path} {message} {schema[key]}", applies, measure))
+
+    if "items" in schema:
+        item_validator = compile_schema(schema["items"], f"{path}[]")
+
+        def check_items(value):
+            if isinstance(value, list):
+                return [item_validator(item) for item in value]
+            return value
+        checks.append(check_items)
+
+    if "properties" in schema or "required" in schema:
+        declared = schema.get("properties", {})
+        properties = {name: compile_schema(sub, f"{path}.{name}") for name, sub in declared.items()}
+        defaults = {name: sub["default"] for name, sub in declared.items() if "default" in sub}
+        required = tuple((name, f"{path}.{name} is required") for name in schema.get("required", ()))
+        closed = schema.get("additionalProperties") is False
+
+        def check_object(value):
+            if not isinstance(value, dict):
+                return value
+            for name, missing_error in required:
+                if name not in value:
+                    raise ToolArgumentError(missing_error)
+            result = defaults.copy()
+            for name, item in value.items():
+                validator = properties.get(name)
+                if validator is not None:
+                    item = validator(item)
+                elif closed:
+                    raise ToolArgumentError(f"{path}.{name} is not allowed")
+                result[name] = item
+            return result
+        checks.append(check_object)
+
+    if not checks:
+        return lambda value: value
+    if len(checks) == 1:
+        return checks[0]
+
+    def validate(value):
+        for check in checks:
+            value = check(value)
+        return value
+    return validate
+
+
+def _bound_check(bound, op, error, applies, measure):
+    def check(value):
+        if applies(value) and not op(measure(value), bound):
+            raise ToolArgumentError(error)
+        return value
+    return check
+
+
+class RegisteredTool:
+    """A tool definition with its handler and compiled validator"""
+
+    __slots__ = ("name", "description", "input_schema", "handler", "validate", "blocking", "priority", "series")
+
+    def __init__(self, name: str, description: str, input_schema: dict,
+                 handler: Callable[[dict], Any], blocking: bool = False, priority: Optional[str] = INTERACTIVE):
+        self.name = name
+        self.description = description
+        self.input_schema = input_schema
+        self.handler = handler
+        self.validate = compile_schema(input_schema)
+        self.blocking = blocking
+        self.priority = priority
+        self.series = None
+
+    def definition(self) -> dict:
+        return {"name": self.name, "description": self.description, "inputSchema": self.input_schema}
+
+
+class ToolRegistry:
+    """Name -> handler table with a cached tool listing
+
+    With `metrics` (a server_metrics.ServerMetrics), dispatch() counts each
+    call and error in the tool's series and records latency and response
+    size for the calls the series samples. With `admission` (an
+    admission.AdmissionController), a call with valid arguments waits for a
+    slot of its tool's priority class, or fails with OverloadedError.
+    """
+
+    def __init__(self, metrics=None, admission=None):
+        self.metrics = metrics
+        self.admission = admission
+        self._tools: dict[str, RegisteredTool] = {}
+        self._definitions: Optional[list[dict]] = None
+
+    def register(self, name: str, description: str, input_schema: dict,
+                 handler: Callable[[dict], Any], blocking: bool = False,
+                 priority: Optional[str] = INTERACTIVE) -> RegisteredTool:
+        """Register a handler, compiling its input schema
+
+        Handlers are coroutine functions, or plain functions with blocking=True,
+        which dispatch() runs on the event loop's default thread pool.
+        `priority` is the tool's admission class; None exempts tools that
+        mostly wait rather than work.
+        """
+        if name in self._tools:
+            raise ValueError(f"Tool already registered: {name}")
+        if self.admission is not None and priority is not None and priority not in self.admission.classes():
+            raise ValueError(f"Unknown priority class for {name}: {priority}")
+        registered = RegisteredTool(name, description, input_schema, handler, blocking, priority)
+        if self.metrics is not None:
+            registered.series = self.metrics.series_for("tool", name)
+        self._tools[name] = registered
+        self._definitions = None
+        return registered
+
+    def tool(self, name: str, description: str, input_schema: Optional[dict] = None, blocking: bool = False,
+             priority: Optional[str] = INTERACTIVE):
+        """Decorator form of register()"""
+        schema = input_schema or {"type": "object", "properties": {}, "required": []}
+
+        def decorator(handler):
+            self.register(name, description, schema, handler, blocking, priority)
+            return handler
+        return decorator
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def __len__(self) -> int:
+        return len(self._tools)
+
+    def get(self, name: str) -> Optional[RegisteredTool]:
+        return self._tools.get(name)
+
+    def definitions(self) -> list[dict]:
+        """Tool definitions in list_tools order, built once"""
+        if self._definitions is None:
+            self._definitions = [tool.definition() for tool in self._tools.values()]
+        return self._definitions
+
+    async def dispatch(self, name: str, arguments: Optional[dict]) -> Any:
+        """Validate arguments and run the named tool's handler"""
+        tool = self._tools.get(name)
+        if tool is None:
+            raise ValueError(f"Unknown tool: {name}")
+        series = tool.series
+        if series is None:
+            return await self._call(tool, arguments)
+
+        # Series.sample(), inlined: most calls only bump the counter
+        series.calls = calls = series.calls + 1
+        if calls & series.sample_mask and calls > series.EXACT_CALLS:
+            try:
+                return await self._call(tool, arguments)
+            except BaseException as e:
+                series.record_error(e)
+                raise
+
+        started = time.perf_counter_ns()
+        try:
+            result = await self._call(tool, arguments)
+        except BaseException as e:
+            series.record_error(e, time.perf_counter_ns() - started)
+            raise
+        series.record(time.perf_counter_ns() - started, payload_bytes(result))
+        return result
+
+    async def _call(self, tool: RegisteredTool, arguments: Optional[dict]) -> Any:
+        arguments = tool.validate(arguments or {})
+        admission = self.admission
+        if admission is None or tool.priority is None:
+            if tool.blocking:
+                return await asyncio.get_running_loop().run_in_executor(None, tool.handler, arguments)
+            return await tool.handler(arguments)
+        token = await admission.acquire(tool.priority, tool.name)
+        try:
+            if tool.blocking:
+                return await asyncio.get_running_loop().run_in_executor(None, tool.handler, arguments)
+            return await tool.handler(arguments)
+        finally:
+            admission.release(token)
@@ -0,0 +1,744 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped transcript archive with an inverted index
+
+Transcripts are appended to an in-memory buffer as calls arrive and flushed
+every `flush_docs` calls into an immutable segment file: the transcript
+texts, call ids, tenants and start times, plus a sorted term dictionary with
+one posting list (sorted local doc numbers) per term. Segments are published
+by fsync and rename and opened with mmap, so posting lists are read in place
+as NumPy views and a query only touches the pages of the terms it names and
+the transcripts it returns. Whenever `merge_factor` segments of the same size
+tier pile up they are merged into one, keeping the segment count logarithmic.
+
+Keyword queries intersect posting lists, rarest term first. Quoted phrases
+are intersected by their terms and then checked against the candidate
+transcripts, newest first, until `limit` matches are found.
+
+Several server processes can share a directory: segment writes, merges and
+the startup sync hold an exclusive lock on it (`archive.lock`), and each
+flush first picks up the segments and watermarks the others published.
+Inside the event loop the lock is only ever tried, never waited on: the
+sync polls for it under an asyncio.Lock, and a flush triggered by `add`
+while the lock is busy leaves the buffer to the next call.
+
+The database stays the source of truth: `sync_from_store` indexes rows that
+started at or after the archive's watermark for that table, skipping the
+calls already indexed at the watermark itself, so calls lost from the
+unflushed buffer in a crash are picked up on the next start. The same call
+can still be indexed twice (live ingest plus a sync that started before the
+flush); search results are deduplicated by call_id. An archive records which
+database it indexes and refuses to open for another one; by default each
+database URL gets its own directory under `transcript_archive/`.
+
+Usage:
+    python transcript_archive.py --archive ./transcript_archive            # sync from CALL_CENTER_DB_URL
+    python transcript_archive.py --archive ./transcript_archive --query '"reschedule my appointment"'
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import mmap
+import os
+import re
+import string
+import struct
+import sys
+import time
+from array import array
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timezone
+from itertools import repeat
+from typing import Optional
+
+import numpy as np
+
+from call_log_store import CALL_LOG_TABLES, DEFAULT_DB_PATH, database_url, get_call_log_store
+
+
+SEGMENT_MAGIC = b"TRSEG001"
+SEGMENT_SUFFIX = ".tseg"
+STATE_FILE = "archive.json"
+LOCK_FILE = "archive.lock"
+DEFAULT_ARCHIVE_DIR = os.path.join(os.path.dirname(DEFAULT_DB_PATH), "transcript_archive")
+
+# Section order in a segment file; blobs are UTF-8, the rest NumPy arrays
+SECTIONS = {
+    "texts": None,
+    "text_ends": np.dtype("<u8"),
+    "call_ids": None,
+    "call_id_ends": np.dtype("<u8"),
+    "start_ms": np.dtype("<i8"),
+    "tenants": None,
+    "tenant_codes": np.dtype("<u4"),
+    "terms": None,
+    "term_ends": np.dtype("<u8"),
+    "posting_ends": np.dtype("<u8"),
+    "postings": np.dtype("<u4"),
+}
+_HEADER = struct.Struct("<8sII")
+_SECTION_TABLE = struct.Struct("<" + "QQ" * len(SECTIONS))
+
+# Terms are lowercased words split on whitespace and punctuation; apostrophes
+# are dropped so "I'd" and "id" match. str.translate + split is several times
+# faster than a regex tokenizer, which dominates indexing time.
+_APOSTROPHES = "'\u2019"
+_SPLIT = str.maketrans({c: " " for c in string.punctuation + "\u201c\u201d\u2013\u2014\u2026" if c != "'"})
+_TERMS = str.maketrans({**_SPLIT, **{c: None for c in _APOSTROPHES}})
+_WORD = re.compile(r"\S+")
+_PHRASE = re.compile(r'"([^"]*)"')
+
+
+def database_key(url: str) -> str:
+    """Short digest of a database URL, so passwords never land on disk"""
+    return hashlib.sha256(url.encode()).hexdigest()[:16]
+
+
+def archive_dir(url: Optional[str] = None) -> str:
+    """CALL_CENTER_TRANSCRIPT_DIR, else a directory of its own for the database at `url`"""
+    return os.environ.get("CALL_CENTER_TRANSCRIPT_DIR") or os.path.join(
+        DEFAULT_ARCHIVE_DIR, database_key(database_url(url)))
+
+
+_OUTSIDE_LOOP = object()
+
+
+def _current_task() -> Optional[asyncio.Task]:
+    try:
+        return asyncio.current_task()
+    except RuntimeError:
+        return None
+
+
+def tokenize(text: str) -> list[str]:
+    return text.lower().translate(_TERMS).split()
+
+
+def parse_query(query: str) -> tuple[list[str], list[list[str]]]:
+    """Split a query into required terms and quoted phrases (as token lists)"""
+    phrases = [tokens for tokens in map(tokenize, _PHRASE.findall(query)) if tokens]
+    terms = tokenize(_PHRASE.sub(" ", query))
+    for phrase in phrases:
+        terms.extend(phrase)
+    return list(dict.fromkeys(terms)), [p for p in phrases if len(p) > 1]
+
+
+def _intersect(lists: list) -> np.ndarray:
+    """Intersect sorted posting lists, starting from the shortest"""
+    lists = sorted(lists, key=len)
+    result = lists[0]
+    for other in lists[1:]:
+        if not len(result):
+            break
+        positions = np.minimum(np.searchsorted(other, result), len(other) - 1)
+        result = result[other[positions] == result]
+    return result
+
+
+def _cumulative(lengths) -> np.ndarray:
+    return np.cumsum(np.fromiter(lengths, dtype=np.uint64), dtype=np.uint64)
+
+
+def write_segment(path: str, docs: int, terms: int, sections: dict):
+    """Write the sections in SECTIONS order, then publish the file by rename"""
+    with open(path + ".tmp", "wb") as f:
+        f.write(b"\0" * (_HEADER.size + _SECTION_TABLE.size))
+        table = []
+        for name, dtype in SECTIONS.items():
+            data = sections[name]
+            data = memoryview(data if dtype is None else np.ascontiguousarray(data, dtype=dtype))
+            f.write(b"\0" * (-f.tell() % 8))
+            table += [f.tell(), data.nbytes]
+            f.write(data)
+        f.seek(0)
+        f.write(_HEADER.pack(SEGMENT_MAGIC, docs, terms) + _SECTION_TABLE.pack(*table))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+class Segment:
+    """Read-only view of one memory-mapped segment file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        name = os.path.basename(path)[:-len(SEGMENT_SUFFIX)]
+        self.first, self.last = (int(part) for part in name.split("-"))
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.docs, self.terms = _HEADER.unpack_from(self._mm, 0)
+        if magic != SEGMENT_MAGIC:
+            raise ValueError(f"Not a transcript segment: {path}")
+        table = _SECTION_TABLE.unpack_from(self._mm, _HEADER.size)
+        self._sections = {name: table[2 * i:2 * i + 2] for i, name in enumerate(SECTIONS)}
+        self.text_ends = self._array("text_ends")
+        self.call_id_ends = self._array("call_id_ends")
+        self.start_ms = self._array("start_ms")
+        self.tenant_codes = self._array("tenant_codes")
+        self.term_ends = self._array("term_ends")
+        self.posting_ends = self._array("posting_ends")
+        self.postings_data = self._array("postings")
+        tenants = self._blob("tenants", 0, self._sections["tenants"][1]).decode()
+        self.tenants = tenants.split("\n")
+
+    def _array(self, name: str) -> np.ndarray:
+        offset, length = self._sections[name]
+        dtype = SECTIONS[name]
+        return np.frombuffer(self._mm, dtype=dtype, count=length // dtype.itemsize, offset=offset)
+
+    def _blob(self, name: str, start: int, end: int) -> bytes:
+        offset = self._sections[name][0]
+        return self._mm[offset + start:offset + end]
+
+    def _span(self, ends: np.ndarray, i: int) -> tuple[int, int]:
+        return (int(ends[i - 1]) if i else 0), int(ends[i])
+
+    def term(self, i: int) -> bytes:
+        return self._blob("terms", *self._span(self.term_ends, i))
+
+    def _find(self, term: bytes) -> int:
+        lo, hi = 0, self.terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.term(mid) < term:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self.terms and self.term(lo) == term else -1
+
+    def postings(self, term: str) -> np.ndarray:
+        i = self._find(term.encode())
+        if i < 0:
+            return self.postings_data[:0]
+        return self.postings_data[slice(*self._span(self.posting_ends, i))]
+
+    def text(self, i: int) -> str:
+        return self._blob("texts", *self._span(self.text_ends, i)).decode()
+
+    def call_id(self, i: int) -> str:
+        return self._blob("call_ids", *self._span(self.call_id_ends, i)).decode()
+
+    def user_id(self, i: int) -> Optional[str]:
+        return self.tenants[self.tenant_codes[i]] or None
+
+    def start(self, i: int) -> int:
+        return int(self.start_ms[i])
+
+    def tenant_mask(self, docs: np.ndarray, user_id: str) -> np.ndarray:
+        if user_id not in self.tenants:
+            return np.zeros(len(docs), dtype=bool)
+        return self.tenant_codes[docs] == self.tenants.index(user_id)
+
+    def nbytes(self) -> int:
+        return len(self._mm)
+
+    def close(self):
+        # Drop the array views first; mmap refuses to close while they export its buffer
+        self.text_ends = self.call_id_ends = self.start_ms = self.tenant_codes = None
+        self.term_ends = self.posting_ends = self.postings_data = None
+        self._mm.close()
+
+
+class MemorySegment:
+    """The unflushed tail of the archive, searchable with the same interface as Segment
+
+    Postings are kept as flat (term id, doc) pairs and grouped by term with
+    one stable sort at flush time.
+    """
+
+    def __init__(self):
+        self.call_ids: list = []
+        self.user_ids: list = []
+        self.starts: list = []
+        self.texts: list = []
+        self.vocabulary: dict = {}
+        self.term_ids = array("I")
+        self.doc_ids = array("I")
+
+    @property
+    def docs(self) -> int:
+        return len(self.texts)
+
+    def add(self, call_id: str, user_id: Optional[str], start_ms: int, text: str):
+        doc = len(self.texts)
+        self.call_ids.append(call_id)
+        self.user_ids.append(user_id or "")
+        self.starts.append(start_ms)
+        self.texts.append(text)
+        terms = set(tokenize(text))
+        vocabulary = self.vocabulary
+        # set.difference(dict) probes the dict, so this is O(len(terms))
+        for term in terms.difference(vocabulary):
+            vocabulary[term] = len(vocabulary)
+        self.term_ids.extend(map(vocabulary.__getitem__, terms))
+        self.doc_ids.extend(repeat(doc, len(terms)))
+
+    def postings(self, term: str) -> np.ndarray:
+        term_id = self.vocabulary.get(term)
+        if term_id is None:
+            return np.zeros(0, dtype=np.uint32)
+        term_ids = np.frombuffer(self.term_ids, dtype=np.uint32)
+        return np.frombuffer(self.doc_ids, dtype=np.uint32)[term_ids == term_id]
+
+    def text(self, i: int) -> str:
+        return self.texts[i]
+
+    def call_id(self, i: int) -> str:
+        return self.call_ids[i]
+
+    def user_id(self, i: int) -> Optional[str]:
+        return self.user_ids[i] or None
+
+    def start(self, i: int) -> int:
+        return self.starts[i]
+
+    def tenant_mask(self, docs: np.ndarray, user_id: str) -> np.ndarray:
+        return np.fromiter((self.user_ids[d] == user_id for d in docs), dtype=bool, count=len(docs))
+
+    def sections(self) -> dict:
+        tenants = list(dict.fromkeys(self.user_ids))
+        codes = {tenant: i for i, tenant in enumerate(tenants)}
+        texts = [t.encode() for t in self.texts]
+        call_ids = [c.encode() for c in self.call_ids]
+        terms = sorted((term.encode(), term_id) for term, term_id in self.vocabulary.items())
+        # Rank term ids by their byte order, then group pairs by rank keeping doc order
+        rank = np.empty(len(terms), dtype=np.uint32)
+        rank[[term_id for _, term_id in terms]] = np.arange(len(terms), dtype=np.uint32)
+        ranks = rank[np.frombuffer(self.term_ids, dtype=np.uint32)]
+        order = np.argsort(ranks, kind="stable")
+        return {
+            "texts": b"".join(texts),
+            "text_ends": _cumulative(map(len, texts)),
+            "call_ids": b"".join(call_ids),
+            "call_id_ends": _cumulative(map(len, call_ids)),
+            "start_ms": np.array(self.starts, dtype=np.int64),
+            "tenants": "\n".join(tenants).encode(),
+            "tenant_codes": np.fromiter((codes[u] for u in self.user_ids), dtype=np.uint32, count=self.docs),
+            "terms": b"".join(term for term, _ in terms),
+            "term_ends": _cumulative(len(term) for term, _ in terms),
+            "posting_ends": np.cumsum(np.bincount(ranks, minlength=len(terms)), dtype=np.uint64),
+            "postings": np.frombuffer(self.doc_ids, dtype=np.uint32)[order],
+        }
+
+
+def merge_sections(segments: list) -> dict:
+    """Sections of one segment holding `segments` in order"""
+    tenants: dict = {}
+    codes, postings = [], {}
+    base = 0
+    for segment in segments:
+        remap = np.array([tenants.setdefault(t, len(tenants)) for t in segment.tenants], dtype=np.uint32)
+        codes.append(remap[segment.tenant_codes])
+        for i in range(segment.terms):
+            start, end = segment._span(segment.posting_ends, i)
+            postings.setdefault(segment.term(i), []).append(segment.postings_data[start:end] + np.uint32(base))
+        base += segment.docs
+    terms = sorted(postings)
+    lists = [np.concatenate(postings[term]) for term in terms]
+
+    def blob(name):
+        return b"".join(s._blob(name, 0, s._sections[name][1]) for s in segments)
+
+    def ends(name, blob_name):
+        offsets = np.cumsum([0] + [s._sections[blob_name][1] for s in segments[:-1]], dtype=np.uint64)
+        return np.concatenate([getattr(s, name) + offset for s, offset in zip(segments, offsets)])
+
+    return {
+        "texts": blob("texts"),
+        "text_ends": ends("text_ends", "texts"),
+        "call_ids": blob("call_ids"),
+        "call_id_ends": ends("call_id_ends", "call_ids"),
+        "start_ms": np.concatenate([s.start_ms for s in segments]),
+        "tenants": "\n".join(tenants).encode(),
+        "tenant_codes": np.concatenate(codes),
+        "terms": b"".join(terms),
+        "term_ends": _cumulative(map(len, terms)),
+        "posting_ends": _cumulative(map(len, lists)),
+        "postings": np.concatenate(lists) if lists else np.zeros(0, dtype=np.uint32),
+    }
+
+
+class TranscriptArchive:
+    """Append-only transcript store searchable by keyword and phrase"""
+
+    def __init__(self, directory: str, flush_docs: int = 20_000, merge_factor: int = 8,
+                 database: Optional[str] = None):
+        self.directory = directory
+        self.flush_docs = flush_docs
+        self.merge_factor = merge_factor
+        os.makedirs(directory, exist_ok=True)
+        self.segments: list = []
+        self.buffer = MemorySegment()
+        # source -> start time (epoch ms) of its newest flushed call, and the call ids flushed at it
+        self.watermarks: dict = {}
+        self.boundaries: dict = {}
+        self.database: Optional[str] = None
+        self._pending: dict = {}
+        self._pending_ids: dict = {}
+        self._lock_file = None
+        self._holder = None  # asyncio task (or _OUTSIDE_LOOP) holding the directory lock
+        self._guard = asyncio.Lock()
+        with self.locked():
+            self.reload()
+        if database is not None:
+            key = database_key(database)
+            if self.database not in (None, key):
+                raise ValueError(f"Transcript archive {directory} indexes a different database; "
+                                 "point CALL_CENTER_TRANSCRIPT_DIR at a directory for this one")
+            self.database = key
+
+    def _try_lock(self, wait: bool = False) -> bool:
+        lock_file = open(os.path.join(self.directory, LOCK_FILE), "a+b")
+        try:
+            if os.name == "nt":
+                import msvcrt
+
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK if wait else msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+
+                fcntl.flock(lock_file, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            if wait:
+                raise
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _unlock(self):
+        if os.name == "nt":
+            import msvcrt
+
+            self._lock_file.seek(0)
+            msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._lock_file.close()
+        self._lock_file = None
+
+    def _holds_lock(self) -> bool:
+        return self._holder is not None and self._holder is (_current_task() or _OUTSIDE_LOOP)
+
+    @contextmanager
+    def locked(self):
+        """Hold the directory's lock, waiting for other processes (reentrant)
+
+        Blocks, so only for use outside the event loop or in a worker thread;
+        tasks take the lock with `alocked()`.
+        """
+        if self._holds_lock():
+            yield
+            return
+        if self._holder is not None:
+            raise RuntimeError("Transcript archive lock is held by another task; use alocked()")
+        self._try_lock(wait=True)
+        self._holder = _current_task() or _OUTSIDE_LOOP
+        try:
+            yield
+        finally:
+            self._holder = None
+            self._unlock()
+
+    @asynccontextmanager
+    async def alocked(self, poll: float = 0.2):
+        """Hold the directory's lock from a task without blocking the event loop"""
+        async with self._guard:
+            delay = 0.005
+            while not self._try_lock():
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, poll)
+            self._holder = asyncio.current_task()
+            try:
+                yield
+            finally:
+                self._holder = None
+                self._unlock()
+
+    def reload(self):
+        """Pick up segments and watermarks other processes published (call while locked)"""
+        on_disk = {name for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX)}
+        current = {os.path.basename(segment.path): segment for segment in self.segments}
+        for name, segment in current.items():
+            if name not in on_disk:
+                segment.close()
+        segments = [current.get(name) or Segment(os.path.join(self.directory, name)) for name in on_disk]
+        # A crash after publishing a merge leaves its inputs behind; drop them
+        kept = []
+        for segment in sorted(segments, key=lambda s: (s.first, -s.last)):
+            if kept and segment.last <= kept[-1].last:
+                segment.close()
+                os.remove(segment.path)
+            else:
+                kept.append(segment)
+        self.segments = kept
+        state_path = os.path.join(self.directory, STATE_FILE)
+        if os.path.exists(state_path):
+            with open(state_path) as f:
+                state = json.load(f)
+            self.database = state.get("database", self.database)
+            boundaries = state.get("boundaries", {})
+            for source, start_ms in state.get("watermarks", {}).items():
+                self._advance(self.watermarks, self.boundaries, source, start_ms, boundaries.get(source, ()))
+
+    def __len__(self) -> int:
+        return sum(s.docs for s in self.segments) + self.buffer.docs
+
+    def nbytes(self) -> int:
+        return sum(s.nbytes() for s in self.segments)
+
+    def add(self, call_id: str, user_id: Optional[str], start_ms: int, transcript: Optional[str],
+            source: str = "customer_call_logs") -> bool:
+        """Index one call's transcript; returns False for an empty transcript"""
+        if not transcript:
+            return False
+        self.buffer.add(call_id, user_id, start_ms, transcript)
+        self._advance(self._pending, self._pending_ids, source, start_ms, (call_id,))
+        if self.buffer.docs >= self.flush_docs:
+            self._flush_if_free()
+        return True
+
+    def watermark(self, source: str) -> Optional[int]:
+        """Start time (epoch ms) of the newest flushed call from `source`"""
+        return self.watermarks.get(source)
+
+    def indexed_at_watermark(self, source: str) -> set:
+        """Call ids from `source` flushed with exactly the watermark's start time"""
+        return self.boundaries.get(source, set())
+
+    @staticmethod
+    def _advance(marks: dict, ids: dict, source: str, start_ms: int, call_ids):
+        if source not in marks or start_ms > marks[source]:
+            marks[source] = start_ms
+            ids[source] = set(call_ids)
+        elif start_ms == marks[source]:
+            ids[source].update(call_ids)
+
+    def flush(self):
+        """Write the buffer as a new segment and advance the watermarks
+
+        Waits for the lock unless the caller already holds it, as
+        `sync_from_store` does.
+        """
+        with self.locked():
+            self.reload()
+            self._flush()
+
+    def _flush_if_free(self):
+        """Flush now if the lock is free or ours; otherwise the buffer waits for the next add"""
+        if self._holds_lock():
+            self.reload()
+            self._flush()
+        elif self._holder is None and self._try_lock():
+            self._holder = _current_task() or _OUTSIDE_LOOP
+            try:
+                self.reload()
+                self._flush()
+            finally:
+                self._holder = None
+                self._unlock()
+
+    def _flush(self):
+        if self.buffer.docs:
+            number = self.segments[-1].last + 1 if self.segments else 1
+            path = os.path.join(self.directory, f"{number:08d}-{number:08d}{SEGMENT_SUFFIX}")
+            write_segment(path, self.buffer.docs, len(self.buffer.vocabulary), self.buffer.sections())
+            self.segments.append(Segment(path))
+            self.buffer = MemorySegment()
+            self._maybe_merge()
+        for source, start_ms in self._pending.items():
+            self._advance(self.watermarks, self.boundaries, source, start_ms, self._pending_ids[source])
+        self._pending, self._pending_ids = {}, {}
+        state_path = os.path.join(self.directory, STATE_FILE)
+        with open(state_path + ".tmp", "w") as f:
+            json.dump({
+                "database": self.database,
+                "watermarks": self.watermarks,
+                "boundaries": {source: sorted(ids) for source, ids in self.boundaries.items()},
+            }, f)
+        os.replace(state_path + ".tmp", state_path)
+
+    def _tier(self, segment: Segment) -> int:
+        return max(0, int(math.log(max(segment.docs, 1) / self.flush_docs, self.merge_factor) + 1e-9))
+
+    def _maybe_merge(self):
+        while len(self.segments) >= self.merge_factor:
+            run = self.segments[-self.merge_factor:]
+            if len({self._tier(s) for s in run}) != 1:
+                return
+            path = os.path.join(self.directory, f"{run[0].first:08d}-{run[-1].last:08d}{SEGMENT_SUFFIX}")
+            sections = merge_sections(run)
+            write_segment(path, sum(s.docs for s in run), len(sections["term_ends"]), sections)
+            self.segments[-self.merge_factor:] = [Segment(path)]
+            for segment in run:
+                segment.close()
+                os.remove(segment.path)
+
+    def search(self, query: str, limit: int = 20, user_id: Optional[str] = None) -> dict:
+        """Newest calls whose transcript has every term and quoted phrase in `query`
+
+        `candidates` counts indexed transcripts containing every term; with
+        phrases, only the transcripts needed to fill `limit` are verified.
+        """
+        terms, phrases = parse_query(query)
+        if not terms:
+            raise ValueError("Query has no searchable terms")
+        candidates = 0
+        matches: list = []
+        seen: set = set()
+        for part in [self.buffer, *reversed(self.segments)]:
+            lists = [part.postings(term) for term in terms]
+            if any(not len(postings) for postings in lists):
+                continue
+            docs = _intersect(lists)
+            if user_id is not None:
+                docs = docs[part.tenant_mask(docs, user_id)]
+            candidates += len(docs)
+            for doc in docs[::-1]:
+                if len(matches) >= limit:
+                    break
+                doc = int(doc)
+                call_id = part.call_id(doc)
+                if call_id in seen:
+                    continue
+                snippet = _snippet(part.text(doc), terms, phrases)
+                if snippet is None:
+                    continue
+                seen.add(call_id)
+                matches.append({
+                    "call_id": call_id,
+                    "user_id": part.user_id(doc),
+                    "start_timestamp": datetime.fromtimestamp(part.start(doc) / 1000, timezone.utc).isoformat(),
+                    "snippet": snippet,
+                })
+        return {"query": query, "candidates": candidates, "matches": matches}
+
+    def close(self):
+        self.flush()
+        for segment in self.segments:
+            segment.close()
+        self.segments = []
+
+
+def _snippet(text: str, terms: list, phrases: list, width: int = 160) -> Optional[str]:
+    """Text around the first phrase (or term) match; None if a phrase does not occur"""
+    spans = [
+        (token, m.start()) for m in _WORD.finditer(text.lower().translate(_SPLIT))
+        if (token := m.group().translate(_TERMS))
+    ]
+    tokens = [token for token, _ in spans]
+    at = None
+    for phrase in phrases:
+        n = len(phrase)
+        found = next((i for i in range(len(tokens) - n + 1) if tokens[i:i + n] == phrase), None)
+        if found is None:
+            return None
+        at = spans[found][1] if at is None else min(at, spans[found][1])
+    if at is None:
+        wanted = set(terms)
+        at = next((start for token, start in spans if token in wanted), 0)
+    start = max(0, at - width // 3)
+    if start:
+        # Begin on a word boundary
+        space = text.find(" ", start, at)
+        start = space + 1 if space >= 0 else start
+    body = " ".join(text[start:start + width].split())
+    return ("…" if start else "") + body + ("…" if start + width < len(text) else "")
+
+
+async def sync_from_store(archive: TranscriptArchive, store, source: str = "customer_call_logs",
+                          chunk_size: int = 2000) -> int:
+    """Index transcripts that started at or after the archive's watermark for `source`
+
+    Rows at the watermark itself whose call id is already indexed are skipped,
+    so a sync with nothing new writes no segment.
+    """
+    table = CALL_LOG_TABLES[source]
+    tenant = "user_id" if "user_id" in table.columns else "client_id"
+    start = table.start_column
+    select = (
+        f"SELECT id, call_id, {tenant} AS user_id, {start} AS start_timestamp, transcript "
+        f"FROM {table.name} WHERE transcript IS NOT NULL AND "
+    )
+    order = f" ORDER BY {start}, id LIMIT {int(chunk_size)}"
+    async with archive.alocked():
+        # Another process may have indexed these rows while this one waited for the lock
+        archive.reload()
+        watermark = archive.watermark(source)
+        done = set(archive.indexed_at_watermark(source))
+        if watermark is None:
+            rows = await store.query(select + f"{start} IS NOT NULL" + order)
+        else:
+            since = datetime.fromtimestamp(watermark / 1000, timezone.utc)
+            rows = await store.query(select + f"{start} >= ?" + order, (since,))
+
+        indexed = 0
+        while rows:
+            for row in rows:
+                start_ms = int(datetime.fromisoformat(row["start_timestamp"]).timestamp() * 1000)
+                if start_ms == watermark and row["call_id"] in done:
+                    continue
+                indexed += archive.add(row["call_id"], row["user_id"], start_ms, row["transcript"], source)
+            if len(rows) < chunk_size:
+                break
+            last = rows[-1]
+            rows = await store.query(
+                select + f"({start}, id) > (?, ?)" + order,
+                (datetime.fromisoformat(last["start_timestamp"]), last["id"]))
+        archive.flush()
+        return indexed
+
+
+_archive: Optional[TranscriptArchive] = None
+_archive_lock = asyncio.Lock()
+
+
+async def get_transcript_archive() -> TranscriptArchive:
+    """Return the process-wide archive (CALL_CENTER_TRANSCRIPT_DIR), synced with the call log store"""
+    global _archive
+    async with _archive_lock:
+        if _archive is None:
+            # Opening waits for the directory lock; keep that off the event loop
+            archive = await asyncio.to_thread(TranscriptArchive, archive_dir(), database=database_url())
+            started = time.perf_counter()
+            indexed = await sync_from_store(archive, await get_call_log_store())
+            print(f"Transcript archive ready: {len(archive)} transcripts ({indexed} new) "
+                  f"in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+            _archive = archive
+    return _archive
+
+
+async def main():
+    from call_log_store import open_call_log_store
+
+    parser = argparse.ArgumentParser(description="Build or query the transcript archive")
+    parser.add_argument("--archive", help="Archive directory (default: CALL_CENTER_TRANSCRIPT_DIR, "
+                        "else one per database under transcript_archive/)")
+    parser.add_argument("--db-url", help="Database URL (default: CALL_CENTER_DB_URL)")
+    parser.add_argument("--source", choices=sorted(CALL_LOG_TABLES), default="customer_call_logs")
+    parser.add_argument("--query", help="Search instead of syncing")
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    archive = TranscriptArchive(args.archive or archive_dir(args.db_url), database=database_url(args.db_url))
+    try:
+        if args.query:
+            print(json.dumps(archive.search(args.query, args.limit), indent=2))
+            return
+        store = await open_call_log_store(args.db_url)
+        started = time.perf_counter()
+        try:
+            indexed = await sync_from_store(archive, store, args.source)
+        finally:
+            await store.close()
+        print(f"Indexed {indexed} transcripts in {time.perf_counter() - started:.2f}s; "
+              f"{len(archive)} in {len(archive.segments)} segments ({archive.nbytes() / 1e6:.1f} MB)",
+              file=sys.stderr)
+    finally:
+        archive.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
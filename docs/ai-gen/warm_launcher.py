@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Warm process pool for the stdio Call Center MCP servers
+
+A stdio client starts a new server process per session, and most of that
+process's startup is importing `mcp` (which pulls in pydantic, httpx,
+starlette and uvicorn) before it can answer `initialize`. The pool imports a
+server once, then keeps a few forked copies waiting on a Unix socket.
+
+The launcher is what the client spawns instead of the server. It imports
+only the standard library modules it needs, connects to the pool, and hands
+over its stdin, stdout and stderr (SCM_RIGHTS), argv, environment and
+working directory. A waiting worker dup2()s those descriptors over its own,
+runs the server's main() on them and reports its exit status back, so
+nothing is relayed. The pool forks a replacement as soon as a worker is
+taken.
+
+With no pool listening, or on platforms without fork and descriptor
+passing (Windows), the launcher runs the server itself, exactly as
+`python <server>` would.
+
+Usage:
+    python warm_launcher.py --serve working_mcp_server.py --spares 4   # start the pool
+    python warm_launcher.py working_mcp_server.py                     # one stdio session
+
+The socket is CALL_CENTER_WARM_SOCKET, or <server>.sock in a private (0700)
+directory call-center-<uid> in XDG_RUNTIME_DIR (default: TMPDIR or /tmp). The
+pool creates the socket readable by its user only. The launcher sends its
+environment (API keys, database URLs) and its stdio, so it only connects to
+a socket that its own user owns, with no group or other access, in a
+directory likewise private (default path), and where the kernel reports
+the peer (SO_PEERCRED) it checks that the pool runs as the same user. The
+pool refuses launchers of other users the same way.
+"""
+
+import os
+import stat
+import sys
+
+
+HEADER_BYTES = 4
+MAX_REQUEST_BYTES = 1 << 20
+
+
+def runtime_dir() -> str:
+    """The current user's private directory for pool sockets"""
+    base = os.environ.get("XDG_RUNTIME_DIR") or os.environ.get("TMPDIR") or "/tmp"
+    return os.path.join(base, f"call-center-{os.getuid()}")
+
+
+def socket_path(server_path: str) -> str:
+    """Where the pool for `server_path` listens"""
+    configured = os.environ.get("CALL_CENTER_WARM_SOCKET")
+    if configured:
+        return configured
+    name = os.path.splitext(os.path.basename(server_path))[0]
+    return os.path.join(runtime_dir(), f"{name}.sock")
+
+
+def owned_privately(path: str) -> bool:
+    """True if `path` (not a symlink) belongs to this user and gives nobody else any access"""
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    return st.st_uid == os.getuid() and not st.st_mode & 0o077 and not stat.S_ISLNK(st.st_mode)
+
+
+def peer_is_us(conn) -> bool:
+    """False if the kernel reports the other end of a Unix socket runs as another user"""
+    import _socket
+
+    if not hasattr(_socket, "SO_PEERCRED"):
+        # No peer credentials here (macOS): the socket and directory checks stand alone
+        return True
+    # struct ucred: pid, uid, gid
+    creds = conn.getsockopt(_socket.SOL_SOCKET, _socket.SO_PEERCRED, 12)
+    return int.from_bytes(creds[4:8], sys.byteorder) == os.getuid()
+
+
+def warm_supported() -> bool:
+    import _socket
+
+    return hasattr(os, "fork") and hasattr(_socket, "AF_UNIX") and hasattr(_socket, "SCM_RIGHTS")
+
+
+def encode_request(argv: list[str]) -> bytes:
+    """cwd, argc, argv and KEY=VALUE environment, NUL-separated (none of them can contain NUL)"""
+    fields = [os.fsencode(os.getcwd()), b"%d" % len(argv), *map(os.fsencode, argv)]
+    fields += [key + b"=" + value for key, value in os.environb.items()]
+    body = b"\0".join(fields)
+    return len(body).to_bytes(HEADER_BYTES, "big") + body
+
+
+def decode_request(body: bytes) -> tuple[str, list[str], dict]:
+    fields = body.split(b"\0")
+    argc = int(fields[1])
+    argv = [os.fsdecode(arg) for arg in fields[2:2 + argc]]
+    env = dict(entry.split(b"=", 1) for entry in fields[2 + argc:] if entry)
+    return os.fsdecode(fields[0]), argv, env
+
+
+def launch(server_path: str, argv: list[str]):
+    """Run one stdio session of `server_path` in a pool worker, or in this process without a pool"""
+    # The launcher's own startup is on the clock: the C socket module and a
+    # NUL-separated request skip the ~20 ms that importing socket (enum) and
+    # json (re) would add
+    import array
+    import _socket
+
+    conn = None
+    path = socket_path(server_path)
+    if warm_supported() and os.path.exists(path):
+        if not owned_privately(path) or (path.startswith(runtime_dir() + os.sep)
+                                         and not owned_privately(runtime_dir())):
+            print(f"Ignoring warm pool socket {path}: it is not private to this user", file=sys.stderr)
+        else:
+            conn = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+            try:
+                conn.connect(path)
+                if not peer_is_us(conn):
+                    print(f"Ignoring warm pool socket {path}: served by another user", file=sys.stderr)
+                    conn.close()
+                    conn = None
+            except OSError:
+                conn.close()
+                conn = None
+    if conn is None:
+        run_directly(server_path, argv)
+        return
+
+    request = encode_request(argv)
+    sent = conn.sendmsg([request], [(_socket.SOL_SOCKET, _socket.SCM_RIGHTS, array.array("i", [0, 1, 2]))])
+    conn.sendall(request[sent:])
+    reply = b""
+    while chunk := conn.recv(64):
+        reply += chunk
+    # No status means the worker died without reporting one
+    sys.exit(int(reply) if reply.strip() else 1)
+
+
+def run_directly(server_path: str, argv: list[str]):
+    import runpy
+
+    sys.argv = [server_path, *argv]
+    sys.path.insert(0, os.path.dirname(os.path.abspath(server_path)))
+    runpy.run_path(server_path, run_name="__main__")
+
+
+def _receive_request(conn) -> tuple[tuple[str, list[str], dict], list[int]]:
+    import socket
+
+    data, fds, _, _ = socket.recv_fds(conn, 65536, 3)
+    if len(fds) != 3 or len(data) < HEADER_BYTES:
+        raise ValueError("Launcher did not send stdio descriptors")
+    size = int.from_bytes(data[:HEADER_BYTES], "big")
+    if size > MAX_REQUEST_BYTES:
+        raise ValueError(f"Launcher request too large: {size} bytes")
+    body = data[HEADER_BYTES:]
+    while len(body) < size:
+        chunk = conn.recv(size - len(body))
+        if not chunk:
+            raise ValueError("Launcher disconnected mid-request")
+        body += chunk
+    return decode_request(body), fds
+
+
+def _exit_with_launcher(conn):
+    """Stop serving if the launcher goes away (its client killed it)"""
+    try:
+        conn.recv(1)
+    except OSError:
+        pass
+    os._exit(1)
+
+
+def _worker(listener, taken_fd: int, server_path: str, module):
+    """Body of one forked worker: wait for a launcher, become its server, exit"""
+    import asyncio
+    import threading
+    import traceback
+
+    conn, _ = listener.accept()
+    listener.close()
+    os.write(taken_fd, f"{os.getpid()}\n".encode())
+    os.close(taken_fd)
+
+    code = 1
+    try:
+        if not peer_is_us(conn):
+            raise PermissionError("Launcher runs as another user")
+        (cwd, argv, env), fds = _receive_request(conn)
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+            os.close(fd)
+        sys.stdin = open(0, "r", closefd=False)
+        sys.stdout = open(1, "w", closefd=False)
+        sys.stderr = open(2, "w", buffering=1, closefd=False)
+        os.chdir(cwd)
+        os.environb.clear()
+        os.environb.update(env)
+        sys.argv = [server_path, *argv]
+        threading.Thread(target=_exit_with_launcher, args=(conn,), daemon=True).start()
+
+        code = 0
+        asyncio.run(module.main())
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except (OSError, ValueError):
+                # The stdio transport closes stdout's buffer when the session ends
+                pass
+        try:
+            conn.sendall(f"{code}\n".encode())
+        except OSError:
+            pass
+        os._exit(code)
+
+
+def serve(server_path: str, path: str, spares: int, preload: list[str]):
+    """Import `server_path` once and keep `spares` forked workers waiting on `path`"""
+    import gc
+    import importlib
+    import select
+    import signal
+    import socket
+
+    server_path = os.path.abspath(server_path)
+    sys.path.insert(0, os.path.dirname(server_path))
+    module = importlib.import_module(os.path.splitext(os.path.basename(server_path))[0])
+    # main() imports these lazily; load them here so workers start with them
+    for name in preload:
+        importlib.import_module(name)
+    # Move everything imported so far out of the collector's view, so the
+    # workers' collections do not touch (and copy) the shared pages
+    gc.collect()
+    gc.freeze()
+
+    if path.startswith(runtime_dir() + os.sep):
+        os.makedirs(runtime_dir(), mode=0o700, exist_ok=True)
+        if not owned_privately(runtime_dir()):
+            raise SystemExit(f"{runtime_dir()} must belong to this user with mode 0700")
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        if os.path.exists(path):
+            os.unlink(path)
+    else:
+        raise SystemExit(f"A warm pool is already listening on {path}")
+    finally:
+        probe.close()
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o177)
+    try:
+        listener.bind(path)
+    finally:
+        os.umask(umask)
+    listener.listen(128)
+
+    taken_r, taken_w = os.pipe()
+    idle: set[int] = set()
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"Warm pool for {server_path} on {path} ({spares} spares)", file=sys.stderr)
+    try:
+        while True:
+            while len(idle) < spares:
+                pid = os.fork()
+                if pid == 0:
+                    try:
+                        # Own process group: Ctrl-C on the pool does not end live sessions
+                        os.setpgid(0, 0)
+                        os.close(taken_r)
+                        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                        _worker(listener, taken_w, server_path, module)
+                    finally:
+                        os._exit(1)
+                idle.add(pid)
+            if select.select([taken_r], [], [], 1.0)[0]:
+                for line in os.read(taken_r, 4096).split():
+                    idle.discard(int(line))
+            while True:
+                try:
+                    pid, _ = os.waitpid(-1, os.WNOHANG)
+                except ChildProcessError:
+                    break
+                if not pid:
+                    break
+                # A worker that died before taking a session is replaced
+                idle.discard(pid)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+        if os.path.exists(path):
+            os.unlink(path)
+        # Busy workers finish their sessions; idle ones would wait forever
+        for pid in idle:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+
+def main():
+    if len(sys.argv) > 1 and not sys.argv[1].startswith("-"):
+        launch(sys.argv[1], sys.argv[2:])
+        return
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Warm process pool for the stdio MCP servers")
+    parser.add_argument("--serve", metavar="SERVER", required=True, help="Server script to keep warm")
+    parser.add_argument("--spares", type=int, default=2, help="Idle workers kept ready (default: 2)")
+    parser.add_argument("--socket", help="Unix socket path (default: see module docstring)")
+    parser.add_argument("--preload", default="mcp.server.stdio,mcp_socket_transport,anyio._backends._asyncio",
+                        help="Comma-separated modules the server imports lazily at startup")
+    args = parser.parse_args()
+    if not warm_supported():
+        raise SystemExit("The warm pool needs fork() and Unix socket descriptor passing")
+    serve(args.serve, args.socket or socket_path(args.serve), max(args.spares, 1),
+          [name for name in args.preload.split(",") if name])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,568 @@
+#!/usr/bin/env python3
+"""
+Snapshot and write-ahead log for the servers' in-memory state
+
+Agent statuses (agent_presence), the ticket queues (ticket_queue) and slot
+indexes (slot_index) live in server memory and used to be rebuilt from the
+database after every restart. With CALL_CENTER_STATE_DIR set they are also
+kept in a WarmState: named tables of key -> JSON value. Every change is
+appended to a write-ahead log as one framed record (length, CRC32, sequence
+number) in a single write() before it is applied, so a killed process loses
+nothing it had applied; a power cut can lose the last records unless
+`fsync` is on.
+
+Every `snapshot_every` records the tables are written to one compact binary
+snapshot: per table, the sorted keys as one NUL-separated blob and the
+values as one JSON array with an array of end offsets. It is written from
+a thread while the log moves on to a new segment, published by fsync and
+rename, and the segments it covers are deleted. On restart the snapshot is
+memory-mapped and the log records newer than it are replayed. Only each
+table's key blob is read up front: a lookup bisects the keys and decodes
+one value, and reading a whole table decodes its array in one call.
+
+A torn record at the end of the newest segment (a crash mid-write) is cut
+off. Anything else that cannot be read back exactly (a corrupt snapshot, a
+bad record in an older segment, a gap in the sequence) discards the whole
+state with a warning: it is only a copy of what the database holds, so the
+servers then load from the database as if there were no state directory.
+
+Files in the state directory (one process at a time, guarded by state.lock):
+    state.snap              newest snapshot
+    wal-<first seq>.log     log segments, each starting where a snapshot began
+
+Configuration:
+    CALL_CENTER_STATE_DIR           state directory (unset: no warm state)
+    CALL_CENTER_SNAPSHOT_EVERY      log records between snapshots (default: 100000)
+    CALL_CENTER_STATE_FSYNC         1 to fsync every log record (default: 0)
+"""
+
+import asyncio
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+from typing import Any, Iterable, Iterator, Optional
+
+
+SNAPSHOT_MAGIC = b"CCSNAP01"
+SNAPSHOT_FILE = "state.snap"
+LOCK_FILE = "state.lock"
+WAL_PREFIX, WAL_SUFFIX = "wal-", ".log"
+
+# magic, sequence number of the last record included, directory offset and length, CRC32 of the rest
+_HEADER = struct.Struct("<8sQQQI")
+# payload length, CRC32 of the sequence number and payload; then the sequence number
+_FRAME = struct.Struct("<II")
+_SEQ = struct.Struct("<Q")
+# operation, table name length, key length; then the name, the key and (PUT only) the JSON value
+_RECORD = struct.Struct("<BHI")
+PUT, DELETE, CLEAR = 1, 2, 3
+MAX_PAYLOAD = 1 << 30
+
+# Tables whose fill() completed, so they hold everything their source had
+_FILLED = "_filled"
+
+
+def encode(value: Any) -> bytes:
+    return json.dumps(value, separators=(",", ":"), default=str).encode()
+
+
+class _SnapshotTable:
+    """One table of a mapped snapshot: sorted keys read up front, values sliced out on demand"""
+
+    def __init__(self, mm: mmap.mmap, entry: dict):
+        self.count = entry["count"]
+        offset, length = entry["keys"]
+        self.keys = mm[offset:offset + length].decode().split("\0") if self.count else []
+        offset, length = entry["ends"]
+        if sys.byteorder == "little":
+            self._ends = memoryview(mm)[offset:offset + length].cast("Q")
+        else:
+            self._ends = array("Q", mm[offset:offset + length])
+            self._ends.byteswap()
+        self._values, self._length = entry["values"]
+        self._mm = mm
+
+    def value(self, i: int) -> bytes:
+        # Past the array's "[" or the comma before it
+        start = self._ends[i - 1] + 1 if i else 1
+        return self._mm[self._values + start:self._values + self._ends[i]]
+
+    def raw(self, key: str) -> Optional[bytes]:
+        i = bisect.bisect_left(self.keys, key)
+        return self.value(i) if i < self.count and self.keys[i] == key else None
+
+    def decode_all(self) -> list:
+        return json.loads(self._mm[self._values:self._values + self._length])
+
+
+class _Snapshot:
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mm) < _HEADER.size:
+            raise ValueError(f"Truncated snapshot: {path}")
+        magic, self.seq, offset, length, crc = _HEADER.unpack_from(self._mm, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"Not a state snapshot: {path}")
+        if zlib.crc32(memoryview(self._mm)[_HEADER.size:]) != crc:
+            raise ValueError(f"Snapshot checksum mismatch: {path}")
+        directory = json.loads(self._mm[offset:offset + length])
+        self.tables = {entry["name"]: _SnapshotTable(self._mm, entry) for entry in directory}
+
+
+def _merged(base: Optional[_SnapshotTable], changes: dict) -> Iterator[tuple[str, bytes]]:
+    """(key, encoded value) in key order: the snapshot's entries with the changes applied"""
+    updates = sorted(changes.items(), key=lambda item: item[0])
+    j = 0
+    if base is not None:
+        for i, key in enumerate(base.keys):
+            while j < len(updates) and updates[j][0] < key:
+                if updates[j][1] is not None:
+                    yield updates[j]
+                j += 1
+            if j < len(updates) and updates[j][0] == key:
+                if updates[j][1] is not None:
+                    yield updates[j]
+                j += 1
+            else:
+                yield key, base.value(i)
+    for key, raw in updates[j:]:
+        if raw is not None:
+            yield key, raw
+
+
+def _write_snapshot(path: str, seq: int, tables: list):
+    """Merge each table's snapshot entries with its frozen changes into a new file, published by rename"""
+    crc = 0
+    with open(path + ".partial", "wb") as f:
+        f.write(b"\0" * _HEADER.size)
+
+        def write(data, align: bool = True) -> list:
+            nonlocal crc
+            if align:
+                padding = b"\0" * (-f.tell() % 8)
+                crc = zlib.crc32(padding, crc)
+                f.write(padding)
+            start = f.tell()
+            crc = zlib.crc32(data, crc)
+            f.write(data)
+            return [start, len(data)]
+
+        directory = []
+        for name, base, changes in tables:
+            keys, ends, chunk, total = [], array("Q"), [b"["], 1
+            values_at = write(b"")[0]
+            for key, raw in _merged(base, changes):
+                if keys:
+                    chunk.append(b",")
+                    total += 1
+                keys.append(key)
+                total += len(raw)
+                ends.append(total)
+                chunk.append(raw)
+                if len(chunk) >= 8192:
+                    write(b"".join(chunk), align=False)
+                    chunk = []
+            chunk.append(b"]")
+            write(b"".join(chunk), align=False)
+            total += 1
+            if sys.byteorder != "little":
+                ends.byteswap()
+            directory.append({"name": name, "count": len(keys), "values": [values_at, total],
+                              "keys": write("\0".join(keys).encode()), "ends": write(ends.tobytes())})
+        offset, length = write(json.dumps(directory).encode())
+        f.seek(0)
+        f.write(_HEADER.pack(SNAPSHOT_MAGIC, seq, offset, length, crc))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".partial", path)
+
+
+class StateTable:
+    """A named table of key -> JSON value; changes are logged before they are applied
+
+    Reads look through the changes logged since the snapshot, the changes
+    being written into the next one, then the mapped snapshot itself.
+    """
+
+    # No __dict__, so tenant_cache.estimate_size counts a table held by a cached value as one object
+    __slots__ = ("_state", "name", "_base", "_changes", "_frozen", "_generation", "present")
+
+    def __init__(self, state: "WarmState", name: str, base: Optional[_SnapshotTable] = None):
+        self._state = state
+        self.name = name
+        self._base = base
+        # key -> encoded value, or None once deleted
+        self._changes: dict = {}
+        self._frozen: dict = {}
+        self._generation = 0
+        self.present = base is not None
+
+    def _raw(self, key: str) -> Optional[bytes]:
+        if key in self._changes:
+            return self._changes[key]
+        if key in self._frozen:
+            return self._frozen[key]
+        return self._base.raw(key) if self._base is not None else None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        raw = self._raw(key)
+        return default if raw is None else json.loads(raw)
+
+    def __contains__(self, key: str) -> bool:
+        return self._raw(key) is not None
+
+    def _entries(self) -> Iterator[tuple[str, Any]]:
+        """(key, encoded value) pairs; don't hold the iterator across an await"""
+        changes, frozen = self._changes, self._frozen
+        for key, raw in changes.items():
+            if raw is not None:
+                yield key, raw
+        for key, raw in frozen.items():
+            if raw is not None and key not in changes:
+                yield key, raw
+        if self._base is not None:
+            base = self._base
+            for i, key in enumerate(base.keys):
+                if key not in changes and key not in frozen:
+                    yield key, base.value(i)
+
+    def __iter__(self) -> Iterator[str]:
+        return (key for key, _ in self._entries())
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self._entries())
+
+    def items(self) -> Iterator[tuple[str, Any]]:
+        changes, frozen = self._changes, self._frozen
+        for key, raw in changes.items():
+            if raw is not None:
+                yield key, json.loads(raw)
+        for key, raw in frozen.items():
+            if raw is not None and key not in changes:
+                yield key, json.loads(raw)
+        if self._base is not None:
+            for key, value in zip(self._base.keys, self._base.decode_all()):
+                if key not in changes and key not in frozen:
+                    yield key, value
+
+    def put(self, key: str, value: Any):
+        if "\0" in key:
+            raise ValueError(f"State keys cannot contain NUL: {key!r}")
+        raw = encode(value)
+        self._state._log(PUT, self.name, key, raw)
+        self._changes[key] = raw
+        self.present = True
+        self._state._logged()
+
+    def delete(self, key: str):
+        if key in self:
+            self._state._log(DELETE, self.name, key)
+            self._changes[key] = None
+            self._state._logged()
+
+    def clear(self):
+        self._state._log(CLEAR, self.name)
+        self._clear()
+        self._state._logged()
+
+    def _clear(self):
+        self._base, self._frozen, self._changes = None, {}, {}
+        self._generation += 1
+        self.present = True
+
+
+def _segment_seq(name: str) -> Optional[int]:
+    if name.startswith(WAL_PREFIX) and name.endswith(WAL_SUFFIX):
+        try:
+            return int(name[len(WAL_PREFIX):-len(WAL_SUFFIX)])
+        except ValueError:
+            return None
+    return None
+
+
+class WarmState:
+    """Tables of JSON values kept in a state directory by snapshot plus write-ahead log"""
+
+    def __init__(self, directory: str, snapshot_every: int = 100_000, fsync: bool = False):
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+        self._lock_file = _lock(os.path.join(directory, LOCK_FILE))
+        self.tables: dict = {}
+        self.seq = 0
+        self.snapshot_seq = 0
+        self.replayed = 0
+        self._snapshot: Optional[_Snapshot] = None
+        self._fd: Optional[int] = None
+        self._segment_seq = 0
+        self._writing: Optional[asyncio.Task] = None
+        self.snapshots = 0
+        started = time.perf_counter()
+        try:
+            self._recover()
+        except ValueError as e:
+            print(f"Discarding warm state in {directory}: {e}", file=sys.stderr)
+            self._reset()
+        self.load_seconds = time.perf_counter() - started
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _segments(self) -> list[tuple[int, str]]:
+        found = ((_segment_seq(name), name) for name in os.listdir(self.directory))
+        return sorted((seq, self._path(name)) for seq, name in found if seq is not None)
+
+    def _recover(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".partial"):
+                # A snapshot that never finished; the segments it would cover are still here
+                os.remove(self._path(name))
+        if os.path.exists(self._path(SNAPSHOT_FILE)):
+            self._snapshot = _Snapshot(self._path(SNAPSHOT_FILE))
+            self.seq = self.snapshot_seq = self._snapshot.seq
+            for name, base in self._snapshot.tables.items():
+                self.tables[name] = StateTable(self, name, base)
+
+        segments = [(seq, path) for seq, path in self._segments()]
+        for n, (first, path) in enumerate(segments):
+            last = n == len(segments) - 1
+            if not last and segments[n + 1][0] <= self.snapshot_seq + 1:
+                continue
+            if first > self.seq + 1:
+                raise ValueError(f"Log records {self.seq + 1}..{first - 1} are missing")
+            with open(path, "rb") as f:
+                data = f.read()
+            end = self._replay(data, first)
+            if end < len(data):
+                if not last:
+                    raise ValueError(f"Bad log record at byte {end} of {os.path.basename(path)}")
+                print(f"Cutting {len(data) - end} bytes of torn log records off {os.path.basename(path)}",
+                      file=sys.stderr)
+                with open(path, "r+b") as f:
+                    f.truncate(end)
+        if segments and segments[-1][0] <= self.seq + 1:
+            self._open_segment(segments[-1][0], segments[-1][1])
+        else:
+            self._open_segment(self.seq + 1)
+
+    def _replay(self, data: bytes, first: int) -> int:
+        """Apply a segment's records after the snapshot; returns where the readable records end"""
+        view, pos, expected = memoryview(data), 0, first
+        while pos + _FRAME.size + _SEQ.size <= len(data):
+            length, crc = _FRAME.unpack_from(data, pos)
+            body = pos + _FRAME.size
+            end = body + _SEQ.size + length
+            if length > MAX_PAYLOAD or end > len(data) or zlib.crc32(view[body:end]) != crc:
+                break
+            seq, = _SEQ.unpack_from(data, body)
+            if seq != expected:
+                break
+            expected += 1
+            if seq > self.seq:
+                self._apply(data, body + _SEQ.size, end)
+                self.seq = seq
+                self.replayed += 1
+            pos = end
+        return pos
+
+    def _apply(self, data: bytes, start: int, end: int):
+        op, name_length, key_length = _RECORD.unpack_from(data, start)
+        start += _RECORD.size
+        name = data[start:start + name_length].decode()
+        table = self.table(name)
+        table.present = True
+        start += name_length
+        key = data[start:start + key_length].decode()
+        if op == PUT:
+            table._changes[key] = data[start + key_length:end]
+        elif op == DELETE:
+            table._changes[key] = None
+        elif op == CLEAR:
+            table._clear()
+        else:
+            raise ValueError(f"Unknown log operation {op}")
+
+    def _reset(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        for _, path in self._segments():
+            os.remove(path)
+        if os.path.exists(self._path(SNAPSHOT_FILE)):
+            os.remove(self._path(SNAPSHOT_FILE))
+        self._snapshot = None
+        self.tables = {}
+        self.seq = self.snapshot_seq = self.replayed = 0
+        self._open_segment(1)
+
+    def _open_segment(self, first: int, path: Optional[str] = None):
+        if self._fd is not None:
+            os.close(self._fd)
+        path = path or self._path(f"{WAL_PREFIX}{first:020d}{WAL_SUFFIX}")
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0), 0o644)
+        self._segment_seq = first
+
+    def __contains__(self, name: str) -> bool:
+        table = self.tables.get(name)
+        return table is not None and table.present
+
+    def table(self, name: str) -> StateTable:
+        """The named table, empty (and not yet present) if nothing was ever written to it"""
+        table = self.tables.get(name)
+        if table is None:
+            table = self.tables[name] = StateTable(self, name)
+        return table
+
+    def filled(self, name: str) -> Optional[StateTable]:
+        """The table if a fill() of it completed, else None"""
+        return self.tables[name] if self.table(_FILLED).get(name) and name in self else None
+
+    def fill(self, name: str, items: Iterable[tuple[str, Any]]) -> StateTable:
+        """Replace a table's contents; it counts as filled only once every item is logged"""
+        marks = self.table(_FILLED)
+        marks.delete(name)
+        table = self.table(name)
+        table.clear()
+        for key, value in items:
+            table.put(key, value)
+        marks.put(name, True)
+        return table
+
+    def _log(self, op: int, name: str, key: str = "", raw: bytes = b""):
+        name_bytes, key_bytes = name.encode(), key.encode()
+        self.seq += 1
+        body = _SEQ.pack(self.seq) + _RECORD.pack(op, len(name_bytes), len(key_bytes)) + name_bytes + key_bytes + raw
+        frame = _FRAME.pack(len(body) - _SEQ.size, zlib.crc32(body)) + body
+        # One write per record: a killed process leaves whole records or a torn tail, never a gap
+        written = os.write(self._fd, frame)
+        while written < len(frame):
+            written += os.write(self._fd, frame[written:])
+        if self.fsync:
+            os.fsync(self._fd)
+
+    def _logged(self):
+        """After a logged change is applied: snapshot once enough records piled up"""
+        if self.seq - self.snapshot_seq < self.snapshot_every or self._writing is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.snapshot()
+            return
+        self._writing = loop.create_task(self.snapshot_async())
+
+    def _freeze(self) -> tuple[int, list]:
+        """Start a new log segment and set aside every table's changes for the snapshot"""
+        self._open_segment(self.seq + 1)
+        frozen = []
+        for table in self.tables.values():
+            if table.present:
+                table._frozen, table._changes = table._changes, {}
+                frozen.append((table, table._generation))
+        return self.seq, frozen
+
+    def _thaw(self, frozen: list):
+        # The snapshot failed: fold its changes back in; the log still has them all
+        for table, generation in frozen:
+            if table._generation == generation:
+                table._changes = {**table._frozen, **table._changes}
+                table._frozen = {}
+
+    def _publish(self, seq: int, frozen: list):
+        snapshot = _Snapshot(self._path(SNAPSHOT_FILE))
+        for table, generation in frozen:
+            # A table cleared meanwhile no longer reads from any snapshot
+            if table._generation == generation:
+                table._base, table._frozen = snapshot.tables[table.name], {}
+        # The old map is released once nothing reads from it
+        self._snapshot, self.snapshot_seq = snapshot, seq
+        self.snapshots += 1
+        for first, path in self._segments():
+            if first <= seq:
+                os.remove(path)
+
+    def snapshot(self):
+        """Write a snapshot now, on this thread"""
+        seq, frozen = self._freeze()
+        try:
+            _write_snapshot(self._path(SNAPSHOT_FILE), seq, [(t.name, t._base, t._frozen) for t, _ in frozen])
+        except BaseException:
+            self._thaw(frozen)
+            raise
+        self._publish(seq, frozen)
+
+    async def snapshot_async(self):
+        """Write a snapshot from a thread while writes continue into the new log segment"""
+        seq, frozen = self._freeze()
+        try:
+            await asyncio.to_thread(_write_snapshot, self._path(SNAPSHOT_FILE), seq,
+                                    [(t.name, t._base, t._frozen) for t, _ in frozen])
+        except Exception as e:
+            self._thaw(frozen)
+            print(f"Warm state snapshot failed: {e!r}", file=sys.stderr)
+        else:
+            self._publish(seq, frozen)
+        finally:
+            self._writing = None
+        # Records written meanwhile may already call for the next one
+        if self._fd is not None:
+            self._logged()
+
+    def close(self, snapshot: bool = True):
+        """Close the log, first folding it into a snapshot so the next start replays nothing"""
+        if self._fd is None:
+            return
+        if snapshot and self.seq > self.snapshot_seq and self._writing is None:
+            self.snapshot()
+        os.close(self._fd)
+        self._fd = None
+        self._lock_file.close()
+
+
+def _lock(path: str):
+    """Hold the directory's lock for the life of the state; fails if another process has it"""
+    lock_file = open(path, "a+b")
+    try:
+        if os.name == "nt":
+            import msvcrt
+
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        raise BlockingIOError(f"{path} is held by another process")
+    return lock_file
+
+
+_state: Optional[WarmState] = None
+_opened = False
+
+
+def get_warm_state() -> Optional[WarmState]:
+    """The process-wide state in CALL_CENTER_STATE_DIR, opened on first use; None when unset or unavailable"""
+    global _state, _opened
+    if not _opened:
+        _opened = True
+        directory = os.environ.get("CALL_CENTER_STATE_DIR")
+        if directory:
+            try:
+                _state = WarmState(directory, int(os.environ.get("CALL_CENTER_SNAPSHOT_EVERY", "100000")),
+                                   os.environ.get("CALL_CENTER_STATE_FSYNC") == "1")
+            except OSError as e:
+                print(f"Running without warm state: {e}", file=sys.stderr)
+            else:
+                print(f"Warm state: {len(_state.tables)} tables, {_state.replayed} log records replayed in "
+                      f"{_state.load_seconds * 1000:.0f} ms", file=sys.stderr)
+    return _state
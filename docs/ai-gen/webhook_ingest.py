@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+Retell webhook ingest worker
+
+The webhook route (or anything else holding Retell payloads) appends events to
+a spool directory with SpoolWriter: events go to a `.tmp` segment that is
+fsynced and renamed to `.ndjson` when it rotates, after `max_events` events or
+`max_seconds` after its first event (on a timer, so a quiet spool is not left
+holding events), and the worker only ever sees complete segments. A `.tmp`
+segment whose writer process died is published by the next writer or worker
+to start; a torn last line is rejected like any invalid event. The worker
+reads segments oldest first, merges events for the same call, and upserts
+each batch into `customer_call_logs` in one transaction (execute_many, one
+row per call) keyed on `call_id`, so replaying a segment is harmless.
+
+Crash safety: after each batch commits, the segment's byte offset is written
+to `<segment>.offset` (atomic rename), and the segment is deleted once it is
+fully applied. A restarted worker resumes from the offset. A crash between a
+commit and its offset write replays one batch, which the upsert absorbs; the
+in-process stats engines may count that batch's completed calls twice.
+
+Usage:
+    python webhook_ingest.py --spool /var/spool/retell
+    python webhook_ingest.py --spool /var/spool/retell --once
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+from customer_history import normalize_phone
+
+
+SEGMENT_SUFFIX = ".ndjson"
+OFFSET_SUFFIX = ".offset"
+REJECTED_DIR = "rejected"
+
+# Columns an event may fill; later events only overwrite with non-null values
+UPSERT_COLUMNS = (
+    "user_id", "call_record_url", "agent_id", "agent_name", "duration_ms", "transcript",
+    "public_log_url", "disconnection_reason", "call_cost", "call_analysis", "from_number",
+    "to_number", "direction", "telephony_identifier", "start_timestamp", "end_timestamp",
+    "agent_version", "call_type",
+)
+INSERT_COLUMNS = ("id", "call_id", "created_at", "updated_at") + UPSERT_COLUMNS
+UPSERT_SQL = (
+    f"INSERT INTO customer_call_logs ({', '.join(INSERT_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(INSERT_COLUMNS))}) "
+    f"ON CONFLICT (call_id) DO UPDATE SET "
+    + ", ".join(f"{c} = COALESCE(excluded.{c}, customer_call_logs.{c})" for c in UPSERT_COLUMNS)
+    + ", updated_at = excluded.updated_at"
+)
+
+
+def _abandoned(name: str, path: str) -> bool:
+    """Whether a `<time>-<pid>-<sequence>.tmp` segment's writer process is gone"""
+    try:
+        pid = int(name.split("-")[1])
+    except (IndexError, ValueError):
+        return False
+    if pid == os.getpid():
+        return False
+    if os.name == "nt":
+        # No harmless liveness probe there; a live writer publishes within max_seconds
+        return time.time() - os.path.getmtime(path) > 3600
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    return False
+
+
+def recover_segments(spool_dir: str) -> int:
+    """Publish `.tmp` segments left by writers that died; returns how many"""
+    recovered = 0
+    for name in os.listdir(spool_dir):
+        stem = name[:-len(".tmp")]
+        # Offset files are written as <segment>.ndjson.offset.tmp
+        if not name.endswith(".tmp") or "." in stem:
+            continue
+        path = os.path.join(spool_dir, name)
+        if _abandoned(name, path):
+            try:
+                os.replace(path, os.path.join(spool_dir, stem + SEGMENT_SUFFIX))
+            except FileNotFoundError:
+                continue  # another process recovered it first
+            recovered += 1
+    if recovered:
+        print(f"Published {recovered} spool segments left by a dead writer", file=sys.stderr)
+    return recovered
+
+
+class SpoolWriter:
+    """Append webhook payloads to a spool directory in atomically published segments
+
+    Safe to share between threads; a timer thread publishes a segment
+    `max_seconds` after its first event.
+    """
+
+    def __init__(self, spool_dir: str, max_events: int = 1000, max_seconds: float = 1.0, fsync: bool = True):
+        self.spool_dir = spool_dir
+        self.max_events = max_events
+        self.max_seconds = max_seconds
+        self.fsync = fsync
+        os.makedirs(spool_dir, exist_ok=True)
+        recover_segments(spool_dir)
+        self._file = None
+        self._path = None
+        self._count = 0
+        self._sequence = 0
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def write(self, payload: dict):
+        line = json.dumps(payload, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._sequence += 1
+                name = f"{time.time_ns():020d}-{os.getpid()}-{self._sequence:06d}"
+                self._path = os.path.join(self.spool_dir, name)
+                self._file = open(self._path + ".tmp", "w", encoding="utf-8")
+                self._timer = threading.Timer(self.max_seconds, self._expire, (self._path,))
+                self._timer.daemon = True
+                self._timer.start()
+            self._file.write(line)
+            self._count += 1
+            if self._count >= self.max_events:
+                self._flush()
+
+    def _expire(self, path: str):
+        with self._lock:
+            if self._path == path:
+                self._flush()
+
+    def flush(self):
+        """Publish the current segment to the worker"""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._file is None:
+            return
+        self._timer.cancel()
+        self._timer = None
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._path + ".tmp", self._path + SEGMENT_SUFFIX)
+        self._file = None
+        self._path = None
+        self._count = 0
+
+    def close(self):
+        self.flush()
+
+
+def _timestamp(value) -> Optional[datetime]:
+    # Retell sends epoch milliseconds; spooled rows may already be ISO strings
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value / 1000, timezone.utc)
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def _json(value) -> Optional[str]:
+    return None if value is None else json.dumps(value, separators=(",", ":"))
+
+
+def _phone(value) -> Optional[str]:
+    return normalize_phone(value) or value
+
+
+def call_log_fields(call: dict) -> dict:
+    """customer_call_logs columns for a Retell call object, as the webhook route maps them"""
+    return {
+        "call_record_url": call.get("recording_url"),
+        "agent_id": call.get("agent_id"),
+        "agent_name": call.get("agent_name"),
+        "duration_ms": call.get("duration_ms"),
+        "transcript": call.get("transcript"),
+        "public_log_url": call.get("public_log_url"),
+        "disconnection_reason": call.get("disconnection_reason"),
+        "call_cost": _json(call.get("call_cost")),
+        "call_analysis": _json(call.get("call_analysis")),
+        "from_number": _phone(call.get("from_number")),
+        "to_number": _phone(call.get("to_number")),
+        "direction": call.get("direction"),
+        "telephony_identifier": _json(call.get("telephony_identifier")),
+        "start_timestamp": _timestamp(call.get("start_timestamp")),
+        "end_timestamp": _timestamp(call.get("end_timestamp")),
+        "agent_version": call.get("agent_version"),
+        "call_type": call.get("call_type"),
+    }
+
+
+class IngestWorker:
+    """Drain spool segments into customer_call_logs and the in-process caches"""
+
+    def __init__(self, store, spool_dir: str, batch_size: int = 2000, stats=None, history=None,
+                 transcripts=None, default_user_id: Optional[str] = None, poll_interval: float = 0.2,
+                 retry_interval: float = 5.0):
+        self.store = store
+        self.spool_dir = spool_dir
+        self.batch_size = batch_size
+        self.stats = stats
+        self.history = history
+        self.transcripts = transcripts
+        self.default_user_id = default_user_id
+        self.poll_interval = poll_interval
+        self.retry_interval = retry_interval
+        self.events = 0
+        self.rejected = 0
+        self._agents: dict = {}
+        self._agents_loaded = float("-inf")
+        os.makedirs(os.path.join(spool_dir, REJECTED_DIR), exist_ok=True)
+        recover_segments(spool_dir)
+
+    async def _user_id(self, payload: dict) -> Optional[str]:
+        if payload.get("user_id"):
+            return payload["user_id"]
+        agent_id = (payload.get("call") or {}).get("agent_id")
+        if agent_id not in self._agents and time.monotonic() - self._agents_loaded > 30:
+            # Same mapping the webhook route uses (getUserIdByAgentId), cached
+            rows = await self.store.query("SELECT retell_agent_id, user_id FROM retell_agents")
+            self._agents = {row["retell_agent_id"]: row["user_id"] for row in rows}
+            self._agents_loaded = time.monotonic()
+        return self._agents.get(agent_id) or self.default_user_id
+
+    def ready_segments(self) -> list[str]:
+        return sorted(
+            os.path.join(self.spool_dir, name)
+            for name in os.listdir(self.spool_dir) if name.endswith(SEGMENT_SUFFIX)
+        )
+
+    async def run_once(self) -> int:
+        """Apply every published segment; returns the number of events applied"""
+        before = self.events
+        for path in self.ready_segments():
+            await self.apply_segment(path)
+        return self.events - before
+
+    async def run(self, stop: Optional[asyncio.Event] = None):
+        """Poll the spool until `stop` is set"""
+        stop = stop or asyncio.Event()
+        while not stop.is_set():
+            delay = self.poll_interval
+            try:
+                applied = await self.run_once()
+            except Exception as e:
+                # Segments stay in the spool and are retried from their offset
+                print(f"Webhook ingest failed, retrying in {self.retry_interval:.0f}s: {e!r}", file=sys.stderr)
+                applied, delay = 0, self.retry_interval
+            if not applied:
+                try:
+                    await asyncio.wait_for(stop.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def apply_segment(self, path: str):
+        offset_path = path + OFFSET_SUFFIX
+        offset = 0
+        if os.path.exists(offset_path):
+            with open(offset_path) as f:
+                offset = int(f.read() or 0)
+
+        with open(path, "rb") as segment:
+            segment.seek(offset)
+            batch: list = []
+            while True:
+                line = segment.readline()
+                if line.strip():
+                    try:
+                        batch.append(json.loads(line))
+                    except ValueError as e:
+                        self._reject(path, line, f"invalid JSON: {e}")
+                if batch and (len(batch) >= self.batch_size or not line):
+                    await self.apply_batch(batch, path)
+                    _write_offset(offset_path, segment.tell())
+                    batch = []
+                if not line:
+                    break
+
+        os.remove(path)
+        if os.path.exists(offset_path):
+            os.remove(offset_path)
+
+    async def apply_batch(self, payloads: list[dict], source: str = "batch"):
+        """Upsert one batch of webhook payloads, then feed the caches"""
+        now = datetime.now(timezone.utc)
+        rows: dict = {}
+        applied = []
+        for payload in payloads:
+            call = payload.get("call") or {}
+            call_id = call.get("call_id")
+            user_id = await self._user_id(payload)
+            if not call_id or not user_id:
+                self._reject(source, payload, "missing call_id" if not call_id else "unknown agent_id")
+                continue
+            try:
+                fields = call_log_fields(call)
+            except (TypeError, ValueError) as e:
+                self._reject(source, payload, f"bad field: {e}")
+                continue
+            fields["user_id"] = user_id
+            # Several events for one call in a batch collapse into one row
+            row = rows.get(call_id)
+            if row is None:
+                rows[call_id] = fields
+            else:
+                row.update((k, v) for k, v in fields.items() if v is not None)
+            applied.append((payload.get("event"), call, user_id, fields))
+
+        if rows:
+            await self.store.execute_many(UPSERT_SQL, [
+                (str(uuid.uuid4()), call_id, now, now, *(row[c] for c in UPSERT_COLUMNS))
+                for call_id, row in rows.items()
+            ])
+        for event, call, user_id, fields in applied:
+            self._feed(event, call, user_id, fields)
+        self.events += len(applied)
+
+    def _feed(self, event: Optional[str], call: dict, user_id: str, fields: dict):
+        for engine in (self.stats(user_id) if self.stats is not None else ()):
+            if event == "call_started":
+                start = fields["start_timestamp"]
+                engine.record_start(call["call_id"], start.timestamp() if start else None, call.get("agent_id"))
+            elif event == "call_ended":
+                end = fields["end_timestamp"]
+                duration_ms = fields["duration_ms"]
+                engine.record_end(
+                    call["call_id"], end.timestamp() if end else None,
+                    duration_seconds=duration_ms / 1000 if duration_ms is not None else None,
+                )
+        if self.history is not None and event != "call_started":
+            self.history.record_call_log(user_id, fields["from_number"])
+        # call_analyzed repeats the transcript; index it once, when the call ends
+        if self.transcripts is not None and event in (None, "call_ended") and fields["transcript"]:
+            start = fields["start_timestamp"] or fields["end_timestamp"] or datetime.now(timezone.utc)
+            self.transcripts.add(call["call_id"], user_id, int(start.timestamp() * 1000), fields["transcript"])
+
+    def _reject(self, source: str, payload, reason: str):
+        self.rejected += 1
+        line = payload.decode("utf-8", "replace").rstrip("\n") if isinstance(payload, bytes) else json.dumps(payload)
+        target = os.path.join(self.spool_dir, REJECTED_DIR, os.path.basename(source))
+        with open(target, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"reason": reason, "payload": line}) + "\n")
+
+
+def _write_offset(path: str, offset: int):
+    with open(path + ".tmp", "w") as f:
+        f.write(str(offset))
+    os.replace(path + ".tmp", path)
+
+
+async def start_ingest_from_env(stats=None, history=None, transcripts=None) -> Optional[asyncio.Task]:
+    """Run a worker inside the MCP server when CALL_CENTER_SPOOL_DIR is set
+
+    `history` and `transcripts` are async getters for the caches and
+    indexes to feed, only called when ingest is enabled; `stats` maps a
+    user_id to the stats engines that count its calls.
+    """
+    spool_dir = os.environ.get("CALL_CENTER_SPOOL_DIR")
+    if not spool_dir:
+        return None
+    from call_log_store import get_call_log_store
+
+    worker = IngestWorker(
+        await get_call_log_store(), spool_dir,
+        stats=stats,
+        history=await history() if history else None,
+        transcripts=await transcripts() if transcripts else None,
+        default_user_id=os.environ.get("CALL_CENTER_USER_ID"),
+    )
+    print(f"Ingesting Retell webhook events from {spool_dir}", file=sys.stderr)
+    return asyncio.create_task(worker.run())
+
+
+async def main():
+    from call_log_store import open_call_log_store
+
+    parser = argparse.ArgumentParser(description="Ingest spooled Retell webhook events into customer_call_logs")
+    parser.add_argument("--spool", required=True, help="Spool directory")
+    parser.add_argument("--db-url", help="Database URL (default: CALL_CENTER_DB_URL)")
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--user-id", default=os.environ.get("CALL_CENTER_USER_ID"),
+                        help="user_id for agents missing from retell_agents")
+    parser.add_argument("--once", action="store_true", help="Drain the spool and exit")
+    args = parser.parse_args()
+
+    store = await open_call_log_store(args.db_url)
+    worker = IngestWorker(store, args.spool, args.batch_size, default_user_id=args.user_id)
+    try:
+        if args.once:
+            started = time.perf_counter()
+            count = await worker.run_once()
+            print(f"Applied {count} events ({worker.rejected} rejected) in {time.perf_counter() - started:.2f}s",
+                  file=sys.stderr)
+        else:
+            await worker.run()
+    finally:
+        await store.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
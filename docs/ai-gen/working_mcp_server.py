@@ -4,224 +4,577 @@ Working MCP Server for Call Center Automation
 """
 
 import asyncio
+import os
+from datetime import datetime, timezone
 from mcp import server, types
+from mcp.server.lowlevel.helper_types import ReadResourceContents
 
+from admission import BULK, admission_from_env
+from batch_operations import TICKET_PROPERTIES, batch_schema, create_tickets
+from call_log_store import get_call_log_store
+from call_stats import get_stats_engines, get_warm_stats_engine
+from serializers import ToolResult, get_serializer
+from server_metrics import METRICS_RESOURCES, ServerMetrics, start_metrics_dump_from_env
+from tenant_cache import resolve_tenant
+from tool_registry import ToolArgumentError, ToolRegistry
+from webhook_ingest import start_ingest_from_env
 
-def create_server():
-    """Create and configure the MCP server"""
-    app = server.Server("call-center-automation")
 
-    @app.list_tools()
-    async def list_tools() -> list[types.Tool]:
-        """List available tools"""
-        return [
-            types.Tool(
-                name="get_call_stats",
-                description="Get current call center statistics",
-                inputSchema={
-                    "type": "object",
-                    "properties": {},
-                    "required": []
-                }
-            ),
-            types.Tool(
-                name="create_ticket",
-                description="Create a support ticket",
-                inputSchema={
+admission = admission_from_env()
+metrics = ServerMetrics(admission=admission)
+tools = ToolRegistry(metrics, admission)
+
+
+@tools.tool(
+    name="get_call_stats",
+    description="Get current call center statistics",
+    input_schema={
+        "type": "object",
+        "properties": {},
+        "required": []
+    }
+)
+async def get_call_stats(arguments: dict) -> ToolResult:
+    stats = (await get_warm_stats_engine(resolve_tenant())).snapshot()
+    return get_serializer().result(stats)
+
+
+@tools.tool(
+    name="create_ticket",
+    description="Create a support ticket",
+    input_schema={
+        "type": "object",
+        "properties": TICKET_PROPERTIES,
+        "required": ["title", "description"]
+    }
+)
+async def create_ticket(arguments: dict) -> ToolResult:
+    store = await get_call_log_store()
+    ticket, = await create_tickets(store, [arguments], resolve_tenant())
+
+    assignee = f"assigned to {ticket['assigned_to']}" if ticket["assigned_to"] else "queued"
+    return get_serializer().result(ticket, header=f"✅ Created ticket {ticket['ticket_id']} ({assignee})")
+
+
+@tools.tool(
+    name="create_tickets",
+    description="Create many support tickets in one call (one transaction)",
+    input_schema=batch_schema("tickets", TICKET_PROPERTIES, ["title", "description"],
+                              "Tickets to create, each like create_ticket's arguments"),
+    priority=BULK
+)
+async def create_tickets_tool(arguments: dict) -> ToolResult:
+    store = await get_call_log_store()
+    tickets = await create_tickets(store, arguments["tickets"], resolve_tenant())
+
+    return get_serializer().result(tickets, header=f"✅ Created {len(tickets)} tickets")
+
+
+@tools.tool(
+    name="resolve_ticket",
+    description="Mark a support ticket resolved; its agent picks up the next queued ticket",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "ticket_id": {
+                "type": "string",
+                "description": "Ticket ID returned by create_ticket"
+            }
+        },
+        "required": ["ticket_id"]
+    }
+)
+async def resolve_ticket(arguments: dict) -> ToolResult:
+    from ticket_queue import get_ticket_service
+
+    service = get_ticket_service(await get_call_log_store())
+    try:
+        assignments = await service.resolve(arguments["ticket_id"], resolve_tenant())
+    except ValueError as e:
+        raise ToolArgumentError(str(e)) from e
+    return get_serializer().result({
+        "ticket_id": arguments["ticket_id"],
+        "status": "resolved",
+        "assigned": [{"ticket_id": ticket_id, "agent_id": agent_id} for ticket_id, agent_id in assignments],
+    })
+
+
+@tools.tool(
+    name="get_retell_agents",
+    description="Get list of deployed Retell AI agents",
+    input_schema={
+        "type": "object",
+        "properties": {},
+        "required": []
+    }
+)
+async def get_retell_agents(arguments: dict) -> ToolResult:
+    from retell_agents import get_agent_directory
+
+    directory = await get_agent_directory()
+    agents = await directory.agents(resolve_tenant())
+    return get_serializer().result(agents, header="🤖 Retell AI Agents:")
+
+
+@tools.tool(
+    name="deploy_agent",
+    description="Queue a Retell AI agent deployment from a template; poll it with get_deployment_status",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "agent_name": {
+                "type": "string",
+                "description": "Name of the agent to deploy"
+            },
+            "business_type": {
+                "type": "string",
+                "enum": ["dental", "medical", "restaurant", "general"],
+                "description": "Type of business"
+            },
+            "template": {
+                "type": "string",
+                "description": "Template file in src/agent-template, without .json "
+                               "(default: <business_type>-inbound-receptionist-v01 if present, "
+                               "else dental-inbound-receptionist-v01)"
+            },
+            "metadata": {
+                "type": "object",
+                "description": "Business details rendered into the prompt: business_name, services, staff, "
+                               "locations, insurance_providers, basic_info_prompt, custom_instructions, "
+                               "call_scripts, call_scripts_prompt"
+            },
+            "idempotency_key": {
+                "type": "string",
+                "description": "Reusing a key returns the earlier deployment instead of starting another",
+                "maxLength": 200
+            }
+        },
+        "required": ["agent_name", "business_type"]
+    }
+)
+async def deploy_agent(arguments: dict) -> ToolResult:
+    from deployment_queue import get_deployment_service
+
+    service = await get_deployment_service()
+    try:
+        job, created = await service.submit(resolve_tenant(), arguments)
+    except ValueError as e:
+        raise ToolArgumentError(str(e)) from e
+
+    header = "🚀 Deployment queued" if created else "↩️ Deployment already requested with this idempotency key"
+    return get_serializer().result(job, header=header)
+
+
+@tools.tool(
+    name="get_deployment_status",
+    description="Get the status of a deploy_agent job, optionally waiting for it to finish",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "deployment_id": {
+                "type": "string",
+                "description": "deployment_id returned by deploy_agent"
+            },
+            "wait_seconds": {
+                "type": "number",
+                "description": "Wait up to this long for the deployment to succeed or fail (default: 0)",
+                "default": 0,
+                "minimum": 0,
+                "maximum": 60
+            }
+        },
+        "required": ["deployment_id"]
+    },
+    # Mostly waits on the deployment queue, holding no admission slot
+    priority=None
+)
+async def get_deployment_status(arguments: dict) -> ToolResult:
+    from deployment_queue import get_deployment_service
+
+    service = await get_deployment_service()
+    job = await service.status(arguments["deployment_id"], resolve_tenant(),
+                               arguments.get("wait_seconds", 0))
+    if job is None:
+        raise ToolArgumentError(f"Unknown deployment_id: {arguments['deployment_id']}")
+    return get_serializer().result(job)
+
+
+@tools.tool(
+    name="get_call_logs",
+    description="Get recent call logs from the system",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "limit": {
+                "type": "integer",
+                "description": "Number of logs to return (default: 10)",
+                "default": 10,
+                "minimum": 1,
+                "maximum": 100000
+            },
+            "cursor": {
+                "type": "string",
+                "description": "next_cursor from a previous call, to continue paging"
+            },
+            "source": {
+                "type": "string",
+                "enum": ["customer_call_logs", "call_logs"],
+                "description": "Table to read (default: customer_call_logs)",
+                "default": "customer_call_logs"
+            }
+        },
+        "required": []
+    },
+    priority=BULK
+)
+async def get_call_logs(arguments: dict) -> ToolResult:
+    limit = arguments.get("limit", 10)
+    cursor = arguments.get("cursor")
+    source = arguments.get("source", "customer_call_logs")
+
+    # Each keyset chunk is encoded as soon as it is read, so only the encoded
+    # page is held, not its row dicts; the page is still one response, so
+    # page with limit and cursor (or use export_call_logs) for large reads
+    serializer = get_serializer()
+    store = await get_call_log_store()
+    chunks = []
+    total = 0
+    next_cursor = None
+    async for rows, next_cursor in store.iter_chunks(limit, cursor=cursor, source=source,
+                                                     user_id=resolve_tenant()):
+        total += len(rows)
+        chunks.extend(serializer.encode_rows(rows))
+
+    return serializer.rows_result(chunks, {"returned": total, "next_cursor": next_cursor},
+                                  header=f"📞 Recent Call Logs (Last {total}):")
+
+
+@tools.tool(
+    name="export_call_logs",
+    description="Export every call with its cost to a Parquet, Arrow or gzipped NDJSON file, plus cost rollups",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "name": {
+                "type": "string",
+                "description": "File name in the export directory (default: call_logs-<UTC time>)",
+                "minLength": 1,
+                "maxLength": 200
+            },
+            "format": {
+                "type": "string",
+                "enum": ["auto", "parquet", "arrow", "ndjson"],
+                "description": "auto: parquet when pyarrow is installed, otherwise ndjson",
+                "default": "auto"
+            },
+            "since": {
+                "type": "string",
+                "description": "Only calls starting at or after this ISO date or timestamp"
+            },
+            "until": {
+                "type": "string",
+                "description": "Only calls starting before this ISO date or timestamp"
+            }
+        },
+        "required": []
+    },
+    priority=BULK
+)
+async def export_call_logs_tool(arguments: dict) -> ToolResult:
+    from call_log_export import SUFFIXES, export_call_logs, parse_time, resolve_format
+
+    try:
+        format = resolve_format(arguments.get("format", "auto"))
+    except ValueError as e:
+        raise ToolArgumentError(str(e)) from e
+    bounds = {}
+    for key in ("since", "until"):
+        try:
+            bounds[key] = parse_time(arguments.get(key))
+        except ValueError as e:
+            raise ToolArgumentError(f"Invalid {key} timestamp: {arguments[key]}") from e
+    name = arguments.get("name") or f"call_logs-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}"
+    if os.path.basename(name) != name or name.startswith("."):
+        raise ToolArgumentError(f"Invalid export name: {name} (a file name, without directories)")
+    if not name.endswith(SUFFIXES[format]):
+        name += SUFFIXES[format]
+
+    directory = os.environ.get("CALL_CENTER_EXPORT_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                         "exports")
+    os.makedirs(directory, exist_ok=True)
+    summary = await export_call_logs(await get_call_log_store(), os.path.join(directory, name), format,
+                                     resolve_tenant(), **bounds)
+    return get_serializer().result(summary, header=f"✅ Exported {summary['rows']} calls to {summary['path']}")
+
+
+@tools.tool(
+    name="get_call_analytics",
+    description="Aggregate call logs per agent, hour of day, direction or disconnection reason",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "group_by": {
+                "type": "string",
+                "enum": ["agent_id", "agent_name", "hour", "direction", "call_type", "disconnection_reason"],
+                "description": "Column to group by (hour is the UTC hour of the call start)",
+                "default": "agent_id"
+            },
+            "since": {
+                "type": "string",
+                "description": "Only calls starting at or after this ISO timestamp"
+            },
+            "until": {
+                "type": "string",
+                "description": "Only calls starting before this ISO timestamp"
+            },
+            "direction": {
+                "type": "string",
+                "enum": ["inbound", "outbound"],
+                "description": "Only calls in this direction"
+            },
+            "agent_id": {
+                "type": "string",
+                "description": "Only calls handled by this agent"
+            },
+            "disconnection_reason": {
+                "type": "string",
+                "description": "Only calls that ended for this reason"
+            }
+        },
+        "required": []
+    },
+    priority=BULK
+)
+async def get_call_analytics(arguments: dict) -> ToolResult:
+    # numpy is only needed once analytics are requested
+    from columnar_calls import get_columnar_call_logs
+
+    user_id = resolve_tenant()
+    calls = await get_columnar_call_logs(user_id)
+    bounds = {}
+    for key, name in (("since", "start_ms"), ("until", "end_ms")):
+        if arguments.get(key):
+            try:
+                moment = datetime.fromisoformat(arguments[key])
+                if moment.tzinfo is None:
+                    moment = moment.replace(tzinfo=timezone.utc)
+                bounds[name] = int(moment.timestamp() * 1000)
+            except ValueError as e:
+                raise ToolArgumentError(f"Invalid {key} timestamp: {arguments[key]}") from e
+    equals = {key: arguments[key] for key in ("direction", "agent_id", "disconnection_reason") if key in arguments}
+    if user_id:
+        equals["user_id"] = user_id
+    mask = calls.filter(**bounds, **equals)
+    group_by = arguments.get("group_by", "agent_id")
+
+    result = {
+        "calls": int(mask.sum()),
+        "group_by": group_by,
+        "groups": calls.group_by(group_by, mask),
+    }
+    return get_serializer().result(result)
+
+
+@tools.tool(
+    name="forecast_staffing",
+    description="Forecast agents needed, expected wait and abandonment for every 15 minutes of the week (Erlang C)",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "scenarios": {
+                "type": "array",
+                "description": "Service level targets to staff for (default: 80% answered within 20 seconds)",
+                "items": {
                     "type": "object",
                     "properties": {
-                        "title": {
-                            "type": "string",
-                            "description": "Ticket title"
+                        "service_level": {
+                            "type": "number",
+                            "description": "Share of calls answered within answer_seconds",
+                            "default": 0.8,
+                            "exclusiveMinimum": 0,
+                            "maximum": 0.999
                         },
-                        "description": {
-                            "type": "string",
-                            "description": "Ticket description"
-                        },
-                        "priority": {
-                            "type": "string",
-                            "enum": ["low", "medium", "high", "urgent"],
-                            "description": "Ticket priority"
-                        }
-                    },
-                    "required": ["title", "description"]
-                }
-            ),
-            types.Tool(
-                name="get_retell_agents",
-                description="Get list of deployed Retell AI agents",
-                inputSchema={
-                    "type": "object",
-                    "properties": {},
-                    "required": []
-                }
-            ),
-            types.Tool(
-                name="deploy_agent",
-                description="Deploy a Retell AI agent configuration",
-                inputSchema={
-                    "type": "object",
-                    "properties": {
-                        "agent_name": {
-                            "type": "string",
-                            "description": "Name of the agent to deploy"
+                        "answer_seconds": {
+                            "type": "number",
+                            "description": "Target time to answer",
+                            "default": 20,
+                            "minimum": 0
                         },
-                        "business_type": {
-                            "type": "string",
-                            "enum": ["dental", "medical", "restaurant", "general"],
-                            "description": "Type of business"
+                        "growth": {
+                            "type": "number",
+                            "description": "Call volume relative to history, e.g. 1.2 for 20% more calls",
+                            "default": 1.0,
+                            "exclusiveMinimum": 0
                         }
                     },
-                    "required": ["agent_name", "business_type"]
-                }
-            ),
-            types.Tool(
-                name="get_call_logs",
-                description="Get recent call logs from the system",
-                inputSchema={
-                    "type": "object",
-                    "properties": {
-                        "limit": {
-                            "type": "integer",
-                            "description": "Number of logs to return (default: 10)",
-                            "default": 10
-                        }
-                    },
-                    "required": []
-                }
-            )
-        ]
-
-    @app.call_tool()
-    async def call_tool(name: str, arguments: dict) -> list[types.TextContent]:
-        """Handle tool calls"""
-        
-        if name == "get_call_stats":
-            import json
-            stats = {
-                "total_calls_today": 127,
-                "average_wait_time": "3:45",
-                "calls_in_queue": 8,
-                "available_agents": 15,
-                "busy_agents": 7,
-                "satisfaction_score": 4.2,
-                "timestamp": "2024-01-16T12:00:00Z"
-            }
-            return [types.TextContent(
-                type="text",
-                text=json.dumps(stats, indent=2)
-            )]
-        
-        elif name == "create_ticket":
-            import json
-            title = arguments.get("title", "")
-            description = arguments.get("description", "")
-            priority = arguments.get("priority", "medium")
-            
-            ticket_id = f"TICKET-{abs(hash(title + description)) % 10000:04d}"
-            
-            ticket = {
-                "ticket_id": ticket_id,
-                "title": title,
-                "description": description,
-                "priority": priority,
-                "status": "open",
-                "created_at": "2024-01-16T12:00:00Z",
-                "assigned_to": "auto-assignment-queue"
-            }
-            
-            return [types.TextContent(
-                type="text",
-                text=f"✅ Created ticket {ticket_id}\n\n" + json.dumps(ticket, indent=2)
-            )]
-        
-        elif name == "get_retell_agents":
-            import json
-            agents = [
-                {
-                    "agent_id": "agent_123abc",
-                    "agent_name": "Dental Reception AI",
-                    "business_type": "dental",
-                    "status": "active",
-                    "last_call": "2024-01-16T11:30:00Z",
-                    "total_calls": 45,
-                    "phone_number": "+1-800-DENTAL"
+                    "additionalProperties": False
                 },
-                {
-                    "agent_id": "agent_456def",
-                    "agent_name": "Customer Support AI",
-                    "business_type": "general",
-                    "status": "active",
-                    "last_call": "2024-01-16T12:15:00Z",
-                    "total_calls": 23,
-                    "phone_number": "+1-800-SUPPORT"
-                }
-            ]
-            
-            return [types.TextContent(
-                type="text",
-                text="🤖 Active Retell AI Agents:\n\n" + json.dumps(agents, indent=2)
-            )]
-        
-        elif name == "deploy_agent":
-            import json
-            agent_name = arguments.get("agent_name", "")
-            business_type = arguments.get("business_type", "general")
-            
-            deployment_id = f"DEPLOY-{abs(hash(agent_name + business_type)) % 10000:04d}"
-            
-            result = {
-                "deployment_id": deployment_id,
-                "agent_name": agent_name,
-                "business_type": business_type,
-                "status": "deploying",
-                "estimated_completion": "3-5 minutes",
-                "webhook_url": f"https://your-domain.com/api/retell/webhook",
-                "phone_number": f"+1-800-{business_type.upper()[:3]}-{abs(hash(agent_name)) % 1000:03d}"
+                "minItems": 1,
+                "maxItems": 1000
+            },
+            "weeks": {
+                "type": "number",
+                "description": "Weeks of call history to average, ending at until (default: 4)",
+                "default": 4,
+                "exclusiveMinimum": 0,
+                "maximum": 52
+            },
+            "until": {
+                "type": "string",
+                "description": "End of the history window as an ISO timestamp (default: the newest call)"
+            },
+            "patience_seconds": {
+                "type": "number",
+                "description": "Mean time a queued caller waits before hanging up (default: 120)",
+                "default": 120,
+                "exclusiveMinimum": 0
+            },
+            "intervals": {
+                "type": "boolean",
+                "description": "Include per-interval agents, waits and abandonment (turn off for many scenarios)",
+                "default": True
+            }
+        },
+        "required": []
+    },
+    priority=BULK
+)
+async def forecast_staffing(arguments: dict) -> ToolResult:
+    from columnar_calls import get_columnar_call_logs
+    from staffing_forecast import (INTERVAL_SECONDS, Scenario, arrival_profile, forecast, history_window,
+                                   staffing_report)
+
+    until_ms = None
+    if arguments.get("until"):
+        try:
+            moment = datetime.fromisoformat(arguments["until"])
+        except ValueError as e:
+            raise ToolArgumentError(f"Invalid until timestamp: {arguments['until']}") from e
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        until_ms = int(moment.timestamp() * 1000)
+    scenarios = [Scenario(**{**Scenario()._asdict(), **scenario})
+                 for scenario in arguments.get("scenarios") or [{}]]
+
+    user_id = resolve_tenant()
+    calls = await get_columnar_call_logs(user_id)
+    starts, durations, observed = history_window(calls, user_id, arguments.get("weeks", 4), until_ms)
+    if not len(starts):
+        raise ToolArgumentError("No calls in the history window to forecast from")
+    arrivals, handle = arrival_profile(starts, durations, observed)
+    result = forecast(arrivals, handle, scenarios, arguments.get("patience_seconds", 120))
+
+    return get_serializer().result({
+        "history": {"calls": len(starts), "weeks": round(float(observed.mean()), 2)},
+        "interval_minutes": INTERVAL_SECONDS // 60,
+        "first_interval": "Mon 00:00 UTC",
+        "calls_per_interval": [round(x, 2) for x in arrivals.tolist()],
+        "handle_seconds": [round(x, 1) for x in handle.tolist()],
+        "scenarios": staffing_report(arrivals, handle, scenarios, result, arguments.get("intervals", True)),
+    })
+
+
+@tools.tool(
+    name="search_transcripts",
+    description="Search call transcripts by keywords and quoted phrases, newest calls first",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "query": {
+                "type": "string",
+                "description": 'Words that must all appear; quote exact phrases, e.g. refund "cancel my appointment"',
+                "minLength": 1
+            },
+            "limit": {
+                "type": "integer",
+                "description": "Maximum number of calls to return (default: 20)",
+                "default": 20,
+                "minimum": 1,
+                "maximum": 200
             }
-            
-            return [types.TextContent(
-                type="text",
-                text=f"🚀 Deploying Retell AI Agent...\n\n" + json.dumps(result, indent=2)
-            )]
-        
-        elif name == "get_call_logs":
-            import json
-            limit = arguments.get("limit", 10)
-            
-            logs = []
-            for i in range(min(limit, 10)):
-                logs.append({
-                    "call_id": f"call_{1000 + i}",
-                    "timestamp": f"2024-01-16T{12 - i:02d}:00:00Z",
-                    "duration": f"{3 + (i % 5)}:{15 + (i % 45):02d}",
-                    "caller_phone": f"+1-555-{100 + i:03d}-{1000 + i}",
-                    "agent_name": "Dental Reception AI" if i % 2 == 0 else "Customer Support AI",
-                    "call_type": "inbound",
-                    "status": "completed",
-                    "sentiment": "positive" if i % 3 == 0 else "neutral"
-                })
-            
-            return [types.TextContent(
-                type="text",
-                text=f"📞 Recent Call Logs (Last {len(logs)}):\n\n" + json.dumps(logs, indent=2)
-            )]
-        
-        else:
-            raise ValueError(f"Unknown tool: {name}")
+        },
+        "required": ["query"]
+    }
+)
+async def search_transcripts(arguments: dict) -> ToolResult:
+    from transcript_archive import get_transcript_archive
+
+    archive = await get_transcript_archive()
+    try:
+        result = archive.search(arguments["query"], arguments.get("limit", 20),
+                                resolve_tenant())
+    except ValueError as e:
+        raise ToolArgumentError(str(e)) from e
+    return get_serializer().result(result, header=f"🔎 {len(result['matches'])} matching calls")
+
+
+def create_server():
+    """Create and configure the MCP server"""
+    app = server.Server("call-center-automation")
+    tool_list = [types.Tool(**definition) for definition in tools.definitions()]
+    resource_list = [types.Resource(uri=uri, name=name, description=description, mimeType=mime_type)
+                     for uri, name, description, mime_type in METRICS_RESOURCES]
+
+    @app.list_tools()
+    async def list_tools() -> list[types.Tool]:
+        """List available tools"""
+        return tool_list
+
+    # Arguments are checked by the registry's precompiled validators
+    @app.call_tool(validate_input=False)
+    async def call_tool(name: str, arguments: dict) -> ToolResult:
+        """Handle tool calls"""
+        return await tools.dispatch(name, arguments)
+
+    @app.list_resources()
+    async def list_resources() -> list[types.Resource]:
+        """List the metrics resources"""
+        return resource_list
+
+    @app.read_resource()
+    async def read_resource(uri) -> list[ReadResourceContents]:
+        """Serve the metrics resources"""
+        uri = str(uri)
+        return await metrics.call("resource", uri.partition("?")[0], _read_metrics, uri)
 
     return app
 
 
+async def _read_metrics(uri: str) -> list[ReadResourceContents]:
+    text, mime_type = await metrics.read(uri)
+    return [ReadResourceContents(content=text, mime_type=mime_type)]
+
+
+async def _transcript_archive():
+    from transcript_archive import get_transcript_archive
+
+    return await get_transcript_archive()
+
+
 async def main():
     """Main entry point"""
-    from mcp.server.stdio import stdio_server
-    
+    from mcp_socket_transport import parse_transport_args, serve_socket
+
+    args = parse_transport_args("Working MCP Server for Call Center Automation")
     app = create_server()
-    
-    async with stdio_server() as (read_stream, write_stream):
-        await app.run(read_stream, write_stream, {})
+    tasks = (await start_ingest_from_env(stats=get_stats_engines, transcripts=_transcript_archive),
+             start_metrics_dump_from_env(metrics))
+    # Webhook ingest and metrics dump, when configured; cancelled on shutdown
+    app.background_tasks = [task for task in tasks if task is not None]
+    try:
+        if args.listen:
+            await serve_socket(app, args)
+            return
+
+        from mcp.server.stdio import stdio_server
+
+        async with stdio_server() as (read_stream, write_stream):
+            await app.run(read_stream, write_stream, app.create_initialization_options())
+    finally:
+        for task in app.background_tasks:
+            task.cancel()
+        await asyncio.gather(*app.background_tasks, return_exceptions=True)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+-- Tables written by the Call Center MCP servers (docs/ai-gen)
+-- create_ticket(s) and update_agent_status(es) write here in batches
+
+-- 1. Support tickets (id: UUIDv7 text, time-ordered; status open -> assigned -> resolved)
+CREATE TABLE IF NOT EXISTS public.support_tickets (
+    id VARCHAR(40) PRIMARY KEY,
+    user_id UUID,
+    title TEXT NOT NULL,
+    description TEXT NOT NULL,
+    priority VARCHAR(10) NOT NULL DEFAULT 'medium' CHECK (priority IN ('low', 'medium', 'high', 'urgent')),
+    skill VARCHAR(50),
+    status VARCHAR(20) NOT NULL DEFAULT 'open',
+    assigned_to VARCHAR(255),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+ALTER TABLE public.support_tickets ADD COLUMN IF NOT EXISTS skill VARCHAR(50);
+
+CREATE INDEX IF NOT EXISTS idx_support_tickets_user_created ON public.support_tickets(user_id, created_at DESC);
+-- Open and assigned tickets are loaded per business when the assignment engine starts
+CREATE INDEX IF NOT EXISTS idx_support_tickets_user_status ON public.support_tickets(user_id, status);
+
+-- 2. Current availability of each call center agent (one row per business and agent)
+-- skills: comma-separated, matched against support_tickets.skill
+CREATE TABLE IF NOT EXISTS public.call_center_agent_status (
+    agent_id VARCHAR(255) NOT NULL,
+    user_id UUID,
+    status VARCHAR(20) NOT NULL CHECK (status IN ('available', 'busy', 'break', 'offline')),
+    skills TEXT,
+    max_tickets INTEGER NOT NULL DEFAULT 5,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+ALTER TABLE public.call_center_agent_status ADD COLUMN IF NOT EXISTS skills TEXT;
+ALTER TABLE public.call_center_agent_status ADD COLUMN IF NOT EXISTS max_tickets INTEGER NOT NULL DEFAULT 5;
+
+-- Agent ids are only unique within a business: key on (user_id, agent_id) instead of agent_id,
+-- with a NULL user_id (single-business servers) counting as one business.
+-- update_agent_status(es) upserts ON CONFLICT on this index.
+ALTER TABLE public.call_center_agent_status DROP CONSTRAINT IF EXISTS call_center_agent_status_pkey;
+CREATE UNIQUE INDEX IF NOT EXISTS call_center_agent_status_business_agent_key
+    ON public.call_center_agent_status ((COALESCE(CAST(user_id AS TEXT), '')), agent_id);
+
+-- 3. Webhook ingest upserts call logs on call_id (docs/ai-gen/webhook_ingest.py)
+CREATE UNIQUE INDEX IF NOT EXISTS customer_call_logs_call_id_key ON public.customer_call_logs(call_id);
+
+-- 4. Change counters for the business metadata resource (docs/ai-gen/business_metadata.py)
+-- Each write to a source table bumps (user_id, table); readers rebuild only the sections it feeds
+CREATE TABLE IF NOT EXISTS public.business_metadata_versions (
+    user_id UUID NOT NULL,
+    source_table TEXT NOT NULL,
+    version BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, source_table)
+);
+
+CREATE OR REPLACE FUNCTION public.bump_business_metadata_version()
+RETURNS TRIGGER AS $$
+DECLARE
+    owner UUID := CASE WHEN TG_OP = 'DELETE' THEN OLD.user_id ELSE NEW.user_id END;
+BEGIN
+    INSERT INTO public.business_metadata_versions (user_id, source_table, version)
+    VALUES (owner, TG_TABLE_NAME, 1)
+    ON CONFLICT (user_id, source_table)
+    DO UPDATE SET version = public.business_metadata_versions.version + 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    source TEXT;
+BEGIN
+    FOREACH source IN ARRAY ARRAY['business_profiles', 'staff_members', 'business_services',
+                                  'appointment_types', 'office_hours']
+    LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON public.%I', source || '_metadata_version', source);
+        EXECUTE format('CREATE TRIGGER %I AFTER INSERT OR UPDATE OR DELETE ON public.%I '
+                       'FOR EACH ROW EXECUTE FUNCTION public.bump_business_metadata_version()',
+                       source || '_metadata_version', source);
+    END LOOP;
+END;
+$$;